@@ -1,12 +1,25 @@
 #!/usr/bin/env python3
 
 import argparse
+import bisect
+import gzip
+import hashlib
+import html
 import ipaddress
+import itertools
 import json
 import math
+import os
+import random
 import re
+import sqlite3
 import sys
-from collections import defaultdict
+import threading
+import time
+from array import array
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 
 import boto3
 from botocore.config import Config
@@ -14,6 +27,10 @@ from botocore.exceptions import BotoCoreError, ClientError
 
 PREFIX_SIZE = 28
 
+# Adaptive retry handles EC2 throttling more aggressively than the legacy
+# default - useful when scanning many subnets in a single invocation.
+_RETRY_CONFIG = Config(retries={"max_attempts": 10, "mode": "adaptive"})
+
 _CONTROL_CHARS = re.compile(r"[\x00-\x1f\x7f-\x9f]")
 
 
@@ -39,12 +56,18 @@ def _force_utf8_output():
             pass
 
 
-def get_session(profile=None, region=None):
+def get_session(profile=None, region=None, credentials=None):
+    """Build a boto3 Session from a profile, or from the `Credentials` dict of
+    an sts:AssumeRole response."""
     kw = {}
     if profile:
         kw["profile_name"] = profile
     if region:
         kw["region_name"] = region
+    if credentials:
+        kw["aws_access_key_id"] = credentials["AccessKeyId"]
+        kw["aws_secret_access_key"] = credentials["SecretAccessKey"]
+        kw["aws_session_token"] = credentials["SessionToken"]
     return boto3.Session(**kw)
 
 
@@ -84,7 +107,11 @@ def get_subnet_info(ec2, subnet_id):
     subnets = ec2.describe_subnets(SubnetIds=[subnet_id]).get("Subnets") or []
     if not subnets:
         raise ValueError(f"no subnet returned for {subnet_id}")
-    s = subnets[0]
+    return _subnet_info(subnets[0], subnet_id)
+
+
+def _subnet_info(s, subnet_id):
+    """Normalize one DescribeSubnets entry into the subnet_info dict."""
     sid = s.get("SubnetId")
     if not sid:
         raise ValueError(f"DescribeSubnets returned an entry with no SubnetId for {subnet_id}")
@@ -123,16 +150,59 @@ def get_enis(ec2, subnet_id):
     return enis
 
 
-def get_instance_info(ec2, instance_ids):
-    if not instance_ids:
-        return {}
-    info = {}
-    ids_list = list(instance_ids)
-    paginator = ec2.get_paginator("describe_instances")
+def load_vpc_snapshot(ec2, vpc_id):
+    """Fetch every subnet and ENI in a VPC in one paginated pass each.
+
+    Cluster scans otherwise call DescribeSubnets and DescribeNetworkInterfaces
+    once per subnet; this costs one call per page for the whole VPC instead.
+
+    Returns:
+      dict with keys:
+        vpc_id
+        subnets:  {subnet_id: raw DescribeSubnets entry}
+        enis:     {subnet_id: [raw DescribeNetworkInterfaces entry, ...]}
+    """
+    vpc_filter = [{"Name": "vpc-id", "Values": [vpc_id]}]
+    subnets = {}
+    for page in ec2.get_paginator("describe_subnets").paginate(Filters=vpc_filter):
+        for sub in page.get("Subnets", []):
+            if sub.get("SubnetId"):
+                subnets[sub["SubnetId"]] = sub
+    enis = defaultdict(list)
+    for page in ec2.get_paginator("describe_network_interfaces").paginate(Filters=vpc_filter):
+        for eni in page["NetworkInterfaces"]:
+            enis[eni.get("SubnetId")].append(eni)
+    return {"vpc_id": vpc_id, "subnets": subnets, "enis": dict(enis)}
+
+
+# DescribeInstances takes at most 1000 values per filter; a rejected batch is
+# split in half until the offending IDs are isolated.
+INSTANCE_BATCH_SIZE = 1000
+INSTANCE_LOOKUP_WORKERS = 4
+_SPLITTABLE_INSTANCE_ERRORS = (
+    "InvalidInstanceID.NotFound",
+    "InvalidInstanceID.Malformed",
+    "FilterLimitExceeded",
+)
+
+
+def _lookup_instances(ec2, instance_ids, workers=INSTANCE_LOOKUP_WORKERS):
+    """Fetch name and state for `instance_ids`.
+
+    Returns (info, unresolved): info maps each instance found to its name
+    and state; unresolved holds IDs whose lookup failed for a reason other
+    than the instance not existing, so callers know not to trust their
+    absence from info.
+    """
+    ids_list = sorted(instance_ids)
+    if not ids_list:
+        return {}, set()
 
     def fetch(ids):
+        info, unresolved = {}, set()
         try:
-            for page in paginator.paginate(InstanceIds=ids):
+            paginator = ec2.get_paginator("describe_instances")
+            for page in paginator.paginate(Filters=[{"Name": "instance-id", "Values": ids}]):
                 for r in page.get("Reservations", []):
                     for inst in r.get("Instances", []):
                         iid = inst.get("InstanceId")
@@ -146,26 +216,71 @@ def get_instance_info(ec2, instance_ids):
                             "name": name,
                             "state": inst.get("State", {}).get("Name", "unknown"),
                         }
-            return True
         except ClientError as e:
-            code = e.response.get("Error", {}).get("Code", "")
-            if code == "InvalidInstanceID.NotFound":
-                return False  # retry per-id
+            code = _client_error_code(e)
+            if code in _SPLITTABLE_INSTANCE_ERRORS:
+                if len(ids) == 1:
+                    return {}, set()  # this ID is gone or invalid
+                # Bisect so one bad ID costs O(log n) calls, not one per ID.
+                mid = len(ids) // 2
+                for half in (ids[:mid], ids[mid:]):
+                    sub_info, sub_unresolved = fetch(half)
+                    info.update(sub_info)
+                    unresolved |= sub_unresolved
+                return info, unresolved
             print(f"  Warning: instance lookup failed ({code}): {e.response['Error'].get('Message', '')}", file=sys.stderr)
-            return True
+            return info, set(ids) - set(info)
         except BotoCoreError as e:
             # Instance metadata is cosmetic; warn and skip rather than aborting
             # the whole subnet analysis on a transient network error.
             print(f"  Warning: instance metadata lookup failed: {e}", file=sys.stderr)
-            return True
+            return info, set(ids) - set(info)
+        return info, unresolved
+
+    batches = [ids_list[i : i + INSTANCE_BATCH_SIZE] for i in range(0, len(ids_list), INSTANCE_BATCH_SIZE)]
+    if len(batches) == 1 or workers <= 1:
+        results = map(fetch, batches)
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+            results = list(pool.map(fetch, batches))
+    info, unresolved = {}, set()
+    for batch_info, batch_unresolved in results:
+        info.update(batch_info)
+        unresolved |= batch_unresolved
+    return info, unresolved
+
+
+def get_instance_info(ec2, instance_ids, workers=INSTANCE_LOOKUP_WORKERS):
+    return _lookup_instances(ec2, instance_ids, workers)[0]
+
+
+class InstanceInfoCache:
+    """Instance name/state lookups memoized across the subnets of one run.
+
+    Nodes in a cluster usually hold IPs in several subnets, so each instance
+    is described once per run. Instances confirmed missing are remembered
+    too; IDs whose lookup failed transiently are retried on the next call.
+    Safe to share between scan threads.
+    """
 
-    for i in range(0, len(ids_list), 50):
-        batch = ids_list[i : i + 50]
-        # On NotFound for any ID in the batch, retry per-id so survivors resolve.
-        if not fetch(batch):
-            for iid in batch:
-                fetch([iid])
-    return info
+    def __init__(self, workers=INSTANCE_LOOKUP_WORKERS):
+        self.workers = workers
+        self._info = {}
+        self._lock = threading.Lock()
+
+    def get(self, ec2, instance_ids):
+        with self._lock:
+            wanted = [iid for iid in instance_ids if iid not in self._info]
+        if wanted:
+            info, unresolved = _lookup_instances(ec2, wanted, self.workers)
+            with self._lock:
+                for iid in wanted:
+                    if iid in info:
+                        self._info[iid] = info[iid]
+                    elif iid not in unresolved:
+                        self._info.setdefault(iid, None)
+        with self._lock:
+            return {iid: self._info[iid] for iid in instance_ids if self._info.get(iid)}
 
 
 def get_cidr_reservations(ec2, subnet_id):
@@ -221,7 +336,46 @@ def _is_iam_denial(code):
     return code in ("AccessDenied", "AccessDeniedException", "UnauthorizedOperation")
 
 
-def discover_cluster_subnets(eks, ec2, cluster_name, *, tag_scan=True):
+def _describe_nodegroup_subnets(eks, cluster_name, ng):
+    """Return (subnet_ids, warning) for one managed node group."""
+    try:
+        ng_desc = eks.describe_nodegroup(clusterName=cluster_name, nodegroupName=ng)["nodegroup"]
+    except ClientError as e:
+        return [], f"DescribeNodegroup({ng}) failed ({_client_error_code(e)}); skipping"
+    return ng_desc.get("subnets", []) or [], None
+
+
+def _describe_fargate_subnets(eks, cluster_name, fg):
+    """Return (subnet_ids, warning) for one Fargate profile."""
+    try:
+        fg_desc = eks.describe_fargate_profile(
+            clusterName=cluster_name, fargateProfileName=fg
+        )["fargateProfile"]
+    except ClientError as e:
+        return [], f"DescribeFargateProfile({fg}) failed ({_client_error_code(e)}); skipping"
+    return fg_desc.get("subnets", []) or [], None
+
+
+def _tag_scan_subnets(ec2, vpc_id, tag_key, values):
+    """Return (subnet_ids, warning) for one discovery tag in the cluster VPC."""
+    # tag_key is the bare AWS tag key; the EC2 filter Name needs a "tag:" prefix.
+    tag_filters = [
+        {"Name": f"tag:{tag_key}", "Values": values},
+        {"Name": "vpc-id", "Values": [vpc_id]},
+    ]
+    sids = []
+    try:
+        for page in ec2.get_paginator("describe_subnets").paginate(Filters=tag_filters):
+            sids.extend(s["SubnetId"] for s in page.get("Subnets", []))
+    except ClientError as e:
+        code = _client_error_code(e)
+        if _is_iam_denial(code):
+            return [], f"DescribeSubnets (tag:{tag_key}): {code} - skipped this tag"
+        return [], f"DescribeSubnets (tag:{tag_key}) failed ({code}); skipped this tag"
+    return sids, None
+
+
+def discover_cluster_subnets(eks, ec2, cluster_name, *, tag_scan=True, workers=8):
     """Discover all subnets associated with an EKS cluster.
 
     Sources unioned:
@@ -233,6 +387,10 @@ def discover_cluster_subnets(eks, ec2, cluster_name, *, tag_scan=True):
            tag:karpenter.sh/discovery = <name>
            tag:kubernetes.io/role/cni = 1   (cluster-agnostic pod/CNI marker)
 
+    The per-nodegroup and per-profile describes and the tag scans run
+    concurrently on up to `workers` threads; results are merged in the order
+    above, so labels and warnings come out the same as a serial run.
+
     DescribeCluster failure is fatal - we cannot resolve the VPC without it.
     Other steps degrade gracefully: AccessDenied or other ClientError -> warn
     and skip.
@@ -260,80 +418,87 @@ def discover_cluster_subnets(eks, ec2, cluster_name, *, tag_scan=True):
     for sid in vpc_cfg.get("subnetIds", []) or []:
         sources[sid].append("control-plane")
 
-    # 2. Managed node groups
+    # 2./3. List managed node groups and Fargate profiles. Each describe is
+    # independent, so they are fanned out below rather than called in turn.
+    ng_names, ng_warning = [], None
     try:
-        ng_names = []
         for page in eks.get_paginator("list_nodegroups").paginate(clusterName=cluster_name):
             ng_names.extend(page.get("nodegroups", []))
-        for ng in ng_names:
-            try:
-                ng_desc = eks.describe_nodegroup(clusterName=cluster_name, nodegroupName=ng)["nodegroup"]
-                for sid in ng_desc.get("subnets", []) or []:
-                    sources[sid].append(f"nodegroup:{ng}")
-            except ClientError as e:
-                code = _client_error_code(e)
-                warnings.append(f"DescribeNodegroup({ng}) failed ({code}); skipping")
     except ClientError as e:
         code = _client_error_code(e)
+        ng_names = []
         if _is_iam_denial(code):
-            warnings.append(f"ListNodegroups: {code} - skipped managed node group discovery")
+            ng_warning = f"ListNodegroups: {code} - skipped managed node group discovery"
         else:
-            warnings.append(f"ListNodegroups failed ({code}); skipped node group discovery")
+            ng_warning = f"ListNodegroups failed ({code}); skipped node group discovery"
 
-    # 3. Fargate profiles
+    fg_names, fg_warning = [], None
     try:
-        fg_names = []
         for page in eks.get_paginator("list_fargate_profiles").paginate(clusterName=cluster_name):
             fg_names.extend(page.get("fargateProfileNames", []))
-        for fg in fg_names:
-            try:
-                fg_desc = eks.describe_fargate_profile(
-                    clusterName=cluster_name, fargateProfileName=fg
-                )["fargateProfile"]
-                for sid in fg_desc.get("subnets", []) or []:
-                    sources[sid].append(f"fargate:{fg}")
-            except ClientError as e:
-                code = _client_error_code(e)
-                warnings.append(f"DescribeFargateProfile({fg}) failed ({code}); skipping")
     except ClientError as e:
         code = _client_error_code(e)
+        fg_names = []
         if _is_iam_denial(code):
-            warnings.append(f"ListFargateProfiles: {code} - skipped Fargate discovery")
+            fg_warning = f"ListFargateProfiles: {code} - skipped Fargate discovery"
         else:
-            warnings.append(f"ListFargateProfiles failed ({code}); skipped Fargate discovery")
+            fg_warning = f"ListFargateProfiles failed ({code}); skipped Fargate discovery"
 
     # 4. Tag scan, scoped to the cluster VPC. EKS doesn't support cross-VPC
     # subnets and the kubernetes.io/cluster/<name> tag has no documented
     # effect outside the cluster VPC, so a region-wide scan would produce
     # at best stale-tag noise and at worst false positives when two clusters
     # share a name across environments.
+    #
+    # Each tag key is a separate DescribeSubnets call (EC2 ANDs filters
+    # within a call, so OR across keys requires separate requests), all
+    # scoped to the cluster VPC. kubernetes.io/cluster and karpenter.sh
+    # are cluster-specific; kubernetes.io/role/cni is cluster-agnostic
+    # (a pod/CNI subnet marker, also the EKS Auto Mode data plane).
+    tag_specs = []
     if tag_scan:
-        # Each tag key is a separate DescribeSubnets call (EC2 ANDs filters
-        # within a call, so OR across keys requires separate requests), all
-        # scoped to the cluster VPC. kubernetes.io/cluster and karpenter.sh
-        # are cluster-specific; kubernetes.io/role/cni is cluster-agnostic
-        # (a pod/CNI subnet marker, also the EKS Auto Mode data plane).
         tag_specs = [
             ("tag:cluster", f"kubernetes.io/cluster/{cluster_name}", ["owned", "shared"]),
             ("tag:karpenter", "karpenter.sh/discovery", [cluster_name]),
             ("tag:cni-role", "kubernetes.io/role/cni", ["1"]),
         ]
-        # tag_key is the bare AWS tag key; the EC2 filter Name needs a "tag:" prefix.
-        for label, tag_key, values in tag_specs:
-            try:
-                tag_filters = [
-                    {"Name": f"tag:{tag_key}", "Values": values},
-                    {"Name": "vpc-id", "Values": [vpc_id]},
-                ]
-                for page in ec2.get_paginator("describe_subnets").paginate(Filters=tag_filters):
-                    for s in page.get("Subnets", []):
-                        sources[s["SubnetId"]].append(label)
-            except ClientError as e:
-                code = _client_error_code(e)
-                if _is_iam_denial(code):
-                    warnings.append(f"DescribeSubnets (tag:{tag_key}): {code} - skipped this tag")
-                else:
-                    warnings.append(f"DescribeSubnets (tag:{tag_key}) failed ({code}); skipped this tag")
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        ng_futures = [
+            (ng, pool.submit(_describe_nodegroup_subnets, eks, cluster_name, ng)) for ng in ng_names
+        ]
+        fg_futures = [
+            (fg, pool.submit(_describe_fargate_subnets, eks, cluster_name, fg)) for fg in fg_names
+        ]
+        tag_futures = [
+            (label, pool.submit(_tag_scan_subnets, ec2, vpc_id, tag_key, values))
+            for label, tag_key, values in tag_specs
+        ]
+
+        if ng_warning:
+            warnings.append(ng_warning)
+        for ng, future in ng_futures:
+            sids, warning = future.result()
+            for sid in sids:
+                sources[sid].append(f"nodegroup:{ng}")
+            if warning:
+                warnings.append(warning)
+
+        if fg_warning:
+            warnings.append(fg_warning)
+        for fg, future in fg_futures:
+            sids, warning = future.result()
+            for sid in sids:
+                sources[sid].append(f"fargate:{fg}")
+            if warning:
+                warnings.append(warning)
+
+        for label, future in tag_futures:
+            sids, warning = future.result()
+            for sid in sids:
+                sources[sid].append(label)
+            if warning:
+                warnings.append(warning)
 
     return {
         "cluster_name": cluster_name,
@@ -344,66 +509,171 @@ def discover_cluster_subnets(eks, ec2, cluster_name, *, tag_scan=True):
     }
 
 
+# How long a cached discover_cluster_subnets() result is reused, in seconds.
+DISCOVERY_CACHE_TTL = 300
+
+
+def _discovery_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "subnet_frag", "discovery")
+
+
+def _discovery_cache_path(cluster_arn, tag_scan):
+    # The ARN holds ":" and "/", so hash it into a portable filename.
+    digest = hashlib.sha256(f"{cluster_arn}|tag_scan={tag_scan}".encode("utf-8")).hexdigest()
+    return os.path.join(_discovery_cache_dir(), f"{digest}.json")
+
+
+def cluster_arn_for(session, cluster_name, region):
+    """Build the EKS cluster ARN for a bare cluster name via sts:GetCallerIdentity.
+
+    GetCallerIdentity needs no IAM permission. Returns None if the caller
+    identity cannot be resolved, in which case the discovery cache is skipped.
+    """
+    try:
+        caller_arn = session.client("sts", config=_RETRY_CONFIG).get_caller_identity()["Arn"]
+    except (ClientError, BotoCoreError, KeyError):
+        return None
+    parts = caller_arn.split(":")
+    if len(parts) < 5 or not region:
+        return None
+    return f"arn:{parts[1]}:eks:{region}:{parts[4]}:cluster/{cluster_name}"
+
+
+def load_cached_discovery(cluster_arn, tag_scan, ttl=DISCOVERY_CACHE_TTL):
+    """Return (discovery, age_seconds) from the on-disk cache, or (None, None)."""
+    path = _discovery_cache_path(cluster_arn, tag_scan)
+    try:
+        with open(path, encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None, None
+    age = time.time() - entry.get("created", 0)
+    if entry.get("cluster_arn") != cluster_arn or not 0 <= age <= ttl:
+        return None, None
+    return entry.get("discovery"), age
+
+
+def save_cached_discovery(cluster_arn, tag_scan, discovery):
+    """Cache a discovery result. Failures are non-fatal: the cache is an optimization."""
+    path = _discovery_cache_path(cluster_arn, tag_scan)
+    entry = {"cluster_arn": cluster_arn, "created": time.time(), "discovery": discovery}
+    try:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, default=str)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"  Warning: cannot write discovery cache {path}: {e}", file=sys.stderr)
+
+
+# InterfaceType -> (owner_type, detail, owned by the attached instance).
+_ENI_TYPES = {
+    "lambda": ("lambda", "VPC Lambda", False),
+    "nat_gateway": ("nat_gateway", "NAT Gateway", False),
+    "gateway_load_balancer": ("gwlb", "Gateway LB", False),
+    "gateway_load_balancer_endpoint": ("gwlb_endpoint", "Gateway LB Endpoint", False),
+    "load_balancer": ("elb", "Load Balancer", False),
+    "network_load_balancer": ("nlb", "Network Load Balancer", False),
+    "transit_gateway": ("transit_gw", "Transit Gateway", False),
+    "vpc_endpoint": ("vpc_endpoint", "VPC Endpoint", False),
+    "api_gateway_managed": ("api_gw", "API Gateway", False),
+    "efs": ("efs", "EFS Mount Target", False),
+    "trunk": ("trunk", "Trunk ENI (SGP)", True),
+    "branch": ("branch", "Branch ENI (SGP)", True),
+    "efa": ("efa", "Elastic Fabric Adapter", True),
+    "efa-only": ("efa", "Elastic Fabric Adapter", True),
+    "evs": ("evs", "Elastic VMware Service", False),
+    "global_accelerator_managed": ("global_accel", "Global Accelerator", False),
+    "ec2_instance_connect_endpoint": ("eice", "EC2 Instance Connect Endpoint", False),
+    "quicksight": ("quicksight", "QuickSight", False),
+    "iot_rules_managed": ("iot", "IoT Rules", False),
+    "aws_codestar_connections_managed": ("codestar", "CodeStar Connections", False),
+}
+
+# Description prefixes for generic interfaces, in match order, as
+# (prefix, owner_type, detail, owned by the attached instance).
+_ENI_DESC_PREFIXES = (
+    ("ELB ", "elb", "Elastic Load Balancer", False),
+    ("aws-elb", "elb", "Elastic Load Balancer", False),
+    ("arn:aws:ecs:", "ecs_task", "ECS Fargate task", False),
+    ("aws-K8S-", "eks_pod", "EKS pod ENI", True),
+    ("Amazon EKS", "eks_managed", "EKS control plane", False),
+    ("RDSNetworkInterface", "rds", "RDS", False),
+    ("ElastiCache", "elasticache", "ElastiCache", False),
+    ("RedshiftNetworkInterface", "redshift", "Redshift", False),
+    ("AWS CodeBuild", "codebuild", "CodeBuild", False),
+    ("DAX", "dax", "DAX", False),
+)
+# One group per prefix; alternation tries them left to right, so the first
+# matching prefix wins as in a startswith() chain.
+_ENI_DESC_RE = re.compile("|".join(f"({re.escape(p[0])})" for p in _ENI_DESC_PREFIXES))
+
+
+class EniClassifier:
+    """Classify ENIs by owner, caching each result by NetworkInterfaceId.
+
+    build_ip_map(), build_prefix_map() and the ENI listings all need the
+    same classification, so each ENI is classified once per run. A cached
+    entry is reused only while the fields it was computed from are
+    unchanged, so an ENI that is re-attached between --watch polls is
+    reclassified. The cache is cleared when it reaches `max_entries`.
+    """
+
+    def __init__(self, max_entries=200_000):
+        self.max_entries = max_entries
+        self._cache = {}
+
+    def classify(self, eni):
+        """Return (owner_type, owner_id, detail, requester) for one ENI."""
+        attachment = eni.get("Attachment", {})
+        fields = (
+            eni.get("Status", ""),
+            eni.get("InterfaceType", "interface"),
+            eni.get("Description", ""),
+            eni.get("RequesterId", ""),
+            attachment.get("InstanceId"),
+            attachment.get("DeviceIndex", 0),
+        )
+        eni_id = eni.get("NetworkInterfaceId")
+        hit = self._cache.get(eni_id)
+        if hit is not None and hit[0] == fields:
+            return hit[1]
+        result = self._classify(eni, *fields)
+        if eni_id is not None:
+            if len(self._cache) >= self.max_entries:
+                self._cache.clear()
+            self._cache[eni_id] = (fields, result)
+        return result
+
+    def discard(self, eni_id):
+        """Forget a deleted ENI."""
+        self._cache.pop(eni_id, None)
+
+    @staticmethod
+    def _classify(eni, status, itype, desc, requester, instance_id, device_index):
+        if status == "available":
+            return "orphaned", eni["NetworkInterfaceId"], "detached/unused", requester
+        known = _ENI_TYPES.get(itype)
+        if known is not None:
+            owner_type, detail, by_instance = known
+            return owner_type, (instance_id or desc) if by_instance else desc, detail, requester
+        m = _ENI_DESC_RE.match(desc)
+        if m is not None:
+            _, owner_type, detail, by_instance = _ENI_DESC_PREFIXES[m.lastindex - 1]
+            return owner_type, (instance_id or desc) if by_instance else desc, detail, requester
+        if instance_id:
+            kind = "ec2_primary" if device_index == 0 else "ec2_secondary"
+            return kind, instance_id, f"device index {device_index}", requester
+        return "other", desc or eni["NetworkInterfaceId"], itype, requester
+
+
+_ENI_CLASSIFIER = EniClassifier()
+
+
 def classify_eni(eni):
-    itype = eni.get("InterfaceType", "interface")
-    desc = eni.get("Description", "")
-    status = eni.get("Status", "")
-    attachment = eni.get("Attachment", {})
-    instance_id = attachment.get("InstanceId")
-    requester = eni.get("RequesterId", "")
-
-    if status == "available":
-        return "orphaned", eni["NetworkInterfaceId"], "detached/unused", requester
-
-    type_map = {
-        "lambda": ("lambda", desc, "VPC Lambda"),
-        "nat_gateway": ("nat_gateway", desc, "NAT Gateway"),
-        "gateway_load_balancer": ("gwlb", desc, "Gateway LB"),
-        "gateway_load_balancer_endpoint": ("gwlb_endpoint", desc, "Gateway LB Endpoint"),
-        "load_balancer": ("elb", desc, "Load Balancer"),
-        "network_load_balancer": ("nlb", desc, "Network Load Balancer"),
-        "transit_gateway": ("transit_gw", desc, "Transit Gateway"),
-        "vpc_endpoint": ("vpc_endpoint", desc, "VPC Endpoint"),
-        "api_gateway_managed": ("api_gw", desc, "API Gateway"),
-        "efs": ("efs", desc, "EFS Mount Target"),
-        "trunk": ("trunk", instance_id or desc, "Trunk ENI (SGP)"),
-        "branch": ("branch", instance_id or desc, "Branch ENI (SGP)"),
-        "efa": ("efa", instance_id or desc, "Elastic Fabric Adapter"),
-        "efa-only": ("efa", instance_id or desc, "Elastic Fabric Adapter"),
-        "evs": ("evs", desc, "Elastic VMware Service"),
-        "global_accelerator_managed": ("global_accel", desc, "Global Accelerator"),
-        "ec2_instance_connect_endpoint": ("eice", desc, "EC2 Instance Connect Endpoint"),
-        "quicksight": ("quicksight", desc, "QuickSight"),
-        "iot_rules_managed": ("iot", desc, "IoT Rules"),
-        "aws_codestar_connections_managed": ("codestar", desc, "CodeStar Connections"),
-    }
-    if itype in type_map:
-        t = type_map[itype]
-        return t[0], t[1], t[2], requester
-
-    if desc.startswith("ELB ") or desc.startswith("aws-elb"):
-        return "elb", desc, "Elastic Load Balancer", requester
-    if desc.startswith("arn:aws:ecs:"):
-        return "ecs_task", desc, "ECS Fargate task", requester
-    if desc.startswith("aws-K8S-"):
-        return "eks_pod", instance_id or desc, "EKS pod ENI", requester
-    if desc.startswith("Amazon EKS"):
-        return "eks_managed", desc, "EKS control plane", requester
-    if desc.startswith("RDSNetworkInterface"):
-        return "rds", desc, "RDS", requester
-    if desc.startswith("ElastiCache"):
-        return "elasticache", desc, "ElastiCache", requester
-    if desc.startswith("RedshiftNetworkInterface"):
-        return "redshift", desc, "Redshift", requester
-    if desc.startswith("AWS CodeBuild"):
-        return "codebuild", desc, "CodeBuild", requester
-    if desc.startswith("DAX"):
-        return "dax", desc, "DAX", requester
-    if instance_id:
-        idx = attachment.get("DeviceIndex", 0)
-        kind = "ec2_primary" if idx == 0 else "ec2_secondary"
-        return kind, instance_id, f"device index {idx}", requester
-    return "other", desc or eni["NetworkInterfaceId"], itype, requester
+    return _ENI_CLASSIFIER.classify(eni)
 
 
 def build_ip_map(enis):
@@ -447,98 +717,226 @@ def build_prefix_map(enis):
             }
     return prefix_map
 
-def analyze_subnet(cidr, ip_map, cidr_reservations=None, prefix_map=None):
+# Per-address flags in a SubnetBitmap. An address can carry more than one
+# flag (e.g. an AWS-reserved IP that is also listed on an ENI).
+_USED = 1
+_PREFIX = 2
+_RESERVED = 4
+_BLOCK_SIZE = 1 << (32 - PREFIX_SIZE)
+_EMPTY_BLOCK = bytes(_BLOCK_SIZE)
+_ALL_OFFSETS = range(_BLOCK_SIZE)
+
+
+def _ipv4_to_int(ip):
+    """Parse a canonical dotted-quad string to an int, or None if it isn't one.
+
+    IPv4Address rejects leading zeros and short forms, so a key that parses
+    here is exactly the string str(IPv4Address) would produce - the same
+    strings the set-based analysis used to compare against.
+    """
     try:
-        network = ipaddress.ip_network(cidr, strict=False)
-    except (ValueError, TypeError) as e:
-        raise ValueError(f"invalid subnet CIDR {cidr!r}: {e}") from e
-    # All IPs in the subnet range (not just hosts) for consistency with /28 block analysis
-    all_ips = {str(ip) for ip in network}
-    # AWS reserves 5 IPs per subnet: .0 (network), .1 (router), .2 (DNS),
-    # .3 (future), and last IP (broadcast).
-    reserved = {str(network.network_address + i) for i in range(0, 4)} | {str(network.broadcast_address)}
-    used = set(ip_map.keys())
-
-    # Build set of IPs consumed by /28 prefixes. build_prefix_map() validates
-    # CIDRs upstream, but parse defensively here so a hand-built prefix_map
-    # passed by a caller can't crash analysis.
-    prefix_ips = set()
-    prefix_blocks = set()
-    if prefix_map:
-        for pfx_cidr in prefix_map:
-            try:
-                pfx_net = ipaddress.ip_network(pfx_cidr, strict=False)
-            except (ValueError, TypeError):
-                print(f"  Warning: skipping malformed prefix CIDR '{pfx_cidr}'", file=sys.stderr)
-                continue
-            prefix_blocks.add(str(pfx_net))
-            for ip in pfx_net:
-                prefix_ips.add(str(ip))
+        return int(ipaddress.IPv4Address(ip))
+    except (ValueError, TypeError):
+        return None
 
-    # Reserved IPs that are not also used or prefix-allocated (for clean accounting)
-    effective_reserved = reserved - used - prefix_ips
-    free = all_ips - used - reserved - prefix_ips
 
-    reservation_nets = []
-    if cidr_reservations:
-        for r in cidr_reservations:
+def _block_ips(start, offsets):
+    """Dotted-quad strings for the given offsets inside the /28 at int `start`.
+
+    A /28 never crosses a /24 boundary, so only the last octet varies.
+    """
+    head = f"{start >> 24}.{(start >> 16) & 0xFF}.{(start >> 8) & 0xFF}."
+    last = start & 0xFF
+    return [head + str(last + k) for k in offsets]
+
+
+class SubnetBitmap:
+    """Address state of one IPv4 subnet as one byte of flags per address.
+
+    Flags are indexed by offset from the network address, so a /16 is 64 KiB
+    instead of 65k string objects. analyze_subnet() builds one from scratch;
+    SubnetTracker keeps one alive and applies ENI changes to it in place.
+    """
+
+    def __init__(self, cidr, cidr_reservations=None):
+        try:
+            network = ipaddress.ip_network(cidr, strict=False)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"invalid subnet CIDR {cidr!r}: {e}") from e
+        if network.version != 4:
+            raise ValueError(f"invalid subnet CIDR {cidr!r}: IPv4 only")
+        self.network = network
+        self.base = int(network.network_address)
+        # All addresses in the range (not just hosts) for consistency with
+        # /28 block analysis.
+        self.size = network.num_addresses
+        self.num_blocks = self.size // _BLOCK_SIZE if network.prefixlen <= PREFIX_SIZE else 0
+        self.flags = bytearray(self.size)
+
+        # AWS reserves 5 IPs per subnet: .0 (network), .1 (router), .2 (DNS),
+        # .3 (future), and last IP (broadcast). EC2 rejects prefix allocation
+        # for any /28 that contains one of them.
+        self.reserved_offsets = {0, 1, 2, 3, self.size - 1}
+        for off in self.reserved_offsets:
+            if off < self.size:
+                self.flags[off] |= _RESERVED
+
+        # (lo, hi) offset ranges of prefixes, counted so overlapping or
+        # duplicate prefixes can be removed independently.
+        self.prefix_ranges = defaultdict(int)
+        self.prefix_blocks = defaultdict(int)
+
+        ranges = []
+        for r in cidr_reservations or []:
             try:
-                reservation_nets.append(ipaddress.ip_network(r["cidr"], strict=False))
+                rnet = ipaddress.ip_network(r["cidr"], strict=False)
             except (ValueError, TypeError, KeyError):
                 print(f"  Warning: skipping malformed CIDR reservation {r!r}", file=sys.stderr)
+                continue
+            if rnet.version == 4:
+                lo = int(rnet.network_address) - self.base
+                ranges.append((lo, lo + rnet.num_addresses - 1))
+        # Reservations as sorted, merged (lo, hi) offset intervals, so a
+        # block's overlap check is one bisect however many there are.
+        self.reservation_ranges = []
+        for lo, hi in sorted(ranges):
+            if self.reservation_ranges and lo <= self.reservation_ranges[-1][1] + 1:
+                prev_lo, prev_hi = self.reservation_ranges[-1]
+                self.reservation_ranges[-1] = (prev_lo, max(prev_hi, hi))
+            else:
+                self.reservation_ranges.append((lo, hi))
+        self._reservation_starts = [lo for lo, _ in self.reservation_ranges]
+
+    def in_reservation(self, lo, hi):
+        """True if offsets lo..hi overlap any CIDR reservation."""
+        # Intervals are disjoint and sorted: only the last one starting at
+        # or before `hi` can reach back to `lo`.
+        i = bisect.bisect_right(self._reservation_starts, hi) - 1
+        return i >= 0 and self.reservation_ranges[i][1] >= lo
+
+    def mark_ip(self, ip, used=True):
+        """Set or clear the used flag for `ip`; return its block index or None."""
+        n = _ipv4_to_int(ip)
+        if n is None or not 0 <= n - self.base < self.size:
+            return None
+        off = n - self.base
+        if used:
+            self.flags[off] |= _USED
+        else:
+            self.flags[off] &= ~_USED
+        return off // _BLOCK_SIZE
 
-    blocks = list(network.subnets(new_prefix=PREFIX_SIZE)) if network.prefixlen <= PREFIX_SIZE else []
-    # IPs that EC2 considers reserved and will reject for prefix allocation.
-    reserved_all = {network.network_address, network.broadcast_address} | {
-        network.network_address + i for i in range(1, 4)
-    }
-    block_analysis = []
-    for block in blocks:
-        # All 16 IPs in the /28 range are usable within the parent subnet.
-        # block.hosts() excludes network/broadcast of the /28, but those are
-        # regular IPs within the larger subnet - only the parent subnet's
-        # 5 reserved IPs (.0, .1, .2, .3, broadcast) are actually reserved.
-        bips = {str(ip) for ip in block}
-        b_used = [ip for ip in bips if ip in used]
-        b_res = [ip for ip in bips if ip in reserved and ip not in used and ip not in prefix_ips]
-        b_prefix = [ip for ip in bips if ip in prefix_ips]
-        b_free = [ip for ip in bips if ip in free]
-        block_has_reserved = b_res or any(ip in block for ip in reserved_all)
-        is_prefix_allocated = str(block) in prefix_blocks
-
-        # Check if this block overlaps with a CIDR reservation
-        in_reservation = any(block.overlaps(rnet) for rnet in reservation_nets)
-
-        if is_prefix_allocated:
-            status = "prefix_allocated"
-        elif block_has_reserved:
-            status = "has_reserved"
-        elif not b_used:
+    def mark_prefix(self, cidr, allocated=True):
+        """Add or remove a delegated prefix; return the touched block indexes.
+
+        Returns None when `cidr` does not parse. Prefixes from another
+        address family or outside the subnet touch no blocks.
+        """
+        try:
+            pfx_net = ipaddress.ip_network(cidr, strict=False)
+        except (ValueError, TypeError):
+            return None
+        if pfx_net.version != 4:
+            return []
+        lo = int(pfx_net.network_address) - self.base
+        hi = lo + pfx_net.num_addresses - 1
+        key = (lo, hi)
+        is_block = pfx_net.prefixlen == PREFIX_SIZE and 0 <= lo < self.size
+        if allocated:
+            self.prefix_ranges[key] += 1
+            if is_block:
+                self.prefix_blocks[lo // _BLOCK_SIZE] += 1
+        else:
+            if self.prefix_ranges.get(key, 0) <= 0:
+                return []
+            self.prefix_ranges[key] -= 1
+            if not self.prefix_ranges[key]:
+                del self.prefix_ranges[key]
+            if is_block:
+                idx = lo // _BLOCK_SIZE
+                self.prefix_blocks[idx] -= 1
+                if not self.prefix_blocks[idx]:
+                    del self.prefix_blocks[idx]
+
+        first, last = max(lo, 0), min(hi, self.size - 1)
+        if first > last:
+            return []
+        if allocated:
+            for off in range(first, last + 1):
+                self.flags[off] |= _PREFIX
+        else:
+            for off in range(first, last + 1):
+                self.flags[off] &= ~_PREFIX
+            # Re-apply any remaining prefix that overlaps the removed one.
+            for (olo, ohi) in self.prefix_ranges:
+                for off in range(max(olo, first), min(ohi, last) + 1):
+                    self.flags[off] |= _PREFIX
+        return range(first // _BLOCK_SIZE, min(last // _BLOCK_SIZE, self.num_blocks - 1) + 1)
+
+    def free_count(self):
+        return self.flags.count(0)
+
+    def effective_reserved(self, ip_map):
+        """Reserved IPs that are not also used or prefix-allocated.
+
+        Offsets past the end only exist for subnets smaller than /30 and have
+        no bitmap slot, so they are checked against the inputs directly.
+        """
+        count = 0
+        for off in self.reserved_offsets:
+            if off < self.size:
+                count += self.flags[off] == _RESERVED
+            elif str(self.network.network_address + off) not in ip_map and not any(
+                lo <= off <= hi for lo, hi in self.prefix_ranges
+            ):
+                count += 1
+        return count
+
+    def block(self, idx):
+        """Classify /28 block `idx` and return its analysis entry."""
+        # All 16 IPs in the /28 range are usable within the parent subnet -
+        # only the parent subnet's 5 reserved IPs are actually reserved.
+        off = idx * _BLOCK_SIZE
+        start = self.base + off
+        end = off + _BLOCK_SIZE - 1
+        in_reservation = self.in_reservation(off, end)
+        seg = self.flags[off : off + _BLOCK_SIZE]
+
+        if seg == _EMPTY_BLOCK:
+            # Fast path: nothing in this block is used, reserved or prefixed.
             status = "free"
-        elif not b_free:
-            status = "full"
+            b_used, b_free = [], _block_ips(start, _ALL_OFFSETS)
+            n_res = n_prefix = 0
         else:
-            status = "fragmented"
+            b_used = _block_ips(start, [k for k in _ALL_OFFSETS if seg[k] & _USED])
+            b_free = _block_ips(start, [k for k in _ALL_OFFSETS if not seg[k]])
+            n_res = seg.count(_RESERVED)
+            n_prefix = sum(1 for f in seg if f & _PREFIX)
+            if idx in self.prefix_blocks:
+                status = "prefix_allocated"
+            elif any(f & _RESERVED for f in seg):
+                status = "has_reserved"
+            elif not b_used:
+                status = "free"
+            elif not b_free:
+                status = "full"
+            else:
+                status = "fragmented"
 
-        block_analysis.append({
-            "block": str(block),
+        return {
+            "block": f"{ipaddress.IPv4Address(start)}/{PREFIX_SIZE}",
             "status": status,
             "used": len(b_used),
             "free": len(b_free),
-            "reserved": len(b_res),
-            "prefix": len(b_prefix),
+            "reserved": n_res,
+            "prefix": n_prefix,
             "used_ips": b_used,
             "free_ips": b_free,
             "in_reservation": in_reservation,
-        })
+        }
 
-    free_blocks = sum(1 for b in block_analysis if b["status"] == "free")
-    frag_blocks = sum(1 for b in block_analysis if b["status"] == "fragmented")
-    full_blocks = sum(1 for b in block_analysis if b["status"] == "full")
-    reserved_blocks = sum(1 for b in block_analysis if b["status"] == "has_reserved")
-    prefix_allocated_blocks = sum(1 for b in block_analysis if b["status"] == "prefix_allocated")
-    total = len(block_analysis)
 
+def _fragmentation_score(free_blocks, frag_blocks, full_blocks):
     # Fragmentation score: of the blocks that could *ever* serve a new
     # prefix request (free + fragmented + full), what fraction is contended -
     # taken (full) or unusable due to fragmentation? Both reject prefix
@@ -551,25 +949,49 @@ def analyze_subnet(cidr, ip_map, cidr_reservations=None, prefix_map=None):
     # ceil ensures any non-zero contention reads as >=1%.
     candidate_blocks = free_blocks + frag_blocks + full_blocks
     if candidate_blocks == 0:
-        fragmentation_score = None
-    else:
-        fragmentation_score = math.ceil((frag_blocks + full_blocks) / candidate_blocks * 100)
+        return None
+    return math.ceil((frag_blocks + full_blocks) / candidate_blocks * 100)
+
 
+def _analysis_result(bitmap, ip_map, blocks, status_counts):
+    """Assemble the analyze_subnet() result dict from classified blocks."""
+    free_blocks = status_counts.get("free", 0)
+    frag_blocks = status_counts.get("fragmented", 0)
+    full_blocks = status_counts.get("full", 0)
     return {
-        "total_ips": len(all_ips),
-        "used": len(used),
-        "free": len(free),
-        "reserved": len(effective_reserved),
-        "blocks": block_analysis,
-        "total_blocks": total,
+        "total_ips": bitmap.size,
+        "used": len(ip_map),
+        "free": bitmap.free_count(),
+        "reserved": bitmap.effective_reserved(ip_map),
+        "blocks": blocks,
+        "total_blocks": len(blocks),
         "free_blocks": free_blocks,
         "fragmented_blocks": frag_blocks,
         "full_blocks": full_blocks,
-        "reserved_blocks": reserved_blocks,
-        "prefix_allocated_blocks": prefix_allocated_blocks,
-        "fragmentation_score": fragmentation_score,
+        "reserved_blocks": status_counts.get("has_reserved", 0),
+        "prefix_allocated_blocks": status_counts.get("prefix_allocated", 0),
+        "fragmentation_score": _fragmentation_score(free_blocks, frag_blocks, full_blocks),
     }
 
+
+def analyze_subnet(cidr, ip_map, cidr_reservations=None, prefix_map=None):
+    bitmap = SubnetBitmap(cidr, cidr_reservations)
+    # Every ip_map key counts as used (matching the ENI listing), but only
+    # in-subnet addresses land in the bitmap.
+    for ip in ip_map:
+        bitmap.mark_ip(ip)
+    # build_prefix_map() validates CIDRs upstream, but parse defensively here
+    # so a hand-built prefix_map passed by a caller can't crash analysis.
+    for pfx_cidr in prefix_map or ():
+        if bitmap.mark_prefix(pfx_cidr) is None:
+            print(f"  Warning: skipping malformed prefix CIDR '{pfx_cidr}'", file=sys.stderr)
+
+    block_analysis = [bitmap.block(idx) for idx in range(bitmap.num_blocks)]
+    status_counts = defaultdict(int)
+    for b in block_analysis:
+        status_counts[b["status"]] += 1
+    return _analysis_result(bitmap, ip_map, block_analysis, status_counts)
+
 def node_recommendations(analysis, ip_map, instance_info):
     frag_blocks = [b for b in analysis["blocks"] if b["status"] == "fragmented"]
     if not frag_blocks:
@@ -613,7 +1035,534 @@ def node_recommendations(analysis, ip_map, instance_info):
 
     return recs
 
-def print_analysis(subnet_info, analysis, ip_map, instance_info, cidr_reservations=None, prefix_map=None):
+def plan_drain(analysis, ip_map, instance_info, target_free_blocks):
+    """Pick a small set of nodes whose drain brings the subnet to
+    `target_free_blocks` free /28 blocks.
+
+    A fragmented or full block is freed once every node holding an IP in it
+    is drained; blocks with any non-instance owner (ENIs that cannot be
+    drained) are never freed. Unlike node_recommendations(), this also
+    counts blocks shared by several nodes and the combined effect of
+    draining them together.
+
+    Exact minimization is NP-hard, so this is greedy over a block -> owners
+    index: each step drains the set of still-needed owners of some block
+    that frees the most blocks per node drained (capped at what is still
+    needed), until the target is met or nothing else can be freed.
+
+    Returns a dict with the target, free block counts and fragmentation
+    score before/after, `reachable`, and `steps`: the nodes drained at each
+    step with the blocks that step frees.
+    """
+    node_ips = defaultdict(int)
+    for info in ip_map.values():
+        node_ips[info.get("owner_id", "")] += 1
+
+    # Index: block -> owners still to drain, the reverse (owner set ->
+    # blocks waiting on exactly that set), node -> blocks it holds IPs in,
+    # and node -> owner sets that include it.
+    missing = {}
+    by_missing = defaultdict(set)
+    node_blocks = defaultdict(set)
+    sets_by_node = defaultdict(set)
+
+    def _index(blk, owners):
+        missing[blk] = owners
+        if not by_missing[owners]:
+            for node in owners:
+                sets_by_node[node].add(owners)
+        by_missing[owners].add(blk)
+
+    def _unindex(blk):
+        owners = missing.pop(blk)
+        by_missing[owners].discard(blk)
+        if not by_missing[owners]:
+            del by_missing[owners]
+            for node in owners:
+                sets_by_node[node].discard(owners)
+        return owners
+
+    for b in analysis["blocks"]:
+        if b["status"] not in ("fragmented", "full"):
+            continue
+        owners = frozenset(ip_map.get(ip, {}).get("owner_id", "") for ip in b["used_ips"])
+        if not owners or not all(o.startswith("i-") for o in owners):
+            continue
+        _index(b["block"], owners)
+        for node in owners:
+            node_blocks[node].add(b["block"])
+
+    def _freed_by(owners):
+        # Blocks freed by draining `owners` are those waiting on a subset of
+        # it. Enumerating subsets is cheap for the usual handful of owners.
+        if len(owners) <= 6:
+            members = sorted(owners)
+            return [
+                blk
+                for r in range(1, len(members) + 1)
+                for sub in itertools.combinations(members, r)
+                for blk in by_missing.get(frozenset(sub), ())
+            ]
+        return [blk for sub, blks in by_missing.items() if sub <= owners for blk in blks]
+
+    # freed-block lists per candidate owner set, invalidated when an owner
+    # set it contains changes.
+    freed_cache = {}
+    free_before = analysis["free_blocks"]
+    need = target_free_blocks - free_before
+    steps = []
+    while need > 0 and by_missing:
+        best, best_key = None, None
+        for owners in by_missing:
+            freed = freed_cache.get(owners)
+            if freed is None:
+                freed = freed_cache[owners] = _freed_by(owners)
+            # Most blocks per node, then more blocks, then a stable order.
+            key = (min(len(freed), need) / len(owners), len(freed))
+            if best_key is None or key > best_key or (
+                key == best_key and sorted(owners) < sorted(best[0])
+            ):
+                best, best_key = (owners, freed), key
+        owners, freed = best
+
+        changed = set()
+        for blk in set().union(*(node_blocks.pop(n, ()) for n in owners)):
+            old = _unindex(blk)
+            remaining = old - owners
+            changed.add(old)
+            if remaining:
+                _index(blk, remaining)
+                changed.add(remaining)
+        for sub in changed:
+            freed_cache.pop(sub, None)
+            for superset in set.intersection(*(sets_by_node[n] for n in sub)):
+                freed_cache.pop(superset, None)
+        need -= len(freed)
+        steps.append({
+            "nodes": [{
+                "node_id": node,
+                "node_name": instance_info.get(node, {}).get("name", node),
+                "state": instance_info.get(node, {}).get("state", "unknown"),
+                "total_ips_held": node_ips[node],
+            } for node in sorted(owners)],
+            "block_cidrs": sorted(freed, key=lambda c: ipaddress.ip_network(c)),
+        })
+
+    freed_total = sum(len(s["block_cidrs"]) for s in steps)
+    # Freed blocks move from fragmented/full to free. A partly drained full
+    # block becomes fragmented, which still counts against the score.
+    contended_after = analysis["fragmented_blocks"] + analysis["full_blocks"] - freed_total
+    return {
+        "target_free_blocks": target_free_blocks,
+        "free_blocks_before": free_before,
+        "free_blocks_after": free_before + freed_total,
+        "reachable": free_before + freed_total >= target_free_blocks,
+        "fragmentation_score_before": analysis["fragmentation_score"],
+        "fragmentation_score_after": _fragmentation_score(
+            free_before + freed_total, contended_after, 0
+        ),
+        "nodes_to_drain": sum(len(s["nodes"]) for s in steps),
+        "steps": steps,
+    }
+
+
+# Defaults for --simulate: a scale-out of `nodes` nodes (one per step), each
+# taking one IP for its primary ENI plus `prefixes_per_node` /28 prefixes,
+# while other workloads allocate `secondary_per_step` individual IPs a step.
+SIMULATION_DEFAULTS = {
+    "nodes": 10,
+    "prefixes_per_node": 2,
+    "churn": 0.05,
+    "secondary_per_step": 2,
+    "steps": 100,
+    "iterations": 1000,
+    "seed": None,
+}
+_FULL_BLOCK = b"\x01" * _BLOCK_SIZE
+
+
+def _percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted, non-empty sequence."""
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(q / 100 * len(sorted_values)) - 1))]
+
+
+class _BlockModel:
+    """Compact allocator state for simulate_capacity().
+
+    One byte per address (1 = taken), one byte per block counting taken
+    addresses, and a swap-remove list of the blocks a new /28 prefix could
+    use. Copying a model for the next Monte Carlo iteration is a few
+    buffer copies, with no per-block or per-IP objects.
+    """
+
+    def __init__(self, ips, used, pinned, free_list, pos):
+        self.ips = ips
+        self.used = used
+        self.pinned = pinned
+        self.free_list = free_list
+        self.pos = pos
+
+    @classmethod
+    def from_analysis(cls, analysis):
+        blocks = analysis["blocks"]
+        ips = bytearray(len(blocks) * _BLOCK_SIZE)
+        pinned = bytearray(len(blocks))
+        for idx, b in enumerate(blocks):
+            if b["status"] == "free":
+                continue
+            off = idx * _BLOCK_SIZE
+            ips[off : off + _BLOCK_SIZE] = _FULL_BLOCK
+            if b["free_ips"]:
+                start = _ipv4_to_int(b["block"].split("/")[0])
+                for ip in b["free_ips"]:
+                    ips[off + _ipv4_to_int(ip) - start] = 0
+            # Reserved and already delegated blocks never take a new prefix.
+            if b["status"] in ("has_reserved", "prefix_allocated"):
+                pinned[idx] = 1
+        used = bytearray(ips[i : i + _BLOCK_SIZE].count(1) for i in range(0, len(ips), _BLOCK_SIZE))
+        free_list = array("l", (i for i in range(len(blocks)) if not used[i] and not pinned[i]))
+        pos = array("l", [-1]) * len(blocks)
+        for k, idx in enumerate(free_list):
+            pos[idx] = k
+        return cls(ips, used, pinned, free_list, pos)
+
+    def copy(self):
+        return _BlockModel(bytearray(self.ips), bytearray(self.used), self.pinned,
+                           array("l", self.free_list), array("l", self.pos))
+
+    def _unlist(self, idx):
+        k = self.pos[idx]
+        last = self.free_list.pop()
+        if last != idx:
+            self.free_list[k] = last
+            self.pos[last] = k
+        self.pos[idx] = -1
+
+    def _list(self, idx):
+        self.pos[idx] = len(self.free_list)
+        self.free_list.append(idx)
+
+    def take_block(self, rng):
+        """Delegate a random free /28; return its index, or None if none is left."""
+        if not self.free_list:
+            return None
+        idx = self.free_list[int(rng.random() * len(self.free_list))]
+        self._unlist(idx)
+        off = idx * _BLOCK_SIZE
+        self.ips[off : off + _BLOCK_SIZE] = _FULL_BLOCK
+        self.used[idx] = _BLOCK_SIZE
+        return idx
+
+    def release_block(self, idx):
+        off = idx * _BLOCK_SIZE
+        self.ips[off : off + _BLOCK_SIZE] = _EMPTY_BLOCK
+        self.used[idx] = 0
+        self._list(idx)
+
+    def take_ip(self, rng):
+        """Assign a random free address; return its offset, or None if full."""
+        size = len(self.ips)
+        if not size:
+            return None
+        # Rejection sampling is O(1) until the subnet is nearly full; then
+        # scan from a random start for the next free address.
+        for _ in range(32):
+            off = int(rng.random() * size)
+            if not self.ips[off]:
+                break
+        else:
+            start = int(rng.random() * size)
+            off = self.ips.find(0, start)
+            if off < 0:
+                off = self.ips.find(0, 0, start)
+                if off < 0:
+                    return None
+        self.ips[off] = 1
+        idx = off // _BLOCK_SIZE
+        self.used[idx] += 1
+        if self.used[idx] == 1 and not self.pinned[idx]:
+            self._unlist(idx)
+        return off
+
+    def release_ip(self, off):
+        self.ips[off] = 0
+        idx = off // _BLOCK_SIZE
+        self.used[idx] -= 1
+        if not self.used[idx] and not self.pinned[idx]:
+            self._list(idx)
+
+
+def _churned(rng, n, p):
+    """Indexes in range(n), highest first, each picked with probability p.
+
+    Draws the gap to the next pick from a geometric distribution, so the
+    cost is proportional to the number picked rather than to n.
+    """
+    if p >= 1:
+        yield from range(n - 1, -1, -1)
+        return
+    if p <= 0:
+        return
+    log_q = math.log1p(-p)
+    i = n
+    while True:
+        i -= 1 + int(math.log(1.0 - rng.random()) / log_q)
+        if i < 0:
+            return
+        yield i
+
+
+def _simulate_once(model, rng, nodes, prefixes_per_node, churn, secondary_per_step, steps):
+    """One Monte Carlo run; return (first failure step or None, failures, free blocks per step)."""
+    prefixes = []
+    secondaries = []
+    first_failure, failures = None, 0
+    series = array("l")
+    for step in range(1, steps + 1):
+        failed = 0
+        # A churned prefix is released and immediately requested again, as
+        # the CNI does when pods cycle through a node's warm pool.
+        for k in _churned(rng, len(prefixes), churn):
+            model.release_block(prefixes[k])
+            idx = model.take_block(rng)
+            if idx is None:
+                prefixes[k] = prefixes[-1]
+                prefixes.pop()
+                failed += 1
+            else:
+                prefixes[k] = idx
+        for k in _churned(rng, len(secondaries), churn):
+            model.release_ip(secondaries[k])
+            secondaries[k] = secondaries[-1]
+            secondaries.pop()
+        if step <= nodes:
+            model.take_ip(rng)  # the node's primary ENI address
+            for _ in range(prefixes_per_node):
+                idx = model.take_block(rng)
+                if idx is None:
+                    failed += 1
+                else:
+                    prefixes.append(idx)
+        for _ in range(secondary_per_step):
+            off = model.take_ip(rng)
+            if off is not None:
+                secondaries.append(off)
+        if failed:
+            failures += failed
+            if first_failure is None:
+                first_failure = step
+        series.append(len(model.free_list))
+    return first_failure, failures, series
+
+
+def simulate_capacity(analysis, *, nodes=SIMULATION_DEFAULTS["nodes"],
+                      prefixes_per_node=SIMULATION_DEFAULTS["prefixes_per_node"],
+                      churn=SIMULATION_DEFAULTS["churn"],
+                      secondary_per_step=SIMULATION_DEFAULTS["secondary_per_step"],
+                      steps=SIMULATION_DEFAULTS["steps"],
+                      iterations=SIMULATION_DEFAULTS["iterations"], seed=None):
+    """Monte Carlo what-if for prefix delegation on top of analyze_subnet().
+
+    Starting from the analyzed block state, each iteration replays `steps`
+    steps: one new node per step until `nodes` have joined (a primary IP
+    plus `prefixes_per_node` /28 prefixes, each on a random free block),
+    `secondary_per_step` individual IPs for other workloads on random free
+    addresses, and every simulated prefix and secondary IP released with
+    probability `churn` per step (prefixes are requested again at once).
+    Existing allocations are left in place.
+
+    Returns the run parameters, the share of iterations in which a /28
+    request failed, percentiles of the first failing step, and p5/p50/p95
+    free /28 blocks after each step.
+    """
+    params = {
+        "nodes": nodes, "prefixes_per_node": prefixes_per_node, "churn": churn,
+        "secondary_per_step": secondary_per_step, "steps": steps,
+        "iterations": iterations, "seed": seed,
+    }
+    base = _BlockModel.from_analysis(analysis)
+    rng = random.Random(seed)
+    first_failures, total_failures, runs = [], 0, []
+    for _ in range(iterations):
+        first, failures, series = _simulate_once(
+            base.copy(), rng, nodes, prefixes_per_node, churn, secondary_per_step, steps,
+        )
+        if first is not None:
+            first_failures.append(first)
+        total_failures += failures
+        runs.append(series)
+
+    first_failures.sort()
+    free_blocks = []
+    for step in range(steps):
+        column = sorted(series[step] for series in runs)
+        free_blocks.append({
+            "step": step + 1,
+            "p5": _percentile(column, 5),
+            "p50": _percentile(column, 50),
+            "p95": _percentile(column, 95),
+        })
+    return {
+        "params": params,
+        "free_blocks_before": len(base.free_list),
+        "failure_probability": len(first_failures) / iterations if iterations else 0.0,
+        "mean_failed_requests": total_failures / iterations if iterations else 0.0,
+        "first_failure_step": {
+            "p5": _percentile(first_failures, 5),
+            "p50": _percentile(first_failures, 50),
+            "p95": _percentile(first_failures, 95),
+        } if first_failures else None,
+        "free_blocks": free_blocks,
+    }
+
+
+def _severity(analysis):
+    """Severity label for an analysis' fragmentation score (None if N/A)."""
+    score = analysis["fragmentation_score"]
+    if score is None:
+        return None
+    if score == 100:
+        return "EXHAUSTED" if analysis["fragmented_blocks"] == 0 else "CRITICAL"
+    if score >= 75:
+        return "HIGH"
+    if score >= 50:
+        return "MEDIUM"
+    if score >= 25:
+        return "LOW"
+    return "HEALTHY"
+
+
+# Block map statuses from best to worst; a zoomed-out cell shows the worst
+# status among the blocks it covers.
+_MAP_STATUSES = ("free", "prefix_reserved", "prefix_allocated", "has_reserved", "fragmented", "full")
+_MAP_RANK = {status: rank for rank, status in enumerate(_MAP_STATUSES)}
+_MAP_GLYPHS = ("□", "P", "A", "R", "▣", "■")
+_MAP_COLORS = ("#e8f5e9", "#bbdefb", "#90caf9", "#bdbdbd", "#ffb74d", "#e53935")
+BLOCK_MAP_ZOOMS = (1, 16, 256)
+_MAP_COLUMNS = 16
+_MAP_MAX_CELLS = 256
+_SVG_COLUMNS = 64
+_SVG_MAX_CELLS = 16384
+
+
+def _map_status(block):
+    # P marks free blocks inside a CIDR reservation.
+    if block["in_reservation"] and block["status"] == "free":
+        return "prefix_reserved"
+    return block["status"]
+
+
+def block_map_zoom(num_blocks, max_cells=_MAP_MAX_CELLS):
+    """Smallest power-of-16 blocks-per-cell that fits the map in `max_cells`."""
+    zoom = 1
+    while -(-num_blocks // zoom) > max_cells:
+        zoom *= 16
+    return zoom
+
+
+def block_map_cells(blocks, zoom=1):
+    """Status rank (index into _MAP_STATUSES) of each map cell as bytes.
+
+    Each cell covers `zoom` consecutive blocks and takes the worst status
+    among them.
+    """
+    ranks = bytes(_MAP_RANK[_map_status(b)] for b in blocks)
+    if zoom == 1:
+        return ranks
+    return bytes(max(ranks[i : i + zoom]) for i in range(0, len(ranks), zoom))
+
+
+def render_block_map(blocks, zoom=None):
+    """The text block map: header, legend and rows of 16 cells, as one string.
+
+    With zoom > 1 (chosen automatically when None, so even a /12 renders as
+    at most 256 cells) each row is labelled with its first block.
+    """
+    if zoom is None:
+        zoom = block_map_zoom(len(blocks))
+    cells = block_map_cells(blocks, zoom)
+    legend = "■ full  ▣ fragmented  □ free  R reserved  A prefix-allocated  P prefix-reserved"
+    if zoom == 1:
+        out = [f"  /28 Block Map:  {legend}"]
+    else:
+        out = [f"  /28 Block Map (1 cell = {zoom} blocks, worst status shown):  {legend}"]
+    step = _MAP_COLUMNS
+    for row in range(0, len(cells), step):
+        glyphs = " ".join(_MAP_GLYPHS[c] for c in cells[row : row + step])
+        if zoom == 1:
+            out.append(f"  {glyphs}")
+        else:
+            out.append(f"  {blocks[row * zoom]['block']:<18} {glyphs}")
+    return "\n".join(out) + "\n"
+
+
+def render_block_map_svg(blocks, zoom=None, cell=12):
+    """The block map as an inline SVG, one square per cell with a tooltip.
+
+    Zooms out automatically to keep at most 16384 cells, so the SVG stays a
+    few megabytes even for a /12.
+    """
+    if zoom is None:
+        zoom = block_map_zoom(len(blocks), _SVG_MAX_CELLS)
+    cells = block_map_cells(blocks, zoom)
+    cols = min(_SVG_COLUMNS, max(1, len(cells)))
+    rows = -(-len(cells) // cols)
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{cols * cell}" height="{rows * cell}" '
+        f'role="img" aria-label="/28 block map">'
+    ]
+    for i, rank in enumerate(cells):
+        first = blocks[i * zoom]["block"]
+        label = first if zoom == 1 else f"{first} +{min(zoom, len(blocks) - i * zoom) - 1} blocks"
+        parts.append(
+            f'<rect x="{(i % cols) * cell}" y="{(i // cols) * cell}" width="{cell - 1}" '
+            f'height="{cell - 1}" fill="{_MAP_COLORS[rank]}"><title>{label}: '
+            f'{_MAP_STATUSES[rank].replace("_", " ")}</title></rect>'
+        )
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+_HTML_HEAD = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Subnet fragmentation report</title>
+<style>
+body { font-family: sans-serif; margin: 2em; }
+section { margin-bottom: 2em; }
+.legend span { display: inline-block; margin-right: 1em; }
+.legend i { display: inline-block; width: 0.9em; height: 0.9em; margin-right: 0.3em; vertical-align: middle; }
+</style></head><body>
+<h1>Subnet fragmentation report</h1>
+"""
+
+
+def html_report_head():
+    legend = "".join(
+        f'<span><i style="background:{color}"></i>{status.replace("_", " ")}</span>'
+        for status, color in zip(_MAP_STATUSES, _MAP_COLORS)
+    )
+    return _HTML_HEAD + f'<p class="legend">{legend}</p>\n'
+
+
+def html_report_section(subnet_info, analysis):
+    """One subnet's heading, block counts and SVG block map for --html."""
+    name = html.escape(subnet_info["tags"].get("Name", subnet_info["subnet_id"]))
+    score = analysis["fragmentation_score"]
+    score_str = "N/A" if score is None else f"{score}% ({_severity(analysis)})"
+    return (
+        f"<section><h2>{name} ({html.escape(subnet_info['subnet_id'])})</h2>\n"
+        f"<p>{html.escape(subnet_info['cidr'])} in {html.escape(subnet_info['az'])}: "
+        f"{analysis['total_blocks']} blocks, {analysis['free_blocks']} free, "
+        f"{analysis['fragmented_blocks']} fragmented, {analysis['full_blocks']} full. "
+        f"Fragmentation {score_str}.</p>\n"
+        f"{render_block_map_svg(analysis['blocks'])}\n</section>\n"
+    )
+
+
+HTML_REPORT_TAIL = "</body></html>\n"
+
+
+def print_analysis(subnet_info, analysis, ip_map, instance_info, cidr_reservations=None, prefix_map=None,
+                   map_zoom=None):
     name = _sanitize(subnet_info["tags"].get("Name", subnet_info["subnet_id"]))
     print(f"\n{'═' * 70}")
     print(f"  Subnet: {name} ({subnet_info['subnet_id']})")
@@ -640,40 +1589,16 @@ def print_analysis(subnet_info, analysis, ip_map, instance_info, cidr_reservatio
         print("  Fragmentation: N/A (no candidate blocks - all reserved or already prefix-allocated)")
     else:
         bar = "█" * (score // 5) + "░" * (20 - score // 5)
-        if score == 100:
-            severity = "EXHAUSTED" if analysis["fragmented_blocks"] == 0 else "CRITICAL"
-        elif score >= 75:
-            severity = "HIGH"
-        elif score >= 50:
-            severity = "MEDIUM"
-        elif score >= 25:
-            severity = "LOW"
-        else:
-            severity = "HEALTHY"
-        print(f"  Fragmentation: [{bar}] {score}% ({severity})")
+        print(f"  Fragmentation: [{bar}] {score}% ({_severity(analysis)})")
 
     # Owner summary
-    owners = defaultdict(lambda: {"enis": set(), "ips": 0})
-    for ip, info in ip_map.items():
-        owners[info["owner_type"]]["enis"].add(info["eni_id"])
-        owners[info["owner_type"]]["ips"] += 1
-
     print(f"\n  {'Owner Type':<20} {'ENIs':>6} {'IPs':>6}")
     print(f"  {'─' * 36}")
-    for otype, data in sorted(owners.items(), key=lambda x: -x[1]["ips"]):
-        print(f"  {otype.replace('_', ' '):<20} {len(data['enis']):>6} {data['ips']:>6}")
-
-    # Block map - P marks blocks inside a CIDR reservation
-    print("\n  /28 Block Map:  ■ full  ▣ fragmented  □ free  R reserved  A prefix-allocated  P prefix-reserved\n  ", end="")
-    for i, b in enumerate(analysis["blocks"]):
-        if b["in_reservation"] and b["status"] == "free":
-            sym = "P"
-        else:
-            sym = {"free": "□", "full": "■", "fragmented": "▣", "has_reserved": "R", "prefix_allocated": "A"}[b["status"]]
-        print(sym, end=" ")
-        if (i + 1) % 16 == 0:
-            print("\n  ", end="")
+    for otype, data in sorted(owner_breakdown(ip_map).items(), key=lambda x: -x[1]["ips"]):
+        print(f"  {otype.replace('_', ' '):<20} {data['enis']:>6} {data['ips']:>6}")
+
     print()
+    sys.stdout.write(render_block_map(analysis["blocks"], map_zoom))
 
     # Fragmented block details
     frag = [b for b in analysis["blocks"] if b["status"] == "fragmented"]
@@ -722,6 +1647,54 @@ def print_node_recs(recs):
             print(f"        ... +{len(r['block_cidrs']) - 5} more")
 
 
+def print_drain_plan(plan):
+    print("\n  ── Drain Plan ──")
+    print(f"  Target: {plan['target_free_blocks']} free /28 blocks "
+          f"(currently {plan['free_blocks_before']})")
+    if not plan["steps"]:
+        if plan["reachable"]:
+            print("  Target already met; nothing to drain.")
+        else:
+            print("  No drain can free another /28 block (remaining blocks hold non-node ENIs).")
+        return
+
+    def _pct(score):
+        return "N/A" if score is None else f"{score}%"
+
+    print(f"  Drain {plan['nodes_to_drain']} node(s) -> {plan['free_blocks_after']} free blocks, "
+          f"fragmentation {_pct(plan['fragmentation_score_before'])} -> "
+          f"{_pct(plan['fragmentation_score_after'])}")
+    if not plan["reachable"]:
+        print("  Target not reachable by draining nodes alone; this plan frees every block it can.")
+    print()
+    for i, step in enumerate(plan["steps"], 1):
+        names = ", ".join(f"{_sanitize(n['node_name'])} ({n['node_id']})" for n in step["nodes"])
+        cidrs = step["block_cidrs"]
+        print(f"    {i}. {names}")
+        more = f" ... +{len(cidrs) - 5} more" if len(cidrs) > 5 else ""
+        print(f"       Frees {len(cidrs)} block(s): {', '.join(cidrs[:5])}{more}")
+
+
+def print_simulation(sim):
+    p = sim["params"]
+    print("\n  ── Capacity Simulation ──")
+    print(f"  {p['iterations']} runs x {p['steps']} steps: +{p['nodes']} node(s) x {p['prefixes_per_node']} "
+          f"prefix(es), {p['secondary_per_step']} secondary IP(s)/step, churn {p['churn']:g}/step")
+    print(f"  Free /28 blocks now: {sim['free_blocks_before']}")
+    first = sim["first_failure_step"]
+    if first is None:
+        print("  No /28 allocation failed in any run.")
+    else:
+        print(f"  /28 allocation failed in {sim['failure_probability']:.1%} of runs; "
+              f"first failure at step {first['p50']} (p5 {first['p5']}, p95 {first['p95']}), "
+              f"{sim['mean_failed_requests']:.1f} failed request(s) per run on average")
+    print(f"\n    {'Step':>6} {'Free /28 p5':>12} {'p50':>6} {'p95':>6}")
+    rows = sim["free_blocks"]
+    stride = max(1, len(rows) // 10)
+    for row in rows[stride - 1 :: stride]:
+        print(f"    {row['step']:>6} {row['p5']:>12} {row['p50']:>6} {row['p95']:>6}")
+
+
 def print_discovery(discovered, region):
     print(f"\n{'═' * 70}")
     mode = "  [EKS Auto Mode]" if discovered.get("auto_mode") else ""
@@ -757,10 +1730,10 @@ def print_enis(enis, ip_map, instance_info):
     print(f"  {'ENI ID':<28} {'Status':<12} {'Type':<16} {'Owner':<40} {'IPs':>4}")
     print(f"  {'─' * 104}")
 
-    for eni in sorted(enis, key=lambda e: classify_eni(e)[0]):
+    classified = [(classify_eni(e), e) for e in enis]
+    for (owner_type, owner_id, detail, requester), eni in sorted(classified, key=lambda c: c[0][0]):
         eni_id = eni["NetworkInterfaceId"]
         status = eni.get("Status", "?")
-        owner_type, owner_id, detail, requester = classify_eni(eni)
         managed = eni.get("RequesterManaged", False)
 
         owner_display = _sanitize(str(owner_id))
@@ -790,6 +1763,1200 @@ def print_enis(enis, ip_map, instance_info):
                 print(f"               ... +{len(secondary) - 6} more")
     print()
 
+# File format version written by --record. Bump when the layout of the file
+# changes incompatibly.
+RECORDING_VERSION = 1
+
+
+def _call_key(operation, params):
+    return operation, json.dumps(params, sort_keys=True, default=str)
+
+
+class _Paginated:
+    """Paginator stand-in that routes paginate() through a wrapping client."""
+
+    def __init__(self, client, operation):
+        self._client = client
+        self._operation = operation
+
+    def paginate(self, **params):
+        return self._client._call(self._operation, params, paginated=True)
+
+
+class RecordingClient:
+    """Wrap a boto3 client and record every response it returns.
+
+    Both direct calls (ec2.describe_subnets(...)) and paginators
+    (ec2.get_paginator(...).paginate(...)) are captured, keyed by operation
+    and parameters. ClientErrors are recorded too so a replay reproduces the
+    same warnings and fallbacks (e.g. AccessDenied on CIDR reservations, or
+    InvalidInstanceID.NotFound batch retries). Transient BotoCoreErrors are
+    not recorded. Safe to share one `calls` list across per-thread clients.
+    """
+
+    def __init__(self, client, calls, lock):
+        self._client = client
+        self._calls = calls
+        self._lock = lock
+
+    def get_paginator(self, operation):
+        return _Paginated(self, operation)
+
+    def __getattr__(self, operation):
+        return lambda **params: self._call(operation, params)
+
+    def _call(self, operation, params, paginated=False):
+        entry = {"operation": operation, "params": params, "paginated": paginated}
+        try:
+            if paginated:
+                result = list(self._client.get_paginator(operation).paginate(**params))
+            else:
+                result = getattr(self._client, operation)(**params)
+        except ClientError as e:
+            entry["error"] = {
+                "Code": _client_error_code(e),
+                "Message": e.response.get("Error", {}).get("Message", ""),
+            }
+            with self._lock:
+                self._calls.append(entry)
+            raise
+        # ResponseMetadata (request IDs, headers) is noise for a replay.
+        if paginated:
+            result = [{k: v for k, v in page.items() if k != "ResponseMetadata"} for page in result]
+        else:
+            result = {k: v for k, v in result.items() if k != "ResponseMetadata"}
+        entry["result"] = result
+        with self._lock:
+            self._calls.append(entry)
+        return result
+
+
+def _instance_id_filter(params):
+    """Instance IDs of a DescribeInstances call filtering on instance-id only, else None."""
+    filters = params.get("Filters", [])
+    if set(params) != {"Filters"} or len(filters) != 1 or filters[0].get("Name") != "instance-id":
+        return None
+    return list(filters[0].get("Values", []))
+
+
+class ReplayClient:
+    """Serve EC2 responses from a --record file instead of AWS.
+
+    A call that was not recorded raises ClientError with code
+    "NotInSnapshot", which callers handle like any other API failure.
+
+    Instance lookups are answered per instance ID from all recorded
+    DescribeInstances calls: with the instance cache shared between scan
+    threads, which IDs share a request depends on thread timing, so a
+    replay (with any --workers) seldom repeats the recorded batches.
+    """
+
+    def __init__(self, calls):
+        self._calls = {}
+        self._instances = {}
+        self._instance_ids_described = set()
+        self._instance_errors = {}
+        for entry in calls:
+            key = _call_key(entry["operation"], entry["params"]) + (entry.get("paginated", False),)
+            self._calls[key] = entry
+            ids = _instance_id_filter(entry["params"]) if entry["operation"] == "describe_instances" else None
+            if ids is None:
+                continue
+            if "error" in entry:
+                # A rejected batch says nothing about its other IDs once it is
+                # bisected; the single-ID call that isolated the bad one does.
+                if len(ids) == 1 or entry["error"]["Code"] not in _SPLITTABLE_INSTANCE_ERRORS:
+                    for iid in ids:
+                        self._instance_errors.setdefault(iid, entry["error"])
+                continue
+            self._instance_ids_described.update(ids)
+            pages = entry["result"] if entry.get("paginated") else [entry["result"]]
+            for page in pages:
+                for r in page.get("Reservations", []):
+                    for inst in r.get("Instances", []):
+                        if inst.get("InstanceId"):
+                            self._instances[inst["InstanceId"]] = inst
+
+    def get_paginator(self, operation):
+        return _Paginated(self, operation)
+
+    def __getattr__(self, operation):
+        return lambda **params: self._call(operation, params)
+
+    def _call(self, operation, params, paginated=False):
+        entry = self._calls.get(_call_key(operation, params) + (paginated,))
+        if entry is None and operation == "describe_instances" and _instance_id_filter(params) is not None:
+            return self._describe_instances(_instance_id_filter(params), paginated)
+        if entry is None:
+            raise ClientError(
+                {"Error": {"Code": "NotInSnapshot",
+                           "Message": f"{operation} {params} was not recorded"}},
+                operation,
+            )
+        if "error" in entry:
+            raise ClientError({"Error": dict(entry["error"])}, operation)
+        return entry["result"]
+
+
+    def _describe_instances(self, ids, paginated):
+        for iid in ids:
+            if iid in self._instances or iid in self._instance_ids_described:
+                continue
+            if iid in self._instance_errors:
+                raise ClientError({"Error": dict(self._instance_errors[iid])}, "describe_instances")
+            raise ClientError(
+                {"Error": {"Code": "NotInSnapshot",
+                           "Message": f"describe_instances for {iid} was not recorded"}},
+                "describe_instances",
+            )
+        page = {"Reservations": [{"Instances": [self._instances[iid] for iid in ids if iid in self._instances]}]}
+        return [page] if paginated else page
+
+
+def save_recording(path, calls, *, region, subnet_ids, discovery=None, vpc_snapshot=True):
+    """Write recorded API calls and run context to a gzip-compressed JSON file.
+
+    EKS discovery calls are not recorded; the discovery result itself is
+    stored so a replay analyzes the same subnet list. `vpc_snapshot` is
+    False for a --no-vpc-snapshot run, whose replay must not ask for the
+    VPC-wide listing it never recorded.
+    """
+    payload = {
+        "version": RECORDING_VERSION,
+        "region": region,
+        "subnet_ids": list(subnet_ids),
+        "discovery": discovery,
+        "vpc_snapshot": vpc_snapshot,
+        "calls": calls,
+    }
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(payload, f, default=str, separators=(",", ":"))
+
+
+def load_recording(path):
+    """Read a file written by save_recording(). Raises ValueError if unusable."""
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            payload = json.load(f)
+    except (OSError, EOFError, json.JSONDecodeError) as e:
+        raise ValueError(f"cannot read recording {path}: {e}") from e
+    if not isinstance(payload, dict) or payload.get("version") != RECORDING_VERSION:
+        raise ValueError(
+            f"{path} is not a version {RECORDING_VERSION} subnet_frag recording"
+        )
+    return payload
+
+
+def scan_subnet(ec2, subnet_id, snapshot=None, instance_cache=None):
+    """Fetch and analyze one subnet.
+
+    Returns a dict with either an "error" key holding (code, message) for a
+    subnet that could not be analyzed, or the subnet_info, enis, ip_map,
+    prefix_map, cidr_reservations, inst_info and analysis for it. Only reads
+    through `ec2`, so concurrent calls are safe as long as each thread passes
+    its own client.
+
+    When `snapshot` (from load_vpc_snapshot) covers the subnet, its subnet
+    and ENI data are used instead of per-subnet Describe calls. Instance
+    lookups go through `instance_cache` when given.
+    """
+    in_snapshot = snapshot is not None and subnet_id in snapshot["subnets"]
+    try:
+        if in_snapshot:
+            subnet_info = _subnet_info(snapshot["subnets"][subnet_id], subnet_id)
+        else:
+            subnet_info = get_subnet_info(ec2, subnet_id)
+    except ClientError as e:
+        return {"subnet_id": subnet_id, "error": (e.response["Error"]["Code"], e.response["Error"]["Message"])}
+    except BotoCoreError as e:
+        return {"subnet_id": subnet_id, "error": ("ConnectionError", str(e))}
+    except ValueError as e:
+        # get_subnet_info normalizes a malformed/unexpected DescribeSubnets
+        # payload (e.g. an IPv6-only subnet with no IPv4 CIDR) into
+        # ValueError. Skip this subnet; do not abort the rest of the run.
+        return {"subnet_id": subnet_id, "error": ("SkippedSubnet", str(e))}
+
+    if subnet_info.get("has_ipv6"):
+        print(
+            f"  Warning ({subnet_id}): subnet is dual-stack (has an IPv6 CIDR). "
+            f"This tool measures IPv4 /28 prefix-delegation fragmentation only; "
+            f"IPv6 pod-IP consumption is not reflected.",
+            file=sys.stderr,
+        )
+
+    if in_snapshot:
+        enis = snapshot["enis"].get(subnet_id, [])
+    else:
+        try:
+            enis = get_enis(ec2, subnet_id)
+        except ClientError as e:
+            return {"subnet_id": subnet_id, "error": (e.response["Error"]["Code"], e.response["Error"]["Message"])}
+        except BotoCoreError as e:
+            return {"subnet_id": subnet_id, "error": ("ConnectionError", str(e))}
+
+    ip_map = build_ip_map(enis)
+    prefix_map = build_prefix_map(enis)
+    cidr_reservations = get_cidr_reservations(ec2, subnet_id)
+
+    instance_ids = {
+        v["owner_id"] for v in ip_map.values()
+        if v["owner_type"] in ("ec2_primary", "ec2_secondary", "eks_pod")
+        and v["owner_id"].startswith("i-")
+    }
+    if instance_cache is not None:
+        inst_info = instance_cache.get(ec2, instance_ids)
+    else:
+        inst_info = get_instance_info(ec2, instance_ids)
+    for iid in instance_ids:
+        if iid not in inst_info:
+            inst_info[iid] = {"name": iid, "state": "terminated"}
+
+    analysis = analyze_subnet(subnet_info["cidr"], ip_map, cidr_reservations, prefix_map)
+    return {
+        "subnet_id": subnet_id,
+        "subnet_info": subnet_info,
+        "enis": enis,
+        "ip_map": ip_map,
+        "prefix_map": prefix_map,
+        "cidr_reservations": cidr_reservations,
+        "inst_info": inst_info,
+        "analysis": analysis,
+    }
+
+
+def subnet_json(result, *, list_enis=False, node_recs=False, drain_target=None, simulation=None):
+    """Build the JSON record for one successful scan_subnet() result.
+
+    `simulation`, when given, holds simulate_capacity() keyword arguments.
+    """
+    analysis = result["analysis"]
+    ip_map = result["ip_map"]
+    out = {
+        "subnet": result["subnet_info"],
+        "analysis": {k: v for k, v in analysis.items() if k != "blocks"},
+        "blocks": analysis["blocks"],
+        "ip_map": ip_map,
+        "cidr_reservations": result["cidr_reservations"],
+    }
+    if list_enis:
+        out["enis"] = []
+        for e in result["enis"]:
+            owner_type, owner_id, detail, requester = classify_eni(e)
+            out["enis"].append({
+                "eni_id": e["NetworkInterfaceId"],
+                "status": e.get("Status", ""),
+                "owner_type": owner_type,
+                "owner_id": str(owner_id),
+                "detail": detail,
+                "requester": requester,
+                "managed": e.get("RequesterManaged", False),
+                "ips": [a["PrivateIpAddress"] for a in e.get("PrivateIpAddresses", [])],
+            })
+    if node_recs:
+        out["node_recommendations"] = node_recommendations(analysis, ip_map, result["inst_info"])
+    if drain_target is not None:
+        out["drain_plan"] = plan_drain(analysis, ip_map, result["inst_info"], drain_target)
+    if simulation is not None:
+        out["simulation"] = simulate_capacity(analysis, **simulation)
+    return out
+
+
+def scan_subnets(subnet_ids, ec2, *, workers=1, client_factory=None, snapshot=None, instance_cache=None):
+    """Yield scan_subnet() results in subnet_ids order.
+
+    Instance lookups are shared across subnets through `instance_cache`
+    (a fresh InstanceInfoCache when not given).
+
+    With workers > 1 subnets are scanned on a bounded thread pool. boto3
+    clients created from one Session are not guaranteed thread-safe to
+    build, so each worker thread gets its own client from client_factory().
+    Results are still yielded in input order, so callers produce the same
+    output as a serial run.
+    """
+    if instance_cache is None:
+        instance_cache = InstanceInfoCache()
+    if workers <= 1 or len(subnet_ids) <= 1 or client_factory is None:
+        for subnet_id in subnet_ids:
+            yield scan_subnet(ec2, subnet_id, snapshot, instance_cache)
+        return
+
+    local = threading.local()
+
+    def _scan(subnet_id):
+        client = getattr(local, "ec2", None)
+        if client is None:
+            client = local.ec2 = client_factory()
+        return scan_subnet(client, subnet_id, snapshot, instance_cache)
+
+    # Bound the number of finished-but-unconsumed results so memory stays
+    # proportional to the pool size rather than the number of subnets.
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for subnet_id in subnet_ids:
+            pending.append(pool.submit(_scan, subnet_id))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _eni_fingerprint(eni):
+    """The ENI fields that feed classify_eni(), build_ip_map() and build_prefix_map()."""
+    attachment = eni.get("Attachment") or {}
+    return (
+        eni.get("Status"),
+        eni.get("InterfaceType"),
+        eni.get("Description"),
+        eni.get("RequesterId"),
+        attachment.get("InstanceId"),
+        attachment.get("DeviceIndex"),
+        tuple(
+            (a.get("PrivateIpAddress"), a.get("Primary", False))
+            for a in eni.get("PrivateIpAddresses", [])
+        ),
+        tuple(p.get("Ipv4Prefix", "") for p in eni.get("Ipv4Prefixes") or []),
+    )
+
+
+class SubnetTracker:
+    """Fragmentation state for one subnet, kept in memory across polls.
+
+    update() diffs a fresh ENI listing against the previous one by
+    NetworkInterfaceId and applies only added, removed or changed ENIs to
+    ip_map, prefix_map and the bitmap, then reclassifies only the /28 blocks
+    those ENIs touch. `analysis` matches what analyze_subnet() would return
+    for the same inputs.
+    """
+
+    def __init__(self, subnet_info, enis, cidr_reservations=None):
+        self.subnet_info = subnet_info
+        self._reset(enis, cidr_reservations)
+
+    def _reset(self, enis, cidr_reservations):
+        self.cidr_reservations = cidr_reservations
+        self.bitmap = SubnetBitmap(self.subnet_info["cidr"], cidr_reservations)
+        self.ip_map = {}
+        self.prefix_map = {}
+        self._enis = {}
+        self._apply(enis, [])
+        self.blocks = [self.bitmap.block(idx) for idx in range(self.bitmap.num_blocks)]
+        self.status_counts = defaultdict(int)
+        for b in self.blocks:
+            self.status_counts[b["status"]] += 1
+
+    def _apply(self, added, removed):
+        """Apply ENI additions/removals; return the set of dirty block indexes."""
+        dirty = set()
+        # Removals first, so an IP or prefix that moved between ENIs in one
+        # poll ends up owned by its new ENI.
+        for eni in removed:
+            eni_id = eni["NetworkInterfaceId"]
+            del self._enis[eni_id]
+            for addr in eni.get("PrivateIpAddresses", []):
+                ip = addr["PrivateIpAddress"]
+                if self.ip_map.get(ip, {}).get("eni_id") == eni_id:
+                    del self.ip_map[ip]
+                    dirty.add(self.bitmap.mark_ip(ip, used=False))
+            for pfx in eni.get("Ipv4Prefixes") or []:
+                cidr = pfx.get("Ipv4Prefix", "")
+                if self.prefix_map.get(cidr, {}).get("eni_id") == eni_id:
+                    del self.prefix_map[cidr]
+                    dirty.update(self.bitmap.mark_prefix(cidr, allocated=False) or ())
+        for eni in added:
+            self._enis[eni["NetworkInterfaceId"]] = (_eni_fingerprint(eni), eni)
+            for ip, info in build_ip_map([eni]).items():
+                self.ip_map[ip] = info
+                dirty.add(self.bitmap.mark_ip(ip))
+            for cidr, info in build_prefix_map([eni]).items():
+                self.prefix_map[cidr] = info
+                dirty.update(self.bitmap.mark_prefix(cidr) or ())
+        dirty.discard(None)
+        return dirty
+
+    def update(self, enis, cidr_reservations=None):
+        """Bring the state up to date with a fresh listing; return ENIs changed."""
+        if cidr_reservations != self.cidr_reservations:
+            # Reservations change which blocks read as prefix-reserved across
+            # the whole subnet; rare enough that a rebuild is simplest.
+            self._reset(enis, cidr_reservations)
+            return len(enis)
+        added, removed, seen = [], [], set()
+        for eni in enis:
+            eni_id = eni["NetworkInterfaceId"]
+            seen.add(eni_id)
+            old = self._enis.get(eni_id)
+            if old is None:
+                added.append(eni)
+            elif old[0] != _eni_fingerprint(eni):
+                removed.append(old[1])
+                added.append(eni)
+        removed.extend(eni for eni_id, (_, eni) in self._enis.items() if eni_id not in seen)
+        for eni in removed:
+            if eni["NetworkInterfaceId"] not in seen:
+                _ENI_CLASSIFIER.discard(eni["NetworkInterfaceId"])
+        for idx in self._apply(added, removed):
+            if idx >= len(self.blocks):
+                continue
+            self.status_counts[self.blocks[idx]["status"]] -= 1
+            self.blocks[idx] = self.bitmap.block(idx)
+            self.status_counts[self.blocks[idx]["status"]] += 1
+        return len(added) + sum(1 for eni in removed if eni["NetworkInterfaceId"] not in seen)
+
+    @property
+    def analysis(self):
+        return _analysis_result(self.bitmap, self.ip_map, self.blocks, self.status_counts)
+
+    def sample(self, timestamp, enis_changed=0):
+        """One time-series point summarizing the current state."""
+        counts = self.status_counts
+        free_blocks = counts.get("free", 0)
+        frag_blocks = counts.get("fragmented", 0)
+        full_blocks = counts.get("full", 0)
+        return {
+            "timestamp": timestamp,
+            "subnet_id": self.subnet_info["subnet_id"],
+            "cidr": self.subnet_info["cidr"],
+            "az": self.subnet_info["az"],
+            "fragmentation_score": _fragmentation_score(free_blocks, frag_blocks, full_blocks),
+            "total_blocks": len(self.blocks),
+            "free_blocks": free_blocks,
+            "fragmented_blocks": frag_blocks,
+            "full_blocks": full_blocks,
+            "reserved_blocks": counts.get("has_reserved", 0),
+            "prefix_allocated_blocks": counts.get("prefix_allocated", 0),
+            "used_ips": len(self.ip_map),
+            "free_ips": self.bitmap.free_count(),
+            "enis": len(self._enis),
+            "enis_changed": enis_changed,
+        }
+
+
+# Prometheus gauges emitted by --watch-format prometheus: (metric, sample key, help).
+_PROM_GAUGES = [
+    ("subnet_frag_fragmentation_score", "fragmentation_score",
+     "Percent of candidate /28 blocks that cannot serve a new prefix"),
+    ("subnet_frag_free_blocks", "free_blocks", "/28 blocks free for prefix delegation"),
+    ("subnet_frag_fragmented_blocks", "fragmented_blocks", "/28 blocks with scattered IPs in use"),
+    ("subnet_frag_full_blocks", "full_blocks", "/28 blocks with every IP in use"),
+    ("subnet_frag_reserved_blocks", "reserved_blocks", "/28 blocks containing AWS-reserved IPs"),
+    ("subnet_frag_prefix_allocated_blocks", "prefix_allocated_blocks", "/28 blocks assigned as prefixes"),
+    ("subnet_frag_used_ips", "used_ips", "IPs assigned to ENIs"),
+    ("subnet_frag_free_ips", "free_ips", "IPs not used, reserved or prefix-allocated"),
+    ("subnet_frag_enis_changed", "enis_changed", "ENIs added, removed or changed since the previous poll"),
+]
+
+
+def _prom_escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_prometheus(samples):
+    """Render samples in the Prometheus text exposition format."""
+    lines = []
+    for metric, key, help_text in _PROM_GAUGES:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} gauge")
+        for s in samples:
+            if s[key] is None:
+                continue
+            labels = ",".join(f'{k}="{_prom_escape(s[k])}"' for k in ("subnet_id", "cidr", "az"))
+            lines.append(f"{metric}{{{labels}}} {s[key]}")
+    return "\n".join(lines) + "\n"
+
+
+def _emit_samples(samples, fmt, output):
+    if fmt == "prometheus":
+        text = format_prometheus(samples)
+        if output:
+            # Write-then-rename so a textfile collector never reads a partial file.
+            tmp = f"{output}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, output)
+        else:
+            print(text, flush=True)
+        return
+    lines = "".join(json.dumps(s, separators=(",", ":")) + "\n" for s in samples)
+    if output:
+        with open(output, "a", encoding="utf-8") as f:
+            f.write(lines)
+    else:
+        sys.stdout.write(lines)
+        sys.stdout.flush()
+
+
+def _poll_subnet(ec2, subnet_id, tracked, vpc_snapshot):
+    """Read one subnet for a watch() poll.
+
+    Returns (subnet_info, ENIs, CIDR reservations); subnet_info is None when
+    the subnet is already `tracked`. The subnet and its ENIs come from
+    `vpc_snapshot` when it lists them.
+    """
+    in_snapshot = vpc_snapshot is not None and subnet_id in vpc_snapshot["subnets"]
+    subnet_info = None
+    if not tracked:
+        if in_snapshot:
+            subnet_info = _subnet_info(vpc_snapshot["subnets"][subnet_id], subnet_id)
+        else:
+            subnet_info = get_subnet_info(ec2, subnet_id)
+    if in_snapshot:
+        enis = vpc_snapshot["enis"].get(subnet_id, [])
+    else:
+        enis = get_enis(ec2, subnet_id)
+    return subnet_info, enis, get_cidr_reservations(ec2, subnet_id)
+
+
+def watch(ec2, subnet_ids, *, interval, vpc_id=None, fmt="jsonl", output=None,
+          count=None, sleep=time.sleep, history=None, workers=1, client_factory=None):
+    """Poll subnets every `interval` seconds and emit fragmentation samples.
+
+    The first poll builds a SubnetTracker per subnet; later polls apply only
+    the ENI changes to it. With `vpc_id`, each poll lists the VPC's ENIs in
+    one paginated pass (see load_vpc_snapshot). A subnet whose poll fails
+    keeps its previous state and is retried on the next poll. Runs until
+    `count` polls have been emitted, or forever when count is None. With a
+    HistoryStore as `history`, every sample is also stored there.
+
+    With workers > 1 the subnets of a poll are read on a thread pool kept
+    across polls, each worker thread with its own client from
+    client_factory() as in scan_subnets(). Samples are still built and
+    emitted in subnet_ids order.
+    """
+    trackers = {}
+    subnet_ids = list(subnet_ids)
+    polls = 0
+    pool = None
+    if workers > 1 and len(subnet_ids) > 1 and client_factory is not None:
+        pool = ThreadPoolExecutor(max_workers=workers)
+        local = threading.local()
+
+    def _poll(subnet_id, tracked, vpc_snapshot):
+        client = getattr(local, "ec2", None)
+        if client is None:
+            client = local.ec2 = client_factory()
+        return _poll_subnet(client, subnet_id, tracked, vpc_snapshot)
+
+    try:
+        while True:
+            started = time.monotonic()
+            now = datetime.now(timezone.utc)
+            timestamp = now.isoformat(timespec="seconds")
+            vpc_snapshot = None
+            if vpc_id:
+                try:
+                    vpc_snapshot = load_vpc_snapshot(ec2, vpc_id)
+                except (ClientError, BotoCoreError) as e:
+                    print(f"  Warning: VPC-wide ENI listing failed: {e}", file=sys.stderr)
+
+            polled_ids = list(subnet_ids)
+            pending = None
+            if pool is not None:
+                pending = [pool.submit(_poll, subnet_id, subnet_id in trackers, vpc_snapshot)
+                           for subnet_id in polled_ids]
+            samples = []
+            for i, subnet_id in enumerate(polled_ids):
+                tracker = trackers.get(subnet_id)
+                try:
+                    if pending is not None:
+                        subnet_info, enis, cidr_reservations = pending[i].result()
+                    else:
+                        subnet_info, enis, cidr_reservations = _poll_subnet(
+                            ec2, subnet_id, tracker is not None, vpc_snapshot)
+                except (ClientError, BotoCoreError) as e:
+                    print(f"  Warning ({subnet_id}): poll failed: {e}", file=sys.stderr)
+                    continue
+                except ValueError as e:
+                    print(f"  Warning ({subnet_id}): {e}; no longer watched", file=sys.stderr)
+                    subnet_ids.remove(subnet_id)
+                    continue
+
+                if tracker is None:
+                    tracker = trackers[subnet_id] = SubnetTracker(subnet_info, enis, cidr_reservations)
+                    changed = len(enis)
+                else:
+                    changed = tracker.update(enis, cidr_reservations)
+                samples.append(tracker.sample(timestamp, changed))
+                if history is not None:
+                    history.add(now.timestamp(), tracker.subnet_info, tracker.analysis, tracker.ip_map)
+
+            if history is not None:
+                history.commit()
+            _emit_samples(samples, fmt, output)
+            polls += 1
+            if count is not None and polls >= count:
+                return trackers
+            sleep(max(0.0, interval - (time.monotonic() - started)))
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+HISTORY_SCHEMA_VERSION = 1
+TREND_WINDOW_DAYS = 7
+
+_HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    id INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,
+    subnet_id TEXT NOT NULL,
+    vpc_id TEXT,
+    cidr TEXT,
+    az TEXT,
+    fragmentation_score INTEGER,
+    total_blocks INTEGER NOT NULL,
+    free_blocks INTEGER NOT NULL,
+    fragmented_blocks INTEGER NOT NULL,
+    full_blocks INTEGER NOT NULL,
+    reserved_blocks INTEGER NOT NULL,
+    prefix_allocated_blocks INTEGER NOT NULL,
+    used_ips INTEGER NOT NULL,
+    free_ips INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_subnet_ts ON samples (subnet_id, ts);
+CREATE INDEX IF NOT EXISTS samples_ts ON samples (ts);
+CREATE TABLE IF NOT EXISTS sample_owners (
+    sample_id INTEGER NOT NULL REFERENCES samples (id),
+    owner_type TEXT NOT NULL,
+    enis INTEGER NOT NULL,
+    ips INTEGER NOT NULL,
+    PRIMARY KEY (sample_id, owner_type)
+) WITHOUT ROWID;
+-- Latest sample per subnet, so "current state" is a primary-key lookup.
+CREATE TABLE IF NOT EXISTS subnets (
+    subnet_id TEXT PRIMARY KEY,
+    last_ts INTEGER NOT NULL,
+    last_sample_id INTEGER NOT NULL
+) WITHOUT ROWID;
+-- Least-squares sums of free_blocks over time per subnet and hour, with u
+-- the sample's offset into the hour. The sums add up across hours, so a
+-- trend fit reads one row per hour instead of one per sample.
+CREATE TABLE IF NOT EXISTS hourly (
+    subnet_id TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    sum_u INTEGER NOT NULL,
+    sum_f INTEGER NOT NULL,
+    sum_uu INTEGER NOT NULL,
+    sum_uf INTEGER NOT NULL,
+    PRIMARY KEY (subnet_id, hour)
+) WITHOUT ROWID;
+"""
+
+
+def owner_breakdown(ip_map):
+    """{owner_type: {"enis": count, "ips": count}} for an ip_map."""
+    owners = defaultdict(lambda: {"enis": set(), "ips": 0})
+    for info in ip_map.values():
+        owners[info["owner_type"]]["enis"].add(info["eni_id"])
+        owners[info["owner_type"]]["ips"] += 1
+    return {otype: {"enis": len(d["enis"]), "ips": d["ips"]} for otype, d in owners.items()}
+
+
+class HistoryStore:
+    """Per-subnet fragmentation samples in a local SQLite database.
+
+    Each add() stores one subnet's block counts and owner-type breakdown at
+    a Unix timestamp; trend() fits free /28 blocks over time per subnet.
+    Uses WAL mode so `--trend` can read while `--watch --history` writes.
+    Raises ValueError if `path` is not a history database this version
+    understands.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            self._db = sqlite3.connect(path)
+            version = self._db.execute("PRAGMA user_version").fetchone()[0]
+            if version not in (0, HISTORY_SCHEMA_VERSION):
+                raise ValueError(f"{path} has history schema version {version}, "
+                                 f"expected {HISTORY_SCHEMA_VERSION}")
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_HISTORY_SCHEMA)
+            self._db.execute(f"PRAGMA user_version = {HISTORY_SCHEMA_VERSION}")
+        except sqlite3.DatabaseError as e:
+            raise ValueError(f"{path} is not a usable history database: {e}") from e
+
+    def add(self, ts, subnet_info, analysis, ip_map):
+        ts = int(ts)
+        subnet_id = subnet_info["subnet_id"]
+        free = analysis["free_blocks"]
+        cur = self._db.execute(
+            "INSERT INTO samples (ts, subnet_id, vpc_id, cidr, az, fragmentation_score, total_blocks, "
+            "free_blocks, fragmented_blocks, full_blocks, reserved_blocks, prefix_allocated_blocks, "
+            "used_ips, free_ips) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                ts, subnet_id, subnet_info.get("vpc_id"), subnet_info["cidr"],
+                subnet_info.get("az"), analysis["fragmentation_score"], analysis["total_blocks"],
+                free, analysis["fragmented_blocks"], analysis["full_blocks"],
+                analysis["reserved_blocks"], analysis["prefix_allocated_blocks"],
+                analysis["used"], analysis["free"],
+            ),
+        )
+        self._db.executemany(
+            "INSERT INTO sample_owners (sample_id, owner_type, enis, ips) VALUES (?, ?, ?, ?)",
+            [(cur.lastrowid, otype, d["enis"], d["ips"]) for otype, d in owner_breakdown(ip_map).items()],
+        )
+        self._db.execute(
+            "INSERT INTO subnets (subnet_id, last_ts, last_sample_id) VALUES (?, ?, ?) "
+            "ON CONFLICT (subnet_id) DO UPDATE SET last_ts = excluded.last_ts, "
+            "last_sample_id = excluded.last_sample_id WHERE excluded.last_ts >= last_ts",
+            (subnet_id, ts, cur.lastrowid),
+        )
+        u = ts % 3600
+        self._db.execute(
+            "INSERT INTO hourly (subnet_id, hour, n, sum_u, sum_f, sum_uu, sum_uf) "
+            "VALUES (?, ?, 1, ?, ?, ?, ?) ON CONFLICT (subnet_id, hour) DO UPDATE SET "
+            "n = n + 1, sum_u = sum_u + excluded.sum_u, sum_f = sum_f + excluded.sum_f, "
+            "sum_uu = sum_uu + excluded.sum_uu, sum_uf = sum_uf + excluded.sum_uf",
+            (subnet_id, ts - u, u, free, u * u, u * free),
+        )
+
+    def commit(self):
+        self._db.commit()
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
+
+    def trend(self, window_seconds, now=None):
+        """Fit free /28 blocks against time for each subnet sampled in the window.
+
+        The window starts on a whole hour, and the fit is summed from the
+        hourly rollups, one indexed range per subnet, so months of samples
+        are never read row by row. Returns one dict per subnet, soonest
+        predicted exhaustion first: latest sample, sample count,
+        `free_blocks_per_day` (None with fewer than two distinct timestamps)
+        and `exhausted_at`, the Unix time the fit reaches zero free blocks
+        (None unless free blocks are falling).
+        """
+        now = int(time.time() if now is None else now)
+        since = now - int(window_seconds)
+        since -= since % 3600
+        # With d = hour - since: sum(t) = n*d + sum_u, sum(t^2) = n*d^2 +
+        # 2*d*sum_u + sum_uu and sum(t*f) = d*sum_f + sum_uf. TOTAL() sums in
+        # floating point, so long windows cannot overflow.
+        fits = {
+            row[0]: row[1:]
+            for row in self._db.execute(
+                "SELECT h.subnet_id, SUM(h.n), TOTAL(h.n * (h.hour - :since) + h.sum_u), SUM(h.sum_f), "
+                "TOTAL(h.n * (h.hour - :since) * (h.hour - :since) + 2 * (h.hour - :since) * h.sum_u "
+                "+ h.sum_uu), TOTAL((h.hour - :since) * h.sum_f + h.sum_uf) "
+                "FROM subnets sub CROSS JOIN hourly h ON h.subnet_id = sub.subnet_id AND h.hour >= :since "
+                "WHERE sub.last_ts >= :since GROUP BY sub.subnet_id",
+                {"since": since},
+            )
+        }
+        latest = self._db.execute(
+            "SELECT s.subnet_id, s.ts, s.cidr, s.az, s.fragmentation_score, s.total_blocks, "
+            "s.free_blocks, s.fragmented_blocks, s.full_blocks "
+            "FROM subnets sub CROSS JOIN samples s ON s.id = sub.last_sample_id "
+            "WHERE sub.last_ts >= ?",
+            (since,),
+        )
+        out = []
+        for subnet_id, ts, cidr, az, score, total, free, frag, full in latest:
+            n, sx, sy, sxx, sxy = fits[subnet_id]
+            denom = n * sxx - sx * sx
+            # Guard against float residue when every sample shares one timestamp.
+            per_second = (n * sxy - sx * sy) / denom if denom > 1e-6 * n * sxx else None
+            exhausted_at = None
+            if per_second is not None and per_second < 0:
+                # Project from the fitted line, not the last (noisy) sample.
+                intercept = (sy - per_second * sx) / n
+                exhausted_at = since + int(-intercept / per_second)
+            out.append({
+                "subnet_id": subnet_id,
+                "cidr": cidr,
+                "az": az,
+                "samples": n,
+                "last_sample": ts,
+                "fragmentation_score": score,
+                "total_blocks": total,
+                "free_blocks": free,
+                "fragmented_blocks": frag,
+                "full_blocks": full,
+                "free_blocks_per_day": None if per_second is None else per_second * 86400,
+                "exhausted_at": exhausted_at,
+            })
+        out.sort(key=lambda r: (r["exhausted_at"] is None, r["exhausted_at"] or 0, r["subnet_id"]))
+        return out
+
+
+def _format_ts(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d %H:%M")
+
+
+def print_trend(rows, window_days, now):
+    print(f"\n{'═' * 70}")
+    print(f"  Free /28 block trend over the last {window_days:g} day(s), {len(rows)} subnet(s)")
+    print(f"{'═' * 70}")
+    if not rows:
+        print("  (no samples in this window)")
+        return
+    print(f"\n  {'Subnet':<26} {'CIDR':<18} {'Samples':>8} {'Free':>6} {'Score':>6} "
+          f"{'Per day':>9}  Runs out")
+    for r in rows:
+        score = "N/A" if r["fragmentation_score"] is None else f"{r['fragmentation_score']}%"
+        rate = "-" if r["free_blocks_per_day"] is None else f"{r['free_blocks_per_day']:+.1f}"
+        if r["exhausted_at"] is not None:
+            eta = "now" if r["exhausted_at"] <= now else _format_ts(r["exhausted_at"])
+        elif r["free_blocks"] == 0:
+            eta = "exhausted"
+        elif r["free_blocks_per_day"] is None:
+            eta = "needs more samples"
+        else:
+            eta = "not trending down"
+        print(f"  {r['subnet_id']:<26} {r['cidr']:<18} {r['samples']:>8} {r['free_blocks']:>6} "
+              f"{score:>6} {rate:>9}  {eta}")
+
+
+FLEET_WORKERS = 4
+FLEET_REGION_RATE = 10.0
+FLEET_SESSION_NAME = "subnet-frag-fleet"
+
+
+def load_fleet_targets(path, default_region=None):
+    """Read a --fleet file: a JSON list of {"cluster", "region", "role_arn"}.
+
+    `cluster` is a name or ARN (see parse_cluster_arg); `region` falls back
+    to `default_region` and `role_arn` is optional (scan with the base
+    credentials). Raises ValueError naming the first bad entry.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)
+    except OSError as e:
+        raise ValueError(f"cannot read {path}: {e}") from e
+    except json.JSONDecodeError as e:
+        raise ValueError(f"{path} is not valid JSON: {e}") from e
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{path} must hold a non-empty JSON list of targets")
+
+    targets = []
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict) or not isinstance(entry.get("cluster"), str):
+            raise ValueError(f"{path} target {i}: expected an object with a \"cluster\" string")
+        role_arn = entry.get("role_arn")
+        if role_arn is not None and (not isinstance(role_arn, str) or not role_arn.startswith("arn:")):
+            raise ValueError(f"{path} target {i}: role_arn must be an IAM role ARN")
+        try:
+            name, region = parse_cluster_arg(entry["cluster"], entry.get("region") or default_region)
+        except ValueError as e:
+            raise ValueError(f"{path} target {i}: {e}") from e
+        if not region:
+            raise ValueError(f"{path} target {i}: no region for cluster {name} (set \"region\" or --region)")
+        targets.append({
+            "cluster": entry["cluster"].strip(),
+            "cluster_name": name,
+            "region": region,
+            "role_arn": role_arn,
+        })
+    return targets
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` calls per second, shared between threads."""
+
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+class _RateLimitedPaginator:
+    def __init__(self, paginator, limiter):
+        self._paginator = paginator
+        self._limiter = limiter
+
+    def paginate(self, **params):
+        # Pages are fetched lazily, so take a token before each one.
+        pages = iter(self._paginator.paginate(**params))
+        while True:
+            self._limiter.acquire()
+            try:
+                page = next(pages)
+            except StopIteration:
+                return
+            yield page
+
+
+class RateLimitedClient:
+    """Wrap a boto3 client so every call and page waits on `limiter`.
+
+    One limiter per region is shared by all clients calling that region, so
+    many accounts scanned at once still stay under a regional request rate.
+    """
+
+    def __init__(self, client, limiter):
+        self._client = client
+        self._limiter = limiter
+
+    def get_paginator(self, operation):
+        return _RateLimitedPaginator(self._client.get_paginator(operation), self._limiter)
+
+    def __getattr__(self, operation):
+        method = getattr(self._client, operation)
+
+        def call(**params):
+            self._limiter.acquire()
+            return method(**params)
+
+        return call
+
+
+def fleet_subnet_summary(result):
+    """The per-subnet fields kept for the fleet report."""
+    info = result["subnet_info"]
+    analysis = result["analysis"]
+    return {
+        "subnet_id": info["subnet_id"],
+        "cidr": info["cidr"],
+        "az": info["az"],
+        "vpc_id": info["vpc_id"],
+        "fragmentation_score": analysis["fragmentation_score"],
+        "severity": _severity(analysis),
+        "total_blocks": analysis["total_blocks"],
+        "free_blocks": analysis["free_blocks"],
+        "fragmented_blocks": analysis["fragmented_blocks"],
+        "full_blocks": analysis["full_blocks"],
+        "used": analysis["used"],
+        "free": analysis["free"],
+    }
+
+
+def scan_fleet_target(target, *, sts=None, profile=None, limiter=None, tag_scan=True,
+                      use_cache=True, cache_ttl=DISCOVERY_CACHE_TTL, vpc_snapshot=True, workers=1):
+    """Discover and scan one fleet target.
+
+    Assumes target["role_arn"] through `sts` when set, otherwise uses the
+    `profile` credentials. Returns the target fields plus `account`,
+    `subnets` (fleet_subnet_summary() records), `errors` for subnets that
+    could not be analyzed, and `error` when the target as a whole failed.
+    Only per-subnet summaries are kept, so memory stays small across a
+    large fleet.
+    """
+    out = {
+        "cluster": target["cluster_name"],
+        "region": target["region"],
+        "role_arn": target["role_arn"],
+        "account": None,
+        "subnets": [],
+        "errors": [],
+        "error": None,
+    }
+    region = target["region"]
+    credentials = None
+    try:
+        if target["role_arn"]:
+            credentials = sts.assume_role(
+                RoleArn=target["role_arn"], RoleSessionName=FLEET_SESSION_NAME,
+            )["Credentials"]
+        session = get_session(None if credentials else profile, region, credentials)
+
+        def _client(service, sess=session):
+            client = sess.client(service, config=_RETRY_CONFIG)
+            return RateLimitedClient(client, limiter) if limiter is not None else client
+
+        ec2 = _client("ec2")
+        if target["cluster"].startswith("arn:"):
+            cluster_arn = target["cluster"]
+        else:
+            cluster_arn = cluster_arn_for(session, target["cluster_name"], region)
+        if cluster_arn:
+            out["account"] = cluster_arn.split(":")[4]
+
+        discovery = None
+        if cluster_arn and use_cache:
+            discovery, _ = load_cached_discovery(cluster_arn, tag_scan, cache_ttl)
+        if discovery is None:
+            discovery = discover_cluster_subnets(
+                _client("eks"), ec2, target["cluster_name"], tag_scan=tag_scan,
+            )
+            if cluster_arn and use_cache:
+                save_cached_discovery(cluster_arn, tag_scan, discovery)
+
+        snapshot = None
+        if vpc_snapshot:
+            try:
+                snapshot = load_vpc_snapshot(ec2, discovery["vpc_id"])
+            except (ClientError, BotoCoreError) as e:
+                print(
+                    f"  Warning ({target['cluster_name']}, {region}): VPC-wide ENI listing "
+                    f"failed ({e}); falling back to per-subnet calls",
+                    file=sys.stderr,
+                )
+    except ClientError as e:
+        out["error"] = f"{_client_error_code(e)}: {e.response.get('Error', {}).get('Message', '')}"
+        return out
+    except (BotoCoreError, RuntimeError) as e:
+        out["error"] = str(e)
+        return out
+
+    def _client_factory():
+        return _client("ec2", get_session(None if credentials else profile, region, credentials))
+
+    for result in scan_subnets(
+        sorted(discovery["subnets"]), ec2, workers=workers,
+        client_factory=_client_factory, snapshot=snapshot,
+    ):
+        if "error" in result:
+            out["errors"].append({"subnet_id": result["subnet_id"], "error": result["error"][0]})
+        else:
+            out["subnets"].append(fleet_subnet_summary(result))
+    return out
+
+
+def scan_fleet(targets, base_session, *, profile=None, fleet_workers=FLEET_WORKERS,
+               region_rate=FLEET_REGION_RATE, **scan_kwargs):
+    """Scan fleet targets on a bounded thread pool; yield results in target order.
+
+    Every region gets one RateLimiter (`region_rate` calls per second, None
+    for no limit) shared by all targets in it. Other keyword arguments are
+    passed through to scan_fleet_target().
+    """
+    limiters = {}
+    if region_rate:
+        limiters = {t["region"]: RateLimiter(region_rate) for t in targets}
+    # Clients are thread-safe once built, but building them from one Session
+    # is not: create the shared STS client here, before any worker starts.
+    sts = None
+    if any(t["role_arn"] for t in targets):
+        sts = base_session.client("sts", config=_RETRY_CONFIG)
+
+    def _scan(target):
+        return scan_fleet_target(
+            target, sts=sts, profile=profile, limiter=limiters.get(target["region"]), **scan_kwargs
+        )
+
+    with ThreadPoolExecutor(max_workers=max(1, fleet_workers)) as pool:
+        yield from pool.map(_scan, targets)
+
+
+def rank_fleet_subnets(target_results, top=None):
+    """Flatten fleet results into subnets ranked worst-fragmented first.
+
+    Orders by fragmentation score (N/A last), then more fragmented blocks,
+    then fewer free blocks. Each record carries its account, region and
+    cluster plus a 1-based `rank`.
+    """
+    rows = []
+    for t in target_results:
+        for sub in t["subnets"]:
+            rows.append(dict(sub, account=t["account"], region=t["region"], cluster=t["cluster"]))
+    rows.sort(key=lambda r: (
+        r["fragmentation_score"] is None,
+        -(r["fragmentation_score"] or 0),
+        -r["fragmented_blocks"],
+        r["free_blocks"],
+        r["account"] or "", r["region"], r["cluster"], r["subnet_id"],
+    ))
+    if top is not None:
+        rows = rows[:top]
+    for i, row in enumerate(rows, 1):
+        row["rank"] = i
+    return rows
+
+
+def print_fleet_report(target_results, ranked):
+    print(f"\n{'═' * 70}")
+    subnets = sum(len(t["subnets"]) for t in target_results)
+    print(f"  Fleet: {len(target_results)} target(s), {subnets} subnet(s) analyzed")
+    print(f"{'═' * 70}")
+    for t in target_results:
+        where = f"{_sanitize(t['cluster'])} ({t['account'] or 'unknown account'}, {t['region']})"
+        if t["error"]:
+            print(f"  ✗ {where}: {_sanitize(t['error'])}")
+        else:
+            failed = f", {len(t['errors'])} failed" if t["errors"] else ""
+            print(f"  ✓ {where}: {len(t['subnets'])} subnet(s){failed}")
+
+    print("\n  ── Worst-fragmented subnets ──\n")
+    if not ranked:
+        print("  (no subnets analyzed)")
+        return
+    print(f"  {'#':>3} {'Score':>6} {'Severity':<10} {'Free/Total':>11} {'Subnet':<26} "
+          f"{'CIDR':<18} {'AZ':<12} {'Account':<13} {'Region':<15} Cluster")
+    for r in ranked:
+        score = "N/A" if r["fragmentation_score"] is None else f"{r['fragmentation_score']}%"
+        blocks = f"{r['free_blocks']}/{r['total_blocks']}"
+        print(f"  {r['rank']:>3} {score:>6} {r['severity'] or '-':<10} {blocks:>11} {r['subnet_id']:<26} "
+              f"{r['cidr']:<18} {r['az']:<12} {r['account'] or '-':<13} {r['region']:<15} "
+              f"{_sanitize(r['cluster'])}")
+
+
+def _run_trend(args):
+    """--trend: print or emit per-subnet trends from a history database."""
+    if not os.path.exists(args.trend):
+        print(f"  Error: no history database at {args.trend}", file=sys.stderr)
+        sys.exit(2)
+    try:
+        store = HistoryStore(args.trend)
+    except ValueError as e:
+        print(f"  Error: {e}", file=sys.stderr)
+        sys.exit(2)
+    now = time.time()
+    rows = store.trend(args.trend_window * 86400, now)
+    store.close()
+    if args.json:
+        print(json.dumps({"window_days": args.trend_window, "subnets": rows}, indent=2))
+    else:
+        print_trend(rows, args.trend_window, now)
+        print()
+
+
+def _run_fleet(args):
+    """--fleet: scan every target, then print or emit the fleet-wide ranking."""
+    try:
+        targets = load_fleet_targets(args.fleet, args.region)
+    except ValueError as e:
+        print(f"  Error: {e}", file=sys.stderr)
+        sys.exit(2)
+    try:
+        base_session = get_session(args.profile, args.region)
+        results = list(scan_fleet(
+            targets, base_session, profile=args.profile,
+            fleet_workers=args.fleet_workers or FLEET_WORKERS,
+            region_rate=args.region_rate or FLEET_REGION_RATE,
+            tag_scan=not args.no_tag_scan, use_cache=not args.no_cache,
+            cache_ttl=args.cache_ttl, vpc_snapshot=not args.no_vpc_snapshot,
+            workers=args.workers,
+        ))
+    except BotoCoreError as e:
+        print(f"  Error: failed to create AWS client: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    for t in results:
+        if t["error"]:
+            print(f"  Error ({t['cluster']}, {t['region']}): {t['error']}", file=sys.stderr)
+        for err in t["errors"]:
+            print(f"  Error ({err['subnet_id']}): {err['error']}", file=sys.stderr)
+
+    ranked = rank_fleet_subnets(results, args.top)
+    if args.json:
+        print(json.dumps({"targets": results, "ranking": ranked}, indent=2, default=str))
+    else:
+        print_fleet_report(results, ranked)
+        print()
+    if any(t["error"] or t["errors"] for t in results):
+        sys.exit(1)
+
+
 def main():
     _force_utf8_output()
     p = argparse.ArgumentParser(
@@ -801,8 +2968,19 @@ def main():
   %(prog)s --cluster my-cluster --region us-east-1
   %(prog)s --cluster arn:aws:eks:us-east-1:123:cluster/my-cluster
   %(prog)s --cluster my-cluster --region us-east-1 --dry-run
+  %(prog)s --cluster my-cluster --region us-east-1 --workers 8
   %(prog)s --subnet-id subnet-abc123 --region us-east-1 --list-enis --node-recs
+  %(prog)s --subnet-id subnet-abc123 --region us-east-1 --drain-target 20
+  %(prog)s --subnet-id subnet-abc123 --region us-east-1 --simulate --sim-nodes 50 --sim-prefixes 2
   %(prog)s --subnet-id subnet-abc123 --region us-east-1 --json
+  %(prog)s --cluster my-cluster --region us-east-1 --html report.html
+  %(prog)s --cluster my-cluster --region us-east-1 --json-lines
+  %(prog)s --cluster my-cluster --region us-east-1 --record incident.json.gz
+  %(prog)s --replay incident.json.gz --node-recs
+  %(prog)s --cluster my-cluster --region us-east-1 --watch 60 --watch-format prometheus
+  %(prog)s --fleet fleet.json --fleet-workers 8 --top 20
+  %(prog)s --cluster my-cluster --region us-east-1 --watch 300 --history history.db
+  %(prog)s --trend history.db --trend-window 30
 
 required IAM permissions (read-only):
   ec2:DescribeSubnets
@@ -814,31 +2992,213 @@ required IAM permissions (read-only):
   eks:ListNodegroups
   eks:DescribeNodegroup
   eks:ListFargateProfiles
-  eks:DescribeFargateProfile"""
+  eks:DescribeFargateProfile
+  # additional, only for --fleet targets with a role_arn (on the base credentials):
+  sts:AssumeRole"""
     )
     src = p.add_mutually_exclusive_group(required=True)
     src.add_argument("--subnet-id", nargs="+", help="One or more subnet IDs")
     src.add_argument("--cluster", metavar="NAME_OR_ARN",
                      help="EKS cluster name or ARN; auto-discovers subnets")
+    src.add_argument("--replay", metavar="FILE",
+                     help="Re-run analysis from a file written by --record (no AWS access)")
+    src.add_argument("--trend", metavar="DB",
+                     help="Report free /28 block trends and predicted exhaustion from a --history "
+                          "database (no AWS access)")
+    src.add_argument("--fleet", metavar="FILE",
+                     help="Scan every cluster in a JSON list of {cluster, region, role_arn} "
+                          "targets and rank their subnets fleet-wide")
     p.add_argument("--profile", help="AWS profile")
     p.add_argument("--region", help="AWS region")
     p.add_argument("--list-enis", action="store_true", help="Show full ENI inventory with owner attribution")
     p.add_argument("--node-recs", action="store_true", help="Show node drain recommendations")
+    p.add_argument("--drain-target", type=int, metavar="N",
+                   help="Plan the fewest node drains that bring each subnet to N free /28 blocks")
+    p.add_argument("--simulate", action="store_true",
+                   help="Monte Carlo what-if: replay a synthetic scale-out against each subnet's "
+                        "current /28 blocks and report when prefix allocation first fails")
+    p.add_argument("--sim-nodes", type=int, default=SIMULATION_DEFAULTS["nodes"], metavar="N",
+                   help="With --simulate: new nodes, one per step (default: %(default)s)")
+    p.add_argument("--sim-prefixes", type=int, default=SIMULATION_DEFAULTS["prefixes_per_node"], metavar="M",
+                   help="With --simulate: /28 prefixes per new node (default: %(default)s)")
+    p.add_argument("--sim-churn", type=float, default=SIMULATION_DEFAULTS["churn"], metavar="RATE",
+                   help="With --simulate: chance per step that each simulated prefix or secondary "
+                        "IP is released (default: %(default)s)")
+    p.add_argument("--sim-secondary", type=int, default=SIMULATION_DEFAULTS["secondary_per_step"],
+                   metavar="K",
+                   help="With --simulate: individual secondary IPs allocated per step (default: %(default)s)")
+    p.add_argument("--sim-steps", type=int, default=SIMULATION_DEFAULTS["steps"], metavar="T",
+                   help="With --simulate: steps per run (default: %(default)s)")
+    p.add_argument("--sim-iterations", type=int, default=SIMULATION_DEFAULTS["iterations"], metavar="I",
+                   help="With --simulate: Monte Carlo runs (default: %(default)s)")
+    p.add_argument("--sim-seed", type=int, metavar="SEED",
+                   help="With --simulate: random seed, for reproducible results")
     p.add_argument("--no-tag-scan", action="store_true",
                    help="With --cluster: skip tag-based subnet discovery (EKS API only)")
     p.add_argument("--dry-run", action="store_true",
                    help="With --cluster: print discovered subnets and exit")
+    p.add_argument("--no-cache", action="store_true",
+                   help="With --cluster: ignore and don't update the on-disk discovery cache")
+    p.add_argument("--cache-ttl", type=float, default=DISCOVERY_CACHE_TTL, metavar="SECONDS",
+                   help=f"With --cluster: reuse cached discovery up to SECONDS old "
+                        f"(default: {DISCOVERY_CACHE_TTL})")
+    p.add_argument("--no-vpc-snapshot", action="store_true",
+                   help="With --cluster: query subnets and ENIs per subnet instead of once per VPC")
+    p.add_argument("--block-map-zoom", choices=("auto",) + tuple(str(z) for z in BLOCK_MAP_ZOOMS),
+                   default="auto",
+                   help="Blocks per block-map cell; zoomed cells show the worst status they cover "
+                        "(default: auto, at most 256 cells)")
+    p.add_argument("--html", metavar="FILE",
+                   help="Also write an HTML report with an SVG block map per subnet")
     p.add_argument("--json", action="store_true", help="JSON output")
+    p.add_argument("--json-lines", action="store_true",
+                   help="Stream one compact JSON record per subnet as it is analyzed")
+    p.add_argument("--workers", type=int, default=1, metavar="N",
+                   help="Scan up to N subnets concurrently (default: 1)")
+    p.add_argument("--watch", type=float, metavar="SECONDS",
+                   help="Keep running and emit fragmentation samples every SECONDS")
+    p.add_argument("--watch-format", choices=("jsonl", "prometheus"), default="jsonl",
+                   help="With --watch: JSON lines (default) or Prometheus text format")
+    p.add_argument("--watch-output", metavar="FILE",
+                   help="With --watch: append JSON lines to FILE, or rewrite FILE each poll "
+                        "for Prometheus (node_exporter textfile collector)")
+    p.add_argument("--watch-count", type=int, metavar="N",
+                   help="With --watch: stop after N polls (default: run until interrupted)")
+    p.add_argument("--record", metavar="FILE",
+                   help="Save the raw EC2 API responses to a gzip-compressed file for --replay")
+    p.add_argument("--history", metavar="DB",
+                   help="Append each subnet's summary to a SQLite history database "
+                        "(every poll with --watch)")
+    p.add_argument("--trend-window", type=float, default=TREND_WINDOW_DAYS, metavar="DAYS",
+                   help="With --trend: fit over the last DAYS days (default: %(default)s)")
+    p.add_argument("--fleet-workers", type=int, metavar="N",
+                   help=f"With --fleet: scan up to N targets concurrently (default: {FLEET_WORKERS})")
+    p.add_argument("--region-rate", type=float, metavar="CALLS",
+                   help=f"With --fleet: at most CALLS API calls per second per region "
+                        f"(default: {FLEET_REGION_RATE:g})")
+    p.add_argument("--top", type=int, metavar="N",
+                   help="With --fleet: report only the N worst-fragmented subnets")
     args = p.parse_args()
 
-    # --no-tag-scan / --dry-run are no-ops without --cluster. Reject
+    # --no-tag-scan / --no-vpc-snapshot / --no-cache are no-ops without
+    # --cluster or --fleet, and --dry-run without --cluster. Reject
     # explicitly so users don't silently get the wrong behavior.
-    if not args.cluster and (args.no_tag_scan or args.dry_run):
+    if not (args.cluster or args.fleet) and (args.no_tag_scan or args.no_vpc_snapshot or args.no_cache):
         print(
-            "  Error: --no-tag-scan / --dry-run require --cluster",
+            "  Error: --no-tag-scan / --no-vpc-snapshot / --no-cache require --cluster or --fleet",
             file=sys.stderr,
         )
         sys.exit(2)
+    if not args.cluster and args.dry_run:
+        print("  Error: --dry-run requires --cluster", file=sys.stderr)
+        sys.exit(2)
+    if not args.fleet and (args.fleet_workers is not None or args.region_rate is not None
+                           or args.top is not None):
+        print("  Error: --fleet-workers / --region-rate / --top require --fleet", file=sys.stderr)
+        sys.exit(2)
+    if args.workers < 1:
+        print("  Error: --workers must be at least 1", file=sys.stderr)
+        sys.exit(2)
+    if args.json and args.json_lines:
+        print("  Error: --json and --json-lines are mutually exclusive", file=sys.stderr)
+        sys.exit(2)
+    json_out = args.json or args.json_lines
+    if args.drain_target is not None and args.drain_target < 0:
+        print("  Error: --drain-target must not be negative", file=sys.stderr)
+        sys.exit(2)
+    if args.record and args.replay:
+        print("  Error: --record and --replay are mutually exclusive", file=sys.stderr)
+        sys.exit(2)
+    if args.history and args.replay:
+        # Replayed samples would be stored at the current time, not when they
+        # were captured, and skew --trend predictions.
+        print("  Error: --history cannot be combined with --replay", file=sys.stderr)
+        sys.exit(2)
+    sim_flags = ("sim_nodes", "sim_prefixes", "sim_churn", "sim_secondary", "sim_steps",
+                 "sim_iterations", "sim_seed")
+    if not args.simulate and any(getattr(args, f) != p.get_default(f) for f in sim_flags):
+        print("  Error: --sim-* options require --simulate", file=sys.stderr)
+        sys.exit(2)
+    simulation = None
+    if args.simulate:
+        if args.watch is not None or args.fleet:
+            print("  Error: --simulate cannot be combined with --watch or --fleet", file=sys.stderr)
+            sys.exit(2)
+        if (min(args.sim_nodes, args.sim_prefixes, args.sim_secondary) < 0
+                or not 0 <= args.sim_churn <= 1 or args.sim_steps < 1 or args.sim_iterations < 1):
+            print(
+                "  Error: --sim-nodes/--sim-prefixes/--sim-secondary must not be negative, "
+                "--sim-churn must be between 0 and 1, and --sim-steps/--sim-iterations must be positive",
+                file=sys.stderr,
+            )
+            sys.exit(2)
+        simulation = {
+            "nodes": args.sim_nodes,
+            "prefixes_per_node": args.sim_prefixes,
+            "churn": args.sim_churn,
+            "secondary_per_step": args.sim_secondary,
+            "steps": args.sim_steps,
+            "iterations": args.sim_iterations,
+            "seed": args.sim_seed,
+        }
+    if args.watch is None and (args.watch_output or args.watch_count is not None):
+        print("  Error: --watch-output / --watch-count require --watch", file=sys.stderr)
+        sys.exit(2)
+    if args.watch is not None:
+        if args.watch <= 0 or (args.watch_count is not None and args.watch_count < 1):
+            print("  Error: --watch and --watch-count must be positive", file=sys.stderr)
+            sys.exit(2)
+        if (json_out or args.list_enis or args.node_recs or args.drain_target is not None
+                or args.record or args.replay or args.dry_run):
+            print(
+                "  Error: --watch cannot be combined with --json, --json-lines, --list-enis, "
+                "--node-recs, --drain-target, --record, --replay or --dry-run",
+                file=sys.stderr,
+            )
+            sys.exit(2)
+
+    if args.trend_window != TREND_WINDOW_DAYS and not args.trend:
+        print("  Error: --trend-window requires --trend", file=sys.stderr)
+        sys.exit(2)
+    if args.trend:
+        if (args.watch is not None or args.history or args.record or args.simulate or args.html
+                or args.json_lines):
+            print(
+                "  Error: --trend cannot be combined with --watch, --history, --record, --simulate, "
+                "--html or --json-lines",
+                file=sys.stderr,
+            )
+            sys.exit(2)
+        if args.trend_window <= 0:
+            print("  Error: --trend-window must be positive", file=sys.stderr)
+            sys.exit(2)
+        _run_trend(args)
+        return
+    if args.history and args.fleet:
+        print("  Error: --history cannot be combined with --fleet", file=sys.stderr)
+        sys.exit(2)
+    if (args.html or args.block_map_zoom != "auto") and (args.watch is not None or args.fleet):
+        print("  Error: --html and --block-map-zoom cannot be combined with --watch or --fleet",
+              file=sys.stderr)
+        sys.exit(2)
+    map_zoom = None if args.block_map_zoom == "auto" else int(args.block_map_zoom)
+
+    if args.fleet:
+        if (args.json_lines or args.list_enis or args.node_recs or args.drain_target is not None
+                or args.watch is not None or args.record):
+            print(
+                "  Error: --fleet cannot be combined with --json-lines, --list-enis, --node-recs, "
+                "--drain-target, --watch or --record",
+                file=sys.stderr,
+            )
+            sys.exit(2)
+        if ((args.fleet_workers is not None and args.fleet_workers < 1)
+                or (args.region_rate is not None and args.region_rate <= 0)
+                or (args.top is not None and args.top < 1)):
+            print("  Error: --fleet-workers, --region-rate and --top must be positive", file=sys.stderr)
+            sys.exit(2)
+        _run_fleet(args)
+        return
 
     # Resolve region from --cluster ARN if given, then build session.
     region = args.region
@@ -850,45 +3210,86 @@ required IAM permissions (read-only):
             print(f"  Error: {e}", file=sys.stderr)
             sys.exit(2)
 
-    # Adaptive retry handles EC2 throttling more aggressively than the legacy
-    # default - useful when scanning many subnets in a single invocation.
-    try:
-        session = get_session(args.profile, region)
-        ec2 = session.client(
-            "ec2", config=Config(retries={"max_attempts": 10, "mode": "adaptive"})
-        )
-    except BotoCoreError as e:
-        print(f"  Error: failed to create AWS client: {e}", file=sys.stderr)
-        sys.exit(2)
-
-    discovery = None
-    if args.cluster:
+    recording = None
+    if args.replay:
         try:
-            eks = session.client(
-                "eks", config=Config(retries={"max_attempts": 10, "mode": "adaptive"})
-            )
-            discovery = discover_cluster_subnets(
-                eks, ec2, cluster_name,
-                tag_scan=not args.no_tag_scan,
-            )
-        except ClientError as e:
-            code = e.response["Error"]["Code"]
-            msg = e.response["Error"].get("Message", "")
-            print(f"  Error: cluster discovery failed ({code}): {msg}", file=sys.stderr)
+            recording = load_recording(args.replay)
+        except ValueError as e:
+            print(f"  Error: {e}", file=sys.stderr)
             sys.exit(2)
+        region = recording["region"]
+        ec2 = ReplayClient(recording["calls"])
+    else:
+        try:
+            session = get_session(args.profile, region)
+            ec2 = session.client("ec2", config=_RETRY_CONFIG)
         except BotoCoreError as e:
-            print(f"  Error: cluster discovery failed: {e}", file=sys.stderr)
-            sys.exit(2)
-        except RuntimeError as e:
-            print(f"  Error: {e}", file=sys.stderr)
+            print(f"  Error: failed to create AWS client: {e}", file=sys.stderr)
             sys.exit(2)
 
-        if not args.json:
+    recorded_calls = None
+    if args.record:
+        recorded_calls, record_lock = [], threading.Lock()
+        ec2 = RecordingClient(ec2, recorded_calls, record_lock)
+
+    discovery = None
+    use_vpc_snapshot = not args.no_vpc_snapshot
+    if recording is not None:
+        discovery = recording["discovery"]
+        # Recordings made before the flag was stored always used the snapshot.
+        use_vpc_snapshot = recording.get("vpc_snapshot", True)
+        subnet_ids = recording["subnet_ids"]
+        if discovery is not None and not json_out:
+            print_discovery(discovery, region or "default-region")
+    elif args.cluster:
+        # Repeated runs against the same cluster within --cache-ttl reuse the
+        # last discovery result instead of re-describing every node group.
+        cluster_arn = None
+        if not args.no_cache:
+            if args.cluster.strip().startswith("arn:"):
+                cluster_arn = args.cluster.strip()
+            else:
+                cluster_arn = cluster_arn_for(
+                    session, cluster_name, region or getattr(session, "region_name", None)
+                )
+        if cluster_arn:
+            discovery, age = load_cached_discovery(cluster_arn, not args.no_tag_scan, args.cache_ttl)
+            if discovery is not None:
+                print(
+                    f"  Using cached discovery for {cluster_arn} ({age:.0f}s old; "
+                    f"--no-cache to refresh)",
+                    file=sys.stderr,
+                )
+
+        if discovery is None:
+            try:
+                eks = session.client("eks", config=_RETRY_CONFIG)
+                discovery = discover_cluster_subnets(
+                    eks, ec2, cluster_name,
+                    tag_scan=not args.no_tag_scan,
+                )
+            except ClientError as e:
+                code = e.response["Error"]["Code"]
+                msg = e.response["Error"].get("Message", "")
+                print(f"  Error: cluster discovery failed ({code}): {msg}", file=sys.stderr)
+                sys.exit(2)
+            except BotoCoreError as e:
+                print(f"  Error: cluster discovery failed: {e}", file=sys.stderr)
+                sys.exit(2)
+            except RuntimeError as e:
+                print(f"  Error: {e}", file=sys.stderr)
+                sys.exit(2)
+            if cluster_arn:
+                save_cached_discovery(cluster_arn, not args.no_tag_scan, discovery)
+
+        if not json_out and args.watch is None:
             print_discovery(discovery, region or "default-region")
 
         if args.dry_run:
             if args.json:
                 print(json.dumps({"cluster": discovery}, indent=2, default=str))
+            elif args.json_lines:
+                print(json.dumps({"cluster": discovery}, separators=(",", ":"), default=str))
             sys.exit(0)
 
         subnet_ids = sorted(discovery["subnets"].keys())
@@ -902,90 +3303,121 @@ required IAM permissions (read-only):
     else:
         subnet_ids = args.subnet_id
 
+    def _ec2_client_factory():
+        if recording is not None:
+            return ec2
+        # One Session per worker thread: boto3 Sessions are not thread-safe.
+        client = get_session(args.profile, region).client("ec2", config=_RETRY_CONFIG)
+        if recorded_calls is not None:
+            client = RecordingClient(client, recorded_calls, record_lock)
+        return client
+
+    # Opened only once every usage error and early exit above is past, so
+    # none of them leaves a new database behind.
+    history = None
+    if args.history:
+        try:
+            history = HistoryStore(args.history)
+        except ValueError as e:
+            print(f"  Error: {e}", file=sys.stderr)
+            sys.exit(2)
+    run_started = time.time()
+
+    if args.watch is not None:
+        vpc_id = None
+        if discovery is not None and use_vpc_snapshot:
+            vpc_id = discovery["vpc_id"]
+        try:
+            watch(ec2, subnet_ids, interval=args.watch, vpc_id=vpc_id,
+                  fmt=args.watch_format, output=args.watch_output, count=args.watch_count,
+                  history=history, workers=args.workers, client_factory=_ec2_client_factory)
+        except KeyboardInterrupt:
+            pass
+        except OSError as e:
+            print(f"  Error: cannot write {args.watch_output}: {e}", file=sys.stderr)
+            sys.exit(1)
+        finally:
+            if history is not None:
+                history.close()
+        sys.exit(0)
+
+    # Cluster subnets all live in the cluster VPC: page through its subnets
+    # and ENIs once rather than once per subnet. Falls back to per-subnet
+    # calls if the VPC-wide listing fails.
+    vpc_snapshot = None
+    if discovery is not None and use_vpc_snapshot:
+        try:
+            vpc_snapshot = load_vpc_snapshot(ec2, discovery["vpc_id"])
+        except ClientError as e:
+            print(
+                f"  Warning: VPC-wide ENI listing failed ({_client_error_code(e)}); "
+                f"falling back to per-subnet calls",
+                file=sys.stderr,
+            )
+        except BotoCoreError as e:
+            print(
+                f"  Warning: VPC-wide ENI listing failed ({e}); falling back to per-subnet calls",
+                file=sys.stderr,
+            )
+
     json_results = []
     errors = 0
 
+    def _emit_json(record):
+        # --json-lines writes each record as soon as it is ready and keeps
+        # nothing, so memory stays flat however many subnets are scanned.
+        if args.json_lines:
+            sys.stdout.write(json.dumps(record, separators=(",", ":"), default=str) + "\n")
+            sys.stdout.flush()
+        else:
+            json_results.append(record)
+
     def _record_error(subnet_id, code, message):
         nonlocal errors
         errors += 1
         print(f"  Error ({subnet_id}): {code} - {message}", file=sys.stderr)
-        if args.json:
-            json_results.append({"subnet_id": subnet_id, "error": code})
+        if json_out:
+            _emit_json({"subnet_id": subnet_id, "error": code})
 
-    for subnet_id in subnet_ids:
-        try:
-            subnet_info = get_subnet_info(ec2, subnet_id)
-        except ClientError as e:
-            _record_error(subnet_id, e.response["Error"]["Code"], e.response["Error"]["Message"])
-            continue
-        except BotoCoreError as e:
-            _record_error(subnet_id, "ConnectionError", str(e))
-            continue
-        except ValueError as e:
-            # get_subnet_info normalizes a malformed/unexpected DescribeSubnets
-            # payload (e.g. an IPv6-only subnet with no IPv4 CIDR) into
-            # ValueError. Skip this subnet; do not abort the rest of the run.
-            _record_error(subnet_id, "SkippedSubnet", str(e))
-            continue
-
-        if subnet_info.get("has_ipv6"):
-            print(
-                f"  Warning ({subnet_id}): subnet is dual-stack (has an IPv6 CIDR). "
-                f"This tool measures IPv4 /28 prefix-delegation fragmentation only; "
-                f"IPv6 pod-IP consumption is not reflected.",
-                file=sys.stderr,
-            )
+    if args.json_lines and discovery is not None:
+        _emit_json({"cluster": discovery})
 
+    html_out = None
+    if args.html:
         try:
-            enis = get_enis(ec2, subnet_id)
-        except ClientError as e:
-            _record_error(subnet_id, e.response["Error"]["Code"], e.response["Error"]["Message"])
+            html_out = open(args.html, "w", encoding="utf-8")
+            html_out.write(html_report_head())
+        except OSError as e:
+            print(f"  Error: cannot write {args.html}: {e}", file=sys.stderr)
+            sys.exit(1)
+
+    for result in scan_subnets(
+        subnet_ids, ec2, workers=args.workers, client_factory=_ec2_client_factory,
+        snapshot=vpc_snapshot,
+    ):
+        subnet_id = result["subnet_id"]
+        if "error" in result:
+            _record_error(subnet_id, *result["error"])
             continue
-        except BotoCoreError as e:
-            _record_error(subnet_id, "ConnectionError", str(e))
+        if history is not None:
+            history.add(run_started, result["subnet_info"], result["analysis"], result["ip_map"])
+        if html_out is not None:
+            html_out.write(html_report_section(result["subnet_info"], result["analysis"]))
+        if json_out:
+            _emit_json(subnet_json(result, list_enis=args.list_enis, node_recs=args.node_recs,
+                                   drain_target=args.drain_target, simulation=simulation))
             continue
 
-        ip_map = build_ip_map(enis)
-        prefix_map = build_prefix_map(enis)
-        cidr_reservations = get_cidr_reservations(ec2, subnet_id)
-
-        instance_ids = {
-            v["owner_id"] for v in ip_map.values()
-            if v["owner_type"] in ("ec2_primary", "ec2_secondary", "eks_pod")
-            and v["owner_id"].startswith("i-")
-        }
-        inst_info = get_instance_info(ec2, instance_ids)
-        for iid in instance_ids:
-            if iid not in inst_info:
-                inst_info[iid] = {"name": iid, "state": "terminated"}
-
-        analysis = analyze_subnet(subnet_info["cidr"], ip_map, cidr_reservations, prefix_map)
-
-        if args.json:
-            out = {
-                "subnet": subnet_info,
-                "analysis": {k: v for k, v in analysis.items() if k != "blocks"},
-                "blocks": analysis["blocks"],
-                "ip_map": ip_map,
-                "cidr_reservations": cidr_reservations,
-            }
-            if args.list_enis:
-                out["enis"] = [{
-                    "eni_id": e["NetworkInterfaceId"],
-                    "status": e.get("Status", ""),
-                    "owner_type": classify_eni(e)[0],
-                    "owner_id": str(classify_eni(e)[1]),
-                    "detail": classify_eni(e)[2],
-                    "requester": classify_eni(e)[3],
-                    "managed": e.get("RequesterManaged", False),
-                    "ips": [a["PrivateIpAddress"] for a in e.get("PrivateIpAddresses", [])],
-                } for e in enis]
-            if args.node_recs:
-                out["node_recommendations"] = node_recommendations(analysis, ip_map, inst_info)
-            json_results.append(out)
-            continue
+        subnet_info = result["subnet_info"]
+        enis = result["enis"]
+        ip_map = result["ip_map"]
+        prefix_map = result["prefix_map"]
+        cidr_reservations = result["cidr_reservations"]
+        inst_info = result["inst_info"]
+        analysis = result["analysis"]
 
-        print_analysis(subnet_info, analysis, ip_map, inst_info, cidr_reservations, prefix_map)
+        print_analysis(subnet_info, analysis, ip_map, inst_info, cidr_reservations, prefix_map,
+                       map_zoom)
 
         if args.list_enis:
             print_enis(enis, ip_map, inst_info)
@@ -994,6 +3426,12 @@ required IAM permissions (read-only):
             recs = node_recommendations(analysis, ip_map, inst_info)
             print_node_recs(recs)
 
+        if args.drain_target is not None:
+            print_drain_plan(plan_drain(analysis, ip_map, inst_info, args.drain_target))
+
+        if simulation is not None:
+            print_simulation(simulate_capacity(analysis, **simulation))
+
     if args.json:
         # Wrap with cluster discovery context only when --cluster was used,
         # so existing --subnet-id consumers see the same shape as before.
@@ -1002,9 +3440,27 @@ required IAM permissions (read-only):
             print(json.dumps(payload, indent=2, default=str))
         else:
             print(json.dumps(json_results, indent=2, default=str))
-    else:
+    elif not args.json_lines:
         print()
 
+    if history is not None:
+        history.close()
+
+    if html_out is not None:
+        html_out.write(HTML_REPORT_TAIL)
+        html_out.close()
+        print(f"  Wrote HTML report to {args.html}", file=sys.stderr)
+
+    if args.record:
+        try:
+            save_recording(args.record, recorded_calls, region=region,
+                           subnet_ids=subnet_ids, discovery=discovery,
+                           vpc_snapshot=use_vpc_snapshot)
+        except OSError as e:
+            print(f"  Error: cannot write recording {args.record}: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"  Recorded {len(recorded_calls)} API calls to {args.record}", file=sys.stderr)
+
     if errors:
         sys.exit(1)
 
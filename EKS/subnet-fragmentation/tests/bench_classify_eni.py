@@ -0,0 +1,73 @@
+"""
+Micro-benchmark: EniClassifier against the original per-call classify_eni().
+
+Not collected by pytest; run directly:
+
+    python3 tests/bench_classify_eni.py [--enis 50000] [--repeat 5]
+
+Times one classification pass with the original function, a cold and a warm
+pass with EniClassifier, and the five classifications per ENI that the
+--json --list-enis path used to make (build_ip_map plus four calls in the
+ENI listing) against the one it makes now.
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import subnet_frag
+from test_subnet_frag import _reference_classify_eni, synthetic_enis
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--enis", type=int, default=50_000)
+    p.add_argument("--repeat", type=int, default=5)
+    args = p.parse_args()
+    enis = synthetic_enis(args.enis)
+
+    def reference():
+        for eni in enis:
+            _reference_classify_eni(eni)
+
+    def cold():
+        classifier = subnet_frag.EniClassifier()
+        for eni in enis:
+            classifier.classify(eni)
+
+    warm_classifier = subnet_frag.EniClassifier()
+    for eni in enis:
+        warm_classifier.classify(eni)
+
+    def warm():
+        for eni in enis:
+            warm_classifier.classify(eni)
+
+    def list_enis_before():
+        for eni in enis:
+            for _ in range(5):
+                _reference_classify_eni(eni)
+
+    def list_enis_after():
+        classifier = subnet_frag.EniClassifier()
+        for eni in enis:
+            classifier.classify(eni)
+            classifier.classify(eni)
+
+    print(f"{args.enis} synthetic ENIs, best of {args.repeat}")
+    for label, fn in [
+        ("reference classify_eni", reference),
+        ("EniClassifier, cold cache", cold),
+        ("EniClassifier, warm cache", warm),
+        ("--list-enis path, before (5 calls/ENI)", list_enis_before),
+        ("--list-enis path, after (1 classify + 1 hit)", list_enis_after),
+    ]:
+        best = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+        print(f"  {label:<46} {best * 1000:8.1f} ms  ({best / args.enis * 1e6:.2f} us/ENI)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,977 @@
+"""
+Tests for the subnet_frag analysis engine.
+
+The bitmap engine in analyze_subnet() replaced a set-of-strings
+implementation, and EniClassifier replaced a per-call classify_eni(); the
+originals are kept below as reference oracles so the two can be compared on
+synthetic inputs.
+"""
+import ipaddress
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import subnet_frag
+
+
+def _reference_analyze_subnet(cidr, ip_map, cidr_reservations=None, prefix_map=None):
+    try:
+        network = ipaddress.ip_network(cidr, strict=False)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"invalid subnet CIDR {cidr!r}: {e}") from e
+    # All IPs in the subnet range (not just hosts) for consistency with /28 block analysis
+    all_ips = {str(ip) for ip in network}
+    # AWS reserves 5 IPs per subnet: .0 (network), .1 (router), .2 (DNS),
+    # .3 (future), and last IP (broadcast).
+    reserved = {str(network.network_address + i) for i in range(0, 4)} | {str(network.broadcast_address)}
+    used = set(ip_map.keys())
+
+    # Build set of IPs consumed by /28 prefixes. build_prefix_map() validates
+    # CIDRs upstream, but parse defensively here so a hand-built prefix_map
+    # passed by a caller can't crash analysis.
+    prefix_ips = set()
+    prefix_blocks = set()
+    if prefix_map:
+        for pfx_cidr in prefix_map:
+            try:
+                pfx_net = ipaddress.ip_network(pfx_cidr, strict=False)
+            except (ValueError, TypeError):
+                print(f"  Warning: skipping malformed prefix CIDR '{pfx_cidr}'", file=sys.stderr)
+                continue
+            prefix_blocks.add(str(pfx_net))
+            for ip in pfx_net:
+                prefix_ips.add(str(ip))
+
+    # Reserved IPs that are not also used or prefix-allocated (for clean accounting)
+    effective_reserved = reserved - used - prefix_ips
+    free = all_ips - used - reserved - prefix_ips
+
+    reservation_nets = []
+    if cidr_reservations:
+        for r in cidr_reservations:
+            try:
+                reservation_nets.append(ipaddress.ip_network(r["cidr"], strict=False))
+            except (ValueError, TypeError, KeyError):
+                print(f"  Warning: skipping malformed CIDR reservation {r!r}", file=sys.stderr)
+
+    blocks = list(network.subnets(new_prefix=subnet_frag.PREFIX_SIZE)) if network.prefixlen <= subnet_frag.PREFIX_SIZE else []
+    # IPs that EC2 considers reserved and will reject for prefix allocation.
+    reserved_all = {network.network_address, network.broadcast_address} | {
+        network.network_address + i for i in range(1, 4)
+    }
+    block_analysis = []
+    for block in blocks:
+        # All 16 IPs in the /28 range are usable within the parent subnet.
+        # block.hosts() excludes network/broadcast of the /28, but those are
+        # regular IPs within the larger subnet - only the parent subnet's
+        # 5 reserved IPs (.0, .1, .2, .3, broadcast) are actually reserved.
+        bips = {str(ip) for ip in block}
+        b_used = [ip for ip in bips if ip in used]
+        b_res = [ip for ip in bips if ip in reserved and ip not in used and ip not in prefix_ips]
+        b_prefix = [ip for ip in bips if ip in prefix_ips]
+        b_free = [ip for ip in bips if ip in free]
+        block_has_reserved = b_res or any(ip in block for ip in reserved_all)
+        is_prefix_allocated = str(block) in prefix_blocks
+
+        # Check if this block overlaps with a CIDR reservation
+        in_reservation = any(block.overlaps(rnet) for rnet in reservation_nets)
+
+        if is_prefix_allocated:
+            status = "prefix_allocated"
+        elif block_has_reserved:
+            status = "has_reserved"
+        elif not b_used:
+            status = "free"
+        elif not b_free:
+            status = "full"
+        else:
+            status = "fragmented"
+
+        block_analysis.append({
+            "block": str(block),
+            "status": status,
+            "used": len(b_used),
+            "free": len(b_free),
+            "reserved": len(b_res),
+            "prefix": len(b_prefix),
+            "used_ips": b_used,
+            "free_ips": b_free,
+            "in_reservation": in_reservation,
+        })
+
+    free_blocks = sum(1 for b in block_analysis if b["status"] == "free")
+    frag_blocks = sum(1 for b in block_analysis if b["status"] == "fragmented")
+    full_blocks = sum(1 for b in block_analysis if b["status"] == "full")
+    reserved_blocks = sum(1 for b in block_analysis if b["status"] == "has_reserved")
+    prefix_allocated_blocks = sum(1 for b in block_analysis if b["status"] == "prefix_allocated")
+    total = len(block_analysis)
+
+    # Fragmentation score: of the blocks that could *ever* serve a new
+    # prefix request (free + fragmented + full), what fraction is contended -
+    # taken (full) or unusable due to fragmentation? Both reject prefix
+    # allocation. AWS-reserved (R) and already-prefix-allocated (A) blocks
+    # aren't candidates for *new* prefix requests, so they're excluded from
+    # both numerator and denominator. None when no candidate blocks exist.
+    #
+    # Round up: a single fragmented block in a /22 subnet is 1/510 ≈ 0.2%,
+    # which would round to 0% (HEALTHY) and hide a real allocation failure.
+    # ceil ensures any non-zero contention reads as >=1%.
+    candidate_blocks = free_blocks + frag_blocks + full_blocks
+    if candidate_blocks == 0:
+        fragmentation_score = None
+    else:
+        fragmentation_score = math.ceil((frag_blocks + full_blocks) / candidate_blocks * 100)
+
+    return {
+        "total_ips": len(all_ips),
+        "used": len(used),
+        "free": len(free),
+        "reserved": len(effective_reserved),
+        "blocks": block_analysis,
+        "total_blocks": total,
+        "free_blocks": free_blocks,
+        "fragmented_blocks": frag_blocks,
+        "full_blocks": full_blocks,
+        "reserved_blocks": reserved_blocks,
+        "prefix_allocated_blocks": prefix_allocated_blocks,
+        "fragmentation_score": fragmentation_score,
+    }
+
+
+def _reference_classify_eni(eni):
+    itype = eni.get("InterfaceType", "interface")
+    desc = eni.get("Description", "")
+    status = eni.get("Status", "")
+    attachment = eni.get("Attachment", {})
+    instance_id = attachment.get("InstanceId")
+    requester = eni.get("RequesterId", "")
+
+    if status == "available":
+        return "orphaned", eni["NetworkInterfaceId"], "detached/unused", requester
+
+    type_map = {
+        "lambda": ("lambda", desc, "VPC Lambda"),
+        "nat_gateway": ("nat_gateway", desc, "NAT Gateway"),
+        "gateway_load_balancer": ("gwlb", desc, "Gateway LB"),
+        "gateway_load_balancer_endpoint": ("gwlb_endpoint", desc, "Gateway LB Endpoint"),
+        "load_balancer": ("elb", desc, "Load Balancer"),
+        "network_load_balancer": ("nlb", desc, "Network Load Balancer"),
+        "transit_gateway": ("transit_gw", desc, "Transit Gateway"),
+        "vpc_endpoint": ("vpc_endpoint", desc, "VPC Endpoint"),
+        "api_gateway_managed": ("api_gw", desc, "API Gateway"),
+        "efs": ("efs", desc, "EFS Mount Target"),
+        "trunk": ("trunk", instance_id or desc, "Trunk ENI (SGP)"),
+        "branch": ("branch", instance_id or desc, "Branch ENI (SGP)"),
+        "efa": ("efa", instance_id or desc, "Elastic Fabric Adapter"),
+        "efa-only": ("efa", instance_id or desc, "Elastic Fabric Adapter"),
+        "evs": ("evs", desc, "Elastic VMware Service"),
+        "global_accelerator_managed": ("global_accel", desc, "Global Accelerator"),
+        "ec2_instance_connect_endpoint": ("eice", desc, "EC2 Instance Connect Endpoint"),
+        "quicksight": ("quicksight", desc, "QuickSight"),
+        "iot_rules_managed": ("iot", desc, "IoT Rules"),
+        "aws_codestar_connections_managed": ("codestar", desc, "CodeStar Connections"),
+    }
+    if itype in type_map:
+        t = type_map[itype]
+        return t[0], t[1], t[2], requester
+
+    if desc.startswith("ELB ") or desc.startswith("aws-elb"):
+        return "elb", desc, "Elastic Load Balancer", requester
+    if desc.startswith("arn:aws:ecs:"):
+        return "ecs_task", desc, "ECS Fargate task", requester
+    if desc.startswith("aws-K8S-"):
+        return "eks_pod", instance_id or desc, "EKS pod ENI", requester
+    if desc.startswith("Amazon EKS"):
+        return "eks_managed", desc, "EKS control plane", requester
+    if desc.startswith("RDSNetworkInterface"):
+        return "rds", desc, "RDS", requester
+    if desc.startswith("ElastiCache"):
+        return "elasticache", desc, "ElastiCache", requester
+    if desc.startswith("RedshiftNetworkInterface"):
+        return "redshift", desc, "Redshift", requester
+    if desc.startswith("AWS CodeBuild"):
+        return "codebuild", desc, "CodeBuild", requester
+    if desc.startswith("DAX"):
+        return "dax", desc, "DAX", requester
+    if instance_id:
+        idx = attachment.get("DeviceIndex", 0)
+        kind = "ec2_primary" if idx == 0 else "ec2_secondary"
+        return kind, instance_id, f"device index {idx}", requester
+    return "other", desc or eni["NetworkInterfaceId"], itype, requester
+
+
+def _normalize(analysis):
+    """Sort per-block IP lists; the reference builds them from sets."""
+    for b in analysis["blocks"]:
+        b["used_ips"] = sorted(b["used_ips"], key=ipaddress.IPv4Address)
+        b["free_ips"] = sorted(b["free_ips"], key=ipaddress.IPv4Address)
+    return analysis
+
+
+def _random_inputs(cidr, seed):
+    rng = random.Random(seed)
+    network = ipaddress.ip_network(cidr)
+    size = network.num_addresses
+    base = network.network_address
+    ip_map = {}
+    for _ in range(rng.randint(0, size // 3)):
+        ip_map[str(base + rng.randrange(size))] = {"owner_id": "i-x"}
+    # A few addresses outside the subnet still count as used.
+    ip_map[str(network.broadcast_address + 1)] = {"owner_id": "i-y"}
+    prefix_map = {}
+    if size >= 16:
+        for _ in range(rng.randint(0, max(1, size // 64))):
+            start = base + rng.randrange(size // 16) * 16
+            prefix_map[f"{start}/28"] = {"eni_id": "eni-1"}
+    prefix_map["not-a-cidr"] = {}
+    reservations = []
+    if size >= 64:
+        start = base + rng.randrange(size // 64) * 64
+        reservations.append({"cidr": f"{start}/26"})
+        reservations.append({"cidr": f"{base + rng.randrange(size)}/32"})
+        # Many small, possibly overlapping or adjacent reservations.
+        for _ in range(rng.randint(0, size // 32)):
+            plen = rng.choice((28, 29, 30, 32))
+            start = base + rng.randrange(size >> (32 - plen)) * (1 << (32 - plen))
+            reservations.append({"cidr": f"{start}/{plen}"})
+    reservations.append({"cidr": f"{network.broadcast_address + 1}/28"})
+    reservations.append({"cidr": "bogus"})
+    return ip_map, reservations, prefix_map
+
+
+@pytest.mark.parametrize("cidr", [
+    "10.0.0.0/28",
+    "10.0.0.0/27",
+    "10.0.0.0/24",
+    "10.0.4.0/22",
+    "172.16.0.0/20",
+    "10.1.2.0/29",
+])
+@pytest.mark.parametrize("seed", range(5))
+def test_analyze_subnet_matches_reference(cidr, seed):
+    ip_map, reservations, prefix_map = _random_inputs(cidr, seed)
+    expected = _reference_analyze_subnet(cidr, ip_map, reservations, prefix_map)
+    actual = subnet_frag.analyze_subnet(cidr, ip_map, reservations, prefix_map)
+    assert _normalize(actual) == _normalize(expected)
+
+
+def test_analyze_subnet_empty_subnet():
+    analysis = subnet_frag.analyze_subnet("10.0.0.0/24", {})
+    assert analysis["free"] == 251
+    assert analysis["reserved"] == 5
+    assert analysis["reserved_blocks"] == 2
+    assert analysis["free_blocks"] == 14
+    assert analysis["fragmentation_score"] == 0
+
+
+def test_analyze_subnet_rejects_invalid_cidr():
+    with pytest.raises(ValueError):
+        subnet_frag.analyze_subnet("not-a-cidr", {})
+
+
+class _FakePaginator:
+    def __init__(self, pages):
+        self._pages = pages
+
+    def paginate(self, **kwargs):
+        return iter(self._pages(**kwargs))
+
+
+class FakeEC2:
+    """Minimal in-memory stand-in for the EC2 calls subnet_frag makes."""
+
+    def __init__(self, subnets, enis, instances=()):
+        self.subnets = {s["SubnetId"]: s for s in subnets}
+        self.enis = list(enis)
+        self.instances = {i["InstanceId"]: i for i in instances}
+        self.calls = defaultdict(int)
+        self.instance_batches = []
+
+    def describe_subnets(self, SubnetIds=None, Filters=None):
+        self.calls["describe_subnets"] += 1
+        return {"Subnets": [self.subnets[sid] for sid in SubnetIds or [] if sid in self.subnets]}
+
+    def get_subnet_cidr_reservations(self, SubnetId, NextToken=None):
+        return {"SubnetIpv4CidrReservations": []}
+
+    def get_paginator(self, name):
+        self.calls[name] += 1
+        if name == "describe_network_interfaces":
+            def pages(Filters):
+                key = {"subnet-id": "SubnetId", "vpc-id": "VpcId"}[Filters[0]["Name"]]
+                wanted = set(Filters[0]["Values"])
+                return [{"NetworkInterfaces": [e for e in self.enis if e[key] in wanted]}]
+        elif name == "describe_subnets":
+            def matches(subnet, f):
+                if f["Name"] == "vpc-id":
+                    return subnet["VpcId"] in f["Values"]
+                tags = {t["Key"]: t["Value"] for t in subnet.get("Tags", [])}
+                return tags.get(f["Name"][len("tag:"):]) in f["Values"]
+
+            def pages(Filters):
+                return [{"Subnets": [s for s in self.subnets.values() if all(matches(s, f) for f in Filters)]}]
+        elif name == "describe_instances":
+            def pages(Filters):
+                self.instance_batches.append(list(Filters[0]["Values"]))
+                found = [self.instances[i] for i in Filters[0]["Values"] if i in self.instances]
+                return [{"Reservations": [{"Instances": found}]}]
+        else:
+            raise NotImplementedError(name)
+        return _FakePaginator(pages)
+
+
+def _fake_account(num_subnets=6):
+    subnets, enis, instances = [], [], []
+    for s in range(num_subnets):
+        sid = f"subnet-{s:04d}"
+        subnets.append({"SubnetId": sid, "CidrBlock": f"10.{s}.0.0/24", "AvailabilityZone": "us-east-1a", "VpcId": "vpc-1"})
+        for n in range(4):
+            iid = f"i-{s:04d}{n:04d}"
+            instances.append({"InstanceId": iid, "State": {"Name": "running"}, "Tags": [{"Key": "Name", "Value": iid}]})
+            enis.append({
+                "NetworkInterfaceId": f"eni-{s:04d}{n:04d}",
+                "SubnetId": sid,
+                "VpcId": "vpc-1",
+                "Status": "in-use",
+                "InterfaceType": "interface",
+                "Description": "aws-K8S-i-x",
+                "Attachment": {"InstanceId": iid, "DeviceIndex": 0},
+                "PrivateIpAddresses": [
+                    {"PrivateIpAddress": f"10.{s}.0.{10 + n * 37 + k}", "Primary": k == 0} for k in range(5)
+                ],
+            })
+    return FakeEC2(subnets, enis, instances)
+
+
+def test_scan_subnets_concurrent_matches_serial():
+    ec2 = _fake_account()
+    subnet_ids = sorted(ec2.subnets) + ["subnet-missing"]
+    serial = list(subnet_frag.scan_subnets(subnet_ids, ec2))
+    concurrent = list(subnet_frag.scan_subnets(subnet_ids, ec2, workers=4, client_factory=lambda: ec2))
+    assert [r["subnet_id"] for r in concurrent] == subnet_ids
+    assert concurrent == serial
+    assert "error" in concurrent[-1]
+
+
+class _FakeSession:
+    def __init__(self, ec2):
+        self._ec2 = ec2
+
+    def client(self, service, config=None):
+        return self._ec2
+
+
+def _run_main(monkeypatch, capsys, ec2, argv):
+    monkeypatch.setattr(subnet_frag, "get_session", lambda profile=None, region=None: _FakeSession(ec2))
+    monkeypatch.setattr(sys, "argv", ["subnet_frag.py"] + argv)
+    try:
+        subnet_frag.main()
+    except SystemExit:
+        pass
+    return capsys.readouterr().out
+
+
+def test_main_json_identical_with_workers(monkeypatch, capsys):
+    ec2 = _fake_account()
+    argv = ["--subnet-id"] + sorted(ec2.subnets) + ["subnet-missing", "--json", "--list-enis", "--node-recs"]
+    serial = _run_main(monkeypatch, capsys, ec2, argv)
+    concurrent = _run_main(monkeypatch, capsys, ec2, argv + ["--workers", "4"])
+    assert serial
+    assert concurrent == serial
+
+
+def test_scan_subnets_from_vpc_snapshot():
+    ec2 = _fake_account()
+    subnet_ids = sorted(ec2.subnets)
+    expected = list(subnet_frag.scan_subnets(subnet_ids, ec2))
+
+    ec2.calls.clear()
+    snapshot = subnet_frag.load_vpc_snapshot(ec2, "vpc-1")
+    actual = list(subnet_frag.scan_subnets(subnet_ids, ec2, snapshot=snapshot))
+    assert actual == expected
+    assert ec2.calls["describe_subnets"] == 1
+    assert ec2.calls["describe_network_interfaces"] == 1
+
+
+def test_record_then_replay_without_aws(monkeypatch, capsys, tmp_path):
+    ec2 = _fake_account()
+    path = str(tmp_path / "run.json.gz")
+    argv = ["--json", "--list-enis", "--node-recs"]
+    recorded = _run_main(monkeypatch, capsys, ec2, ["--subnet-id"] + sorted(ec2.subnets) + argv + ["--record", path])
+
+    def no_aws(*args, **kwargs):
+        raise AssertionError("replay must not create AWS sessions")
+
+    monkeypatch.setattr(subnet_frag, "get_session", no_aws)
+    monkeypatch.setattr(sys, "argv", ["subnet_frag.py", "--replay", path] + argv)
+    subnet_frag.main()
+    assert capsys.readouterr().out == recorded
+
+
+class _ClusterSession(_FakeSession):
+    def __init__(self, ec2, eks):
+        super().__init__(ec2)
+        self._eks = eks
+
+    def client(self, service, config=None):
+        return self._eks if service == "eks" else self._ec2
+
+
+def test_replay_honours_no_vpc_snapshot(monkeypatch, capsys, tmp_path):
+    ec2 = _fake_account()
+    eks = FakeEKS({"ng": sorted(ec2.subnets)})
+    path = str(tmp_path / "run.json.gz")
+    monkeypatch.setattr(subnet_frag, "get_session", lambda profile=None, region=None: _ClusterSession(ec2, eks))
+    monkeypatch.setattr(sys, "argv", ["subnet_frag.py", "--cluster", "demo", "--no-cache", "--no-tag-scan",
+                                      "--no-vpc-snapshot", "--json", "--record", path])
+    subnet_frag.main()
+    recorded = capsys.readouterr().out
+
+    monkeypatch.setattr(sys, "argv", ["subnet_frag.py", "--replay", path, "--json"])
+    subnet_frag.main()
+    captured = capsys.readouterr()
+    assert captured.out == recorded
+    assert "VPC-wide ENI listing failed" not in captured.err
+
+
+def test_replay_reports_unrecorded_calls():
+    client = subnet_frag.ReplayClient([])
+    with pytest.raises(subnet_frag.ClientError) as excinfo:
+        client.describe_subnets(SubnetIds=["subnet-1"])
+    assert excinfo.value.response["Error"]["Code"] == "NotInSnapshot"
+
+
+def _account_with_shared_node():
+    ec2 = _fake_account()
+    # Every subnet also holds an ENI of the first subnet's node, so which
+    # subnet's lookup describes it depends on thread timing.
+    shared = ec2.enis[0]
+    for sid in sorted(ec2.subnets)[1:]:
+        ec2.enis.append(dict(shared, NetworkInterfaceId=f"eni-shared-{sid}", SubnetId=sid, PrivateIpAddresses=[
+            {"PrivateIpAddress": ec2.subnets[sid]["CidrBlock"].replace("0.0/24", "0.250"), "Primary": False}]))
+    return ec2
+
+
+def test_replay_with_other_workers_than_recording(monkeypatch, capsys, tmp_path):
+    ec2 = _account_with_shared_node()
+    path = str(tmp_path / "run.json.gz")
+    argv = ["--subnet-id"] + sorted(ec2.subnets) + ["--json", "--list-enis", "--node-recs"]
+    expected = _run_main(monkeypatch, capsys, ec2, argv)
+    # Slow instance lookups so that concurrent subnets all ask for the shared node.
+    get_paginator = ec2.get_paginator
+
+    def slow_get_paginator(name):
+        paginator = get_paginator(name)
+        if name == "describe_instances":
+            pages = paginator._pages
+            paginator._pages = lambda **kwargs: (time.sleep(0.05), pages(**kwargs))[1]
+        return paginator
+
+    monkeypatch.setattr(ec2, "get_paginator", slow_get_paginator)
+    _run_main(monkeypatch, capsys, ec2, argv + ["--workers", "4", "--record", path])
+
+    monkeypatch.setattr(sys, "argv", ["subnet_frag.py", "--replay", path, "--workers", "1"] + argv[len(ec2.subnets) + 1:])
+    subnet_frag.main()
+    captured = capsys.readouterr()
+    assert captured.out == expected
+    assert "NotInSnapshot" not in captured.err
+    assert '"terminated"' not in captured.out
+
+
+def test_replay_answers_instance_lookups_by_id():
+    def lookup(ids, **outcome):
+        return {"operation": "describe_instances", "paginated": True,
+                "params": {"Filters": [{"Name": "instance-id", "Values": ids}]}, **outcome}
+
+    running = {"InstanceId": "i-a", "State": {"Name": "running"}}
+    client = subnet_frag.ReplayClient([
+        lookup(["i-a", "i-b"], result=[{"Reservations": [{"Instances": [running]}]}]),
+        lookup(["i-c", "i-bad"], error={"Code": "InvalidInstanceID.Malformed", "Message": "bad id"}),
+        lookup(["i-c"], result=[{"Reservations": [{"Instances": [dict(running, InstanceId="i-c")]}]}]),
+        lookup(["i-bad"], error={"Code": "InvalidInstanceID.Malformed", "Message": "bad id"}),
+    ])
+    info, unresolved = subnet_frag._lookup_instances(client, ["i-c", "i-b", "i-a", "i-bad"])
+    assert set(info) == {"i-a", "i-c"} and unresolved == set()
+    with pytest.raises(subnet_frag.ClientError) as excinfo:
+        client.get_paginator("describe_instances").paginate(Filters=[{"Name": "instance-id", "Values": ["i-a", "i-new"]}])
+    assert excinfo.value.response["Error"]["Code"] == "NotInSnapshot"
+
+
+def _mutate(enis, rng, cidr_base):
+    """Add, drop and re-address a few ENIs, returning a new listing."""
+    enis = [dict(e) for e in enis]
+    for e in rng.sample(enis, k=min(2, len(enis))):
+        enis.remove(e)
+    for e in rng.sample(enis, k=min(2, len(enis))):
+        e["PrivateIpAddresses"] = [{"PrivateIpAddress": f"{cidr_base}.{rng.randrange(4, 250)}", "Primary": True}]
+    n = rng.randrange(10**6)
+    enis.append({
+        "NetworkInterfaceId": f"eni-new{n}",
+        "Status": "in-use",
+        "InterfaceType": "interface",
+        "Description": "",
+        "PrivateIpAddresses": [{"PrivateIpAddress": f"{cidr_base}.{rng.randrange(4, 250)}", "Primary": True}],
+        "Ipv4Prefixes": [{"Ipv4Prefix": f"{cidr_base}.{rng.randrange(1, 15) * 16}/28"}],
+    })
+    return enis
+
+
+def test_subnet_tracker_matches_full_analysis():
+    rng = random.Random(7)
+    ec2 = _fake_account(1)
+    info = subnet_frag.get_subnet_info(ec2, "subnet-0000")
+    enis = list(ec2.enis)
+    tracker = subnet_frag.SubnetTracker(info, enis, [])
+    for _ in range(20):
+        enis = _mutate(enis, rng, "10.0.0")
+        tracker.update(enis, [])
+        expected = subnet_frag.analyze_subnet(
+            info["cidr"], subnet_frag.build_ip_map(enis), [], subnet_frag.build_prefix_map(enis)
+        )
+        assert tracker.analysis == expected
+    assert tracker.update(enis, []) == 0
+
+
+def test_watch_emits_prometheus_samples(capsys):
+    ec2 = _fake_account(2)
+    subnet_frag.watch(ec2, sorted(ec2.subnets), interval=1, fmt="prometheus",
+                      count=2, sleep=lambda seconds: None)
+    out = capsys.readouterr().out
+    assert out.count("# TYPE subnet_frag_fragmentation_score gauge") == 2
+    assert 'subnet_frag_enis_changed{subnet_id="subnet-0001",cidr="10.1.0.0/24",az="us-east-1a"} 0' in out
+
+
+def test_watch_reads_subnets_with_workers(capsys):
+    ec2 = _fake_account(6)
+    subnet_frag.watch(ec2, sorted(ec2.subnets), interval=1, count=2, sleep=lambda seconds: None)
+    serial = capsys.readouterr().out
+    threads = set()
+
+    def client_factory():
+        threads.add(threading.get_ident())
+        return ec2
+
+    subnet_frag.watch(ec2, sorted(ec2.subnets), interval=1, count=2, sleep=lambda seconds: None,
+                      workers=4, client_factory=client_factory)
+    concurrent = capsys.readouterr().out
+    strip = lambda out: [{k: v for k, v in json.loads(line).items() if k != "timestamp"} for line in out.splitlines()]
+    assert strip(concurrent) == strip(serial)
+    assert len(strip(serial)) == 12
+    assert threads and threading.get_ident() not in threads
+
+
+class FakeEKS:
+    def __init__(self, nodegroups, fargate_profiles=(), fail=()):
+        self.nodegroups = nodegroups
+        self.fargate_profiles = dict(fargate_profiles)
+        self.fail = set(fail)
+        self.calls = defaultdict(int)
+
+    def describe_cluster(self, name):
+        self.calls["describe_cluster"] += 1
+        return {"cluster": {"resourcesVpcConfig": {"vpcId": "vpc-1", "subnetIds": ["subnet-0000"]}}}
+
+    def get_paginator(self, name):
+        if name == "list_nodegroups":
+            return _FakePaginator(lambda clusterName: [{"nodegroups": list(self.nodegroups)}])
+        return _FakePaginator(lambda clusterName: [{"fargateProfileNames": list(self.fargate_profiles)}])
+
+    def describe_nodegroup(self, clusterName, nodegroupName):
+        self.calls["describe_nodegroup"] += 1
+        if nodegroupName in self.fail:
+            raise subnet_frag.ClientError({"Error": {"Code": "ResourceNotFoundException"}}, "DescribeNodegroup")
+        return {"nodegroup": {"subnets": self.nodegroups[nodegroupName]}}
+
+    def describe_fargate_profile(self, clusterName, fargateProfileName):
+        return {"fargateProfile": {"subnets": self.fargate_profiles[fargateProfileName]}}
+
+
+def test_discover_cluster_subnets_concurrent_matches_serial():
+    ec2 = _fake_account(6)
+    ec2.subnets["subnet-0005"]["Tags"] = [{"Key": "kubernetes.io/role/cni", "Value": "1"}]
+    nodegroups = {f"ng-{i:03d}": [f"subnet-{i % 5:04d}"] for i in range(40)}
+    eks = FakeEKS(nodegroups, {"fp": ["subnet-0001"]}, fail={"ng-007"})
+    serial = subnet_frag.discover_cluster_subnets(eks, ec2, "demo", workers=1)
+    concurrent = subnet_frag.discover_cluster_subnets(eks, ec2, "demo", workers=16)
+    assert concurrent == serial
+    assert list(concurrent["subnets"]["subnet-0000"][:2]) == ["control-plane", "nodegroup:ng-000"]
+    assert concurrent["subnets"]["subnet-0005"] == ["tag:cni-role"]
+    assert concurrent["warnings"] == ["DescribeNodegroup(ng-007) failed (ResourceNotFoundException); skipping"]
+
+
+def test_discovery_cache_roundtrip(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    arn = "arn:aws:eks:us-east-1:123456789012:cluster/demo"
+    discovery = {"cluster_name": "demo", "vpc_id": "vpc-1", "subnets": {"subnet-1": ["control-plane"]}}
+    assert subnet_frag.load_cached_discovery(arn, True) == (None, None)
+    subnet_frag.save_cached_discovery(arn, True, discovery)
+    cached, age = subnet_frag.load_cached_discovery(arn, True)
+    assert cached == discovery
+    assert age >= 0
+    assert subnet_frag.load_cached_discovery(arn, False) == (None, None)
+    assert subnet_frag.load_cached_discovery(arn, True, ttl=-1) == (None, None)
+
+
+def test_main_json_lines_matches_json(monkeypatch, capsys):
+    ec2 = _fake_account()
+    argv = ["--subnet-id"] + sorted(ec2.subnets) + ["subnet-missing", "--node-recs"]
+    full = json.loads(_run_main(monkeypatch, capsys, ec2, argv + ["--json"]))
+    lines = _run_main(monkeypatch, capsys, ec2, argv + ["--json-lines", "--workers", "3"]).splitlines()
+    assert len(lines) == len(full)
+    assert [json.loads(line) for line in lines] == full
+
+
+def _owned(ip_owners):
+    return {ip: {"owner_id": owner, "eni_id": f"eni-{owner}"} for ip, owner in ip_owners.items()}
+
+
+def test_plan_drain_prefers_combined_drains():
+    # i-a alone frees nothing; i-b and i-c together free three blocks that
+    # node_recommendations() cannot see because no single node owns them.
+    ip_map = _owned({
+        "10.0.0.20": "i-a", "10.0.0.21": "eni-lambda",
+        "10.0.0.36": "i-b", "10.0.0.37": "i-c",
+        "10.0.0.52": "i-b", "10.0.0.53": "i-c",
+        "10.0.0.68": "i-c", "10.0.0.69": "i-b",
+        "10.0.0.84": "i-d",
+    })
+    analysis = subnet_frag.analyze_subnet("10.0.0.0/24", ip_map)
+    plan = subnet_frag.plan_drain(analysis, ip_map, {}, analysis["free_blocks"] + 4)
+    assert plan["reachable"]
+    assert [[n["node_id"] for n in s["nodes"]] for s in plan["steps"]] == [["i-b", "i-c"], ["i-d"]]
+    assert plan["steps"][0]["block_cidrs"] == ["10.0.0.32/28", "10.0.0.48/28", "10.0.0.64/28"]
+    assert plan["free_blocks_after"] == analysis["free_blocks"] + 4
+    assert plan["fragmentation_score_after"] < plan["fragmentation_score_before"]
+
+    # The lambda-held block can never be freed.
+    plan = subnet_frag.plan_drain(analysis, ip_map, {}, analysis["total_blocks"])
+    assert not plan["reachable"]
+    assert plan["nodes_to_drain"] == 3
+
+    assert subnet_frag.plan_drain(analysis, ip_map, {}, 0)["steps"] == []
+
+
+class _MalformedIdEC2(FakeEC2):
+    """Rejects any DescribeInstances batch that contains a bad instance ID."""
+
+    def __init__(self, instances, bad_ids):
+        super().__init__([], [], instances)
+        self.bad_ids = set(bad_ids)
+
+    def get_paginator(self, name):
+        paginator = super().get_paginator(name)
+        pages = paginator._pages
+
+        def checked(Filters):
+            if self.bad_ids & set(Filters[0]["Values"]):
+                self.instance_batches.append(list(Filters[0]["Values"]))
+                raise subnet_frag.ClientError(
+                    {"Error": {"Code": "InvalidInstanceID.Malformed", "Message": "bad id"}}, "DescribeInstances")
+            return pages(Filters)
+
+        paginator._pages = checked
+        return paginator
+
+
+def test_get_instance_info_batches_and_bisects():
+    instances = [{"InstanceId": f"i-{n:06d}", "State": {"Name": "running"}} for n in range(2500)]
+    ec2 = FakeEC2([], [], instances)
+    info = subnet_frag.get_instance_info(ec2, {i["InstanceId"] for i in instances})
+    assert len(info) == 2500
+    assert sorted(len(b) for b in ec2.instance_batches) == [500, 1000, 1000]
+
+    ec2 = _MalformedIdEC2(instances[:1000], ["i-000123"])
+    info = subnet_frag.get_instance_info(ec2, {i["InstanceId"] for i in instances[:1000]})
+    assert set(info) == {i["InstanceId"] for i in instances[:1000]} - {"i-000123"}
+    # One bad ID costs a logarithmic number of calls, not one per ID.
+    assert len(ec2.instance_batches) <= 2 * 11
+
+
+def test_scan_subnets_memoizes_instances_across_subnets():
+    ec2 = _fake_account()
+    # Every subnet also holds an ENI of the first subnet's node.
+    shared = ec2.enis[0]
+    for sid in sorted(ec2.subnets)[1:]:
+        ec2.enis.append(dict(shared, NetworkInterfaceId=f"eni-shared-{sid}", SubnetId=sid, PrivateIpAddresses=[
+            {"PrivateIpAddress": ec2.subnets[sid]["CidrBlock"].replace("0.0/24", "0.250"), "Primary": False}]))
+    results = list(subnet_frag.scan_subnets(sorted(ec2.subnets), ec2))
+    assert all("error" not in r for r in results)
+    looked_up = [iid for batch in ec2.instance_batches for iid in batch]
+    assert len(looked_up) == len(set(looked_up)) == len(ec2.instances)
+
+
+class _FakeSTS:
+    def __init__(self, account):
+        self.account = account
+
+    def assume_role(self, RoleArn, RoleSessionName):
+        account = RoleArn.split(":")[4]
+        if account == "999999999999":
+            raise subnet_frag.ClientError({"Error": {"Code": "AccessDenied", "Message": "no"}}, "AssumeRole")
+        return {"Credentials": {"AccessKeyId": account, "SecretAccessKey": "s", "SessionToken": "t"}}
+
+    def get_caller_identity(self):
+        return {"Arn": f"arn:aws:sts::{self.account}:assumed-role/scanner/{subnet_frag.FLEET_SESSION_NAME}"}
+
+
+class _FleetSession:
+    """Session stand-in whose clients belong to the account in its credentials."""
+
+    def __init__(self, accounts, account):
+        self.accounts = accounts
+        self.account = account
+
+    def client(self, service, config=None):
+        if service == "sts":
+            return _FakeSTS(self.account)
+        ec2 = self.accounts[self.account]
+        if service == "eks":
+            return FakeEKS({"ng": sorted(ec2.subnets)})
+        return ec2
+
+
+def test_scan_fleet_ranks_subnets_across_accounts(monkeypatch):
+    accounts = {"111111111111": _fake_account(2), "222222222222": _fake_account(3)}
+    # Fill one subnet of the second account with single-IP ENIs so it ranks first.
+    worst = accounts["222222222222"]
+    for n in range(16):
+        worst.enis.append({
+            "NetworkInterfaceId": f"eni-frag{n}", "SubnetId": "subnet-0002", "VpcId": "vpc-1",
+            "Status": "in-use", "InterfaceType": "interface", "Description": "",
+            "PrivateIpAddresses": [{"PrivateIpAddress": f"10.2.0.{n * 16 + 5}", "Primary": True}],
+        })
+    monkeypatch.setattr(
+        subnet_frag, "get_session",
+        lambda profile=None, region=None, credentials=None: _FleetSession(
+            accounts, credentials["AccessKeyId"] if credentials else "111111111111"),
+    )
+    targets = [
+        {"cluster": "a", "cluster_name": "a", "region": "us-east-1", "role_arn": None},
+        {"cluster": "b", "cluster_name": "b", "region": "eu-west-1",
+         "role_arn": "arn:aws:iam::222222222222:role/scanner"},
+        {"cluster": "c", "cluster_name": "c", "region": "eu-west-1",
+         "role_arn": "arn:aws:iam::999999999999:role/scanner"},
+    ]
+    base = _FleetSession(accounts, "111111111111")
+    results = list(subnet_frag.scan_fleet(
+        targets, base, fleet_workers=3, region_rate=None, tag_scan=False, use_cache=False,
+    ))
+    assert [t["account"] for t in results] == ["111111111111", "222222222222", None]
+    assert results[2]["error"].startswith("AccessDenied")
+    ranked = subnet_frag.rank_fleet_subnets(results)
+    assert len(ranked) == 5
+    assert (ranked[0]["account"], ranked[0]["subnet_id"]) == ("222222222222", "subnet-0002")
+    scores = [r["fragmentation_score"] for r in ranked]
+    assert scores == sorted(scores, reverse=True)
+    assert [r["rank"] for r in subnet_frag.rank_fleet_subnets(results, top=2)] == [1, 2]
+
+
+def test_load_fleet_targets(tmp_path):
+    path = tmp_path / "fleet.json"
+    path.write_text(json.dumps([
+        {"cluster": "arn:aws:eks:eu-west-1:222222222222:cluster/b"},
+        {"cluster": "a", "role_arn": "arn:aws:iam::111111111111:role/scanner"},
+    ]))
+    targets = subnet_frag.load_fleet_targets(str(path), "us-east-1")
+    assert [(t["cluster_name"], t["region"]) for t in targets] == [("b", "eu-west-1"), ("a", "us-east-1")]
+    with pytest.raises(ValueError, match="no region"):
+        subnet_frag.load_fleet_targets(str(path))
+
+
+def test_rate_limiter_spaces_calls():
+    now, slept = [0.0], []
+
+    def sleep(seconds):
+        slept.append(seconds)
+        now[0] += seconds
+
+    limiter = subnet_frag.RateLimiter(2, clock=lambda: now[0], sleep=sleep)
+    for _ in range(6):
+        limiter.acquire()
+    # Two calls fit in the initial burst; the other four wait half a second each.
+    assert sum(slept) == pytest.approx(2.0)
+
+
+_ENI_SHAPES = [
+    {"Status": "available"},
+    {"InterfaceType": "branch", "Attachment": {"InstanceId": "i-trunk"}},
+    {"InterfaceType": "efa-only"},
+    {"InterfaceType": "some_future_type"},
+    {"Attachment": {"InstanceId": "i-node", "DeviceIndex": 2}},
+    {"Attachment": {"InstanceId": "i-node"}},
+    {"Description": ""},
+    {"Description": "DAXtra", "Attachment": {"InstanceId": "i-node", "DeviceIndex": 0}},
+    {"Description": "aws-K8S-i-0abc", "Attachment": {"InstanceId": "i-node", "DeviceIndex": 1}},
+    {"Description": "aws-K8S-i-0abc"},
+    {"Description": "ELB app/x", "InterfaceType": "interface"},
+] + [{"InterfaceType": t, "Description": "d"} for t in subnet_frag._ENI_TYPES] + [
+    {"Description": p[0] + "suffix"} for p in subnet_frag._ENI_DESC_PREFIXES
+]
+
+
+def synthetic_enis(count, seed=0):
+    """`count` ENIs drawn from every classification shape, with requesters."""
+    rng = random.Random(seed)
+    enis = []
+    for n in range(count):
+        eni = dict(rng.choice(_ENI_SHAPES), NetworkInterfaceId=f"eni-{n:08x}")
+        if rng.random() < 0.3:
+            eni["RequesterId"] = "amazon-aws"
+        enis.append(eni)
+    return enis
+
+
+def test_classifier_matches_reference():
+    classifier = subnet_frag.EniClassifier()
+    for eni in synthetic_enis(2000):
+        expected = _reference_classify_eni(eni)
+        assert classifier.classify(eni) == expected
+        assert classifier.classify(eni) == expected
+
+
+def test_classifier_reclassifies_changed_eni():
+    classifier = subnet_frag.EniClassifier(max_entries=2)
+    eni = {"NetworkInterfaceId": "eni-1", "Status": "in-use", "Description": "aws-K8S-i-1",
+           "Attachment": {"InstanceId": "i-1", "DeviceIndex": 1}}
+    assert classifier.classify(eni)[0] == "eks_pod"
+    assert classifier.classify(dict(eni, Status="available"))[0] == "orphaned"
+    for n in range(5):
+        classifier.classify(dict(eni, NetworkInterfaceId=f"eni-x{n}"))
+    assert len(classifier._cache) <= 2
+
+
+def test_simulate_capacity_block_model():
+    ip_map = _owned({"10.0.0.20": "i-a", "10.0.0.21": "i-a", "10.0.0.200": "i-b"})
+    analysis = subnet_frag.analyze_subnet("10.0.0.0/24", ip_map, prefix_map={"10.0.0.64/28": {}})
+    model = subnet_frag._BlockModel.from_analysis(analysis)
+    assert len(model.free_list) == analysis["free_blocks"]
+
+    rng = random.Random(7)
+    taken_blocks, taken_ips = [], []
+    for _ in range(500):
+        r = rng.random()
+        if r < 0.3:
+            idx = model.take_block(rng)
+            if idx is not None:
+                taken_blocks.append(idx)
+        elif r < 0.5 and taken_blocks:
+            model.release_block(taken_blocks.pop(rng.randrange(len(taken_blocks))))
+        elif r < 0.8:
+            off = model.take_ip(rng)
+            if off is not None:
+                taken_ips.append(off)
+        elif taken_ips:
+            model.release_ip(taken_ips.pop(rng.randrange(len(taken_ips))))
+        # The free list always holds exactly the unpinned blocks with no address taken.
+        expected = {i for i in range(len(model.used)) if not model.used[i] and not model.pinned[i]}
+        assert set(model.free_list) == expected
+        assert all(model.pos[idx] == k for k, idx in enumerate(model.free_list))
+
+
+def test_simulate_capacity_reports_exhaustion():
+    analysis = subnet_frag.analyze_subnet("10.0.0.0/24", {})
+    idle = subnet_frag.simulate_capacity(analysis, nodes=0, secondary_per_step=0, steps=5, iterations=3)
+    assert idle["failure_probability"] == 0.0 and idle["first_failure_step"] is None
+    assert [row["p50"] for row in idle["free_blocks"]] == [analysis["free_blocks"]] * 5
+
+    # 14 free blocks cannot hold 10 nodes x 2 prefixes.
+    run = subnet_frag.simulate_capacity(analysis, nodes=10, prefixes_per_node=2, steps=20,
+                                        iterations=50, seed=3)
+    assert run["failure_probability"] == 1.0
+    assert 1 <= run["first_failure_step"]["p5"] <= run["first_failure_step"]["p95"] <= 10
+    assert run == subnet_frag.simulate_capacity(analysis, nodes=10, prefixes_per_node=2, steps=20,
+                                                iterations=50, seed=3)
+
+
+def test_render_block_map_zooms_to_worst_status():
+    ip_map = _owned({"10.0.1.20": "i-a"})
+    blocks = subnet_frag.analyze_subnet("10.0.0.0/22", ip_map)["blocks"]
+    full = subnet_frag.render_block_map(blocks, zoom=1).splitlines()
+    assert len(full) == 1 + 64 // 16
+    assert full[1].split() == ["R"] + ["□"] * 15
+
+    zoomed = subnet_frag.render_block_map(blocks, zoom=16).splitlines()
+    # One cell per /24: reserved network addresses, one used IP, free, broadcast.
+    assert zoomed[1:] == ["  10.0.0.0/28        R ▣ □ R"]
+
+
+def test_block_maps_stay_bounded_for_huge_subnets():
+    blocks = subnet_frag.analyze_subnet("10.0.0.0/12", {})["blocks"]
+    assert len(blocks) == 65536
+    text = subnet_frag.render_block_map(blocks)
+    assert len(text.splitlines()) == 1 + 256 // 16
+    svg = subnet_frag.render_block_map_svg(blocks)
+    assert svg.count("<rect") == 65536 // 16
+
+
+def test_history_store_trend(tmp_path):
+    store = subnet_frag.HistoryStore(str(tmp_path / "history.db"))
+    ip_map = _owned({"10.0.0.20": "i-a"})
+    for k in range(10):
+        ip_map[f"10.0.0.{21 + k}"] = {"owner_id": "i-a", "eni_id": "eni-i-a", "owner_type": "eks_pod"}
+    for info in ip_map.values():
+        info["owner_type"] = "eks_pod"
+    analysis = subnet_frag.analyze_subnet("10.0.0.0/24", ip_map)
+    day = 86400
+    for k in range(5):
+        # Shrinking: 14 free blocks losing 2 per day; steady: always 10.
+        shrinking = dict(analysis, free_blocks=14 - 2 * k)
+        store.add(1000 * day + k * day, {"subnet_id": "subnet-a", "cidr": "10.0.0.0/24"}, shrinking, ip_map)
+        store.add(1000 * day + k * day, {"subnet_id": "subnet-b", "cidr": "10.1.0.0/24"}, analysis, ip_map)
+    store.add(900 * day, {"subnet_id": "subnet-old", "cidr": "10.2.0.0/24"}, analysis, ip_map)
+    store.close()
+
+    store = subnet_frag.HistoryStore(str(tmp_path / "history.db"))
+    rows = store.trend(7 * day, now=1004 * day)
+    assert [r["subnet_id"] for r in rows] == ["subnet-a", "subnet-b"]
+    assert rows[0]["samples"] == 5 and rows[0]["free_blocks"] == 6
+    assert rows[0]["free_blocks_per_day"] == pytest.approx(-2)
+    assert rows[0]["exhausted_at"] == 1007 * day
+    assert rows[1]["free_blocks_per_day"] == pytest.approx(0)
+    assert rows[1]["exhausted_at"] is None
+    owners = store._db.execute("SELECT owner_type, enis, ips FROM sample_owners LIMIT 1").fetchall()
+    assert owners == [("eks_pod", 1, 11)]
+
+
+def test_history_rejected_with_replay(monkeypatch, capsys, tmp_path):
+    db = str(tmp_path / "history.db")
+    monkeypatch.setattr(sys, "argv", ["subnet_frag.py", "--replay", str(tmp_path / "run.json.gz"), "--history", db])
+    with pytest.raises(SystemExit) as excinfo:
+        subnet_frag.main()
+    assert excinfo.value.code == 2
+    assert "--history cannot be combined with --replay" in capsys.readouterr().err
+    assert not os.path.exists(db)
+
+
+@pytest.mark.parametrize("extra", [
+    ["--watch", "5", "--html", "report.html"],
+    ["--watch", "5", "--block-map-zoom", "16"],
+    ["--cluster", "arn:aws:eks:us-east-1:123456789012:nodegroup/demo"],
+])
+def test_history_not_created_on_usage_error(monkeypatch, capsys, tmp_path, extra):
+    db = str(tmp_path / "history.db")
+    argv = ["subnet_frag.py", "--history", db] + extra
+    if "--cluster" not in extra:
+        argv += ["--subnet-id", "subnet-1"]
+    monkeypatch.setattr(sys, "argv", argv)
+    with pytest.raises(SystemExit) as excinfo:
+        subnet_frag.main()
+    assert excinfo.value.code == 2
+    assert "Error:" in capsys.readouterr().err
+    assert not os.path.exists(db)
+
+
+def test_history_store_rejects_other_databases(tmp_path):
+    path = tmp_path / "other.db"
+    path.write_bytes(b"not a database" * 100)
+    with pytest.raises(ValueError):
+        subnet_frag.HistoryStore(str(path))
@@ -0,0 +1,230 @@
+# This Python file uses the following encoding: utf-8
+'''
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+"""
+Tests for CheckRunner scheduling and ReportWriter buffering.
+Validates that checks run concurrently while the report keeps the order
+the checks were added in, that dependencies are waited for, and that
+interactive checks run on the main thread.
+"""
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'verify_env'))
+
+from check_runner import CheckRunner, check
+from report_writer import ReportWriter
+
+
+@pytest.fixture
+def report():
+    """ReportWriter writing to standard output, as when the user declines the report files."""
+    with patch('builtins.input', return_value='n'):
+        writer = ReportWriter()
+    return writer
+
+
+class FakeVerifier:
+    """Verifier whose checks record when and where they ran."""
+
+    def __init__(self, report):
+        self.report = report
+        self.events = []
+        self.threads = {}
+        self.blocking_started = threading.Event()
+        self.release = threading.Event()
+
+    def _record(self, name):
+        self.events.append(name)
+        self.threads[name] = threading.current_thread()
+
+    @check()
+    def check_slow(self):
+        time.sleep(0.2)
+        self.report.write_all_locations("slow")
+        self._record("check_slow")
+
+    @check()
+    def check_fast(self):
+        self.report.write_full_report("fast", 1, sep="-", end="\n")
+        self._record("check_fast")
+
+    @check(depends_on=("check_slow",))
+    def check_after_slow(self):
+        self._record("check_after_slow")
+        self.report.write_all_locations("after slow")
+
+    @check(interactive=True)
+    def check_prompt(self):
+        self._record("check_prompt")
+        self.report.write_all_locations("prompt")
+
+    @check(depends_on=("check_prompt",))
+    def check_after_prompt(self):
+        self._record("check_after_prompt")
+        self.report.write_all_locations("after prompt")
+
+    @check()
+    def check_blocking(self):
+        self.threads["check_blocking"] = threading.current_thread()
+        self.blocking_started.set()
+        self.release.wait()
+
+    @check()
+    def check_failing(self):
+        self.report.write_all_locations("failing")
+        raise ValueError("check failed")
+
+    def not_a_check(self):
+        pass
+
+
+class TestCheckRunner:
+    """Tests for CheckRunner."""
+
+    def test_report_keeps_order_of_checks(self, report, capsys):
+        """A later check finishing first is still written after the earlier one."""
+        capsys.readouterr()
+        verifier = FakeVerifier(report)
+        runner = CheckRunner(report)
+        runner.add(verifier.check_slow)
+        runner.add(verifier.check_fast)
+        runner.run()
+        assert verifier.events == ["check_fast", "check_slow"]
+        assert capsys.readouterr().out == "slow\n\nfast-1\n"
+
+    def test_dependency_runs_after_its_dependency(self, report, capsys):
+        """A check does not start before the checks it depends on have finished."""
+        verifier = FakeVerifier(report)
+        runner = CheckRunner(report)
+        runner.add(verifier.check_slow)
+        runner.add(verifier.check_after_slow)
+        runner.add(verifier.check_fast)
+        runner.run()
+        assert verifier.events.index("check_after_slow") > verifier.events.index("check_slow")
+        assert capsys.readouterr().out.endswith("slow\n\nafter slow\n\nfast-1\n")
+
+    def test_interactive_check_runs_on_main_thread_in_order(self, report, capsys):
+        """Interactive checks run on the main thread once the output before them is written."""
+        capsys.readouterr()
+        verifier = FakeVerifier(report)
+        runner = CheckRunner(report)
+        runner.add(verifier.check_slow)
+        runner.add(verifier.check_prompt)
+        runner.add(verifier.check_fast)
+        runner.run()
+        assert verifier.threads["check_prompt"] is threading.main_thread()
+        assert verifier.threads["check_slow"] is not threading.main_thread()
+        assert capsys.readouterr().out == "slow\n\nprompt\n\nfast-1\n"
+
+    def test_failing_check_raises_after_earlier_output(self, report, capsys):
+        """A failing check's exception is raised after the output of the checks before it."""
+        capsys.readouterr()
+        verifier = FakeVerifier(report)
+        runner = CheckRunner(report)
+        runner.add(verifier.check_slow)
+        runner.add(verifier.check_failing)
+        runner.add(verifier.check_prompt)
+        with pytest.raises(ValueError):
+            runner.run()
+        assert "check_prompt" not in verifier.events
+        assert capsys.readouterr().out == "slow\n\nfailing\n\n"
+
+    def test_background_check_waits_for_interactive_dependency(self, report, capsys):
+        """A background check depending on an interactive check starts once the user has answered it."""
+        capsys.readouterr()
+        verifier = FakeVerifier(report)
+        runner = CheckRunner(report)
+        runner.add(verifier.check_slow)
+        runner.add(verifier.check_prompt)
+        runner.add(verifier.check_after_prompt)
+        runner.run()
+        assert verifier.events == ["check_slow", "check_prompt", "check_after_prompt"]
+        assert verifier.threads["check_after_prompt"] is not threading.main_thread()
+        assert capsys.readouterr().out == "slow\n\nprompt\n\nafter prompt\n\n"
+
+    def test_failing_check_does_not_wait_for_running_checks(self, report):
+        """run() raises without waiting for the checks still running, which run on daemon threads."""
+        verifier = FakeVerifier(report)
+        runner = CheckRunner(report)
+        runner.add(verifier.check_failing)
+        runner.add(verifier.check_blocking)
+        try:
+            start = time.time()
+            with pytest.raises(ValueError):
+                runner.run()
+            assert time.time() - start < 1
+            assert verifier.blocking_started.wait(1)
+            assert verifier.threads["check_blocking"].daemon
+        finally:
+            verifier.release.set()
+
+    def test_single_worker_runs_checks_in_order(self, report):
+        """With one worker, checks run one after another in the order they were added."""
+        verifier = FakeVerifier(report)
+        runner = CheckRunner(report, max_workers=1)
+        runner.add(verifier.check_slow)
+        runner.add(verifier.check_fast)
+        runner.run()
+        assert verifier.events == ["check_slow", "check_fast"]
+
+    def test_add_rejects_invalid_checks(self, report):
+        """Undecorated methods, duplicates and dependencies added later are rejected."""
+        verifier = FakeVerifier(report)
+        runner = CheckRunner(report)
+        with pytest.raises(ValueError):
+            runner.add(verifier.not_a_check)
+        with pytest.raises(ValueError):
+            runner.add(verifier.check_after_slow)
+        runner.add(verifier.check_slow)
+        with pytest.raises(ValueError):
+            runner.add(verifier.check_slow)
+
+
+class TestReportWriterBuffer:
+    """Tests for the per thread buffer of ReportWriter."""
+
+    def test_buffered_writes_are_replayed(self, report, capsys):
+        """Writes are held while buffering and written unchanged by replay."""
+        capsys.readouterr()
+        report.start_buffer()
+        report.write_all_locations("a", 1, sep=",")
+        report.write_key_findings("b", end="\n")
+        entries = report.end_buffer()
+        assert capsys.readouterr().out == ""
+        report.replay(entries)
+        assert capsys.readouterr().out == "a,1\n\nb\n"
+
+    def test_buffer_is_per_thread(self, report, capsys):
+        """Other threads keep writing directly while one thread buffers."""
+        capsys.readouterr()
+        report.start_buffer()
+        writer = threading.Thread(target=report.write_full_report, args=("direct",))
+        writer.start()
+        writer.join()
+        report.write_full_report("held")
+        entries = report.end_buffer()
+        assert capsys.readouterr().out == "direct\n\n"
+        report.replay(entries)
+        assert capsys.readouterr().out == "held\n\n"
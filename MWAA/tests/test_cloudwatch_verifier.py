@@ -0,0 +1,159 @@
+# This Python file uses the following encoding: utf-8
+'''
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+"""
+Tests for CloudWatchVerifier and its GetMetricData batch.
+Validates that the metrics of all checks are fetched with one request per
+time window, even when the checks run concurrently, that paginated results
+are joined, and that each check evaluates the returned datapoints.
+"""
+import threading
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'verify_env'))
+
+from cloudwatch_verifier import CloudWatchVerifier
+from metric_data import MetricDataBatch
+from .conftest import RecordingReport
+
+
+class FakeCloudWatch:
+    """
+    CloudWatch client answering GetMetricData from datapoints listed per metric name
+    (and cluster) as (age, value), returning the datapoints of one query per page.
+    """
+
+    def __init__(self, datapoints):
+        self.datapoints = datapoints
+        self.requests = []
+
+    def get_metric_data(self, MetricDataQueries, StartTime, EndTime, ScanBy, NextToken=None):
+        if NextToken is None:
+            self.requests.append((MetricDataQueries, StartTime, EndTime))
+        index = int(NextToken or 0)
+        query = MetricDataQueries[index]
+        metric = query['MetricStat']['Metric']
+        dimensions = {dimension['Name']: dimension['Value'] for dimension in metric['Dimensions']}
+        key = (metric['MetricName'], dimensions['Cluster']) if 'Cluster' in dimensions else metric['MetricName']
+        datapoints = [(EndTime - age, value) for age, value in self.datapoints.get(key, [])
+                      if EndTime - age >= StartTime]
+        response = {'MetricDataResults': [{
+            'Id': query['Id'],
+            'Timestamps': [timestamp for timestamp, _ in datapoints],
+            'Values': [value for _, value in datapoints],
+            'StatusCode': 'Complete'
+        }]}
+        if index + 1 < len(MetricDataQueries):
+            response['NextToken'] = str(index + 1)
+        return response
+
+
+DATAPOINTS = {
+    'TaskQueued': [(timedelta(hours=3), 1.0), (timedelta(minutes=70), 2.0)],
+    'TaskPulled': [(timedelta(minutes=70), 2.0)],
+    'CeleryWorkerHeartbeat': [(timedelta(minutes=10), 1.0)],
+    ('CPUUtilization', 'BaseWorker'): [(timedelta(days=7), 91.5)],
+    ('CPUUtilization', 'Scheduler'): [(timedelta(days=7), 20.0)],
+    ('CPUUtilization', 'WebServer'): [(timedelta(days=7), 5.0)],
+    ('MemoryUtilization', 'BaseWorker'): [(timedelta(days=7), 40.0)],
+    ('MemoryUtilization', 'Scheduler'): [(timedelta(days=7), 30.0)],
+    ('MemoryUtilization', 'WebServer'): [(timedelta(days=7), 10.0)],
+    'DagBagSize': [(timedelta(minutes=30), 10.0), (timedelta(minutes=4), 60.0)],
+}
+
+
+def make_verifier(datapoints, environment_class="mw1.small"):
+    clients = SimpleNamespace(cw=FakeCloudWatch(datapoints))
+    env = {"Name": "test", "EnvironmentClass": environment_class}
+    return CloudWatchVerifier(clients, RecordingReport(), env)
+
+
+class TestMetricDataBatch:
+    """Tests for MetricDataBatch"""
+
+    def test_metrics_are_fetched_once_per_window_for_concurrent_checks(self):
+        verifier = make_verifier(DATAPOINTS)
+        checks = [verifier.check_celery_sqs_health, verifier.check_environment_class_utilization,
+                  verifier.check_environment_class_dag_count]
+        threads = [threading.Thread(target=check) for check in checks]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        requests = verifier.cw.requests
+        # one request for the 24 hour metrics and one for the 7 day utilizations
+        assert sorted(len(queries) for queries, _, _ in requests) == [5, 6]
+        assert sorted(end - start for _, start, end in requests) == [timedelta(hours=24), timedelta(days=7)]
+
+    def test_pages_are_joined_per_metric(self):
+        cw = FakeCloudWatch(DATAPOINTS)
+        batch = MetricDataBatch(cw)
+        dimensions = [{"Name": "Environment", "Value": "test"}]
+        for metric in ["TaskQueued", "TaskPulled", "TaskExecuted"]:
+            batch.add(metric, "AmazonMWAA", metric, dimensions, period=300, window=timedelta(hours=24))
+        assert [value for _, value in batch.get("TaskQueued")] == [1.0, 2.0]
+        assert [value for _, value in batch.get("TaskPulled")] == [2.0]
+        assert batch.get("TaskExecuted") == []
+        assert len(cw.requests) == 1
+
+    def test_metrics_cannot_be_added_after_the_fetch(self):
+        batch = MetricDataBatch(FakeCloudWatch({}))
+        batch.add("TaskQueued", "AmazonMWAA", "TaskQueued", [], period=300, window=timedelta(hours=24))
+        batch.get("TaskQueued")
+        with pytest.raises(ValueError):
+            batch.add("TaskPulled", "AmazonMWAA", "TaskPulled", [], period=300, window=timedelta(hours=24))
+
+
+class TestCloudWatchChecks:
+    """Tests for the checks of CloudWatchVerifier"""
+
+    def test_celery_sqs_health(self):
+        verifier = make_verifier(DATAPOINTS)
+        verifier.check_celery_sqs_health()
+        lines = verifier.report.lines
+        assert lines[1].startswith("TaskQueued Latest Datapoint - 1h 10m ago") and lines[1].endswith("Value: 2.0")
+        assert lines[2].startswith("TaskPulled Latest Datapoint - 1h 10m ago")
+        assert lines[3] == "⚠️ TaskExecuted did not have any datapoints in last 24 hours."
+        assert lines[4] == "✅ Celery worker heartbeat received in last 20 minutes."
+
+    def test_missing_heartbeat(self):
+        verifier = make_verifier({'CeleryWorkerHeartbeat': [(timedelta(minutes=25), 1.0)]})
+        verifier.check_celery_sqs_health()
+        assert verifier.report.lines[-1] == "🚫 No Celery Worker heartbeat received in last 20 minutes"
+
+    def test_environment_class_utilization(self):
+        verifier = make_verifier(DATAPOINTS)
+        verifier.check_environment_class_utilization()
+        lines = verifier.report.lines
+        assert ("⚠️ The BaseWorker cluster had an average CPUUtilization of 91 percent over last 7 days. "
+                "MWAA recommends this value to be less than 85 percent.") in lines
+        assert len([line for line in lines if line.startswith("✅ The")]) == 5
+        assert "⚠️ MWAA recommends the environment class to be upgraded to mw1.medium" in lines
+
+    def test_environment_class_dag_count(self):
+        verifier = make_verifier(DATAPOINTS, environment_class="mw1.micro")
+        verifier.check_environment_class_dag_count()
+        lines = verifier.report.lines
+        assert "Dag count: 60" in lines
+        assert lines[-1].startswith("⚠️ The DAG count exceeds the capacity")
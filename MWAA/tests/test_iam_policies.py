@@ -0,0 +1,167 @@
+# This Python file uses the following encoding: utf-8
+'''
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+"""
+Tests for the shared IAM policy cache and batched policy simulation.
+Validates that the policy documents of a role are fetched once per run,
+that paginated IAM results are followed, and that simulations sharing
+resources and context entries are sent as a single request.
+"""
+import json
+import threading
+import time
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'verify_env'))
+
+from iam_policies import RolePolicyCache, simulate_custom_policies
+
+
+class FakeIAM:
+    """
+    IAM client holding the policies of one role. List and simulation results
+    are returned one item per page to exercise Marker pagination.
+    """
+
+    def __init__(self, managed=None, inline=None, denied=()):
+        self.managed = managed or {}
+        self.inline = inline or {}
+        self.denied = denied
+        self.calls = {}
+        self.simulations = []
+        self._lock = threading.Lock()
+
+    def _count(self, operation):
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        # leave time for other threads to make the same request
+        time.sleep(0.01)
+
+    @staticmethod
+    def _page(items, key, Marker=None):
+        start = int(Marker or 0)
+        page = {key: items[start:start + 1], 'IsTruncated': start + 1 < len(items)}
+        if page['IsTruncated']:
+            page['Marker'] = str(start + 1)
+        return page
+
+    def list_attached_role_policies(self, RoleName, Marker=None):
+        self._count('list_attached_role_policies')
+        return self._page([{'PolicyArn': arn} for arn in self.managed], 'AttachedPolicies', Marker)
+
+    def list_role_policies(self, RoleName, Marker=None):
+        self._count('list_role_policies')
+        return self._page(list(self.inline), 'PolicyNames', Marker)
+
+    def get_policy(self, PolicyArn):
+        self._count('get_policy')
+        return {'Policy': {'DefaultVersionId': 'v1'}}
+
+    def get_policy_version(self, PolicyArn, VersionId):
+        self._count('get_policy_version')
+        return {'PolicyVersion': {'Document': self.managed[PolicyArn]}}
+
+    def get_role_policy(self, RoleName, PolicyName):
+        self._count('get_role_policy')
+        return {'PolicyDocument': self.inline[PolicyName]}
+
+    def simulate_custom_policy(self, PolicyInputList, ActionNames, ResourceArns, ContextEntries=None, Marker=None):
+        if Marker is None:
+            self.simulations.append((list(ActionNames), list(ResourceArns), ContextEntries))
+        results = [{'EvalActionName': action, 'EvalResourceName': resource,
+                    'EvalDecision': 'implicitDeny' if action in self.denied else 'allowed'}
+                   for action in ActionNames for resource in ResourceArns]
+        return self._page(results, 'EvaluationResults', Marker)
+
+
+def context(service):
+    return [{'ContextKeyName': 'kms:viaservice', 'ContextKeyValues': [service], 'ContextKeyType': 'string'}]
+
+
+class TestRolePolicyCache:
+    """Tests for RolePolicyCache.get_policy_documents"""
+
+    def test_returns_managed_then_inline_documents(self):
+        iam = FakeIAM(managed={'arn:a': {'Statement': 'a'}, 'arn:b': {'Statement': 'b'}},
+                      inline={'c': {'Statement': 'c'}})
+        documents = RolePolicyCache(iam).get_policy_documents('role')
+        assert [json.loads(document)['Statement'] for document in documents] == ['a', 'b', 'c']
+        # one page per policy
+        assert iam.calls['list_attached_role_policies'] == 2
+
+    def test_documents_are_fetched_once_for_concurrent_callers(self):
+        iam = FakeIAM(managed={'arn:a': {'Statement': 'a'}}, inline={'c': {'Statement': 'c'}})
+        cache = RolePolicyCache(iam)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_policy_documents('role')))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(results) == 4 and all(result == results[0] for result in results)
+        assert iam.calls == {'list_attached_role_policies': 1, 'list_role_policies': 1,
+                             'get_policy': 1, 'get_policy_version': 1, 'get_role_policy': 1}
+
+
+class TestSimulateCustomPolicies:
+    """Tests for simulate_custom_policies"""
+
+    def test_simulations_sharing_resources_and_context_are_batched(self):
+        iam = FakeIAM(denied=('s3:ListAllMyBuckets',))
+        simulations = [
+            {'ActionNames': ['s3:ListAllMyBuckets'], 'ResourceArns': ['arn:bucket', 'arn:bucket/']},
+            {'ActionNames': ['s3:GetObject*', 's3:List*'], 'ResourceArns': ['arn:bucket', 'arn:bucket/']},
+            {'ActionNames': ['logs:DescribeLogGroups'], 'ResourceArns': ['*']},
+            {'ActionNames': ['cloudwatch:PutMetricData'], 'ResourceArns': ['*']},
+            {'ActionNames': ['kms:Decrypt'], 'ResourceArns': ['arn:key'], 'ContextEntries': context('sqs')},
+            {'ActionNames': ['kms:GenerateDataKey*'], 'ResourceArns': ['arn:key'], 'ContextEntries': context('sqs')},
+            {'ActionNames': ['kms:Decrypt'], 'ResourceArns': ['arn:key'], 'ContextEntries': context('s3')},
+        ]
+        results = simulate_custom_policies(iam, ['{}'], simulations)
+        assert sorted(iam.simulations, key=str) == sorted([
+            (['s3:ListAllMyBuckets', 's3:GetObject*', 's3:List*'], ['arn:bucket', 'arn:bucket/'], None),
+            (['logs:DescribeLogGroups', 'cloudwatch:PutMetricData'], ['*'], None),
+            (['kms:Decrypt', 'kms:GenerateDataKey*'], ['arn:key'], context('sqs')),
+            (['kms:Decrypt'], ['arn:key'], context('s3')),
+        ], key=str)
+        # each simulation gets back the results of its own actions, in order
+        assert [[(result['EvalActionName'], result['EvalResourceName']) for result in simulation_results]
+                for simulation_results in results] == [
+            [('s3:ListAllMyBuckets', 'arn:bucket'), ('s3:ListAllMyBuckets', 'arn:bucket/')],
+            [('s3:GetObject*', 'arn:bucket'), ('s3:GetObject*', 'arn:bucket/'),
+             ('s3:List*', 'arn:bucket'), ('s3:List*', 'arn:bucket/')],
+            [('logs:DescribeLogGroups', '*')],
+            [('cloudwatch:PutMetricData', '*')],
+            [('kms:Decrypt', 'arn:key')],
+            [('kms:GenerateDataKey*', 'arn:key')],
+            [('kms:Decrypt', 'arn:key')],
+        ]
+        assert results[0][0]['EvalDecision'] == 'implicitDeny'
+        assert results[1][0]['EvalDecision'] == 'allowed'
+
+    def test_one_request_for_several_resources(self):
+        iam = FakeIAM()
+        roles = ['arn:role/Admin', 'arn:role/Op', 'arn:role/User']
+        results = simulate_custom_policies(iam, ['{}'], [
+            {'ActionNames': ['airflow:InvokeRestApi'], 'ResourceArns': roles}
+        ])
+        assert len(iam.simulations) == 1
+        assert [result['EvalResourceName'] for result in results[0]] == roles
@@ -0,0 +1,161 @@
+# This Python file uses the following encoding: utf-8
+'''
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+"""
+Tests for LogsVerifier.check_for_failing_logs.
+Validates that every page of every log group is scanned, that the error logs
+of all groups are written in timestamp order, that only the latest error logs
+are kept, and that Logs Insights results are read back the same way.
+"""
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'verify_env'))
+
+from logs_verifier import LogsVerifier
+from .conftest import RecordingReport
+
+
+class FakeLogs:
+    """
+    CloudWatch Logs client holding the error logs of each log group as (timestamp, message).
+    Log groups and events are returned two per page.
+    """
+
+    def __init__(self, events, insights_status='Complete'):
+        self.events = events
+        self.insights_status = insights_status
+        self.filter_calls = []
+        self.queries = {}
+
+    @staticmethod
+    def _page(items, key, nextToken=None):
+        start = int(nextToken or 0)
+        page = {key: items[start:start + 2]}
+        if start + 2 < len(items):
+            page['nextToken'] = str(start + 2)
+        return page
+
+    def describe_log_groups(self, logGroupNamePrefix, nextToken=None):
+        groups = [{'logGroupName': name} for name in self.events]
+        return self._page(groups, 'logGroups', nextToken)
+
+    def filter_log_events(self, logGroupName, startTime, endTime, filterPattern, nextToken=None):
+        self.filter_calls.append(logGroupName)
+        events = [{'timestamp': timestamp, 'message': message} for timestamp, message in self.events[logGroupName]]
+        return self._page(events, 'events', nextToken)
+
+    def start_query(self, logGroupNames, startTime, endTime, queryString, limit):
+        query_id = str(len(self.queries))
+        self.queries[query_id] = (logGroupNames, queryString, limit)
+        return {'queryId': query_id}
+
+    def get_query_results(self, queryId):
+        log_group_names, query_string, limit = self.queries[queryId]
+        if 'stats' in query_string:
+            results = [[{'field': '@log', 'value': '111122223333:' + name},
+                        {'field': 'errors', 'value': str(len(self.events[name]))}]
+                       for name in log_group_names if self.events[name]]
+        else:
+            events = sorted(((timestamp, name, message) for name in log_group_names
+                             for timestamp, message in self.events[name]), reverse=True)[:limit]
+            results = [[{'field': '@timestamp',
+                         'value': datetime.fromtimestamp(timestamp / 1000, timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]},
+                        {'field': '@message', 'value': message},
+                        {'field': '@log', 'value': '111122223333:' + name}]
+                       for timestamp, name, message in events]
+        return {'status': self.insights_status, 'results': results}
+
+
+EVENTS = {
+    'airflow-test-Scheduler': [(1000, 'ERROR a\n'), (4000, 'ERROR d\n'), (6000, 'ERROR f\n')],
+    'airflow-test-Task': [],
+    'airflow-test-Worker': [(2000, 'Traceback b\n'), (3000, 'Traceback c\n'), (5000, 'Traceback e\n')],
+}
+
+
+def make_verifier(logs, **kwargs):
+    clients = SimpleNamespace(logs=logs, cloudtrail=None)
+    return LogsVerifier(clients, RecordingReport(), {}, 'test', **kwargs)
+
+
+def event_lines(report):
+    return [line for line in report.lines if line[:1].isdigit()]
+
+
+class TestCheckForFailingLogs:
+    """Tests for LogsVerifier.check_for_failing_logs"""
+
+    def test_all_pages_of_all_groups_are_merged_in_timestamp_order(self):
+        logs = FakeLogs(EVENTS)
+        verifier = make_verifier(logs)
+        verifier.check_for_failing_logs()
+        # the log groups themselves are listed over two pages
+        assert [log['logGroupName'] for log in verifier.log_groups] == list(EVENTS)
+        assert sorted(logs.filter_calls) == ['airflow-test-Scheduler'] * 2 + ['airflow-test-Task'] + ['airflow-test-Worker'] * 2
+        assert event_lines(verifier.report) == [
+            '1000 airflow-test-Scheduler ERROR a\n',
+            '2000 airflow-test-Worker Traceback b\n',
+            '3000 airflow-test-Worker Traceback c\n',
+            '4000 airflow-test-Scheduler ERROR d\n',
+            '5000 airflow-test-Worker Traceback e\n',
+            '6000 airflow-test-Scheduler ERROR f\n',
+        ]
+        lines = verifier.report.lines
+        task = lines.index('Log group:  airflow-test-Task')
+        assert lines[task + 1] == '✅ No error logs found in the past hour'
+        worker = lines.index('Log group:  airflow-test-Worker')
+        assert lines[worker + 1] == '⚠️ Found 3 error logs. Please see the full report for logs.'
+
+    def test_only_the_latest_events_are_kept(self):
+        verifier = make_verifier(FakeLogs(EVENTS), max_log_events=4)
+        verifier.check_for_failing_logs()
+        assert 'Showing the latest 4 of 6 error logs' in verifier.report.lines
+        assert [line.split(' ')[0] for line in event_lines(verifier.report)] == ['3000', '4000', '5000', '6000']
+
+    def test_logs_insights_results_are_merged_the_same_way(self):
+        logs = FakeLogs(EVENTS)
+        verifier = make_verifier(logs, use_insights=True, max_log_events=5)
+        verifier.check_for_failing_logs()
+        # one counting query and one events query for all groups
+        assert len(logs.queries) == 2
+        assert logs.filter_calls == []
+        assert 'Showing the latest 5 of 6 error logs' in verifier.report.lines
+        assert event_lines(verifier.report) == [
+            '2000 airflow-test-Worker Traceback b\n',
+            '3000 airflow-test-Worker Traceback c\n',
+            '4000 airflow-test-Scheduler ERROR d\n',
+            '5000 airflow-test-Worker Traceback e\n',
+            '6000 airflow-test-Scheduler ERROR f\n',
+        ]
+        lines = verifier.report.lines
+        scheduler = lines.index('Log group:  airflow-test-Scheduler')
+        assert lines[scheduler + 1] == '⚠️ Found 3 error logs. Please see the full report for logs.'
+
+    def test_failed_logs_insights_query_is_reported(self):
+        verifier = make_verifier(FakeLogs(EVENTS, insights_status='Failed'), use_insights=True)
+        verifier.check_for_failing_logs()
+        assert any(line.startswith('🚫 Logs Insights query on') and line.endswith('status Failed')
+                   for line in verifier.report.lines)
+        assert event_lines(verifier.report) == []
+        lines = verifier.report.lines
+        task = lines.index('Log group:  airflow-test-Task')
+        assert lines[task + 1] == '⚠️ The log group could not be searched'
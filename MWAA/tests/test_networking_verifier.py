@@ -0,0 +1,210 @@
+# This Python file uses the following encoding: utf-8
+'''
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+"""
+Tests for NetworkingVerifier.check_connectivity_to_dep_services.
+Validates that the SSM automations are started up front and polled together,
+that ENI discovery is reused across services, and that the results are
+written in the order of the services.
+"""
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from botocore.exceptions import ClientError
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'verify_env'))
+
+import networking_verifier
+from networking_verifier import NetworkingVerifier
+from .conftest import RecordingReport
+
+
+class FakeEC2:
+    """EC2 client returning one ENI per subnet and no VPC endpoints."""
+
+    def __init__(self, interfaces=True, endpoint_errors=None):
+        self.interfaces = interfaces
+        self.endpoint_errors = endpoint_errors or {}
+        self.describe_network_interfaces_calls = 0
+
+    def describe_network_interfaces(self, Filters):
+        self.describe_network_interfaces_calls += 1
+        if not self.interfaces:
+            return {'NetworkInterfaces': []}
+        subnets = Filters[0]['Values']
+        return {'NetworkInterfaces': [
+            {'SubnetId': subnet, 'NetworkInterfaceId': 'eni-' + str(self.describe_network_interfaces_calls) + subnet,
+             'PrivateIpAddress': '10.0.0.' + str(i)}
+            for i, subnet in enumerate(subnets)]}
+
+    def describe_vpc_endpoints(self, Filters):
+        service_name = Filters[0]['Values'][0]
+        if self.endpoint_errors.get(service_name, 0) > 0:
+            self.endpoint_errors[service_name] -= 1
+            raise ClientError({'Error': {'Code': 'RequestLimitExceeded', 'Message': 'Request limit exceeded.'}},
+                              'DescribeVpcEndpoints')
+        return {'VpcEndpoints': []}
+
+
+class FakeSSM:
+    """
+    SSM client running AWSSupport-ConnectivityTroubleshooter executions.
+    An execution's first step finishes after two polls, with the next outcome
+    listed for its destination IP (Success by default).
+    """
+
+    def __init__(self, outcomes=None):
+        self.outcomes = outcomes or {}
+        self.executions = {}
+        self.calls = []
+        self.max_running = 0
+
+    def start_automation_execution(self, DocumentName, DocumentVersion, Parameters):
+        self.calls.append('start')
+        destination = Parameters['DestinationIP'][0]
+        outcomes = self.outcomes.get(destination, [])
+        outcome = outcomes.pop(0) if outcomes else 'Success'
+        execution_id = 'exec-' + str(len(self.executions))
+        self.executions[execution_id] = {'outcome': outcome, 'polls': 2, 'destination': destination}
+        running = sum(1 for execution in self.executions.values() if execution['polls'] > 0)
+        self.max_running = max(self.max_running, running)
+        return {'AutomationExecutionId': execution_id}
+
+    def _step(self, execution_id):
+        execution = self.executions[execution_id]
+        execution['polls'] -= 1
+        if execution['polls'] > 0:
+            return 'InProgress', 'InProgress', 'testReachability'
+        if execution['outcome'] == 'Failed':
+            return 'Failed', 'Failed', 'testReachability'
+        return execution['outcome'], 'InProgress', 'evaluateResults'
+
+    def describe_automation_executions(self, Filters):
+        self.calls.append('describe')
+        assert len(Filters[0]['Values']) <= networking_verifier.SSM_FILTER_VALUES_LIMIT
+        metadata = []
+        for execution_id in Filters[0]['Values']:
+            _, status, step = self._step(execution_id)
+            metadata.append({'AutomationExecutionId': execution_id, 'AutomationExecutionStatus': status, 'CurrentStepName': step})
+        return {'AutomationExecutionMetadataList': metadata}
+
+    def get_automation_execution(self, AutomationExecutionId):
+        self.calls.append('get')
+        execution = self.executions[AutomationExecutionId]
+        if execution['polls'] > 0:
+            step_status, status, step = 'InProgress', 'InProgress', 'testReachability'
+        else:
+            step_status, status, step = self._step(AutomationExecutionId)
+            execution['polls'] = 0
+        return {'AutomationExecution': {'AutomationExecutionStatus': status, 'CurrentStepName': step,
+                                        'StepExecutions': [{'StepStatus': step_status}]}}
+
+
+def resolve(hostname):
+    """Resolves each service hostname to its own IP address."""
+    return '172.16.' + str(sum(hostname.encode()) % 256) + '.' + str(len(hostname))
+
+
+def run_check(ec2, ssm, partition='aws'):
+    """Runs the connectivity check and returns what was written."""
+    report = RecordingReport()
+    clients = SimpleNamespace(ec2=ec2, s3=None, s3control=None, ssm=ssm)
+    env = {'NetworkConfiguration': {'SecurityGroupIds': ['sg-1']}}
+    verifier = NetworkingVerifier(clients, report, env, 'us-east-1', partition, '.amazonaws.com')
+    subnets = [{'SubnetId': 'subnet-a', 'VpcId': 'vpc-1'}, {'SubnetId': 'subnet-b', 'VpcId': 'vpc-1'}]
+    with patch('networking_verifier.socket.gethostbyname', side_effect=resolve), \
+            patch('networking_verifier.time.sleep'):
+        verifier.check_connectivity_to_dep_services(subnets, ['subnet-a', 'subnet-b'])
+    return report.lines
+
+
+class TestConnectivityToDepServices:
+    """Tests for check_connectivity_to_dep_services."""
+
+    def test_automations_start_before_polling(self):
+        """Every service's automation is started before any of them is polled."""
+        ec2 = FakeEC2()
+        ssm = FakeSSM()
+        lines = run_check(ec2, ssm)
+        assert ssm.calls[:10] == ['start'] * 10
+        assert ssm.calls.count('start') == 10
+        assert ec2.describe_network_interfaces_calls == 1
+        links = [line for line in lines if line.startswith('https://console.aws.amazon.com/systems-manager')]
+        assert [link.split('/')[-1].split('?')[0] for link in links] == ['exec-' + str(i) for i in range(10)]
+
+    def test_failed_eni_lookup_is_retried_with_new_enis(self):
+        """A service whose automation cannot find the eni is retried after one new ENI lookup."""
+        failing = resolve('kms.us-east-1.amazonaws.com')
+        ec2 = FakeEC2()
+        ssm = FakeSSM({failing: ['Failed']})
+        lines = run_check(ec2, ssm)
+        assert ssm.calls.count('start') == 11
+        assert ec2.describe_network_interfaces_calls == 2
+        tested = [line for line in lines if line.startswith('Testing connectivity between eni')]
+        assert len(tested) == 10
+        # results keep the order of the services, the retried one with the new eni
+        assert 'kms.us-east-1.amazonaws.com' in tested[3]
+        assert 'eni-2subnet-a' in tested[3]
+        assert all('eni-1subnet-a' in line for i, line in enumerate(tested) if i != 3)
+
+    def test_service_is_abandoned_after_max_attempts(self):
+        """A service failing every attempt is started MAX_CONNECTIVITY_ATTEMPTS times and not reported."""
+        failing = resolve('sqs.us-east-1.amazonaws.com')
+        ssm = FakeSSM({failing: ['Failed'] * 10})
+        lines = run_check(FakeEC2(), ssm)
+        started = [execution for execution in ssm.executions.values() if execution['destination'] == failing]
+        assert len(started) == networking_verifier.MAX_CONNECTIVITY_ATTEMPTS
+        assert not any('sqs.us-east-1' in line for line in lines if line.startswith('Testing connectivity between eni'))
+
+    def test_concurrent_automations_are_bounded(self):
+        """No more than MAX_CONCURRENT_SSM_AUTOMATIONS automations run at the same time."""
+        ssm = FakeSSM()
+        with patch('networking_verifier.MAX_CONCURRENT_SSM_AUTOMATIONS', 3):
+            lines = run_check(FakeEC2(), ssm)
+        assert ssm.max_running == 3
+        assert len([line for line in lines if line.startswith('Testing connectivity between eni')]) == 10
+
+    def test_no_enis(self):
+        """Without ENIs, no automation is started and every service reports it."""
+        ssm = FakeSSM()
+        lines = run_check(FakeEC2(interfaces=False), ssm, partition='aws-cn')
+        assert ssm.calls == []
+        assert len([line for line in lines if line.startswith('🚫 no enis found for MWAA')]) == 9
+
+    def test_failed_endpoint_lookup_is_recorded_and_retried(self):
+        """A service whose VPC endpoint lookup fails is reported and retried, without stopping the others."""
+        ec2 = FakeEC2(endpoint_errors={'com.amazonaws.us-east-1.kms': 2})
+        ssm = FakeSSM()
+        lines = run_check(ec2, ssm)
+        assert ssm.calls.count('start') == 10
+        assert len([line for line in lines if line.startswith('🚫 Attempt')]) == 2
+        tested = [line for line in lines if line.startswith('Testing connectivity between eni')]
+        assert len(tested) == 10
+        assert 'kms.us-east-1.amazonaws.com' in tested[3]
+
+    def test_endpoint_lookup_is_abandoned_after_max_attempts(self):
+        """A service whose VPC endpoint lookup always fails is tried MAX_CONNECTIVITY_ATTEMPTS times."""
+        ec2 = FakeEC2(endpoint_errors={'com.amazonaws.us-east-1.kms': 10})
+        ssm = FakeSSM()
+        lines = run_check(ec2, ssm)
+        assert ssm.calls.count('start') == 9
+        assert ec2.endpoint_errors['com.amazonaws.us-east-1.kms'] == 10 - networking_verifier.MAX_CONNECTIVITY_ATTEMPTS
+        assert not any('kms.us-east-1' in line for line in lines if line.startswith('Testing connectivity between eni'))
@@ -16,20 +16,22 @@ HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTIO
 OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 '''
-import json
 import os
 import time
 from datetime import datetime, timedelta, timezone
 from botocore.exceptions import ClientError, ProfileNotFound
 from aws_clients import AWSClients
 from report_writer import ReportWriter
-from utils import get_account_id, get_inline_policies
+from check_runner import check
+from utils import get_account_id
+from iam_policies import simulate_custom_policies
 
 class AirflowVerifier:
     def __init__(self, clients: AWSClients, report: ReportWriter, env, region, env_name):
         self.mwaa = clients.mwaa
         self.s3 = clients.s3
         self.iam = clients.iam
+        self.role_policies = clients.role_policies
         self.report = report
         self.env = env
         self.region = region
@@ -39,30 +41,20 @@ class AirflowVerifier:
         ''' Check which airflow roles (Admin, Op, User, etc.) have access to call REST API using IAM simulation to check policy permissions'''
         account_id = get_account_id(self.env)
         airflow_roles = {"Admin":"", "Op":"", "User":"", "Viewer":"", "Public":""}
-        policies = self.iam.list_attached_role_policies(
-            RoleName=self.env["ExecutionRoleArn"].split("/")[-1]
-        )["AttachedPolicies"]
-        policy_list = []
-        for policy in policies:
-            policy_arn = policy["PolicyArn"]
-            policy_version = self.iam.get_policy(PolicyArn=policy_arn)['Policy']['DefaultVersionId']
-            policy_doc = self.iam.get_policy_version(PolicyArn=policy_arn,
-                                                    VersionId=policy_version)['PolicyVersion']['Document']
-            policy_list.append(json.dumps(policy_doc))
-        policy_list.extend(get_inline_policies(self.iam, self.env['ExecutionRoleArn'].split("/")[-1]))
-        for role in airflow_roles.keys():
-            results = self.iam.simulate_custom_policy(
-                    PolicyInputList=policy_list,
-                    ActionNames=[
-                        "airflow:InvokeRestApi"
-                    ],
-                    ResourceArns=[
-                        "arn:aws:airflow:" + self.region + ":" + account_id + ":role/" + self.env_name + "/" + role
-                    ]
-                )["EvaluationResults"]
-        
-            for result in results:
-                airflow_roles[result["EvalResourceName"].split("/")[-1]] = result["EvalDecision"]
+        policy_list = self.role_policies.get_policy_documents(self.env["ExecutionRoleArn"].split("/")[-1])
+        # all roles are simulated with a single request
+        results = simulate_custom_policies(self.iam, policy_list, [{
+            'ActionNames': [
+                "airflow:InvokeRestApi"
+            ],
+            'ResourceArns': [
+                "arn:aws:airflow:" + self.region + ":" + account_id + ":role/" + self.env_name + "/" + role
+                for role in airflow_roles.keys()
+            ]
+        }])[0]
+
+        for result in results:
+            airflow_roles[result["EvalResourceName"].split("/")[-1]] = result["EvalDecision"]
 
         if "allowed" in airflow_roles.values():
             self.report.write_all_locations("🔐 The following Airflow roles have IAM permissions to access the Airflow REST API: ")
@@ -116,6 +108,7 @@ class AirflowVerifier:
             else:
                 self.report.write_full_report(f"   This resource does not publish a heartbeat")
 
+    @check(interactive=True)
     def check_airflow_rest_api(self):
         ''' Perform REST API IAM access check, ask user permission to invoke API, perform health entpoint invocation check'''
         self.report.write_all_locations("### Airflow REST API")
@@ -134,6 +127,7 @@ class AirflowVerifier:
             self.report.write_all_locations("Skipping Airflow REST API test because no role have IAM permissions to access REST API.")
             self.report.write_all_locations("If you would like to allow REST API access: https://docs.aws.amazon.com/mwaa/latest/userguide/access-mwaa-apache-airflow-rest-api.html#granting-access-MWAA-Enhanced-REST-API")
 
+    @check(interactive=True)
     def check_airflowignore(self):
         common_ignores = [".ipynb_checkpoints", ".git", "__pycache__"]
         self.report.write_all_locations("### Check `.airflowignore`")
@@ -212,6 +206,7 @@ class AirflowVerifier:
         if all_ignores_found:
             self.report.write_all_locations("✅ No immediate issue found with .airflowignore. Note that this check does not cover all potential issues with .airflowignore")
 
+    @check(depends_on=("check_airflow_rest_api", "check_airflowignore"), interactive=True)
     def check_full_dag_run(self):
         """
         Test a full DAG run using the MWAA REST API to trigger and monitor a simple test DAG
@@ -458,6 +453,7 @@ class AirflowVerifier:
             print(f"Error deleting file from S3: {e}")
             return False
 
+    @check()
     def check_airflow_config(self):
         self.report.write_all_locations("### Airflow Configuration")
         config = self.env["AirflowConfigurationOptions"]
@@ -17,6 +17,7 @@ OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 '''
 import boto3
+from iam_policies import RolePolicyCache
 
 class AWSClients:
     def __init__(self, region, profile=None):
@@ -32,3 +33,5 @@ class AWSClients:
         self.iam = boto3.client('iam', region_name=region)
         self.mwaa = boto3.client('mwaa', region_name=region)
         self.cw = boto3.client('cloudwatch', region_name=region)
+        # policy documents of the execution role, shared by all verifiers
+        self.role_policies = RolePolicyCache(self.iam)
@@ -0,0 +1,191 @@
+# This Python file uses the following encoding: utf-8
+'''
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+import queue
+import threading
+from concurrent.futures import Future
+from report_writer import ReportWriter
+
+DEFAULT_MAX_WORKERS = 8
+
+def check(depends_on=(), interactive=False):
+    """
+    Decorator declaring a verifier method as a check that CheckRunner can schedule.
+
+    Args:
+        depends_on (tuple, optional): Names of the checks that must finish before this one
+            starts. They must be added to the runner before this check. Defaults to ()
+        interactive (bool, optional): True if the check asks the user for consent with
+            input(). Interactive checks run on the main thread, in order, once the output
+            of every check before them is written. Defaults to False
+
+    Example:
+        >>> class NetworkingVerifier:
+        ...     @check(depends_on=("check_nacl",))
+        ...     def check_routes(self, input_subnets, input_subnet_ids):
+        ...         ...
+    """
+    def decorate(method):
+        method.check_depends_on = tuple(depends_on)
+        method.check_interactive = interactive
+        return method
+    return decorate
+
+
+class CheckRunner:
+    """
+    Runs verifier checks concurrently while keeping the report in the order the checks were added.
+
+    Checks that are not interactive run on a thread pool as soon as the checks they depend
+    on have finished. What they write to the ReportWriter is buffered per check and
+    replayed in the order the checks were added, so the report reads the same as when the
+    checks run one after another. Interactive checks run on the main thread, unbuffered,
+    when their turn comes, while the other checks keep running in the background.
+
+    If a check raises an exception, the output of the checks before it and of the failing
+    check itself is written, then the exception is raised again by run(). The checks after
+    it are abandoned, as they would never have run one after another. The workers are daemon
+    threads, so checks still running when run() raises (e.g. SSM automations being polled, or
+    on Ctrl-C at an interactive prompt) do not keep the script from exiting, and abandoned
+    checks waiting for their dependencies do not start.
+
+    Example:
+        >>> runner = CheckRunner(report)
+        >>> runner.add(net_verifier.check_nacl, subnets, subnet_ids)
+        >>> runner.add(af_verifier.check_airflowignore)
+        >>> runner.run()
+    """
+    def __init__(self, report: ReportWriter, max_workers=DEFAULT_MAX_WORKERS):
+        self.report = report
+        self.max_workers = max_workers
+        self.checks = []
+        self._finished = {}
+        self._failed = set()
+        self._aborted = threading.Event()
+
+    def add(self, method, *args):
+        """
+        Add a check, decorated with @check, to run with the provided arguments.
+
+        Args:
+            method: Bound verifier method decorated with @check
+            *args: Arguments passed to the method
+
+        Raises:
+            ValueError: If the method is not a check, was already added, or depends on a
+                check that was not added before it
+        """
+        name = method.__name__
+        if not hasattr(method, 'check_depends_on'):
+            raise ValueError(name + " is not decorated with @check")
+        if name in self._finished:
+            raise ValueError(name + " was already added")
+        for dependency in method.check_depends_on:
+            if dependency not in self._finished:
+                raise ValueError(name + " depends on " + dependency + ", which must be added before it")
+        self.checks.append((name, method, args))
+        self._finished[name] = threading.Event()
+
+    def run(self):
+        """
+        Run all checks and write their output in the order they were added.
+
+        Raises:
+            Exception: The first exception raised by a check, in the order they were added
+        """
+        work = queue.Queue()
+        futures = {}
+        # Checks are queued in order, so a check's dependencies always start before it.
+        for name, method, args in self.checks:
+            if not method.check_interactive:
+                futures[name] = Future()
+                work.put((futures[name], name, method, args))
+        workers = [threading.Thread(target=self._work, args=(work,), daemon=True)
+                   for _ in range(min(self.max_workers, len(futures)))]
+        for worker in workers:
+            worker.start()
+        try:
+            for name, method, args in self.checks:
+                if method.check_interactive:
+                    self._run_interactive(name, method, args)
+                else:
+                    entries, error = futures[name].result()
+                    self.report.replay(entries)
+                    if error is not None:
+                        raise error
+        finally:
+            self._aborted.set()
+            for future in futures.values():
+                future.cancel()
+            for worker in workers:
+                work.put(None)
+
+    def _work(self, work):
+        """
+        Run the queued checks on a worker thread until it gets None.
+        """
+        while True:
+            item = work.get()
+            if item is None:
+                return
+            future, name, method, args = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self._run_buffered(name, method, args))
+            except BaseException as exception:
+                future.set_exception(exception)
+
+    def _run_buffered(self, name, method, args):
+        """
+        Run a check on a worker thread once its dependencies have finished.
+
+        Returns:
+            tuple: The buffered writes of the check and the exception it raised, if any
+        """
+        for dependency in method.check_depends_on:
+            self._finished[dependency].wait()
+        if self._aborted.is_set():
+            return [], None
+        if any(dependency in self._failed for dependency in method.check_depends_on):
+            self._failed.add(name)
+            self._finished[name].set()
+            return [], None
+        self.report.start_buffer()
+        error = None
+        try:
+            method(*args)
+        except Exception as exception:
+            error = exception
+            self._failed.add(name)
+        finally:
+            entries = self.report.end_buffer()
+            self._finished[name].set()
+        return entries, error
+
+    def _run_interactive(self, name, method, args):
+        """
+        Run an interactive check on the main thread, writing its output right away.
+        """
+        try:
+            method(*args)
+        except Exception:
+            self._failed.add(name)
+            raise
+        finally:
+            self._finished[name].set()
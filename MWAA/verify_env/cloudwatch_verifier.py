@@ -19,7 +19,13 @@ SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 from aws_clients import AWSClients
 from report_writer import ReportWriter
-from datetime import datetime, timedelta, timezone
+from check_runner import check
+from metric_data import MetricDataBatch
+from datetime import timedelta
+
+CELERY_METRICS = ["TaskQueued", "TaskPulled", "TaskExecuted"]
+UTILIZATION_CLUSTERS = ["BaseWorker", "Scheduler", "WebServer"]
+UTILIZATION_METRICS = ["CPUUtilization", "MemoryUtilization"]
 
 class CloudWatchVerifier:
     '''
@@ -29,61 +35,80 @@ class CloudWatchVerifier:
         self.cw = clients.cw
         self.report = report
         self.env = env
+        # every metric read by the checks below, fetched together the first time one is read
+        self.metrics = MetricDataBatch(self.cw)
+        celery_dimensions = [
+            {
+                "Name": "Environment",
+                "Value": self.env["Name"]
+            },
+            {
+                "Name": "Function",
+                "Value": "Celery"
+            }
+        ]
+        for metric in CELERY_METRICS + ["CeleryWorkerHeartbeat"]:
+            self.metrics.add(metric, "AmazonMWAA", metric, celery_dimensions,
+                             period=300, window=timedelta(hours=24))  # 5 minutes
+        for metric in UTILIZATION_METRICS:
+            for cluster in UTILIZATION_CLUSTERS:
+                cluster_dimensions = [
+                    {
+                        "Name": "Environment",
+                        "Value": self.env["Name"]
+                    },
+                    {
+                        "Name": "Cluster",
+                        "Value": cluster
+                    }
+                ]
+                self.metrics.add((metric, cluster), "AWS/MWAA", metric, cluster_dimensions,
+                                 period=604800, window=timedelta(days=7))  # 7 days
+        dag_processing_dimensions = [
+            {
+                "Name": "Environment",
+                "Value": self.env["Name"]
+            },
+            {
+                "Name": "Function",
+                "Value": "DAG Processing"
+            }
+        ]
+        # read with the 24 hour window of the Celery metrics, so that it shares their request
+        self.metrics.add("DagBagSize", "AmazonMWAA", "DagBagSize", dag_processing_dimensions,
+                         period=300, window=timedelta(hours=24))  # 5 minutes
 
+    def _recent_datapoints(self, key, window):
+        '''returns the datapoints of a metric of the batch that are less than window old'''
+        datapoints = self.metrics.get(key)
+        return [datapoint for datapoint in datapoints if datapoint[0] >= self.metrics.end_time - window]
+
+    @check()
     def check_celery_sqs_health(self):
         '''
         Check CloudWatch metrics for task queue activity (TaskQueued, TaskPulled, TaskExecuted)
         over the last 24 hours and worker heartbeats over the last 20 minutes.
         '''
         self.report.write_all_locations("### Checking Celery executor SQS queue health...")
-        metrics = ["TaskQueued", "TaskPulled", "TaskExecuted"]
-        dimensions = [
-                {
-                    "Name": "Environment",
-                    "Value": self.env["Name"]
-                },
-                {
-                    "Name": "Function",
-                    "Value": "Celery"
-                }
-            ]
-        
-        for metric in metrics:
-            response = self.cw.get_metric_statistics(
-                Namespace="AmazonMWAA",
-                MetricName=metric,
-                Dimensions=dimensions,
-                StartTime=datetime.now(timezone.utc) - timedelta(hours=24),
-                EndTime=datetime.now(timezone.utc),
-                Period=300,  # 5 minutes
-                Statistics=["Average"]
-            )
+        for metric in CELERY_METRICS:
+            datapoints = self.metrics.get(metric)
 
             # Find the latest datapoint
-            if response["Datapoints"]:
-                latest = max(response["Datapoints"], key=lambda x: x["Timestamp"])
-                delta = datetime.now(timezone.utc) - latest['Timestamp']
+            if datapoints:
+                timestamp, value = datapoints[-1]
+                delta = self.metrics.end_time - timestamp
                 hours = int(delta.total_seconds() // 3600)
                 minutes = int((delta.total_seconds() % 3600) // 60)
-                self.report.write_all_locations(f"{metric} Latest Datapoint - {hours}h {minutes}m ago - Time: {latest['Timestamp']}, Value: {latest['Average']}")
+                self.report.write_all_locations(f"{metric} Latest Datapoint - {hours}h {minutes}m ago - Time: {timestamp}, Value: {value}")
             else:
                 self.report.write_all_locations(f"⚠️ {metric} did not have any datapoints in last 24 hours.")
 
-        response = self.cw.get_metric_statistics(
-            Namespace="AmazonMWAA",
-            MetricName="CeleryWorkerHeartbeat",
-            Dimensions=dimensions,
-            StartTime=datetime.now(timezone.utc) - timedelta(minutes=20),
-            EndTime=datetime.now(timezone.utc),
-            Period=300,  # 5 minutes
-            Statistics=["Average"]
-        )
-
-        if response["Datapoints"]:
+        if self._recent_datapoints("CeleryWorkerHeartbeat", timedelta(minutes=20)):
             self.report.write_all_locations("✅ Celery worker heartbeat received in last 20 minutes.")
         else:
             self.report.write_all_locations("🚫 No Celery Worker heartbeat received in last 20 minutes")
 
+    @check()
     def check_environment_class_utilization(self):
         '''
         For one of BaseWorker, Scheduler, or WebServer clusters,
@@ -95,42 +120,25 @@ class CloudWatchVerifier:
         self.report.write_all_locations("### Environment Class - Cluster Utilization")
         THRESHOLD = 85
 
-        clusters = ["BaseWorker", "Scheduler", "WebServer"]
-        metrics = ["CPUUtilization", "MemoryUtilization"]
         env_classes = ["mw1.micro", "mw1.small", "mw1.medium", "mw1.large", "mw1.xlarge", "mw1.2xlarge"]
 
         suggest_upgrade = False
-        for metric in metrics:
-            for cluster in clusters:
-                dimensions = [
-                    {
-                        "Name": "Environment",
-                        "Value": self.env["Name"]
-                    },
-                    {
-                        "Name": "Cluster",
-                        "Value": cluster
-                    }
-                ]
-
-                response = self.cw.get_metric_statistics(
-                    Namespace="AWS/MWAA",
-                    MetricName=metric,
-                    Dimensions=dimensions,
-                    StartTime=datetime.now(timezone.utc) - timedelta(days=7),
-                    EndTime=datetime.now(timezone.utc),
-                    Period=604800,  # 7 days
-                    Statistics=["Average"]
-                )
-
-                if response["Datapoints"][0]["Average"] > THRESHOLD:
+        for metric in UTILIZATION_METRICS:
+            for cluster in UTILIZATION_CLUSTERS:
+                datapoints = self.metrics.get((metric, cluster))
+                if not datapoints:
+                    self.report.write_all_locations("⚠️ The", cluster, "cluster did not have any", metric, "datapoints over last 7 days.")
+                    continue
+                # the CPU and memory utilizations are percentages
+                average = datapoints[0][1]
+                if average > THRESHOLD:
                     suggest_upgrade = True
                     self.report.write_all_locations("⚠️ The", cluster, "cluster had an average", metric, "of",
-                                            int(response["Datapoints"][0]["Average"]), response["Datapoints"][0]["Unit"].lower(),
+                                            int(average), "percent",
                                             "over last 7 days. MWAA recommends this value to be less than", THRESHOLD, "percent.")
                 else:
                     self.report.write_full_report("✅ The", cluster, "cluster had an average", metric, "of",
-                                            int(response["Datapoints"][0]["Average"]), response["Datapoints"][0]["Unit"].lower(),
+                                            int(average), "percent",
                                             "over last 7 days. This is under the MWAA recommended threshold of", THRESHOLD, "percent.")
 
         if suggest_upgrade:
@@ -143,6 +151,7 @@ class CloudWatchVerifier:
         else:
             self.report.write_all_locations("✅ The average CPU and memory utilizations of all clusters were under the threshold of", THRESHOLD, "percent for the last 7 days.")
 
+    @check()
     def check_environment_class_dag_count(self):
         '''
         Suggest the use of a specific environment class based on the number
@@ -161,28 +170,11 @@ class CloudWatchVerifier:
             ("mw1.2xlarge", 4000)
         ]
 
-        dimensions = [
-            {
-                "Name": "Environment",
-                "Value": self.env["Name"]
-            },
-            {
-                "Name": "Function",
-                "Value": "DAG Processing"
-            }
-        ]
-
-        response = self.cw.get_metric_statistics(
-            Namespace="AmazonMWAA",
-            MetricName="DagBagSize",
-            Dimensions=dimensions,
-            StartTime=datetime.now(timezone.utc) - timedelta(minutes=6),
-            EndTime=datetime.now(timezone.utc),
-            Period=300,  # 5 minutes
-            Statistics=["Average"]
-        )
-
-        dagcount = int(response["Datapoints"][0]["Average"])
+        datapoints = self._recent_datapoints("DagBagSize", timedelta(minutes=6))
+        if not datapoints:
+            self.report.write_all_locations("⚠️ DagBagSize did not have any datapoints in last 6 minutes.")
+            return
+        dagcount = int(datapoints[-1][1])
         self.report.write_all_locations("Dag count:", dagcount)
 
         current_capacity = 0
@@ -0,0 +1,129 @@
+# This Python file uses the following encoding: utf-8
+'''
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+import json
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# IAM calls made at the same time when fetching policy documents or running simulations
+MAX_IAM_WORKERS = 4
+
+def list_all(iam_call, list_key, **kwargs):
+    '''
+    calls an IAM List API, following Marker until the result is no longer truncated,
+    and returns the items of all pages
+    '''
+    response = iam_call(**kwargs)
+    items = list(response[list_key])
+    while response.get('IsTruncated'):
+        response = iam_call(Marker=response['Marker'], **kwargs)
+        items.extend(response[list_key])
+    return items
+
+
+class RolePolicyCache:
+    '''
+    Per run cache of the policy documents of IAM roles, shared by all verifiers through AWSClients.
+    The documents of a role are fetched once, the first time they are needed, with the
+    GetPolicy/GetPolicyVersion and GetRolePolicy calls made concurrently. Verifiers running
+    on other threads at the same time wait for that fetch instead of repeating it.
+    '''
+    def __init__(self, iam):
+        self.iam = iam
+        self._lock = threading.Lock()
+        self._documents = {}
+
+    def get_policy_documents(self, role_name):
+        '''
+        returns the documents of the managed policies attached to the role, followed by its inline
+        policies, each as a JSON string as expected by PolicyInputList
+        '''
+        with self._lock:
+            documents = self._documents.get(role_name)
+            fetch = documents is None
+            if fetch:
+                documents = Future()
+                self._documents[role_name] = documents
+        if fetch:
+            try:
+                documents.set_result(self._fetch_policy_documents(role_name))
+            except Exception as error:
+                documents.set_exception(error)
+        return list(documents.result())
+
+    def _fetch_policy_documents(self, role_name):
+        '''fetch the managed and inline policy documents of a role'''
+        policy_arns = [policy['PolicyArn'] for policy in
+                       list_all(self.iam.list_attached_role_policies, 'AttachedPolicies', RoleName=role_name)]
+        policy_names = list_all(self.iam.list_role_policies, 'PolicyNames', RoleName=role_name)
+        with ThreadPoolExecutor(max_workers=MAX_IAM_WORKERS) as pool:
+            managed = pool.map(self._get_managed_policy_document, policy_arns)
+            inline = pool.map(lambda policy_name: self._get_inline_policy_document(role_name, policy_name), policy_names)
+            return list(managed) + list(inline)
+
+    def _get_managed_policy_document(self, policy_arn):
+        '''get the default version of a managed policy'''
+        policy_version = self.iam.get_policy(PolicyArn=policy_arn)['Policy']['DefaultVersionId']
+        policy_doc = self.iam.get_policy_version(PolicyArn=policy_arn,
+                                                 VersionId=policy_version)['PolicyVersion']['Document']
+        return json.dumps(policy_doc)
+
+    def _get_inline_policy_document(self, role_name, policy_name):
+        '''get an inline policy of a role'''
+        return json.dumps(self.iam.get_role_policy(RoleName=role_name, PolicyName=policy_name).get("PolicyDocument", ))
+
+
+def simulate_custom_policies(iam, policy_list, simulations):
+    '''
+    runs several iam policy simulations against the same policies with as few SimulateCustomPolicy
+    requests as possible, and returns the evaluation results of each simulation, in order.
+
+    Each simulation is a dictionary with the ActionNames, ResourceArns and, optionally, ContextEntries
+    of a SimulateCustomPolicy request. A request evaluates every action on every resource with one
+    set of context entries, so the simulations sharing the same resources and context entries are
+    sent as one request holding all their actions. The requests run concurrently and their results
+    are split back per simulation. Truncated results are followed with Marker.
+    '''
+    groups = {}
+    for simulation in simulations:
+        key = (tuple(simulation['ResourceArns']), json.dumps(simulation.get('ContextEntries', []), sort_keys=True))
+        actions = groups.setdefault(key, [])
+        for action in simulation['ActionNames']:
+            if action not in actions:
+                actions.append(action)
+
+    def simulate(key):
+        request = {
+            'PolicyInputList': policy_list,
+            'ActionNames': groups[key],
+            'ResourceArns': list(key[0])
+        }
+        context_entries = json.loads(key[1])
+        if context_entries:
+            request['ContextEntries'] = context_entries
+        return list_all(iam.simulate_custom_policy, 'EvaluationResults', **request)
+
+    keys = list(groups)
+    with ThreadPoolExecutor(max_workers=MAX_IAM_WORKERS) as pool:
+        group_results = dict(zip(keys, pool.map(simulate, keys)))
+
+    results = []
+    for simulation in simulations:
+        key = (tuple(simulation['ResourceArns']), json.dumps(simulation.get('ContextEntries', []), sort_keys=True))
+        results.append([result for result in group_results[key] if result['EvalActionName'] in simulation['ActionNames']])
+    return results
@@ -16,14 +16,16 @@ HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTIO
 OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 '''
-import json
 from aws_clients import AWSClients
 from report_writer import ReportWriter
-from utils import get_account_id, get_inline_policies
+from check_runner import check
+from utils import get_account_id
+from iam_policies import simulate_custom_policies
 
 class IAMVerifier:
     def __init__(self, clients: AWSClients, report: ReportWriter, env, partition, region, env_name, top_level_domain):
         self.iam = clients.iam
+        self.role_policies = clients.role_policies
         self.report = report
         self.partition = partition
         self.region = region
@@ -31,62 +33,48 @@ class IAMVerifier:
         self.top_level_domain = top_level_domain
         self.env = env
 
+    @check()
     def check_iam_permissions(self):
         '''uses iam simulation to check permissions of the role assigned to the environment'''
         self.report.write_all_locations("### IAM Permissions")
         self.report.write_all_locations('Checking the IAM execution role', self.env['ExecutionRoleArn'], 'using iam policy simulation')
         account_id = get_account_id(self.env)
-        policies = self.iam.list_attached_role_policies(
-            RoleName=self.env['ExecutionRoleArn'].split("/")[-1]
-        )['AttachedPolicies']
-        policy_list = []
-        for policy in policies:
-            policy_arn = policy['PolicyArn']
-            policy_version = self.iam.get_policy(PolicyArn=policy_arn)['Policy']['DefaultVersionId']
-            policy_doc = self.iam.get_policy_version(PolicyArn=policy_arn,
-                                                    VersionId=policy_version)['PolicyVersion']['Document']
-            policy_list.append(json.dumps(policy_doc))
-        eval_results = []
-        # Add inline policies
-        policy_list.extend(get_inline_policies(self.iam, self.env['ExecutionRoleArn'].split("/")[-1]))
+        policy_list = self.role_policies.get_policy_documents(self.env['ExecutionRoleArn'].split("/")[-1])
+        simulations = []
         if "KmsKey" in self.env:
             self.report.write_full_report('Found Customer managed CMK')
             if self.partition != 'aws-cn':
-                eval_results = eval_results + self.iam.simulate_custom_policy(
-                    PolicyInputList=policy_list,
-                    ActionNames=[
+                simulations.append({
+                    'ActionNames': [
                         "airflow:PublishMetrics"
                     ],
-                    ResourceArns=[
+                    'ResourceArns': [
                         self.env['Arn']
                     ]
-                )['EvaluationResults']
+                })
             # this next test should be denied
-            eval_results = eval_results + self.iam.simulate_custom_policy(
-                PolicyInputList=policy_list,
-                ActionNames=[
+            simulations.append({
+                'ActionNames': [
                     "s3:ListAllMyBuckets"
                 ],
-                ResourceArns=[
+                'ResourceArns': [
                     self.env['SourceBucketArn'],
                     self.env['SourceBucketArn'] + '/'
                 ]
-            )['EvaluationResults']
-            eval_results = eval_results + self.iam.simulate_custom_policy(
-                PolicyInputList=policy_list,
-                ActionNames=[
+            })
+            simulations.append({
+                'ActionNames': [
                     "s3:GetObject*",
                     "s3:GetBucket*",
                     "s3:List*"
                 ],
-                ResourceArns=[
+                'ResourceArns': [
                     self.env['SourceBucketArn'],
                     self.env['SourceBucketArn'] + '/'
                 ]
-            )['EvaluationResults']
-            eval_results = eval_results + self.iam.simulate_custom_policy(
-                PolicyInputList=policy_list,
-                ActionNames=[
+            })
+            simulations.append({
+                'ActionNames': [
                     "logs:CreateLogStream",
                     "logs:CreateLogGroup",
                     "logs:PutLogEvents",
@@ -95,31 +83,28 @@ class IAMVerifier:
                     "logs:GetLogGroupFields",
                     "logs:GetQueryResults"
                 ],
-                ResourceArns=[
+                'ResourceArns': [
                     "arn:" + self.partition + ":logs:" + self.region + ":" + account_id + ":log-group:airflow-" + self.env_name + "-*"
                 ]
-            )['EvaluationResults']
-            eval_results = eval_results + self.iam.simulate_custom_policy(
-                PolicyInputList=policy_list,
-                ActionNames=[
+            })
+            simulations.append({
+                'ActionNames': [
                     "logs:DescribeLogGroups"
                 ],
-                ResourceArns=[
+                'ResourceArns': [
                     "*"
                 ]
-            )['EvaluationResults']
-            eval_results = eval_results + self.iam.simulate_custom_policy(
-                PolicyInputList=policy_list,
-                ActionNames=[
+            })
+            simulations.append({
+                'ActionNames': [
                     "cloudwatch:PutMetricData"
                 ],
-                ResourceArns=[
+                'ResourceArns': [
                     "*"
                 ]
-            )['EvaluationResults']
-            eval_results = eval_results + self.iam.simulate_custom_policy(
-                PolicyInputList=policy_list,
-                ActionNames=[
+            })
+            simulations.append({
+                'ActionNames': [
                     "sqs:ChangeMessageVisibility",
                     "sqs:DeleteMessage",
                     "sqs:GetQueueAttributes",
@@ -127,19 +112,18 @@ class IAMVerifier:
                     "sqs:ReceiveMessage",
                     "sqs:SendMessage"
                 ],
-                ResourceArns=[
+                'ResourceArns': [
                     "arn:" + self.partition + ":sqs:" + self.region + ":*:airflow-celery-*"
                 ]
-            )['EvaluationResults']
-            eval_results = eval_results + self.iam.simulate_custom_policy(
-                PolicyInputList=policy_list,
-                ActionNames=[
+            })
+            simulations.append({
+                'ActionNames': [
                     "kms:GenerateDataKey*"
                 ],
-                ResourceArns=[
+                'ResourceArns': [
                     self.env['KmsKey']
                 ],
-                ContextEntries=[
+                'ContextEntries': [
                     {
                         'ContextKeyName': 'kms:viaservice',
                         'ContextKeyValues': [
@@ -147,17 +131,16 @@ class IAMVerifier:
                         ],
                         'ContextKeyType': 'string'
                     }
-                ],
-            )['EvaluationResults']
-            eval_results = eval_results + self.iam.simulate_custom_policy(
-                PolicyInputList=policy_list,
-                ActionNames=[
+                ]
+            })
+            simulations.append({
+                'ActionNames': [
                     "kms:GenerateDataKey*"
                 ],
-                ResourceArns=[
+                'ResourceArns': [
                     self.env['KmsKey']
                 ],
-                ContextEntries=[
+                'ContextEntries': [
                     {
                         'ContextKeyName': 'kms:viaservice',
                         'ContextKeyValues': [
@@ -165,19 +148,18 @@ class IAMVerifier:
                         ],
                         'ContextKeyType': 'string'
                     }
-                ],
-            )['EvaluationResults']
-            eval_results = eval_results + self.iam.simulate_custom_policy(
-                PolicyInputList=policy_list,
-                ActionNames=[
+                ]
+            })
+            simulations.append({
+                'ActionNames': [
                     "kms:Decrypt",
                     "kms:DescribeKey",
                     "kms:Encrypt"
                 ],
-                ResourceArns=[
+                'ResourceArns': [
                     self.env['KmsKey']
                 ],
-                ContextEntries=[
+                'ContextEntries': [
                     {
                         'ContextKeyName': 'kms:viaservice',
                         'ContextKeyValues': [
@@ -185,19 +167,18 @@ class IAMVerifier:
                         ],
                         'ContextKeyType': 'string'
                     }
-                ],
-            )['EvaluationResults']
-            eval_results = eval_results + self.iam.simulate_custom_policy(
-                PolicyInputList=policy_list,
-                ActionNames=[
+                ]
+            })
+            simulations.append({
+                'ActionNames': [
                     "kms:Decrypt",
                     "kms:DescribeKey",
                     "kms:Encrypt"
                 ],
-                ResourceArns=[
+                'ResourceArns': [
                     self.env['KmsKey']
                 ],
-                ContextEntries=[
+                'ContextEntries': [
                     {
                         'ContextKeyName': 'kms:viaservice',
                         'ContextKeyValues': [
@@ -205,46 +186,42 @@ class IAMVerifier:
                         ],
                         'ContextKeyType': 'string'
                     }
-                ],
-            )['EvaluationResults']
+                ]
+            })
         else:
             self.report.write_full_report('Using AWS CMK')
             if self.partition != 'aws-cn':
-                eval_results = eval_results + self.iam.simulate_custom_policy(
-                    PolicyInputList=policy_list,
-                    ActionNames=[
+                simulations.append({
+                    'ActionNames': [
                         "airflow:PublishMetrics"
                     ],
-                    ResourceArns=[
+                    'ResourceArns': [
                         self.env['Arn']
                     ]
-                )['EvaluationResults']
+                })
             # this action should be denied
-            eval_results = eval_results + self.iam.simulate_custom_policy(
-                PolicyInputList=policy_list,
-                ActionNames=[
+            simulations.append({
+                'ActionNames': [
                     "s3:ListAllMyBuckets"
                 ],
-                ResourceArns=[
+                'ResourceArns': [
                     self.env['SourceBucketArn'],
                     self.env['SourceBucketArn'] + '/'
                 ]
-            )['EvaluationResults']
-            eval_results = eval_results + self.iam.simulate_custom_policy(
-                PolicyInputList=policy_list,
-                ActionNames=[
+            })
+            simulations.append({
+                'ActionNames': [
                     "s3:GetObject*",
                     "s3:GetBucket*",
                     "s3:List*"
                 ],
-                ResourceArns=[
+                'ResourceArns': [
                     self.env['SourceBucketArn'],
                     self.env['SourceBucketArn'] + '/'
                 ]
-            )['EvaluationResults']
-            eval_results = eval_results + self.iam.simulate_custom_policy(
-                PolicyInputList=policy_list,
-                ActionNames=[
+            })
+            simulations.append({
+                'ActionNames': [
                     "logs:CreateLogStream",
                     "logs:CreateLogGroup",
                     "logs:PutLogEvents",
@@ -253,31 +230,28 @@ class IAMVerifier:
                     "logs:GetLogGroupFields",
                     "logs:GetQueryResults"
                 ],
-                ResourceArns=[
+                'ResourceArns': [
                     "arn:" + self.partition + ":logs:" + self.region + ":" + account_id + ":log-group:airflow-" + self.env_name + "-*"
                 ]
-            )['EvaluationResults']
-            eval_results = eval_results + self.iam.simulate_custom_policy(
-                PolicyInputList=policy_list,
-                ActionNames=[
+            })
+            simulations.append({
+                'ActionNames': [
                     "logs:DescribeLogGroups"
                 ],
-                ResourceArns=[
+                'ResourceArns': [
                     "*"
                 ]
-            )['EvaluationResults']
-            eval_results = eval_results + self.iam.simulate_custom_policy(
-                PolicyInputList=policy_list,
-                ActionNames=[
+            })
+            simulations.append({
+                'ActionNames': [
                     "cloudwatch:PutMetricData"
                 ],
-                ResourceArns=[
+                'ResourceArns': [
                     "*"
                 ]
-            )['EvaluationResults']
-            eval_results = eval_results + self.iam.simulate_custom_policy(
-                PolicyInputList=policy_list,
-                ActionNames=[
+            })
+            simulations.append({
+                'ActionNames': [
                     "sqs:ChangeMessageVisibility",
                     "sqs:DeleteMessage",
                     "sqs:GetQueueAttributes",
@@ -285,22 +259,21 @@ class IAMVerifier:
                     "sqs:ReceiveMessage",
                     "sqs:SendMessage"
                 ],
-                ResourceArns=[
+                'ResourceArns': [
                     "arn:" + self.partition + ":sqs:" + self.region + ":*:airflow-celery-*"
                 ]
-            )['EvaluationResults']
+            })
             # tests role to allow any kms all for resources not in this account and that are from the sqs service
-            eval_results = eval_results + self.iam.simulate_custom_policy(
-                PolicyInputList=policy_list,
-                ActionNames=[
+            simulations.append({
+                'ActionNames': [
                     "kms:Decrypt",
                     "kms:DescribeKey",
                     "kms:Encrypt"
                 ],
-                ResourceArns=[
+                'ResourceArns': [
                     "arn:" + self.partition + ":kms:*:111122223333:key/*"
                 ],
-                ContextEntries=[
+                'ContextEntries': [
                     {
                         'ContextKeyName': 'kms:viaservice',
                         'ContextKeyValues': [
@@ -308,17 +281,16 @@ class IAMVerifier:
                         ],
                         'ContextKeyType': 'string'
                     }
-                ],
-            )['EvaluationResults']
-            eval_results = eval_results + self.iam.simulate_custom_policy(
-                PolicyInputList=policy_list,
-                ActionNames=[
+                ]
+            })
+            simulations.append({
+                'ActionNames': [
                     "kms:GenerateDataKey*"
                 ],
-                ResourceArns=[
+                'ResourceArns': [
                     "arn:" + self.partition + ":kms:*:111122223333:key/*"
                 ],
-                ContextEntries=[
+                'ContextEntries': [
                     {
                         'ContextKeyName': 'kms:viaservice',
                         'ContextKeyValues': [
@@ -326,8 +298,12 @@ class IAMVerifier:
                         ],
                         'ContextKeyType': 'string'
                     }
-                ],
-            )['EvaluationResults']
+                ]
+            })
+
+        # the simulations sharing resources and context entries are sent as a single request
+        eval_results = [eval_result for results in simulate_custom_policies(self.iam, policy_list, simulations)
+                        for eval_result in results]
 
         iam_issue_detected = False
         for eval_result in eval_results:
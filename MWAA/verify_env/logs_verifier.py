@@ -16,21 +16,48 @@ HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTIO
 OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 '''
+import heapq
+import itertools
 import time
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from aws_clients import AWSClients
 from report_writer import ReportWriter
+from check_runner import check
+
+FAILING_LOGS_FILTER_PATTERN = '?ERROR ?Error ?error ?traceback ?Traceback ?exception ?Exception ?fail ?Fail'
+# the terms of FAILING_LOGS_FILTER_PATTERN as a CloudWatch Logs Insights filter
+FAILING_LOGS_QUERY_FILTER = 'filter @message like /ERROR|Error|error|traceback|Traceback|exception|Exception|fail|Fail/'
+# most error logs written to the full report, which is also the largest limit of a Logs Insights query
+MAX_LOG_EVENTS = 10000
+# log groups scanned at the same time with FilterLogEvents
+MAX_LOG_SCAN_WORKERS = 5
+# log groups a single Logs Insights query can search
+MAX_INSIGHTS_LOG_GROUPS = 50
+INSIGHTS_POLL_INTERVAL = 1
+INSIGHTS_QUERY_ENDED = ['Complete', 'Failed', 'Cancelled', 'Timeout', 'Unknown']
 
 class LogsVerifier:
-    def __init__(self, clients: AWSClients, report: ReportWriter, env, env_name):
+    def __init__(self, clients: AWSClients, report: ReportWriter, env, env_name,
+                 use_insights=False, max_log_events=MAX_LOG_EVENTS):
         self.logs = clients.logs
         self.cloudtrail = clients.cloudtrail
         self.report = report
         self.env = env
-        self.log_groups = self.logs.describe_log_groups(
+        self.use_insights = use_insights
+        self.max_log_events = max_log_events
+        response = self.logs.describe_log_groups(
             logGroupNamePrefix='airflow-'+ env_name
-        )['logGroups']
+        )
+        self.log_groups = response['logGroups']
+        while response.get('nextToken'):
+            response = self.logs.describe_log_groups(
+                logGroupNamePrefix='airflow-'+ env_name,
+                nextToken=response['nextToken']
+            )
+            self.log_groups = self.log_groups + response['logGroups']
 
+    @check()
     def check_log_groups(self):
         '''check if cloudwatch log groups exists, if not check cloudtrail to see why they weren't created'''
         num_of_enabled_log_groups = sum(
@@ -78,23 +105,123 @@ class LogsVerifier:
         else:
             self.report.write_all_locations("✅ Number of log groups match suggesting they've been created successfully.")
 
+    # runs after the test DAG run, so that errors it logs are found
+    @check(depends_on=("check_full_dag_run",))
     def check_for_failing_logs(self):
-        '''look for any failing logs from CloudWatch in the past hour'''
+        '''
+        look for any failing logs from CloudWatch in the past hour. The log groups are scanned concurrently, either
+        page by page with FilterLogEvents or with Logs Insights queries, and the latest error logs of all groups are
+        written to the full report in timestamp order. At most max_log_events error logs are kept in memory per scan.
+        '''
         self.report.write_all_locations("### Failing Cloudwatch Logs\nChecking CloudWatch logs for any errors less than 1 hour old")
         now = int(time.time() * 1000)
         past_day = now - 3600000
-        for log in self.log_groups:
-            events = self.logs.filter_log_events(
-                logGroupName=log['logGroupName'],
-                startTime=past_day,
-                endTime=now,
-                filterPattern='?ERROR ?Error ?error ?traceback ?Traceback ?exception ?Exception ?fail ?Fail'
-            )['events']
-            events = sorted(events, key=lambda i: i['timestamp'])
-            self.report.write_all_locations('Log group: ', log['logGroupName'])
-            if len(events) == 0:
+        log_group_names = [log['logGroupName'] for log in self.log_groups]
+        if self.use_insights:
+            sources = [log_group_names[i:i + MAX_INSIGHTS_LOG_GROUPS]
+                       for i in range(0, len(log_group_names), MAX_INSIGHTS_LOG_GROUPS)]
+            scan = lambda names: self._query_failing_logs(names, past_day, now)
+        else:
+            sources = log_group_names
+            scan = lambda name: self._filter_failing_logs(name, past_day, now)
+        if sources:
+            with ThreadPoolExecutor(max_workers=min(MAX_LOG_SCAN_WORKERS, len(sources))) as pool:
+                scans = list(pool.map(scan, sources))
+        else:
+            scans = []
+
+        counts = {}
+        for scan_counts, _, error in scans:
+            counts.update(scan_counts)
+            if error:
+                self.report.write_all_locations('🚫', error)
+        for name in log_group_names:
+            self.report.write_all_locations('Log group: ', name)
+            if name in counts and counts[name] is None:
+                self.report.write_all_locations('⚠️ The log group could not be searched')
+                continue
+            if counts.get(name, 0) == 0:
                 self.report.write_all_locations('✅ No error logs found in the past hour')
                 continue
-            self.report.write_all_locations('⚠️ Please see the full report for logs.')
-            for event in events:
-                self.report.write_full_report(str(event['timestamp']) + " " + event['message'], end='')
+            self.report.write_all_locations('⚠️ Found', counts[name], 'error logs. Please see the full report for logs.')
+
+        # each scan holds its latest error logs, oldest first: merge them and keep the latest overall
+        retained = sum(len(events) for _, events, _ in scans)
+        skipped = max(0, retained - self.max_log_events)
+        total = sum(count for count in counts.values() if count)
+        if total > self.max_log_events:
+            self.report.write_full_report('Showing the latest', self.max_log_events, 'of', total, 'error logs')
+        for timestamp, name, message in itertools.islice(heapq.merge(*[events for _, events, _ in scans]), skipped, None):
+            self.report.write_full_report(str(timestamp) + " " + name + " " + message, end='')
+
+    def _filter_failing_logs(self, log_group_name, start_time, end_time):
+        '''
+        find the error logs of a log group with FilterLogEvents, following nextToken, and return the number
+        of error logs, the latest max_log_events of them as (timestamp, log group, message) oldest first and an error
+        '''
+        latest = []
+        count = 0
+        kwargs = {}
+        while True:
+            response = self.logs.filter_log_events(
+                logGroupName=log_group_name,
+                startTime=start_time,
+                endTime=end_time,
+                filterPattern=FAILING_LOGS_FILTER_PATTERN,
+                **kwargs
+            )
+            for event in response['events']:
+                count += 1
+                item = (event['timestamp'], log_group_name, event['message'])
+                if len(latest) < self.max_log_events:
+                    heapq.heappush(latest, item)
+                elif item > latest[0]:
+                    heapq.heapreplace(latest, item)
+            if not response.get('nextToken'):
+                break
+            kwargs['nextToken'] = response['nextToken']
+        return {log_group_name: count}, sorted(latest), None
+
+    def _query_failing_logs(self, log_group_names, start_time, end_time):
+        '''
+        find the error logs of up to MAX_INSIGHTS_LOG_GROUPS log groups with two Logs Insights queries, one counting
+        the error logs of each group and one returning the latest max_log_events of them, and return the same
+        values as _filter_failing_logs
+        '''
+        queries = [
+            FAILING_LOGS_QUERY_FILTER + ' | stats count(*) as errors by @log',
+            'fields @timestamp, @message, @log | ' + FAILING_LOGS_QUERY_FILTER + ' | sort @timestamp desc'
+        ]
+        query_ids = [
+            self.logs.start_query(
+                logGroupNames=log_group_names,
+                startTime=start_time // 1000,
+                endTime=end_time // 1000,
+                queryString=query_string,
+                limit=self.max_log_events
+            )['queryId']
+            for query_string in queries
+        ]
+        counts_response, events_response = [self._get_query_results(query_id) for query_id in query_ids]
+        for response in (counts_response, events_response):
+            if response['status'] != 'Complete':
+                return dict.fromkeys(log_group_names), [], 'Logs Insights query on ' + ', '.join(log_group_names) + ' ended with status ' + response['status']
+
+        counts = {}
+        for row in counts_response['results']:
+            fields = {field['field']: field['value'] for field in row}
+            counts[fields['@log'].split(':', 1)[-1]] = int(fields['errors'])
+        events = []
+        for row in events_response['results']:
+            fields = {field['field']: field['value'] for field in row}
+            timestamp = datetime.strptime(fields['@timestamp'], '%Y-%m-%d %H:%M:%S.%f').replace(tzinfo=timezone.utc)
+            events.append((int(round(timestamp.timestamp() * 1000)), fields['@log'].split(':', 1)[-1], fields['@message']))
+        return counts, sorted(events), None
+
+    def _get_query_results(self, query_id):
+        '''wait for a Logs Insights query to end and return its results'''
+        while True:
+            response = self.logs.get_query_results(queryId=query_id)
+            if response['status'] in INSIGHTS_QUERY_ENDED:
+                return response
+            time.sleep(INSIGHTS_POLL_INTERVAL)
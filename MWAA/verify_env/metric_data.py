@@ -0,0 +1,115 @@
+# This Python file uses the following encoding: utf-8
+'''
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timezone
+
+# largest number of metrics a single GetMetricData request can return
+MAX_METRIC_DATA_QUERIES = 500
+
+
+class MetricDataBatch:
+    '''
+    Per run batch of the CloudWatch metrics read by the CloudWatch checks.
+    The metrics are added up front, then fetched together the first time one of them is read:
+    one GetMetricData request (following NextToken) per time window, rather than one
+    GetMetricStatistics request per metric. Checks running on other threads at the same
+    time wait for that fetch instead of repeating it.
+    '''
+    def __init__(self, cw):
+        self.cw = cw
+        self.end_time = None
+        self._queries = {}
+        self._lock = threading.Lock()
+        self._series = None
+
+    def add(self, key, namespace, metric_name, dimensions, period, window, stat='Average'):
+        '''
+        add a metric statistic to the batch. key identifies the metric in get(), window is the
+        timedelta before the time of the fetch to read, and period the length in seconds of each datapoint
+        '''
+        if self._series is not None:
+            raise ValueError('metrics cannot be added once the batch is fetched')
+        self._queries[key] = {
+            'MetricStat': {
+                'Metric': {
+                    'Namespace': namespace,
+                    'MetricName': metric_name,
+                    'Dimensions': dimensions
+                },
+                'Period': period,
+                'Stat': stat
+            },
+            'window': window
+        }
+
+    def get(self, key):
+        '''
+        returns the datapoints of a metric as a list of (timestamp, value), oldest first
+        '''
+        with self._lock:
+            series = self._series
+            fetch = series is None
+            if fetch:
+                series = self._series = Future()
+        if fetch:
+            try:
+                series.set_result(self._fetch())
+            except Exception as error:
+                series.set_exception(error)
+        return list(series.result()[key])
+
+    def _fetch(self):
+        '''fetch every metric of the batch, with one GetMetricData request per time window'''
+        self.end_time = datetime.now(timezone.utc)
+        windows = {}
+        for key, query in self._queries.items():
+            windows.setdefault(query['window'], []).append(key)
+        series = {}
+        for window, keys in windows.items():
+            for i in range(0, len(keys), MAX_METRIC_DATA_QUERIES):
+                series.update(self._get_metric_data(keys[i:i + MAX_METRIC_DATA_QUERIES], self.end_time - window))
+        return series
+
+    def _get_metric_data(self, keys, start_time):
+        '''read the datapoints of the metrics of one time window'''
+        # GetMetricData ids must start with a lower case letter
+        ids = {'m' + str(i): key for i, key in enumerate(keys)}
+        queries = [
+            {'Id': query_id, 'MetricStat': self._queries[key]['MetricStat'], 'ReturnData': True}
+            for query_id, key in ids.items()
+        ]
+        series = {key: [] for key in keys}
+        kwargs = {}
+        while True:
+            response = self.cw.get_metric_data(
+                MetricDataQueries=queries,
+                StartTime=start_time,
+                EndTime=self.end_time,
+                ScanBy='TimestampAscending',
+                **kwargs
+            )
+            for result in response['MetricDataResults']:
+                series[ids[result['Id']]].extend(zip(result['Timestamps'], result['Values']))
+            if not response.get('NextToken'):
+                break
+            kwargs['NextToken'] = response['NextToken']
+        for key in keys:
+            series[key].sort(key=lambda datapoint: datapoint[0])
+        return series
@@ -18,11 +18,24 @@ SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 '''
 import socket
 import time
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
 from aws_clients import AWSClients
 from report_writer import ReportWriter
+from check_runner import check
 from utils import get_account_id
 
+# A service is tested up to this many times when the automation cannot find the eni
+MAX_CONNECTIVITY_ATTEMPTS = 5
+# Automations running at the same time, well under the SSM quota of concurrently running automations
+MAX_CONCURRENT_SSM_AUTOMATIONS = 10
+# Number of execution ids accepted by a DescribeAutomationExecutions filter
+SSM_FILTER_VALUES_LIMIT = 10
+SSM_POLL_INTERVAL = 1
+SSM_MAX_POLL_INTERVAL = 10
+SSM_STEP_FINISHED = ['Success', 'TimedOut', 'Cancelled', 'Failed']
+SSM_EXECUTION_ENDED = ['Success', 'TimedOut', 'Cancelled', 'Failed', 'CompletedWithSuccess', 'CompletedWithFailure', 'Rejected', 'Exited']
+
 class NetworkingVerifier:
     def __init__(self, clients: AWSClients, report: ReportWriter, env, region, partition, top_level_domain):
         self.ec2 = clients.ec2
@@ -35,6 +48,7 @@ class NetworkingVerifier:
         self.partition = partition
         self.top_level_domain = top_level_domain
 
+    @check()
     def check_nacl(self, input_subnets, input_subnet_ids):
         '''
         check to see if the nacls for the subnets have port 5432 if they're even listing any specific ports
@@ -106,6 +120,7 @@ class NetworkingVerifier:
                     return acl['RuleAction'] == 'allow'
         return ""
 
+    @check()
     def check_routes(self, input_subnets, input_subnet_ids):
         '''
         method to check and make sure routes have access to the internet if public and subnets are private
@@ -214,6 +229,7 @@ class NetworkingVerifier:
             else:
                 self.report.write_full_report('✅ VPC endpoint', vpc_endpnt['VpcEndpointId'], "has private dns enabled.")
 
+    @check()
     def check_security_groups(self):
         '''
         check MWAA environment's security groups for:
@@ -251,6 +267,7 @@ class NetworkingVerifier:
         else:
             self.report.write_all_locations("🚫 Ingress for security groups do not have at least 1 rule to allow itself.")
 
+    @check()
     def check_s3_block_public_access(self):
         '''check s3 bucket or account and make sure "block public access" is enabled'''
         self.report.write_all_locations("### Verifying 'block public access' is enabled on the s3 bucket or account")
@@ -320,11 +337,14 @@ class NetworkingVerifier:
         return mwaa_utilized_services
 
 
+    @check()
     def check_connectivity_to_dep_services(self, input_subnets, subnet_ids):
         '''
         uses ssm document AWSSupport-ConnectivityTroubleshooter to check connectivity between MWAA's enis
         and a list of services. More information on this document can be found here
         https://docs.aws.amazon.com/systems-manager/latest/userguide/automation-awssupport-connectivitytroubleshooter.html
+        The automations for all services are started up front (at most MAX_CONCURRENT_SSM_AUTOMATIONS at a time)
+        and polled together. The results are written in the order of the services.
         '''
         vpc = input_subnets[0]['VpcId']
         mwaa_utilized_services = self.get_mwaa_utilized_services(vpc)
@@ -332,90 +352,187 @@ class NetworkingVerifier:
         self.report.write_all_locations("### Connectivity Check via ENIs\nPlease see the full report for results if no error in output.")
         self.report.write_full_report("Testing connectivity to the following service endpoints from MWAA enis...")
         security_groups = self.env['NetworkConfiguration']['SecurityGroupIds']
-        for service in mwaa_utilized_services:
-            # retry 5 times for just one of the enis the service uses
-            for i in range(0, 5):
+        destination_ips, resolve_errors = self._get_ip_addresses([service['service'] for service in mwaa_utilized_services], vpc)
+        # what to write for each service, as (report method, arguments)
+        findings = [[] for _ in mwaa_utilized_services]
+        attempts = [0] * len(mwaa_utilized_services)
+        pending = [index for index in range(len(mwaa_utilized_services)) if index not in resolve_errors]
+        # services whose IP address is looked up again when they are retried
+        unresolved = set()
+        for index, client_error in resolve_errors.items():
+            retry = self._record_attempt_errors([index], attempts, findings, client_error)
+            pending.extend(retry)
+            unresolved.update(retry)
+        running = {}
+        current_steps = {}
+        eni = None
+        while pending or running:
+            # get ENIs used by MWAA once, and again only after an automation could not find the eni
+            if pending and eni is None:
                 try:
-                    # get ENIs used by MWAA
                     enis = self._get_enis(subnet_ids, vpc, security_groups)
-                    if not enis:
-                        self.report.write_all_locations("🚫 no enis found for MWAA, exiting test for ", service['service'])
-                        self.report.write_all_locations("please try accessing the airflow UI and then try running this script again")
-                        break
-                    eni = list(enis.values())[0]
-                    interface_ip = self.ec2.describe_network_interfaces(
-                        NetworkInterfaceIds=[eni]
-                    )['NetworkInterfaces'][0]['PrivateIpAddress']
-                    ssm_execution_id = ''
+                except ClientError as client_error:
+                    pending = self._record_attempt_errors(pending, attempts, findings, client_error)
+                    continue
+                if not enis:
+                    for index in pending:
+                        findings[index].append(("write_all_locations", ("🚫 no enis found for MWAA, exiting test for ", mwaa_utilized_services[index]['service'])))
+                        findings[index].append(("write_all_locations", ("please try accessing the airflow UI and then try running this script again",)))
+                    pending = []
+                    continue
+                eni = list(enis.values())[0]
+            while pending and len(running) < MAX_CONCURRENT_SSM_AUTOMATIONS:
+                index = pending.pop(0)
+                service = mwaa_utilized_services[index]
+                try:
+                    if index in unresolved:
+                        destination_ips[index] = self.get_ip_address(service['service'], vpc)
+                        unresolved.discard(index)
                     ssm_execution_id = self.ssm.start_automation_execution(
                         DocumentName='AWSSupport-ConnectivityTroubleshooter',
                         DocumentVersion='$DEFAULT',
                         Parameters={
-                            'SourceIP': [interface_ip],
-                            'DestinationIP': [self.get_ip_address(service['service'], input_subnets[0]['VpcId'])],
+                            'SourceIP': [eni['PrivateIpAddress']],
+                            'DestinationIP': [destination_ips[index]],
                             'DestinationPort': [service['port']],
                             'SourceVpc': [vpc],
                             'DestinationVpc': [vpc],
                             'SourcePortRange': ["0-65535"]
                         }
                     )['AutomationExecutionId']
-                    self._wait_for_ssm_step_one_to_finish(ssm_execution_id)
-                    execution = self.ssm.get_automation_execution(
-                        AutomationExecutionId=ssm_execution_id
-                    )['AutomationExecution']
-                    # check if the failure is due to not finding the eni. If it is, retry testing the service again
-                    if execution['StepExecutions'][0]['StepStatus'] != 'Failed':
-                        self.report.write_full_report('Testing connectivity between eni', eni, "with private ip of",
-                            interface_ip, "and", service['service'], "on port", service['port'])
-                        self.report.write_full_report("Please follow this link to view the results of the test:")
-                        self.report.write_full_report("https://console.aws.amazon.com/systems-manager/automation/execution/" + ssm_execution_id +
-                            "?self.region=" + self.region + "\n")
-                        break
                 except ClientError as client_error:
-                    self.report.write_all_locations('🚫 Attempt', i, 'encountered error', client_error.response['Error']['Message'], ' retrying...')
+                    if client_error.response['Error']['Code'] == 'AutomationExecutionLimitExceededException' and running:
+                        # wait for one of the running automations to finish before starting more
+                        pending.insert(0, index)
+                        break
+                    pending.extend(self._record_attempt_errors([index], attempts, findings, client_error))
+                    continue
+                attempts[index] += 1
+                running[ssm_execution_id] = (index, eni)
+            if not running:
+                continue
+            try:
+                finished = self._wait_for_ssm_step_one_to_finish(list(running), current_steps)
+            except ClientError as client_error:
+                failed = [running[ssm_execution_id][0] for ssm_execution_id in running]
+                running = {}
+                current_steps = {}
+                pending.extend(self._record_attempt_errors(failed, attempts, findings, client_error, counted=True))
+                continue
+            for ssm_execution_id, step_status in finished.items():
+                index, execution_eni = running.pop(ssm_execution_id)
+                service = mwaa_utilized_services[index]
+                # check if the failure is due to not finding the eni. If it is, retry testing the service again
+                if step_status != 'Failed':
+                    findings[index].append(("write_full_report", ('Testing connectivity between eni', execution_eni['NetworkInterfaceId'], "with private ip of",
+                        execution_eni['PrivateIpAddress'], "and", service['service'], "on port", service['port'])))
+                    findings[index].append(("write_full_report", ("Please follow this link to view the results of the test:",)))
+                    findings[index].append(("write_full_report", ("https://console.aws.amazon.com/systems-manager/automation/execution/" + ssm_execution_id +
+                        "?self.region=" + self.region + "\n",)))
+                elif attempts[index] < MAX_CONNECTIVITY_ATTEMPTS:
+                    pending.append(index)
+                    eni = None
+        for service_findings in findings:
+            for method, args in service_findings:
+                getattr(self.report, method)(*args)
 
-    def _wait_for_ssm_step_one_to_finish(self, ssm_execution_id):
+    def _record_attempt_errors(self, indexes, attempts, findings, client_error, counted=False):
         '''
-        check if the first step finished because that will do the test on the IP to get the eni.
-        The eni changes to quickly that sometimes this fails so I retry till it works
+        records an error for the current attempt of each service and returns the services which can be retried
         '''
-        execution = self.ssm.get_automation_execution(
-            AutomationExecutionId=ssm_execution_id
-        )['AutomationExecution']['StepExecutions'][0]['StepStatus']
+        retry = []
+        for index in indexes:
+            findings[index].append(("write_all_locations", ('🚫 Attempt', attempts[index] - 1 if counted else attempts[index], 'encountered error',
+                client_error.response['Error']['Message'], ' retrying...')))
+            if not counted:
+                attempts[index] += 1
+            if attempts[index] < MAX_CONNECTIVITY_ATTEMPTS:
+                retry.append(index)
+        return retry
+
+    def _wait_for_ssm_step_one_to_finish(self, ssm_execution_ids, current_steps):
+        '''
+        wait until the first step of at least one of the executions finished because that will do the test on the IP to get the eni.
+        The eni changes to quickly that sometimes this fails so the caller retries till it works.
+        The executions are polled together with DescribeAutomationExecutions and GetAutomationExecution is only called for
+        the ones which moved to another step or ended. current_steps maps the execution ids to the step they were last seen in,
+        and is kept up to date across calls. Polling backs off from SSM_POLL_INTERVAL to SSM_MAX_POLL_INTERVAL seconds.
+        Returns a dictionary of execution id -> status of the first step, for the executions whose first step finished
+        '''
+        interval = SSM_POLL_INTERVAL
         while True:
-            if execution in ['Success', 'TimedOut', 'Cancelled', 'Failed']:
-                break
-            time.sleep(5)
-            execution = self.ssm.get_automation_execution(
-                AutomationExecutionId=ssm_execution_id
-            )['AutomationExecution']['StepExecutions'][0]['StepStatus']
+            changed = [ssm_execution_id for ssm_execution_id in ssm_execution_ids if ssm_execution_id not in current_steps]
+            known = [ssm_execution_id for ssm_execution_id in ssm_execution_ids if ssm_execution_id in current_steps]
+            for i in range(0, len(known), SSM_FILTER_VALUES_LIMIT):
+                executions = self.ssm.describe_automation_executions(
+                    Filters=[{'Key': 'ExecutionId', 'Values': known[i:i + SSM_FILTER_VALUES_LIMIT]}]
+                )['AutomationExecutionMetadataList']
+                for execution in executions:
+                    if (execution['AutomationExecutionStatus'] in SSM_EXECUTION_ENDED or
+                            execution.get('CurrentStepName') != current_steps[execution['AutomationExecutionId']]):
+                        changed.append(execution['AutomationExecutionId'])
+            finished = {}
+            for ssm_execution_id in changed:
+                execution = self.ssm.get_automation_execution(
+                    AutomationExecutionId=ssm_execution_id
+                )['AutomationExecution']
+                step_status = execution['StepExecutions'][0]['StepStatus'] if execution.get('StepExecutions') else 'Pending'
+                if step_status in SSM_STEP_FINISHED or execution['AutomationExecutionStatus'] in SSM_EXECUTION_ENDED:
+                    finished[ssm_execution_id] = step_status
+                    current_steps.pop(ssm_execution_id, None)
+                else:
+                    current_steps[ssm_execution_id] = execution.get('CurrentStepName')
+            if finished:
+                return finished
+            time.sleep(interval)
+            interval = min(SSM_MAX_POLL_INTERVAL, interval * 2)
 
     def _get_enis(self, input_subnet_ids, vpc, security_groups):
         '''
-        method which returns the ENIs used by MWAA based on security groups assigned to the environment
+        method which returns the ENIs used by MWAA based on security groups assigned to the environment,
+        as a dictionary of subnet id -> network interface (including its private IP address).
+        All subnets are looked up with a single DescribeNetworkInterfaces call
         '''
+        interfaces = self.ec2.describe_network_interfaces(
+            Filters=[
+                {
+                    'Name': 'subnet-id',
+                    'Values': input_subnet_ids
+                },
+                {
+                    'Name': 'vpc-id',
+                    'Values': [vpc]
+                },
+                {
+                    'Name': 'group-id',
+                    'Values': security_groups
+                }
+            ]
+        )['NetworkInterfaces']
         enis = {}
         for subnet_id in input_subnet_ids:
-            interfaces = self.ec2.describe_network_interfaces(
-                Filters=[
-                    {
-                        'Name': 'subnet-id',
-                        'Values': [subnet_id]
-                    },
-                    {
-                        'Name': 'vpc-id',
-                        'Values': [vpc]
-                    },
-                    {
-                        'Name': 'group-id',
-                        'Values': security_groups
-                    }
-                ]
-            )['NetworkInterfaces']
             for interface in interfaces:
-                enis[subnet_id] = interface['NetworkInterfaceId']
+                if interface['SubnetId'] == subnet_id:
+                    enis[subnet_id] = interface
         return enis
 
+    def _get_ip_addresses(self, hostnames, vpc):
+        '''
+        method to get the IP addresses of several hostnames (see get_ip_address) at the same time.
+        Returns the IP addresses, in the order of the hostnames, and a dictionary of index -> ClientError
+        for the hostnames whose VPC endpoint lookup failed
+        '''
+        def resolve(hostname):
+            try:
+                return self.get_ip_address(hostname, vpc), None
+            except ClientError as client_error:
+                return None, client_error
+
+        with ThreadPoolExecutor(max_workers=max(1, len(hostnames))) as pool:
+            results = list(pool.map(resolve, hostnames))
+        return ([ip_address for ip_address, _ in results],
+                {index: client_error for index, (_, client_error) in enumerate(results) if client_error is not None})
+
     def get_ip_address(self, hostname, vpc):
         '''
         method to get the hostname's IP address. This will first check to see if there is a VPC endpoint.
@@ -17,6 +17,7 @@ OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 '''
 import os
+import threading
 from datetime import datetime, timezone
 
 class ReportWriter:
@@ -44,6 +45,8 @@ class ReportWriter:
     def __init__(self):
         self.full_report_file = None
         self.key_findings_file = None
+        # Writes made by a thread that called start_buffer() are held per thread until replayed
+        self._buffers = threading.local()
 
         self.full_report_path = self._generate_unique_filepath("MWAA_DIAGNOSTICS_FULL_REPORT", ".md")
         self.key_findings_path = self._generate_unique_filepath("MWAA_DIAGNOSTICS_KEY_FINDINGS", ".md")
@@ -140,6 +143,8 @@ class ReportWriter:
             >>> report.write_full_report("Checking security group:", "sg-12345")
             >>> report.write_full_report("Status", "PASSED", sep=": ")
         """
+        if self._buffer('write_full_report', args, sep, end):
+            return
         text = sep.join(str(arg) for arg in args) + end
         if self.full_report_requested:
             self.full_report_file.write(text)
@@ -162,6 +167,8 @@ class ReportWriter:
             >>> report.write_key_findings("🚫 Critical issue found in IAM permissions")
             >>> report.write_key_findings("✅ All security groups configured correctly")
         """
+        if self._buffer('write_key_findings', args, sep, end):
+            return
         text = sep.join(str(arg) for arg in args) + end
         if self.key_findings_requested:
             self.key_findings_file.write(text)
@@ -184,6 +191,8 @@ class ReportWriter:
             >>> report.write_all_locations("### Starting IAM Permission Check")
             >>> report.write_all_locations("🚫 CRITICAL: Environment configuration invalid")
         """
+        if self._buffer('write_all_locations', args, sep, end):
+            return
         text = sep.join(str(arg) for arg in args) + end
         if self.key_findings_requested:
             self.key_findings_file.write(text)
@@ -213,3 +222,48 @@ class ReportWriter:
             self.key_findings_file.close()
             print("📝 Key findings are written to", self.key_findings_path)
 
+    def start_buffer(self):
+        """
+        Hold the writes made by the calling thread instead of writing them.
+
+        Used by CheckRunner so that checks running concurrently do not interleave
+        their output. The held writes are returned by end_buffer() and written
+        later with replay().
+        """
+        self._buffers.entries = []
+
+    def end_buffer(self):
+        """
+        Stop holding the writes made by the calling thread.
+
+        Returns:
+            list: The held writes, in the order they were made
+        """
+        entries = self._buffers.entries
+        self._buffers.entries = None
+        return entries
+
+    def replay(self, entries):
+        """
+        Write the writes returned by end_buffer() to their original locations.
+
+        Args:
+            entries (list): Writes returned by end_buffer()
+        """
+        for method, args, sep, end in entries:
+            getattr(self, method)(*args, sep=sep, end=end)
+
+    def _buffer(self, method, args, sep, end):
+        """
+        Hold a write if the calling thread is buffering. The arguments are
+        converted to text right away, as they would be by an immediate write.
+
+        Returns:
+            bool: True if the write was held, False if it should be written now
+        """
+        entries = getattr(self._buffers, 'entries', None)
+        if entries is None:
+            return False
+        entries.append((method, tuple(str(arg) for arg in args), sep, end))
+        return True
+
@@ -19,29 +19,20 @@ SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 import json
 from aws_clients import AWSClients
 from report_writer import ReportWriter
-from utils import get_account_id, get_inline_policies
+from check_runner import check
+from utils import get_account_id
 
 class SecretsVerifier:
     def __init__(self, clients: AWSClients, report: ReportWriter, env):
         self.iam = clients.iam
+        self.role_policies = clients.role_policies
         self.kms = clients.kms
         self.report = report
         self.env = env
 
     def check_secrets_manager_iam(self):
         account_id = get_account_id(self.env)
-        policies = self.iam.list_attached_role_policies(
-            RoleName=self.env["ExecutionRoleArn"].split("/")[-1]
-        )["AttachedPolicies"]
-
-        policy_list = []
-        for policy in policies:
-            policy_arn = policy["PolicyArn"]
-            policy_version = self.iam.get_policy(PolicyArn=policy_arn)['Policy']['DefaultVersionId']
-            policy_doc = self.iam.get_policy_version(PolicyArn=policy_arn,
-                                                    VersionId=policy_version)['PolicyVersion']['Document']
-            policy_list.append(json.dumps(policy_doc))
-        policy_list.extend(get_inline_policies(self.iam, self.env['ExecutionRoleArn'].split("/")[-1]))
+        policy_list = self.role_policies.get_policy_documents(self.env["ExecutionRoleArn"].split("/")[-1])
 
         # Because we don't know the names of the secrets user set up for airflow,
         # we cannot use policy simulations. Instead, we check if the action is included
@@ -87,6 +78,7 @@ class SecretsVerifier:
             
         return True
 
+    @check()
     def check_secrets_manager(self):
         '''
         There are five steps needed to connect AWS Secrets Manager with
@@ -116,6 +108,7 @@ class SecretsVerifier:
         else:
             self.report.write_all_locations("AWS Secrets Manager is not being used. This is not necessarily an error since the use of secrets manager is optional.")
 
+    @check()
     def check_kms_key_policy(self):
         '''
         check kms key and if its customer managed if it has a policy like this
@@ -17,7 +17,6 @@ OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 '''
 import argparse
-import json
 import re
 from boto3.session import Session
 
@@ -80,15 +79,23 @@ def validation_profile(profile_name):
     raise argparse.ArgumentTypeError("%s is an invalid profile name value" % profile_name)
 
 
-def get_inline_policies(iam_client, role_arn):
-    """
-    Get inline policies in for a role
-    """
-    inline_policies = iam_client.list_role_policies(RoleName=role_arn)
-    return [
-            json.dumps(iam_client.get_role_policy(RoleName=role_arn, PolicyName=policy).get("PolicyDocument", ))
-            for policy in inline_policies.get("PolicyNames", [])
-    ]
+def validate_max_workers(max_workers):
+    '''
+    verify the number of concurrent checks is a positive integer
+    '''
+    if re.match(r"^[0-9]+$", max_workers) and int(max_workers) > 0:
+        return int(max_workers)
+    raise argparse.ArgumentTypeError("%s is an invalid number of workers" % max_workers)
+
+
+def validate_max_log_events(max_log_events):
+    '''
+    verify the number of error logs kept is between 1 and 10000, the largest limit of a Logs Insights query
+    '''
+    if re.match(r"^[0-9]+$", max_log_events) and 0 < int(max_log_events) <= 10000:
+        return int(max_log_events)
+    raise argparse.ArgumentTypeError("%s is an invalid number of log events" % max_log_events)
+
 
 def print_err_msg(c_err):
     '''short method to handle printing an error message if there is one'''
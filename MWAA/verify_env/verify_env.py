@@ -30,7 +30,8 @@ from networking_verifier import NetworkingVerifier
 from airflow_verifier import AirflowVerifier
 from iam_verifier import IAMVerifier
 from secrets_verifier import SecretsVerifier
-from logs_verifier import LogsVerifier
+from logs_verifier import LogsVerifier, MAX_LOG_EVENTS
+from check_runner import CheckRunner, DEFAULT_MAX_WORKERS
 from utils import *
 
 def prompt_user_and_print_info(input_env_name, ec2_client, mwaa, report: ReportWriter):
@@ -75,6 +76,12 @@ if __name__ == '__main__':
                         required=True, help="region, Ex: us-east-1")
     parser.add_argument('--profile', type=validation_profile, default=None,
                         required=False, help="AWS CLI profile name (optional). If omitted, uses the default credential chain (env vars, instance profile, etc.)")
+    parser.add_argument('--max-workers', type=validate_max_workers, default=DEFAULT_MAX_WORKERS,
+                        required=False, help="number of checks run at the same time (optional). Use 1 to run the checks one after another")
+    parser.add_argument('--logs-insights', action='store_true', default=False,
+                        required=False, help="search the log groups for errors with CloudWatch Logs Insights queries (optional)")
+    parser.add_argument('--max-log-events', type=validate_max_log_events, default=MAX_LOG_EVENTS,
+                        required=False, help="most error logs written to the full report (optional, at most 10000). The latest are kept")
     args, _ = parser.parse_known_args()
     ENV_NAME = args.envname
     REGION = args.region
@@ -94,30 +101,35 @@ if __name__ == '__main__':
         net_verifier = NetworkingVerifier(clients, report, env, REGION, PARTITION, TOP_LEVEL_DOMAIN)
         af_verifier = AirflowVerifier(clients, report, env, REGION, ENV_NAME)
         secrets_verifier = SecretsVerifier(clients, report, env)
-        logs_verifier = LogsVerifier(clients, report, env, ENV_NAME)
+        logs_verifier = LogsVerifier(clients, report, env, ENV_NAME, args.logs_insights, args.max_log_events)
 
-        iam_verifier.check_iam_permissions()
+        # Independent checks run concurrently; the report keeps the order below.
+        runner = CheckRunner(report, args.max_workers)
 
-        secrets_verifier.check_kms_key_policy()
-        secrets_verifier.check_secrets_manager()
+        runner.add(iam_verifier.check_iam_permissions)
 
-        net_verifier.check_nacl(subnets, subnet_ids)
-        net_verifier.check_routes(subnets, subnet_ids)
-        net_verifier.check_security_groups()
-        net_verifier.check_s3_block_public_access()
-        net_verifier.check_connectivity_to_dep_services(subnets, subnet_ids)
+        runner.add(secrets_verifier.check_kms_key_policy)
+        runner.add(secrets_verifier.check_secrets_manager)
 
-        cw_verifier.check_celery_sqs_health()
-        cw_verifier.check_environment_class_utilization()
-        cw_verifier.check_environment_class_dag_count()
+        runner.add(net_verifier.check_nacl, subnets, subnet_ids)
+        runner.add(net_verifier.check_routes, subnets, subnet_ids)
+        runner.add(net_verifier.check_security_groups)
+        runner.add(net_verifier.check_s3_block_public_access)
+        runner.add(net_verifier.check_connectivity_to_dep_services, subnets, subnet_ids)
 
-        af_verifier.check_airflow_rest_api()
-        af_verifier.check_airflowignore()
-        af_verifier.check_full_dag_run()
-        af_verifier.check_airflow_config()
+        runner.add(cw_verifier.check_celery_sqs_health)
+        runner.add(cw_verifier.check_environment_class_utilization)
+        runner.add(cw_verifier.check_environment_class_dag_count)
 
-        logs_verifier.check_log_groups()
-        logs_verifier.check_for_failing_logs()
+        runner.add(af_verifier.check_airflow_rest_api)
+        runner.add(af_verifier.check_airflowignore)
+        runner.add(af_verifier.check_full_dag_run)
+        runner.add(af_verifier.check_airflow_config)
+
+        runner.add(logs_verifier.check_log_groups)
+        runner.add(logs_verifier.check_for_failing_logs)
+
+        runner.run()
 
         report.close()
         goodbye_message()
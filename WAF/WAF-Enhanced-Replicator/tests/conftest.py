@@ -0,0 +1,179 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Fake WAF Classic client and golden file helper shared by the WAFER tests.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from botocore.exceptions import ClientError
+
+goldenDir = os.path.join(os.path.dirname(__file__), 'golden')
+
+
+def assertMatchesGolden(rendered, goldenName):
+    """Compares a template with its golden file, or rewrites the golden file when WAFER_UPDATE_GOLDEN is set."""
+    goldenPath = os.path.join(goldenDir, goldenName)
+    if os.environ.get('WAFER_UPDATE_GOLDEN'):
+        with open(goldenPath, 'w') as goldenFile:
+            goldenFile.write(rendered)
+    with open(goldenPath) as goldenFile:
+        assert rendered == goldenFile.read()
+
+
+class FakeWaf:
+    """
+    WAF Classic (global or regional) and CloudFront client answering with two Web ACLs that use every condition type.
+    The second Web ACL shares a rule group, a regular rule and conditions with the first one.
+    The operations in failures fail with the given error code. The List APIs return at most pageSize items per page,
+    with a NextMarker like WAF Classic, and every call is recorded in calls as (operation, keyword arguments).
+    """
+
+    conditions = {
+        'ByteMatchSet': [
+            {'ByteMatchSetId': 'byte-1', 'Name': 'bad-agents', 'ByteMatchTuples': [
+                {'FieldToMatch': {'Type': 'HEADER', 'Data': 'user-agent'}, 'TargetString': b'badbot',
+                 'TextTransformation': 'LOWERCASE', 'PositionalConstraint': 'CONTAINS'},
+                {'FieldToMatch': {'Type': 'URI'}, 'TargetString': b'/admin',
+                 'TextTransformation': 'NONE', 'PositionalConstraint': 'STARTS_WITH'}]}],
+        'RegexPatternSet': [
+            {'RegexPatternSetId': 'pattern-1', 'Name': 'digits', 'RegexPatternStrings': ['id=\\d+', 'token']}],
+        'RegexMatchSet': [
+            {'RegexMatchSetId': 'regex-1', 'Name': 'query-ids', 'RegexMatchTuples': [
+                {'FieldToMatch': {'Type': 'QUERY_STRING'}, 'TextTransformation': 'URL_DECODE', 'RegexPatternSetId': 'pattern-1'}]}],
+        'SqlInjectionMatchSet': [
+            {'SqlInjectionMatchSetId': 'sql-1', 'Name': 'sqli-body', 'SqlInjectionMatchTuples': [
+                {'FieldToMatch': {'Type': 'BODY'}, 'TextTransformation': 'HTML_ENTITY_DECODE'}]}],
+        'SizeConstraintSet': [
+            {'SizeConstraintSetId': 'size-1', 'Name': 'big-body', 'SizeConstraints': [
+                {'FieldToMatch': {'Type': 'BODY'}, 'TextTransformation': 'NONE', 'ComparisonOperator': 'GT', 'Size': 8192}]}],
+        'IPSet': [
+            {'IPSetId': 'ip-1', 'Name': 'blocked-ips', 'IPSetDescriptors': [
+                {'Type': 'IPV4', 'Value': '192.0.2.0/24'}, {'Type': 'IPV6', 'Value': '2001:db8::/32'}]},
+            {'IPSetId': 'ip-unused', 'Name': 'unused-ips', 'IPSetDescriptors': [{'Type': 'IPV4', 'Value': '198.51.100.0/24'}]}],
+        'GeoMatchSet': [
+            {'GeoMatchSetId': 'geo-1', 'Name': 'countries', 'GeoMatchConstraints': [
+                {'Type': 'Country', 'Value': 'FR'}, {'Type': 'Country', 'Value': 'US'}]}],
+        'XssMatchSet': [
+            {'XssMatchSetId': 'xss-1', 'Name': 'xss-query', 'XssMatchTuples': [
+                {'FieldToMatch': {'Type': 'QUERY_STRING'}, 'TextTransformation': 'URL_DECODE'}]}],
+    }
+    rules = {
+        'rule-1': {'RuleId': 'rule-1', 'Name': 'block-agents', 'MetricName': 'blockAgents', 'Predicates': [
+            {'Negated': False, 'Type': 'ByteMatch', 'DataId': 'byte-1'},
+            {'Negated': True, 'Type': 'IPMatch', 'DataId': 'ip-1'},
+            {'Negated': False, 'Type': 'GeoMatch', 'DataId': 'geo-1'}]},
+        'rule-2': {'RuleId': 'rule-2', 'Name': 'block-ids', 'MetricName': 'blockIds', 'Predicates': [
+            {'Negated': False, 'Type': 'RegexMatch', 'DataId': 'regex-1'},
+            {'Negated': False, 'Type': 'SizeConstraint', 'DataId': 'size-1'}]},
+        'rule-3': {'RuleId': 'rule-3', 'Name': 'block-injections', 'MetricName': 'blockInjections', 'Predicates': [
+            {'Negated': False, 'Type': 'SqlInjectionMatch', 'DataId': 'sql-1'},
+            {'Negated': False, 'Type': 'XssMatch', 'DataId': 'xss-1'}]},
+        'rule-4': {'RuleId': 'rule-4', 'Name': 'allow-office', 'MetricName': 'allowOffice', 'Predicates': [
+            {'Negated': False, 'Type': 'IPMatch', 'DataId': 'ip-1'},
+            {'Negated': True, 'Type': 'ByteMatch', 'DataId': 'byte-1'}]},
+    }
+    rateRules = {
+        'rate-1': {'RuleId': 'rate-1', 'Name': 'rate-limit', 'MetricName': 'rateLimit', 'RateKey': 'IP', 'RateLimit': 2000,
+                   'MatchPredicates': [{'Negated': False, 'Type': 'IPMatch', 'DataId': 'ip-1'}]},
+    }
+    ruleGroups = {
+        'group-1': {'Name': 'injections', 'MetricName': 'injections', 'ActivatedRules': [
+            {'RuleId': 'rule-3', 'Priority': 1, 'Action': {'Type': 'BLOCK'}},
+            {'RuleId': 'rule-2', 'Priority': 2, 'Action': {'Type': 'COUNT'}}]},
+        'group-2': {'Name': 'office', 'MetricName': 'office', 'ActivatedRules': [
+            {'RuleId': 'rule-4', 'Priority': 1, 'Action': {'Type': 'ALLOW'}},
+            {'RuleId': 'rule-3', 'Priority': 2, 'Action': {'Type': 'BLOCK'}}]},
+    }
+    webAcls = [
+        {'WebACLId': 'acl-1', 'Name': 'golden-acl', 'MetricName': 'goldenAcl', 'DefaultAction': {'Type': 'ALLOW'}, 'Rules': [
+            {'Priority': 1, 'RuleId': 'rule-1', 'Action': {'Type': 'BLOCK'}, 'Type': 'REGULAR'},
+            {'Priority': 2, 'RuleId': 'group-1', 'OverrideAction': {'Type': 'NONE'}, 'Type': 'GROUP'},
+            {'Priority': 3, 'RuleId': 'rate-1', 'Action': {'Type': 'COUNT'}, 'Type': 'RATE_BASED'}]},
+        # Its rule group at position 1 is not the first Web ACL's rule_group_1, so it gets the next free name.
+        {'WebACLId': 'acl-2', 'Name': 'second-acl', 'MetricName': 'secondAcl', 'DefaultAction': {'Type': 'BLOCK'}, 'Rules': [
+            {'Priority': 1, 'RuleId': 'rule-4', 'Action': {'Type': 'ALLOW'}, 'Type': 'REGULAR'},
+            {'Priority': 2, 'RuleId': 'group-2', 'OverrideAction': {'Type': 'COUNT'}, 'Type': 'GROUP'},
+            {'Priority': 3, 'RuleId': 'group-1', 'OverrideAction': {'Type': 'NONE'}, 'Type': 'GROUP'},
+            {'Priority': 4, 'RuleId': 'rule-1', 'Action': {'Type': 'BLOCK'}, 'Type': 'REGULAR'}]},
+    ]
+    # Kinds of resources associated with each Web ACL.
+    associated = {'acl-1': ["APPLICATION_LOAD_BALANCER", "API_GATEWAY", "CloudFront"], 'acl-2': ["API_GATEWAY"]}
+
+    def __init__(self, failures = None, pageSize = 100):
+        self.failures = failures or {}
+        self.pageSize = pageSize
+        self.calls = []
+        # Copied, so a test can add conditions to its own fake.
+        self.conditions = dict((conditionType, list(conditions)) for conditionType, conditions in FakeWaf.conditions.items())
+
+    def call(self, operation, kwargs = None):
+        self.calls.append((operation, kwargs or {}))
+        if operation in self.failures:
+            raise ClientError({'Error': {'Code': self.failures[operation], 'Message': operation}}, operation)
+
+    def page(self, listKey, items, kwargs):
+        limit = kwargs.get('Limit', 100)
+        assert 1 <= limit <= 100
+        start = int(kwargs.get('NextMarker', "0"))
+        end = start + min(limit, self.pageSize)
+        response = {listKey: items[start:end]}
+        if end < len(items):
+            response['NextMarker'] = str(end)
+        return (response)
+
+    def __getattr__(self, name):
+        # list_<condition type>s and get_<condition type> methods, e.g. list_ip_sets() and get_ip_set().
+        for conditionType, conditions in self.conditions.items():
+            snakeName = conditionType.replace('IPSet', 'IpSet')
+            snakeName = ''.join(['_' + c.lower() if c.isupper() else c for c in snakeName]).lstrip('_')
+            idKey = conditionType + 'Id'
+            if name == 'list_' + snakeName + 's':
+                def listConditions(**kwargs):
+                    self.call(name, kwargs)
+                    return (self.page(conditionType + 's', [{idKey: c[idKey], 'Name': c['Name']} for c in conditions], kwargs))
+                return (listConditions)
+            if name == 'get_' + snakeName:
+                def getCondition(**kwargs):
+                    self.call(name, kwargs)
+                    return ({conditionType: [c for c in conditions if c[idKey] == kwargs[idKey]][0]})
+                return (getCondition)
+        raise AttributeError(name)
+
+    def list_web_acls(self, **kwargs):
+        self.call('list_web_acls', kwargs)
+        return (self.page('WebACLs', [{'WebACLId': webAcl['WebACLId'], 'Name': webAcl['Name']} for webAcl in self.webAcls], kwargs))
+
+    def get_web_acl(self, WebACLId):
+        self.call('get_web_acl', {'WebACLId': WebACLId})
+        return ({'WebACL': [webAcl for webAcl in self.webAcls if webAcl['WebACLId'] == WebACLId][0]})
+
+    def get_rule(self, RuleId):
+        self.call('get_rule', {'RuleId': RuleId})
+        return ({'Rule': self.rules[RuleId]})
+
+    def get_rate_based_rule(self, RuleId):
+        self.call('get_rate_based_rule', {'RuleId': RuleId})
+        return ({'Rule': self.rateRules[RuleId]})
+
+    def get_rule_group(self, RuleGroupId):
+        self.call('get_rule_group', {'RuleGroupId': RuleGroupId})
+        group = self.ruleGroups[RuleGroupId]
+        return ({'RuleGroup': {'RuleGroupId': RuleGroupId, 'Name': group['Name'], 'MetricName': group['MetricName']}})
+
+    def list_activated_rules_in_rule_group(self, RuleGroupId, **kwargs):
+        self.call('list_activated_rules_in_rule_group', dict(kwargs, RuleGroupId = RuleGroupId))
+        activatedRules = [dict(activatedRule, RuleGroupId = RuleGroupId) for activatedRule in self.ruleGroups[RuleGroupId]['ActivatedRules']]
+        return (self.page('ActivatedRules', activatedRules, kwargs))
+
+    def list_resources_for_web_acl(self, WebACLId, ResourceType):
+        self.call('list_resources_for_web_acl', {'WebACLId': WebACLId, 'ResourceType': ResourceType})
+        if ResourceType in self.associated[WebACLId]:
+            return ({'ResourceArns': ['arn:aws:' + ResourceType.lower()]})
+        return ({'ResourceArns': []})
+
+    def list_distributions_by_web_acl_id(self, WebACLId, **kwargs):
+        self.call('list_distributions_by_web_acl_id', dict(kwargs, WebACLId = WebACLId))
+        return ({'DistributionList': {'Quantity': self.associated[WebACLId].count("CloudFront")}})
@@ -0,0 +1,516 @@
+provider "aws" {
+  region = "us-east-1"
+}
+
+resource "aws_waf_byte_match_set" "byte_match_set_0" {
+  name = "bad-agents"
+
+  byte_match_tuples {
+    text_transformation   = "LOWERCASE"
+    target_string         = "badbot"
+    positional_constraint = "CONTAINS"
+
+    field_to_match {
+      type = "HEADER"
+      data = "user-agent"
+    }
+  }
+
+  byte_match_tuples {
+    text_transformation   = "NONE"
+    target_string         = "/admin"
+    positional_constraint = "STARTS_WITH"
+
+    field_to_match {
+      type = "URI"
+    }
+  }
+}
+
+resource "aws_waf_regex_pattern_set" "regex_pattern_set_0" {
+  name                  = "digits"
+  regex_pattern_strings = [ "\\d+", "token" ]
+}
+
+resource "aws_waf_regex_match_set" "regex_match_set_0" {
+  name = "query-ids"
+
+  regex_match_tuple {
+    field_to_match {
+      type = "QUERY_STRING"
+    }
+
+    text_transformation   = "URL_DECODE"
+    regex_pattern_set_id  = "${aws_waf_regex_pattern_set.regex_pattern_set_0.id}"
+  }
+}
+
+resource "aws_waf_sql_injection_match_set" "sql_injection_match_set_0" {
+  name = "sqli-body"
+
+  sql_injection_match_tuples {
+    text_transformation   = "HTML_ENTITY_DECODE"
+    field_to_match {
+      type = "BODY"
+    }
+  }
+}
+
+resource "aws_waf_size_constraint_set" "size_constraint_set_0" {
+  name = "big-body"
+
+  size_constraints {
+    text_transformation = "NONE"
+    comparison_operator = "GT"
+    size                = "8192"
+
+    field_to_match {
+      type = "BODY"
+    }
+  }
+}
+
+resource "aws_waf_ipset" "ipset_0" {
+  name = "blocked-ips"
+
+  ip_set_descriptors {
+    type  = "IPV4"
+    value = "192.0.2.0/24"
+  }
+
+  ip_set_descriptors {
+    type  = "IPV6"
+    value = "2001:db8::/32"
+  }
+}
+
+resource "aws_waf_geo_match_set" "geo_match_set_0" {
+  name = "countries"
+
+  geo_match_constraint {
+    type  = "Country"
+    value = "FR"
+  }
+
+  geo_match_constraint {
+    type  = "Country"
+    value = "US"
+  }
+}
+
+resource "aws_waf_xss_match_set" "xss_match_set_0" {
+  name = "xss-query"
+
+  xss_match_tuples {
+    text_transformation   = "URL_DECODE"
+    field_to_match {
+      type = "QUERY_STRING"
+    }
+  }
+}
+
+resource "aws_waf_rule" "rule_0" {
+  name        = "block-agents"
+  metric_name = "blockAgents"
+
+  predicates {
+    data_id = "${aws_waf_byte_match_set.byte_match_set_0.id}"
+    negated = false
+    type    = "ByteMatch"
+  }
+
+  predicates {
+    data_id = "${aws_waf_ipset.ipset_0.id}"
+    negated = true
+    type    = "IPMatch"
+  }
+
+  predicates {
+    data_id = "${aws_waf_geo_match_set.geo_match_set_0.id}"
+    negated = false
+    type    = "GeoMatch"
+  }
+
+}
+
+resource "aws_waf_rule" "rule_1" {
+  name        = "block-injections"
+  metric_name = "blockInjections"
+
+  predicates {
+    type    = "SqlInjectionMatch"
+    negated = false
+    data_id = "${aws_waf_sql_injection_match_set.sql_injection_match_set_0.id}"
+  }
+  predicates {
+    type    = "XssMatch"
+    negated = false
+    data_id = "${aws_waf_xss_match_set.xss_match_set_0.id}"
+  }
+}
+
+resource "aws_waf_rule" "rule_2" {
+  name        = "block-ids"
+  metric_name = "blockIds"
+
+  predicates {
+    type    = "RegexMatch"
+    negated = false
+    data_id = "${aws_waf_regex_match_set.regex_match_set_0.id}"
+  }
+  predicates {
+    type    = "SizeConstraint"
+    negated = false
+    data_id = "${aws_waf_size_constraint_set.size_constraint_set_0.id}"
+  }
+}
+
+resource "aws_waf_rule_group" "rule_group_1" {
+  name        = "injections"
+  metric_name = "injections"
+
+  activated_rule {
+    action {
+      type = "BLOCK"
+    }
+
+    priority = 1
+    rule_id  = "${aws_waf_rule.rule_1.id}"
+  }
+
+  activated_rule {
+    action {
+      type = "COUNT"
+    }
+
+    priority = 2
+    rule_id  = "${aws_waf_rule.rule_2.id}"
+  }
+
+}
+
+resource "aws_waf_rate_based_rule" "rule_4" {
+  name        = "rate-limit"
+  metric_name = "rateLimit"
+
+  rate_key    = "IP"
+  rate_limit  = 2000
+
+  predicates {
+    data_id = "${aws_waf_ipset.ipset_0.id}"
+    negated = false
+    type    = "IPMatch"
+  }
+
+}
+
+resource "aws_vpc" "waferVPC_0" {
+  cidr_block = "10.10.0.0/16"
+
+  tags = {
+    Name = "WAFER"
+  }
+}
+
+resource "aws_subnet" "waferSubnet1_0" {
+  vpc_id            = "${aws_vpc.waferVPC_0.id}"
+  availability_zone = "us-east-1a"
+  cidr_block        = "10.10.1.0/24"
+
+  tags = {
+    Name = "WAFER"
+  }
+}
+
+resource "aws_subnet" "waferSubnet2_0" {
+  vpc_id            = "${aws_vpc.waferVPC_0.id}"
+  availability_zone = "us-east-1b"
+  cidr_block        = "10.10.2.0/24"
+
+  tags = {
+    Name = "WAFER"
+  }
+}
+
+resource "aws_internet_gateway" "waferIGW_0" {
+  vpc_id = "${aws_vpc.waferVPC_0.id}"
+
+  tags = {
+    Name = "WAFER"
+  }
+}
+
+resource "aws_route_table" "waferRT_0" {
+  vpc_id     = "${aws_vpc.waferVPC_0.id}"
+
+  route {
+    cidr_block = "0.0.0.0/0"
+    gateway_id = "${aws_internet_gateway.waferIGW_0.id}"
+  }
+
+  tags = {
+    Name = "WAFER"
+  }
+}
+
+resource "aws_route_table_association" "waferRTAssociation1_0" {
+  subnet_id      = "${aws_subnet.waferSubnet1_0.id}"
+  route_table_id = "${aws_route_table.waferRT_0.id}"
+}
+
+resource "aws_route_table_association" "waferRTAssociation2_0" {
+  subnet_id      = "${aws_subnet.waferSubnet2_0.id}"
+  route_table_id = "${aws_route_table.waferRT_0.id}"
+}
+
+resource "aws_security_group" "waferALBSG_0" {
+  name        = "waferALBSG"
+  description = "Allow HTTP inbound traffic"
+  vpc_id      = "${aws_vpc.waferVPC_0.id}"
+  ingress {
+    from_port   = 80
+    to_port     = 80
+    protocol    = "tcp"
+    cidr_blocks = [ "0.0.0.0/0" ]
+  }
+
+  egress {
+    from_port   = 0
+    to_port     = 0
+    protocol    = "-1"
+    cidr_blocks = [ "0.0.0.0/0" ]
+  }
+
+  tags = {
+     Name = "WAFER"
+  }
+}
+
+resource "aws_lb" "waferALB_0" {
+  name               = "waferALB-0"
+  internal           = false
+  load_balancer_type = "application"
+  security_groups    = ["${aws_security_group.waferALBSG_0.id}"]
+  subnets            = ["${aws_subnet.waferSubnet1_0.id}", "${aws_subnet.waferSubnet2_0.id}"]
+
+  enable_cross_zone_load_balancing = true
+
+  tags = {
+    Name = "WAFER"
+  }
+}
+
+resource "aws_lb_target_group" "waferALBTG_0" {
+  name     = "waferALBTG-0"
+  port     = 80
+  protocol = "HTTP"
+  vpc_id   = "${aws_vpc.waferVPC_0.id}"
+}
+
+resource "aws_lb_listener" "waferALBListener_0" {
+  load_balancer_arn = "${aws_lb.waferALB_0.arn}"
+  port     = "80"
+  protocol = "HTTP"
+
+  default_action {
+    type             = "forward"
+    target_group_arn = "${aws_lb_target_group.waferALBTG_0.arn}"
+  }
+}
+
+resource "aws_cloudfront_distribution" "waferCFN_0" {
+  comment    = "WAFER CloudFront Distribution"
+  enabled    = true
+  web_acl_id = "${aws_waf_web_acl.web_acl_0.id}"
+
+  origin {
+    domain_name = "${aws_lb.waferALB_0.dns_name}"
+    origin_id   = "ELB-${aws_lb.waferALB_0.name}"
+
+    custom_origin_config {
+      http_port              = 80
+      https_port             = 443
+      origin_protocol_policy = "http-only"
+      origin_ssl_protocols   = ["TLSv1", "TLSv1.1", "TLSv1.2", "SSLv3"]
+    }
+  }
+
+  default_cache_behavior {
+    allowed_methods  = ["GET", "HEAD", "OPTIONS", "PUT", "POST", "PATCH", "DELETE"]
+    cached_methods   = ["GET", "HEAD"]
+    target_origin_id = "ELB-${aws_lb.waferALB_0.name}"
+
+    forwarded_values {
+      query_string = true
+      headers      = ["*"]
+      cookies {
+        forward = "all"
+      }
+    }
+
+    viewer_protocol_policy = "allow-all"
+  }
+
+  viewer_certificate {
+    cloudfront_default_certificate = true
+  }
+
+  restrictions {
+    geo_restriction {
+      restriction_type = "none"
+    }
+  }
+}
+
+resource "aws_waf_web_acl" "web_acl_0" {
+  name        = "golden-acl"
+  metric_name = "goldenAcl"
+
+  default_action {
+    type = "ALLOW"
+  }
+
+  rules {
+    priority = 1
+    type     = "REGULAR"
+    rule_id  = "${aws_waf_rule.rule_0.id}"
+
+    action {
+      type = "BLOCK"
+    }
+  }
+
+  rules {
+    priority = 2
+    type     = "GROUP"
+    rule_id  = "${aws_waf_rule_group.rule_group_1.id}"
+
+    override_action {
+      type = "NONE"
+    }
+  }
+
+  rules {
+    priority = 3
+    type     = "RATE_BASED"
+    rule_id  = "${aws_waf_rate_based_rule.rule_4.id}"
+
+    action {
+      type = "COUNT"
+    }
+  }
+
+}
+
+output "Web_ACL_Name_0" {
+  description = "Please refer to this Web ACL"
+  value       = "golden-acl"
+}
+
+output "ALB_DNS_Name_0" {
+  description = "ALB DNS Name"
+  value       = aws_lb.waferALB_0.dns_name
+}
+
+output "CloudFront_Distribution_Domain_Name_0" {
+  description = "CloudFront Distribution Name"
+  value       = aws_cloudfront_distribution.waferCFN_0.domain_name
+}
+
+resource "aws_waf_rule" "rule_5" {
+  name        = "allow-office"
+  metric_name = "allowOffice"
+
+  predicates {
+    data_id = "${aws_waf_ipset.ipset_0.id}"
+    negated = false
+    type    = "IPMatch"
+  }
+
+  predicates {
+    data_id = "${aws_waf_byte_match_set.byte_match_set_0.id}"
+    negated = true
+    type    = "ByteMatch"
+  }
+
+}
+
+resource "aws_waf_rule_group" "rule_group_2" {
+  name        = "office"
+  metric_name = "office"
+
+  activated_rule {
+    action {
+      type = "ALLOW"
+    }
+
+    priority = 1
+    rule_id  = "${aws_waf_rule.rule_5.id}"
+  }
+
+  activated_rule {
+    action {
+      type = "BLOCK"
+    }
+
+    priority = 2
+    rule_id  = "${aws_waf_rule.rule_1.id}"
+  }
+
+}
+
+resource "aws_waf_web_acl" "web_acl_1" {
+  name        = "second-acl"
+  metric_name = "secondAcl"
+
+  default_action {
+    type = "BLOCK"
+  }
+
+  rules {
+    priority = 1
+    type     = "REGULAR"
+    rule_id  = "${aws_waf_rule.rule_5.id}"
+
+    action {
+      type = "ALLOW"
+    }
+  }
+
+  rules {
+    priority = 2
+    type     = "GROUP"
+    rule_id  = "${aws_waf_rule_group.rule_group_2.id}"
+
+    override_action {
+      type = "COUNT"
+    }
+  }
+
+  rules {
+    priority = 3
+    type     = "GROUP"
+    rule_id  = "${aws_waf_rule_group.rule_group_1.id}"
+
+    override_action {
+      type = "NONE"
+    }
+  }
+
+  rules {
+    priority = 4
+    type     = "REGULAR"
+    rule_id  = "${aws_waf_rule.rule_0.id}"
+
+    action {
+      type = "BLOCK"
+    }
+  }
+
+}
+
+output "Web_ACL_Name_1" {
+  description = "Please refer to this Web ACL"
+  value       = "second-acl"
+}
+
@@ -0,0 +1,423 @@
+provider "aws" {
+  region = "eu-west-1"
+}
+
+resource "aws_wafregional_byte_match_set" "byte_match_set_0" {
+  name = "bad-agents"
+
+  byte_match_tuples {
+    text_transformation   = "LOWERCASE"
+    target_string         = "badbot"
+    positional_constraint = "CONTAINS"
+
+    field_to_match {
+      type = "HEADER"
+      data = "user-agent"
+    }
+  }
+
+  byte_match_tuples {
+    text_transformation   = "NONE"
+    target_string         = "/admin"
+    positional_constraint = "STARTS_WITH"
+
+    field_to_match {
+      type = "URI"
+    }
+  }
+}
+
+resource "aws_wafregional_regex_pattern_set" "regex_pattern_set_0" {
+  name                  = "digits"
+  regex_pattern_strings = [ "\\d+", "token" ]
+}
+
+resource "aws_wafregional_regex_match_set" "regex_match_set_0" {
+  name = "query-ids"
+
+  regex_match_tuple {
+    field_to_match {
+      type = "QUERY_STRING"
+    }
+
+    text_transformation   = "URL_DECODE"
+    regex_pattern_set_id  = "${aws_wafregional_regex_pattern_set.regex_pattern_set_0.id}"
+  }
+}
+
+resource "aws_wafregional_sql_injection_match_set" "sql_injection_match_set_0" {
+  name = "sqli-body"
+
+  sql_injection_match_tuple {
+    text_transformation   = "HTML_ENTITY_DECODE"
+    field_to_match {
+      type = "BODY"
+    }
+  }
+}
+
+resource "aws_wafregional_size_constraint_set" "size_constraint_set_0" {
+  name = "big-body"
+
+  size_constraints {
+    text_transformation = "NONE"
+    comparison_operator = "GT"
+    size                = "8192"
+
+    field_to_match {
+      type = "BODY"
+    }
+  }
+}
+
+resource "aws_wafregional_ipset" "ipset_0" {
+  name = "blocked-ips"
+
+  ip_set_descriptor {
+    type  = "IPV4"
+    value = "192.0.2.0/24"
+  }
+
+  ip_set_descriptor {
+    type  = "IPV6"
+    value = "2001:db8::/32"
+  }
+}
+
+resource "aws_wafregional_geo_match_set" "geo_match_set_0" {
+  name = "countries"
+
+  geo_match_constraint {
+    type  = "Country"
+    value = "FR"
+  }
+
+  geo_match_constraint {
+    type  = "Country"
+    value = "US"
+  }
+}
+
+resource "aws_wafregional_xss_match_set" "xss_match_set_0" {
+  name = "xss-query"
+
+  xss_match_tuple {
+    text_transformation   = "URL_DECODE"
+    field_to_match {
+      type = "QUERY_STRING"
+    }
+  }
+}
+
+resource "aws_wafregional_rule" "rule_0" {
+  name        = "block-agents"
+  metric_name = "blockAgents"
+
+  predicate {
+    data_id = "${aws_wafregional_byte_match_set.byte_match_set_0.id}"
+    negated = false
+    type    = "ByteMatch"
+  }
+
+  predicate {
+    data_id = "${aws_wafregional_ipset.ipset_0.id}"
+    negated = true
+    type    = "IPMatch"
+  }
+
+  predicate {
+    data_id = "${aws_wafregional_geo_match_set.geo_match_set_0.id}"
+    negated = false
+    type    = "GeoMatch"
+  }
+
+}
+
+resource "aws_wafregional_rule" "rule_1" {
+  name        = "block-injections"
+  metric_name = "blockInjections"
+
+  predicate {
+    type    = "SqlInjectionMatch"
+    negated = false
+    data_id = "${aws_wafregional_sql_injection_match_set.sql_injection_match_set_0.id}"
+  }
+  predicate {
+    type    = "XssMatch"
+    negated = false
+    data_id = "${aws_wafregional_xss_match_set.xss_match_set_0.id}"
+  }
+}
+
+resource "aws_wafregional_rule" "rule_2" {
+  name        = "block-ids"
+  metric_name = "blockIds"
+
+  predicate {
+    type    = "RegexMatch"
+    negated = false
+    data_id = "${aws_wafregional_regex_match_set.regex_match_set_0.id}"
+  }
+  predicate {
+    type    = "SizeConstraint"
+    negated = false
+    data_id = "${aws_wafregional_size_constraint_set.size_constraint_set_0.id}"
+  }
+}
+
+resource "aws_wafregional_rule_group" "rule_group_1" {
+  name        = "injections"
+  metric_name = "injections"
+
+  activated_rule {
+    action {
+      type = "BLOCK"
+    }
+
+    priority = 1
+    rule_id  = "${aws_wafregional_rule.rule_1.id}"
+  }
+
+  activated_rule {
+    action {
+      type = "COUNT"
+    }
+
+    priority = 2
+    rule_id  = "${aws_wafregional_rule.rule_2.id}"
+  }
+
+}
+
+resource "aws_wafregional_rate_based_rule" "rule_4" {
+  name        = "rate-limit"
+  metric_name = "rateLimit"
+
+  rate_key    = "IP"
+  rate_limit  = 2000
+
+  predicate {
+    data_id = "${aws_wafregional_ipset.ipset_0.id}"
+    negated = false
+    type    = "IPMatch"
+  }
+
+}
+
+resource "aws_vpc" "waferVPC" {
+  cidr_block = "10.10.0.0/16"
+
+  tags = {
+    Name = "WAFER"
+  }
+}
+
+resource "aws_subnet" "waferSubnet1" {
+  vpc_id            = "${aws_vpc.waferVPC.id}"
+  availability_zone = "eu-west-1a"
+  cidr_block        = "10.10.1.0/24"
+
+  tags = {
+    Name = "WAFER"
+  }
+}
+
+resource "aws_subnet" "waferSubnet2" {
+  vpc_id            = "${aws_vpc.waferVPC.id}"
+  availability_zone = "eu-west-1b"
+  cidr_block        = "10.10.2.0/24"
+
+  tags = {
+    Name = "WAFER"
+  }
+}
+
+resource "aws_internet_gateway" "waferIGW" {
+  vpc_id = "${aws_vpc.waferVPC.id}"
+
+  tags = {
+    Name = "WAFER"
+  }
+}
+
+resource "aws_route_table" "waferRT" {
+  vpc_id     = "${aws_vpc.waferVPC.id}"
+
+  route {
+    cidr_block = "0.0.0.0/0"
+    gateway_id = "${aws_internet_gateway.waferIGW.id}"
+  }
+
+  tags = {
+    Name = "WAFER"
+  }
+}
+
+resource "aws_route_table_association" "waferRTAssociation1" {
+  subnet_id      = "${aws_subnet.waferSubnet1.id}"
+  route_table_id = "${aws_route_table.waferRT.id}"
+}
+
+resource "aws_route_table_association" "waferRTAssociation2" {
+  subnet_id      = "${aws_subnet.waferSubnet2.id}"
+  route_table_id = "${aws_route_table.waferRT.id}"
+}
+
+resource "aws_security_group" "waferALBSG" {
+  name        = "waferALBSG"
+  description = "Allow HTTP inbound traffic"
+  vpc_id      = "${aws_vpc.waferVPC.id}"
+  ingress {
+    from_port   = 80
+    to_port     = 80
+    protocol    = "tcp"
+    cidr_blocks = [ "0.0.0.0/0" ]
+  }
+
+  egress {
+    from_port   = 0
+    to_port     = 0
+    protocol    = "-1"
+    cidr_blocks = [ "0.0.0.0/0" ]
+  }
+
+  tags = {
+     Name = "WAFER"
+  }
+}
+
+resource "aws_lb" "waferALB" {
+  name               = "waferALB"
+  internal           = false
+  load_balancer_type = "application"
+  security_groups    = ["${aws_security_group.waferALBSG.id}"]
+  subnets            = ["${aws_subnet.waferSubnet1.id}", "${aws_subnet.waferSubnet2.id}"]
+
+  enable_cross_zone_load_balancing = true
+
+  tags = {
+    Name = "WAFER"
+  }
+}
+
+resource "aws_lb_target_group" "waferALBTG" {
+  name     = "waferALBTG"
+  port     = 80
+  protocol = "HTTP"
+  vpc_id   = "${aws_vpc.waferVPC.id}"
+}
+
+resource "aws_lb_listener" "waferALBListener" {
+  load_balancer_arn = "${aws_lb.waferALB.arn}"
+  port     = "80"
+  protocol = "HTTP"
+
+  default_action {
+    type             = "forward"
+    target_group_arn = "${aws_lb_target_group.waferALBTG.arn}"
+  }
+}
+
+resource "aws_api_gateway_rest_api" "waferAPI" {
+  name        = "waferAPI"
+  description = "WAFER API"
+}
+
+resource "aws_api_gateway_resource" "waferAPIResource" {
+  rest_api_id = "${aws_api_gateway_rest_api.waferAPI.id}"
+  parent_id   = "${aws_api_gateway_rest_api.waferAPI.root_resource_id}"
+  path_part   = "WAFER"
+}
+
+resource "aws_api_gateway_method" "waferMethod" {
+  rest_api_id   = "${aws_api_gateway_rest_api.waferAPI.id}"
+  resource_id   = "${aws_api_gateway_resource.waferAPIResource.id}"
+  http_method   = "GET"
+  authorization = "NONE"
+}
+
+resource "aws_api_gateway_deployment" "waferDeployment" {
+  depends_on  = ["aws_api_gateway_integration.waferIntegration"]
+  rest_api_id = "${aws_api_gateway_rest_api.waferAPI.id}"
+  stage_name  = "test"
+}
+
+resource "aws_api_gateway_stage" "waferStage" {
+  stage_name    = "waferStage"
+  rest_api_id   = "${aws_api_gateway_rest_api.waferAPI.id}"
+  deployment_id = "${aws_api_gateway_deployment.waferDeployment.id}"
+}
+
+resource "aws_api_gateway_integration" "waferIntegration" {
+  rest_api_id             = "${aws_api_gateway_rest_api.waferAPI.id}"
+  resource_id             = "${aws_api_gateway_resource.waferAPIResource.id}"
+  http_method             = "${aws_api_gateway_method.waferMethod.http_method}"
+  integration_http_method = "GET"
+  type                    = "MOCK"
+}
+
+resource "aws_wafregional_web_acl" "web_acl" {
+  name        = "golden-acl"
+  metric_name = "goldenAcl"
+
+  default_action {
+    type = "ALLOW"
+  }
+
+  rule {
+    priority = 1
+    type     = "REGULAR"
+    rule_id  = "${aws_wafregional_rule.rule_0.id}"
+
+    action {
+      type = "BLOCK"
+    }
+  }
+
+  rule {
+    priority = 2
+    type     = "GROUP"
+    rule_id  = "${aws_wafregional_rule_group.rule_group_1.id}"
+
+    override_action {
+      type = "NONE"
+    }
+  }
+
+  rule {
+    priority = 3
+    type     = "RATE_BASED"
+    rule_id  = "${aws_wafregional_rate_based_rule.rule_4.id}"
+
+    action {
+      type = "COUNT"
+    }
+  }
+
+}
+
+resource "aws_wafregional_web_acl_association" "web_acl_association_0" {
+  web_acl_id   = "${aws_wafregional_web_acl.web_acl.id}"
+  resource_arn = "arn:aws:apigateway:eu-west-1::/restapis/${aws_api_gateway_rest_api.waferAPI.id}/stages/waferStage"
+}
+
+resource "aws_wafregional_web_acl_association" "web_acl_association_1" {
+  web_acl_id   = "${aws_wafregional_web_acl.web_acl.id}"
+  resource_arn = "arn:aws:apigateway:eu-west-1::/restapis/${aws_api_gateway_rest_api.waferAPI.id}/stages/waferStage"
+}
+
+output "Web_ACL_Name" {
+  description = "Please refer to this Web ACL"
+  value       = "golden-acl"
+}
+
+output "ALB_DNS_Name" {
+  description = "ALB DNS Name"
+  value       = aws_lb.waferALB.dns_name
+}
+
+output "API_Gateway_Invoke_URL" {
+  description = "API Gateway Invoke URL"
+  value       = aws_api_gateway_stage.waferStage.invoke_url
+}
+
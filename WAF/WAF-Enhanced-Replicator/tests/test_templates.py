@@ -0,0 +1,54 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Golden tests for the templates: a fake Web ACL using every condition type is crawled and written through both the HCL
+and the Terraform JSON writers, for global WAF and for WAF regional, and compared with the files in tests/golden.
+Run with WAFER_UPDATE_GOLDEN=1 to rewrite the golden files after an intended change of the templates.
+"""
+import sys
+import os
+import io
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+import wafget as get
+import wafemit as emit
+from conftest import FakeWaf, assertMatchesGolden
+
+
+def render(isRegional, outputFormat):
+    fake = FakeWaf()
+    region = "us-east-1"
+    if isRegional:
+        region = "eu-west-1"
+        crawl = get.crawlScope(fake, None, True, ['acl-1'], {})
+    else:
+        crawl = get.crawlScope(fake, fake, False, ['acl-1'], {})
+    template = io.StringIO()
+    emit.writeTemplate(template, get.templateBlocks(crawl, region, isRegional, io.StringIO(), False), outputFormat)
+    return (template.getvalue())
+
+
+@pytest.mark.parametrize('isRegional, outputFormat, goldenName', [
+    (False, 'hcl', 'global.tf'),
+    (False, 'json', 'global.tf.json'),
+    (True, 'hcl', 'regional.tf'),
+    (True, 'json', 'regional.tf.json'),
+])
+def test_template_matches_golden(isRegional, outputFormat, goldenName):
+    """The template of the fake Web ACL is written exactly as in the golden file."""
+    assertMatchesGolden(render(isRegional, outputFormat), goldenName)
+
+
+@pytest.mark.parametrize('isRegional', [False, True])
+def test_golden_covers_every_condition_type(isRegional):
+    """Every condition type in use is written, and the unused IP set is left out."""
+    rendered = render(isRegional, 'hcl')
+    suffix = "regional_" if isRegional else "_"
+    for resourceType in ["byte_match_set", "regex_pattern_set", "regex_match_set", "sql_injection_match_set",
+                         "size_constraint_set", "ipset", "geo_match_set", "xss_match_set",
+                         "rule", "rate_based_rule", "rule_group", "web_acl"]:
+        assert 'resource "aws_waf' + suffix + resourceType + '"' in rendered
+    assert "unused-ips" not in rendered
@@ -0,0 +1,192 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Tests for the ThrottledClient retries and statistics.
+The clock of waffun is replaced by a fake one, so the backoff and token bucket waits do not sleep.
+"""
+import sys
+import os
+import threading
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+from botocore.exceptions import ClientError
+
+import waffun as function
+
+
+class FakeClock:
+    """Stands in for the time module of waffun, recording the sleeps instead of sleeping."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        # Like a real clock, it always moves forward, even when a token bucket wait is below its precision.
+        self.sleeps.append(seconds)
+        self.now += max(seconds, 0.000001)
+
+
+class FakeEvent:
+    """Stands in for the cancelled event of a ThrottledClient, so the backoff waits go through the fake clock."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.flag = False
+
+    def set(self):
+        self.flag = True
+
+    def is_set(self):
+        return self.flag
+
+    def wait(self, timeout):
+        self.clock.sleep(timeout)
+        return self.flag
+
+
+class FakeApiCall:
+    """Boto3 method returning (or raising) the provided outcomes, one per call."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def __call__(self, **kwargs):
+        outcome = self.outcomes[min(self.calls, len(self.outcomes) - 1)]
+        self.calls += 1
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def client_error(code):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, 'GetRule')
+
+
+def throttled_client(clock):
+    client = function.ThrottledClient(object())
+    client.cancelled = FakeEvent(clock)
+    return client
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(function, 'time', fake)
+    return fake
+
+
+@pytest.fixture
+def long_backoff(monkeypatch):
+    """Makes every retry wait apiBackoffCap seconds."""
+    monkeypatch.setattr(function, 'apiBackoffBase', function.apiBackoffCap)
+    monkeypatch.setattr(function.random, 'uniform', lambda low, high: high)
+
+
+class TestThrottledClient:
+    """Tests for ThrottledClient.call()."""
+
+    def test_throttled_calls_are_retried_and_halve_the_rate(self, clock):
+        """Each throttle halves the rate; the success after them adds apiRateIncrease back."""
+        client = throttled_client(clock)
+        apiCall = FakeApiCall([client_error('WAFLimitsExceededException'), client_error('ThrottlingException'), {'Rule': {}}])
+
+        assert client.call('get_rule', apiCall, {'RuleId': 'r1'}) == {'Rule': {}}
+        assert apiCall.calls == 3
+        assert client.throttled
+        assert client.rate == function.apiInitialRate / 4 + function.apiRateIncrease
+        assert client.statistics['get_rule'][:3] == [3, 2, 0]
+        assert len(clock.sleeps) > 0
+
+    def test_non_retriable_error_is_recorded_and_raised(self, clock):
+        """An error that is neither a throttle nor transient fails the call at once, but still counts in the statistics."""
+        client = throttled_client(clock)
+        apiCall = FakeApiCall([client_error('WAFNonexistentItemException')])
+
+        with pytest.raises(ClientError):
+            client.call('get_rule', apiCall, {'RuleId': 'r1'})
+        assert apiCall.calls == 1
+        assert client.rate == function.apiInitialRate
+        assert client.statistics['get_rule'][:3] == [1, 0, 1]
+        assert clock.sleeps == []
+
+    def test_gives_up_after_max_attempts(self, clock):
+        """A call that keeps failing with a transient error is raised after apiMaxAttempts attempts."""
+        client = throttled_client(clock)
+        apiCall = FakeApiCall([client_error('WAFInternalErrorException')])
+
+        with pytest.raises(ClientError):
+            client.call('get_rule', apiCall, {'RuleId': 'r1'})
+        assert apiCall.calls == function.apiMaxAttempts
+        assert not client.throttled
+        assert client.rate == function.apiInitialRate
+        assert client.statistics['get_rule'][:3] == [function.apiMaxAttempts, 0, function.apiMaxAttempts]
+        assert len(clock.sleeps) == function.apiMaxAttempts - 1
+
+    def test_cancel_during_backoff_raises_at_once(self, long_backoff):
+        """A call waiting to be retried fails with an ApiCallError as soon as its client is cancelled."""
+        client = function.ThrottledClient(object())
+        apiCall = FakeApiCall([client_error('ThrottlingException')])
+        errors = []
+
+        def call():
+            try:
+                client.call('get_rule', apiCall, {'RuleId': 'r1'})
+            except function.ApiCallError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=call)
+        thread.start()
+        while apiCall.calls == 0:
+            time.sleep(0.01)
+        start = time.time()
+        client.cancel()
+        thread.join(function.apiBackoffCap)
+        assert not thread.is_alive()
+        assert time.time() - start < 2
+        assert [e.apiCall for e in errors] == ['get_rule()']
+        assert apiCall.calls == 1
+
+
+class FakeBotoClient:
+    """Boto3 client whose get_rule is throttled forever and whose get_ip_set is denied."""
+
+    def __init__(self):
+        self.calls = []
+
+    def get_rule(self, **kwargs):
+        self.calls.append('get_rule')
+        raise client_error('ThrottlingException')
+
+    def get_ip_set(self, **kwargs):
+        self.calls.append('get_ip_set')
+        time.sleep(0.05)
+        raise client_error('AccessDeniedException')
+
+
+class TestFetchConcurrently:
+    """Tests for fetchConcurrently() failures."""
+
+    def test_failure_cancels_the_clients_of_the_other_calls(self, long_backoff):
+        """The first failed call is raised without waiting for the retries of the calls listed before it."""
+        botoClient = FakeBotoClient()
+        client = function.ThrottledClient(botoClient)
+        calls = {
+            'rule': ["get_rule()", client.get_rule, {'RuleId': 'r1'}],
+            'ipSet': ["get_ip_set()", client.get_ip_set, {'IPSetId': 'ip1'}],
+        }
+
+        start = time.time()
+        with pytest.raises(function.ApiCallError) as raised:
+            function.fetchConcurrently(calls)
+        assert raised.value.apiCall == "get_ip_set()"
+        assert time.time() - start < 2
+        assert client.cancelled.is_set()
+        assert botoClient.calls.count('get_rule') == 1
@@ -0,0 +1,156 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Tests for getAllWafs() (--all): the batch templates of two Web ACLs sharing a rule group, a rule and conditions are
+compared with the files in tests/golden, one template per Web ACL is checked for --zip-per-acl, and a failing
+scope is checked to abort the run once the other scopes are cancelled.
+Also tests the crawl of one scope: the List APIs are read page by page, only the conditions in use are fetched, and
+each resource is fetched once.
+"""
+import sys
+import os
+import io
+import glob
+import threading
+import time
+import zipfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+import waffun as function
+import wafget as get
+import wafemit as emit
+from conftest import FakeWaf, assertMatchesGolden, goldenDir
+
+
+@pytest.fixture
+def wafer(monkeypatch, tmp_path):
+    """Points WAFER at a temporary home directory and at the fake WAF clients of each scope, which the test can replace."""
+    monkeypatch.setenv('HOME', str(tmp_path))
+    fakes = {'global': FakeWaf(), 'eu-west-1': FakeWaf()}
+    clients = []
+
+    def getWafClient(serviceName, region = None):
+        client = function.ThrottledClient(fakes[region or "global"])
+        clients.append(client)
+        return (client)
+
+    monkeypatch.setattr(function, 'getWafClient', getWafClient)
+    return ({'home': os.path.join(str(tmp_path), '.wafer'), 'fakes': fakes, 'clients': clients})
+
+
+def templateOf(wafer, label):
+    templates = glob.glob(os.path.join(wafer['home'], 'templates', 'wafer-tf-*-' + label + '.tf*'))
+    assert len(templates) == 1
+    with open(templates[0]) as template:
+        return (template.read())
+
+
+@pytest.mark.parametrize('outputFormat, extension', [('hcl', '.tf'), ('json', '.tf.json')])
+def test_all_web_acls_match_golden(wafer, outputFormat, extension):
+    """Each scope gets one template where the shared rule group, rules and conditions are written once."""
+    get.getAllWafs([3, ["global", "eu-west-1"], "", outputFormat, False])
+
+    for scope in ["global", "eu-west-1"]:
+        assertMatchesGolden(templateOf(wafer, scope), 'all-' + scope + extension)
+    packages = glob.glob(os.path.join(wafer['home'], 'wafer-pkg-*.zip'))
+    assert len(packages) == 1
+    assert len(zipfile.ZipFile(packages[0]).namelist()) == 3
+
+
+def test_all_web_acls_write_shared_resources_once(wafer):
+    """The batch template suffixes the per Web ACL resources with the Web ACL's position and names rule groups uniquely."""
+    get.getAllWafs([3, ["eu-west-1"], "", "hcl", False])
+
+    rendered = templateOf(wafer, "eu-west-1")
+    for resource in ['"aws_wafregional_web_acl" "web_acl_0"', '"aws_wafregional_web_acl" "web_acl_1"',
+                     '"aws_lb" "waferALB_0"', '"aws_api_gateway_rest_api" "waferAPI_1"',
+                     '"aws_wafregional_rule_group" "rule_group_1"', '"aws_wafregional_rule_group" "rule_group_2"']:
+        assert rendered.count('resource ' + resource) == 1
+    assert rendered.count('resource "aws_wafregional_ipset"') == 1
+    assert rendered.count('name        = "block-injections"') == 1
+    assert '"aws_lb" "waferALB_1"' not in rendered
+
+
+def test_zip_per_acl(wafer):
+    """With --zip-per-acl, each Web ACL gets its own template, written as when it is replicated alone, and zip file."""
+    get.getAllWafs([3, ["global"], "", "hcl", True])
+
+    with open(os.path.join(goldenDir, 'global.tf')) as golden:
+        assert templateOf(wafer, "global-acl-1") == golden.read()
+    assert 'resource "aws_waf_web_acl" "web_acl"' in templateOf(wafer, "global-acl-2")
+    packages = sorted(glob.glob(os.path.join(wafer['home'], 'wafer-pkg-*.zip')))
+    assert [package.rsplit("-", 2)[-2:] for package in packages] == [["acl", "1.zip"], ["acl", "2.zip"]]
+    for package in packages:
+        names = zipfile.ZipFile(package).namelist()
+        assert len(names) == 2
+        assert any(name.endswith(".log") for name in names)
+
+
+def test_failed_scope_cancels_the_other_scopes(wafer, monkeypatch):
+    """A failed call aborts the run from the main thread, without waiting for the retries of the other scopes."""
+    monkeypatch.setattr(function, 'apiBackoffBase', function.apiBackoffCap)
+    monkeypatch.setattr(function.random, 'uniform', lambda low, high: high)
+    wafer['fakes']['global'] = FakeWaf({'list_web_acls': 'WAFLimitsExceededException'})
+    wafer['fakes']['eu-west-1'] = FakeWaf({'get_rule': 'AccessDeniedException'})
+    threads = threading.active_count()
+
+    start = time.time()
+    with pytest.raises(SystemExit):
+        get.getAllWafs([3, ["global", "eu-west-1"], "", "hcl", False])
+    assert time.time() - start < 5
+    assert all(client.cancelled.is_set() for client in wafer['clients'])
+    assert threading.active_count() == threads
+    with open(glob.glob(os.path.join(wafer['home'], 'logs', '*.log'))[0]) as log:
+        lines = log.read().splitlines()
+    assert lines[-2].endswith("*** Failure on making API call: get_rule()! ***")
+    assert lines[-1].endswith("End of Log.")
+    assert glob.glob(os.path.join(wafer['home'], 'templates', '*')) == []
+
+
+def test_conditions_are_listed_page_by_page():
+    """Conditions listed after the first page are written, and the conditions no rule uses are never fetched."""
+    fake = FakeWaf(pageSize = 2)
+    unusedIpSets = [{'IPSetId': 'ip-unused-' + str(i), 'Name': 'unused-' + str(i), 'IPSetDescriptors': []} for i in range(5)]
+    fake.conditions['IPSet'] = unusedIpSets + fake.conditions['IPSet']
+    fake.conditions['XssMatchSet'] = [{'XssMatchSetId': 'xss-unused', 'Name': 'unused-xss', 'XssMatchTuples': []}] * 3 + fake.conditions['XssMatchSet']
+
+    crawl = get.crawlScope(fake, fake, False, ['acl-1'], {})
+    template = io.StringIO()
+    emit.writeTemplate(template, get.templateBlocks(crawl, "us-east-1", False, io.StringIO(), False), "hcl")
+    rendered = template.getvalue()
+
+    assert 'resource "aws_waf_ipset" "ipset_0"' in rendered
+    assert 'name = "blocked-ips"' in rendered
+    assert 'name = "xss-query"' in rendered
+    assert "unused" not in rendered
+    ipSetPages = [kwargs.get('NextMarker') for operation, kwargs in fake.calls if operation == 'list_ip_sets']
+    assert ipSetPages == [None, "2", "4", "6"]
+    fetched = [list(kwargs.values())[0] for operation, kwargs in fake.calls if operation.startswith("get_") and operation.endswith("_set")]
+    assert sorted(fetched) == ["byte-1", "geo-1", "ip-1", "pattern-1", "regex-1", "size-1", "sql-1", "xss-1"]
+
+
+def test_each_resource_is_fetched_once():
+    """Rules activated by several rule groups and conditions used by several rules are fetched once, and not again from the cache."""
+    fake = FakeWaf()
+    cache = {}
+
+    get.crawlScope(fake, fake, False, ['acl-1', 'acl-2'], cache)
+    fetched = {}
+    for operation, kwargs in fake.calls:
+        if operation.startswith("get_"):
+            fetched.setdefault(operation, []).append(list(kwargs.values())[0])
+    assert sorted(fetched.pop('get_rule')) == ["rule-1", "rule-2", "rule-3", "rule-4"]
+    assert sorted(fetched.pop('get_rule_group')) == ["group-1", "group-2"]
+    assert fetched.pop('get_rate_based_rule') == ["rate-1"]
+    assert sorted(fetched.pop('get_web_acl')) == ["acl-1", "acl-2"]
+    for operation, ids in fetched.items():
+        assert len(ids) == len(set(ids)), operation
+    assert fetched['get_ip_set'] == ["ip-1"]
+    assert fetched['get_byte_match_set'] == ["byte-1"]
+
+    calls = len(fake.calls)
+    get.crawlScope(fake, fake, False, ['acl-1', 'acl-2'], cache)
+    assert len(fake.calls) == calls
@@ -0,0 +1,163 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+#!/usr/bin/env python3
+
+# Modules importing
+from __future__ import print_function
+import json
+
+# Constants Section
+# Size of the write buffer of the template file. Blocks are rendered one at a time and written through it.
+templateBufferSize = 1024 * 1024
+indentation = "  "
+
+# Kinds of template items. Items are tuples whose first element is their kind, as a big IP set has tens of thousands of them.
+blockKind = 0
+attributeKind = 1
+blankKind = 2
+blockListKind = 3
+blankItem = (blankKind,)
+
+def block(keyword, labels, body):
+    '''
+    Returns a Terraform block, like a resource, an output or a nested block such as a predicate.
+    The labels are a list of strings (e.g. [resource type, resource name]) and the body is a list of
+    attribute(), block() and blank() items, in the order they are written.
+    '''
+    return ((blockKind, keyword, labels, body))
+
+def attribute(name, value, width = 0):
+    '''
+    Returns a Terraform attribute. Strings are written quoted, booleans and integers are written as they are
+    and expression() values are written verbatim. The name is padded to width characters to align the equal signs.
+    '''
+    return ((attributeKind, name, value, width))
+
+def blockList(keyword, names, widths, rows):
+    '''
+    Returns a run of nested blocks of the same type separated by empty lines, such as the descriptors of an IP set.
+    Each row is a tuple with the string values of the attributes named in names, padded to the matching widths.
+    Keeping the values as rows keeps IP sets with thousands of descriptors cheap to hold and to write.
+    '''
+    return ((blockListKind, keyword, names, widths, rows))
+
+def blank():
+    '''
+    Returns an empty line. It is only used when writing HCL.
+    '''
+    return (blankItem)
+
+def expression(hcl, value):
+    '''
+    Returns a value that is written as the hcl text in HCL templates and as value in Terraform JSON templates.
+    '''
+    return ((hcl, value))
+
+def stringList(values, spaced = False):
+    '''
+    Returns a list of strings, written as ["a", "b"] or, when spaced, as [ "a", "b" ].
+    '''
+    items = ", ".join(['"' + value + '"' for value in values])
+    if spaced:
+        return (expression("[ " + items + " ]", list(values)))
+    return (expression("[" + items + "]", list(values)))
+
+def tags(name, tagIndentation = "    "):
+    '''
+    Returns the map of tags of a top-level resource, holding only the Name tag.
+    '''
+    return (expression("{\n" + tagIndentation + "Name = \"" + name + "\"\n" + indentation + "}", {'Name': name}))
+
+def separated(blocks):
+    '''
+    Returns the provided nested blocks with an empty line between each two of them.
+    '''
+    body = []
+    for i in range(len(blocks)):
+        if i > 0:
+            body.append(blank())
+        body.append(blocks[i])
+    return (body)
+
+def hclValue(value):
+    '''
+    Renders an attribute value as HCL.
+    '''
+    if isinstance(value, str):
+        return ('"' + value + '"')
+    if isinstance(value, tuple):
+        return (value[0])
+    if isinstance(value, bool):
+        return (str(value).lower())
+    return (str(value))
+
+def hclLines(item, depth, lines):
+    '''
+    Appends the HCL lines of a block at the provided nesting depth to lines.
+    '''
+    header = indentation * depth + item[1]
+    for label in item[2]:
+        header += ' "' + label + '"'
+    lines.append(header + " {\n")
+    bodyIndentation = indentation * (depth + 1)
+    for bodyItem in item[3]:
+        kind = bodyItem[0]
+        if kind == attributeKind:
+            lines.append(bodyIndentation + bodyItem[1].ljust(bodyItem[3]) + " = " + hclValue(bodyItem[2]) + "\n")
+        elif kind == blankKind:
+            lines.append("\n")
+        elif kind == blockListKind:
+            rowFormat = bodyIndentation + bodyItem[1] + " {\n"
+            for i in range(len(bodyItem[2])):
+                rowFormat += bodyIndentation + indentation + bodyItem[2][i].ljust(bodyItem[3][i]) + ' = "%s"\n'
+            rowFormat += bodyIndentation + "}\n"
+            lines.append("\n".join([rowFormat % row for row in bodyItem[4]]))
+        else:
+            hclLines(bodyItem, depth + 1, lines)
+    lines.append(indentation * depth + "}\n")
+
+def jsonBody(body):
+    '''
+    Converts a block body into a Terraform JSON object. Nested blocks of the same type become a list.
+    '''
+    result = {}
+    for item in body:
+        if item[0] == attributeKind:
+            value = item[2]
+            if isinstance(value, tuple):
+                value = value[1]
+            result[item[1]] = value
+        elif item[0] == blockKind:
+            result.setdefault(item[1], []).append(jsonBody(item[3]))
+        elif item[0] == blockListKind:
+            result.setdefault(item[1], []).extend([dict(zip(item[2], row)) for row in item[4]])
+    return (result)
+
+def jsonDocument(blocks):
+    '''
+    Converts top-level blocks (providers, resources and outputs) into a Terraform JSON document.
+    '''
+    document = {}
+    for topBlock in blocks:
+        section = document.setdefault(topBlock[1], {})
+        for label in topBlock[2][:-1]:
+            section = section.setdefault(label, {})
+        section[topBlock[2][-1]] = jsonBody(topBlock[3])
+    return (document)
+
+def writeTemplate(templateFile, blocks, outputFormat):
+    '''
+    Writes the top-level blocks to the template file, either as HCL ("hcl") or as Terraform JSON ("json").
+    HCL blocks are rendered and written one at a time, each followed by an empty line.
+    '''
+    if outputFormat == "json":
+        json.dump(jsonDocument(blocks), templateFile, indent = 2)
+        templateFile.write("\n")
+        return
+
+    for topBlock in blocks:
+        lines = []
+        hclLines(topBlock, 0, lines)
+        lines.append("\n")
+        templateFile.writelines(lines)
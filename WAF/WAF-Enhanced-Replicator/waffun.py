@@ -6,13 +6,38 @@
 # Modules Importing
 from __future__ import print_function
 from datetime import datetime
-import sys, os, uuid
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+import sys, os, uuid, time, random, threading
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionError
 
 # Constants Section
 versionNumber = "1.0"
 versionBuild = "Build Date 2019-05-27"
 accountLength = 12
+# WAF Classic throttles its Get/List APIs at a few requests per second per account, so the number of
+# calls in flight is kept small and the calls go through a ThrottledClient (see getWafClient()).
+maxApiWorkers = 4
+apiMaxAttempts = 10
+# Token bucket of each WAF client: it starts at apiInitialRate requests per second and grows by apiRateGrowth per
+# successful call until the first throttle. From then on, it halves its rate on every throttled call (down to
+# apiMinRate) and climbs back by apiRateIncrease per successful call. It never goes above apiMaxRate.
+apiInitialRate = 10.0
+apiMinRate = 0.5
+apiMaxRate = 50.0
+apiRateGrowth = 1.2
+apiRateIncrease = 0.5
+apiBurst = 10
+# Throttled calls are retried after a random delay of up to apiBackoffBase * 2^attempt seconds, capped at apiBackoffCap.
+apiBackoffBase = 0.25
+apiBackoffCap = 20.0
+throttlingErrors = ["WAFLimitsExceededException", "ThrottlingException", "Throttling", "ThrottledException",
+                    "TooManyRequestsException", "RequestLimitExceeded"]
+# Transient errors are retried the same way, but do not slow the token bucket down.
+transientErrors = ["WAFInternalErrorException", "InternalFailure", "InternalError", "ServiceUnavailable"]
+# Largest page size accepted by the WAF Classic List APIs.
+listPageSize = 100
 
 if os.environ.get('LC_CTYPE', '') == 'UTF-8':
     os.environ['LC_CTYPE'] = 'en_US.UTF-8'
@@ -36,11 +61,15 @@ def usage():
     Prints the correct utility usage.
     '''
     usageMessage = "Usage:\n" \
-                   "    wafer {global | regional --region <AWS region>} [--web-acl <Web ACL ID>]\n\n" \
+                   "    wafer {global | regional --region <AWS region>} [--web-acl <Web ACL ID>] [--json]\n" \
+                   "    wafer [global] [regional --region <AWS region>[,<AWS region>...]] --all [--zip-per-acl] [--json]\n\n" \
                    "    Notes:\n" \
-                   "    1. You must choose the scope to be either global OR regional.\n" \
+                   "    1. You must choose the scope to be either global OR regional, unless you replicate all Web ACLs.\n" \
                    "    2. If you choose regional, you must provide one valid AWS region.\n" \
-                   "    3. Optionally, regardless of the scope, you can directly provide the desired Web ACL ID.\n"
+                   "    3. Optionally, regardless of the scope, you can directly provide the desired Web ACL ID.\n" \
+                   "    4. Optionally, you can get the template in Terraform JSON syntax (.tf.json) instead of HCL (.tf).\n" \
+                   "    5. With --all, every Web ACL of the chosen scopes is replicated, with one template per scope (global or region).\n" \
+                   "       Several regions can be separated by commas. With --zip-per-acl, each Web ACL gets its own template and zip file.\n"
     
     print(usageMessage)
     return(-1)
@@ -64,7 +93,7 @@ def validateArguments():
     if len(parameters) == 1:
         return([usage(), "", ""])
 
-    if ("global" in parameters) and ("regional" in parameters):
+    if ("global" in parameters) and ("regional" in parameters) and (not "--all" in parameters):
         return([usage(), "", ""])
 
     if (not "global" in parameters) and (not "regional" in parameters):
@@ -74,9 +103,31 @@ def validateArguments():
     if '--web-acl' in parameters:
         webacl_idx = parameters.index('--web-acl') + 1
         webAcl = parameters[webacl_idx]
+
+    outputFormat = "hcl"
+    if '--json' in parameters:
+        outputFormat = "json"
+
+    if '--all' in parameters:
+        if len(webAcl) > 0:
+            return([usage(), "", ""])
+        scopes = []
+        if "global" in parameters:
+            scopes.append("global")
+        if "regional" in parameters:
+            if not "--region" in parameters:
+                return([usage(), "", ""])
+            region_idx = parameters.index('--region') + 1
+            for region in parameters[region_idx].split(","):
+                if not isValidRegion(region):
+                    print("*** Invalid AWS Region {}! ***\n".format(region), file=sys.stderr)
+                    return([usage(), "", ""])
+                if not region in scopes:
+                    scopes.append(region)
+        return([3, scopes, "", outputFormat, '--zip-per-acl' in parameters])
     
     if "global" in parameters:
-        return([1, "", webAcl])
+        return([1, "", webAcl, outputFormat])
 
     region = ""
     if "regional" in parameters:
@@ -87,9 +138,208 @@ def validateArguments():
         if not isValidRegion(region):
             print("*** Invalid AWS Region! ***\n", file=sys.stderr)
             return([usage(), "", ""])
-        return([2, region, webAcl])
+        return([2, region, webAcl, outputFormat])
+
+class ApiCallError(Exception):
+    '''
+    Raised when an API call fails, with the name of the call (e.g. "get_rule()"), so that abortMission() is only called
+    by the main thread, once the crawls using the log and template files have stopped.
+    '''
+
+    def __init__(self, apiCall):
+        Exception.__init__(self, apiCall)
+        self.apiCall = apiCall
+
+class ThrottledClient(object):
+    '''
+    Wraps a WAF (global) or WAF Regional Boto3 client. Every API call waits for a token of an adaptive token bucket
+    and throttled calls are retried with jittered exponential backoff, instead of failing the whole run.
+    The number of calls, throttles, failed calls and the latency of each operation are recorded for writeApiStatistics().
+    The client is shared by the threads of fetchConcurrently(), so its state is protected by a lock.
+    Once cancelled (see cancel()), the calls not yet made fail with an ApiCallError instead of reaching the API.
+    '''
+
+    def __init__(self, botoClient):
+        self.botoClient = botoClient
+        self.rate = apiInitialRate
+        self.throttled = False
+        self.tokens = float(apiBurst)
+        self.lastRefill = time.time()
+        self.statistics = {}
+        self.lock = threading.Lock()
+        self.cancelled = threading.Event()
+
+    def __getattr__(self, name):
+        attribute = getattr(self.botoClient, name)
+        if name.startswith("_") or not callable(attribute):
+            return (attribute)
+        def throttledCall(**kwargs):
+            return (self.call(name, attribute, kwargs))
+        # Lets fetchConcurrently() find and cancel the client behind a call.
+        throttledCall.client = self
+        return (throttledCall)
+
+    def cancel(self):
+        '''
+        Makes every later call and retry fail, and wakes up the calls waiting to be retried, so that the crawls using this client stop quickly.
+        '''
+        self.cancelled.set()
+
+    def waitForToken(self):
+        '''
+        Takes a token from the bucket, sleeping until one is available.
+        '''
+        while True:
+            with self.lock:
+                now = time.time()
+                self.tokens = min(float(apiBurst), self.tokens + (now - self.lastRefill) * self.rate)
+                self.lastRefill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            if self.cancelled.is_set():
+                return
+            time.sleep(delay)
 
-def getHomeConfig():
+    def call(self, operation, apiCall, kwargs):
+        '''
+        Calls the provided Boto3 method, retrying it up to apiMaxAttempts times while it is throttled or fails with a transient error.
+        '''
+        attempt = 0
+        while True:
+            self.waitForToken()
+            if self.cancelled.is_set():
+                raise ApiCallError(operation + "()")
+            start = time.time()
+            try:
+                response = apiCall(**kwargs)
+            except (ClientError, ConnectionError) as e:
+                throttled = False
+                if isinstance(e, ClientError):
+                    errorCode = e.response.get('Error', {}).get('Code', "")
+                    if not errorCode in throttlingErrors and not errorCode in transientErrors:
+                        with self.lock:
+                            self.record(operation, time.time() - start, 0, 1)
+                        raise
+                    throttled = errorCode in throttlingErrors
+                attempt += 1
+                with self.lock:
+                    if throttled:
+                        self.throttled = True
+                        self.rate = max(apiMinRate, self.rate / 2)
+                        self.tokens = min(self.tokens, 0.0)
+                        self.record(operation, time.time() - start, 1, 0)
+                    else:
+                        self.record(operation, time.time() - start, 0, 1)
+                if attempt >= apiMaxAttempts:
+                    raise
+                # Waiting on the cancelled event rather than sleeping, so a cancel() does not wait for the backoff to end.
+                self.cancelled.wait(random.uniform(0, min(apiBackoffCap, apiBackoffBase * 2 ** attempt)))
+            else:
+                with self.lock:
+                    if self.throttled:
+                        self.rate = min(apiMaxRate, self.rate + apiRateIncrease)
+                    else:
+                        self.rate = min(apiMaxRate, self.rate * apiRateGrowth)
+                    self.record(operation, time.time() - start, 0, 0)
+                return (response)
+
+    def record(self, operation, latency, throttles, errors):
+        '''
+        Adds one call to the statistics of the operation ([calls, throttles, failures, total latency, max latency]).
+        '''
+        counters = self.statistics.setdefault(operation, [0, 0, 0, 0.0, 0.0])
+        counters[0] += 1
+        counters[1] += throttles
+        counters[2] += errors
+        counters[3] += latency
+        counters[4] = max(counters[4], latency)
+
+def getWafClient(serviceName, region = None):
+    '''
+    Returns a WAF (global) or WAF Regional client that paces its calls and retries throttled ones (see ThrottledClient).
+    The CloudFront client used to find the distributions associated with global Web ACLs is created the same way.
+    The region is only needed by WAF Regional; otherwise the default region is used.
+    Botocore does not retry calls itself, so that every throttle slows the token bucket down.
+    '''
+    config = Config(retries = {'max_attempts': 1, 'mode': "standard"})
+    return (ThrottledClient(boto3.client(serviceName, region_name = region, config = config)))
+
+def writeApiStatistics(logFile, wafClient, scope):
+    '''
+    Writes to the log file the number of calls, throttles, failures and latency of each API operation made by a WAF client.
+    '''
+    with wafClient.lock:
+        statistics = sorted(wafClient.statistics.items())
+        rate = wafClient.rate
+    for operation, counters in statistics:
+        logFile.write(getFormattedDateTime() + "API statistics (" + scope + "): " + operation + ": " + str(counters[0]) + " call(s), " +
+                      str(counters[1]) + " throttled, " + str(counters[2]) + " failed, average latency " +
+                      str(int(counters[3] * 1000 / counters[0])) + " ms, maximum " + str(int(counters[4] * 1000)) + " ms\n")
+    logFile.write(getFormattedDateTime() + "API statistics (" + scope + "): final request rate " + str(round(rate, 1)) + " call(s) per second\n")
+
+def listAllPages(apiCall, listKey, **kwargs):
+    '''
+    Calls a WAF Classic List API until there is no NextMarker left.
+    Returns a response holding the items of all pages under listKey.
+    '''
+    response = apiCall(Limit = listPageSize, **kwargs)
+    items = list(response[listKey])
+    while len(response.get('NextMarker', "")) > 0 and len(response[listKey]) > 0:
+        response = apiCall(Limit = listPageSize, NextMarker = response['NextMarker'], **kwargs)
+        items.extend(response[listKey])
+    return ({listKey: items})
+
+def callClient(call):
+    '''
+    Returns the ThrottledClient making a call of fetchConcurrently(), either directly or through listAllPages(), or None.
+    '''
+    method = call[2].get('apiCall', call[1])
+    return (getattr(method, 'client', None))
+
+def fetchConcurrently(calls, cache = None):
+    '''
+    Runs the provided API calls through a bounded thread pool and returns their responses.
+    The calls are a dictionary of key -> [API call name, Boto3 method, keyword arguments]. Each key is fetched
+    only once, so keying the calls by resource ID deduplicates resources referenced more than once.
+    If a cache dictionary is provided, keys already in it are not fetched again and new responses are added to it.
+    Returns a dictionary of key -> response. Raises an ApiCallError with the name of the first failed call, once the
+    calls still running have ended: the other calls are cancelled, and so are their ThrottledClients, so that their retries stop.
+    '''
+    results = {}
+    if cache is not None:
+        for key in calls:
+            if key in cache:
+                results[key] = cache[key]
+    calls = dict((key, call) for key, call in calls.items() if not key in results)
+    if len(calls) == 0:
+        return (results)
+
+    pool = ThreadPoolExecutor(max_workers = min(maxApiWorkers, len(calls)))
+    futures = {}
+    for key, call in calls.items():
+        futures[key] = pool.submit(call[1], **call[2])
+    # Stopping at the first failure, whichever call it is, rather than waiting for the calls in order.
+    wait(futures.values(), return_when = FIRST_EXCEPTION)
+    for key, future in futures.items():
+        if future.done() and not future.cancelled() and future.exception() is not None:
+            for pending in futures.values():
+                pending.cancel()
+            for call in calls.values():
+                client = callClient(call)
+                if client is not None:
+                    client.cancel()
+            pool.shutdown()
+            raise ApiCallError(calls[key][0])
+    pool.shutdown()
+    for key, future in futures.items():
+        results[key] = future.result()
+        if cache is not None:
+            cache[key] = results[key]
+    return (results)
+
+def getHomeConfig(templateExtension = ".tf"):
     '''
     Checks operating system, the existence of home directory.
     In case it does not exist, creates it and also returns the corresponding UUID 
@@ -132,11 +382,23 @@ def getHomeConfig():
         while os.path.exists(uniqueLogName):
             uniqueId = str(uuid.uuid4())
             uniqueLogName = logsDir + separator + "wafer-log-" + uniqueId + ".log"
-    uniqueTemplateName = templatesDir + separator + "wafer-tf-" + uniqueId + ".tf"
+    uniqueTemplateName = templatesDir + separator + "wafer-tf-" + uniqueId + templateExtension
     uniqueZipFile = home + separator + "wafer-pkg-" + uniqueId + ".zip"
     
     return ([uniqueLogName, uniqueTemplateName, uniqueZipFile])
 
+def getLabeledName(fileName, label):
+    '''
+    Returns the provided file name with the label inserted before its extensions
+    (e.g. wafer-tf-<UUID>.tf.json becomes wafer-tf-<UUID>-<label>.tf.json).
+    '''
+    directory, separator, baseName = fileName.rpartition(os.sep)
+    nameParts = baseName.split(".", 1)
+    labeledName = directory + separator + nameParts[0] + "-" + label
+    if len(nameParts) > 1:
+        labeledName += "." + nameParts[1]
+    return (labeledName)
+
 def getFormattedDateTime():
     '''
     Builds a formatted date and time to be used in logging.
@@ -145,7 +407,7 @@ def getFormattedDateTime():
 
 def abortMission(logFile, templateFile, apiCall):
     '''
-    Closes the log and template files, throws an error message and exits with -1.
+    Closes the log and template files (the template may be None when not staged yet), throws an error message and exits with -1.
     '''
     if len(apiCall) > 0:
         print("*** Failure on making API call: {}! ***".format(apiCall), file=sys.stderr)
@@ -153,5 +415,6 @@ def abortMission(logFile, templateFile, apiCall):
     print("*** Aborting program execution. ***\n", file=sys.stderr)
     logFile.write(getFormattedDateTime() + "End of Log.")
     logFile.close()
-    templateFile.close()
+    if templateFile is not None:
+        templateFile.close()
     sys.exit(-1)
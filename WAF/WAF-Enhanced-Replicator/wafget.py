@@ -7,17 +7,18 @@
 from __future__ import print_function
 import os, sys
 import waffun as function
-import boto3
+import wafemit as emit
 import zipfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
 
 # Global Constants
 limitWebAcl = '10'
 
-def stageFile(fileName):
+def stageFile(fileName, bufferSize = -1):
     # Trying to 'touch' (create) the provided file
     dummyFile = ""
     try:
-        dummyFile = open(fileName, 'w')
+        dummyFile = open(fileName, 'w', bufferSize)
     except:
         print("*** Unable to create the file " + fileName + "! ***\n", file=sys.stderr)
         sys.exit(-1)
@@ -27,14 +28,19 @@ def stageFile(fileName):
 def getWaf(arguments):
     '''
     Prints customer account and calls the right WAF function to get customer's resources.
-    The arguments are a list with the following values: [wafType to be considered (1 = global, 2 = regional), region name, Web ACL ID]
+    The arguments are a list with the following values: [wafType to be considered (1 = global, 2 = regional), region name, Web ACL ID, template format ("hcl" or "json")]
     '''
 
+    outputFormat = arguments[3]
+    templateExtension = ".tf"
+    if outputFormat == "json":
+        templateExtension = ".tf.json"
+
     # Staging all files. The first one is the log file. The second one is the Terraform template file.
     # The third one is the zip file containing the two previous ones.
-    listLogTemplate = function.getHomeConfig()
+    listLogTemplate = function.getHomeConfig(templateExtension)
     log = stageFile(listLogTemplate[0])
-    template = stageFile(listLogTemplate[1])
+    template = stageFile(listLogTemplate[1], emit.templateBufferSize)
     package = listLogTemplate[2]
 
     print("Your WAFER log file is " + listLogTemplate[0])
@@ -57,13 +63,15 @@ def getWaf(arguments):
     if isRegional:
         print("Considering WAF regional resources on " + region + ".\n")
         log.write(function.getFormattedDateTime() + "Region: " + region + "\n")
-        client = boto3.setup_default_session(region_name = region)
-        client = boto3.client('waf-regional')
+        client = function.getWafClient('waf-regional', region)
+        cloudFront = None
     else:
         print("Considering WAF global resources.\n")
         log.write(function.getFormattedDateTime() + "Global WAF\n")
-        client = boto3.client('waf')
+        client = function.getWafClient('waf')
+        cloudFront = function.getWafClient('cloudfront')
     
+    cache = {}
     if len(webAclId) == 0:
         try:
             response = client.list_web_acls()
@@ -108,228 +116,371 @@ def getWaf(arguments):
                 log.write(function.getFormattedDateTime() + "Unable to find the provided global Web ACL " + webAclId + ".\n")
             function.abortMission(log, template, "")
         webAclName = response['WebACL']['Name']
+        cache[("webAcls", webAclId)] = response
     
     log.write(function.getFormattedDateTime() + "Web ACL (ID): " + webAclName + " (" + webAclId + ")\n")
     print("Grabbing resources for Web ACL {} (ID: {})...".format(webAclName, webAclId))
 
+    # Getting everything the Web ACL uses. The cache holds every API response of this run, so nothing is fetched twice.
     try:
-        response1 = client.get_web_acl(WebACLId = webAclId)
+        crawl = crawlScope(client, cloudFront, isRegional, [webAclId], cache)
+    except function.ApiCallError as e:
+        function.abortMission(log, template, e.apiCall)
+    blocks = templateBlocks(crawl, region, isRegional, log, False)
+    emit.writeTemplate(template, blocks, outputFormat)
+    if isRegional:
+        function.writeApiStatistics(log, client, region)
+    else:
+        function.writeApiStatistics(log, client, "global")
+        function.writeApiStatistics(log, cloudFront, "CloudFront")
+    log.write(function.getFormattedDateTime() + "End of Log.")
+    print("All done.")
+    log.close()
+    template.close()
+
+    # Zipping files.
+    zipFiles(package, [listLogTemplate[0], listLogTemplate[1]])
+    print("\nGenerated ZIP file: {}.".format(package))
+
+def getAllWafs(arguments):
+    '''
+    Replicates every Web ACL of the global scope and/or of a list of regions.
+    The arguments are a list with the following values: [3, scopes ("global" and/or region names), "", template format ("hcl" or "json"), one zip file per Web ACL (True/False)]
+    The scopes are crawled in parallel. Each scope gets one template holding all of its Web ACLs, where the conditions, rules and
+    rule groups shared between Web ACLs are written once. With one zip file per Web ACL, each Web ACL gets its own template instead.
+    '''
+
+    outputFormat = arguments[3]
+    perWebAcl = arguments[4]
+    templateExtension = ".tf"
+    if outputFormat == "json":
+        templateExtension = ".tf.json"
+
+    # Staging the log file. The templates are staged once their scope is crawled.
+    listLogTemplate = function.getHomeConfig(templateExtension)
+    log = stageFile(listLogTemplate[0])
+    print("Your WAFER log file is " + listLogTemplate[0])
+
+    # Populating first lines of the log file
+    log.write("*************************************************************************\n")
+    log.write("WAFER - AWS WAF Enhanced Repicator - Version " + function.getVersion() + "\n")
+    log.write("*************************************************************************\n")
+
+    # Creating all clients up front, as Boto3 does not create clients safely from several threads.
+    scopes = []
+    for scopeName in arguments[1]:
+        if scopeName == "global":
+            scopes.append({'name': scopeName, 'region': "us-east-1", 'isRegional': False, 'suffix': "_",
+                           'client': function.getWafClient('waf'), 'cloudFront': function.getWafClient('cloudfront')})
+        else:
+            scopes.append({'name': scopeName, 'region': scopeName, 'isRegional': True, 'suffix': "regional_",
+                           'client': function.getWafClient('waf-regional', scopeName), 'cloudFront': None})
+    log.write(function.getFormattedDateTime() + "All Web ACLs of: " + ", ".join(arguments[1]) + "\n")
+    print("Grabbing all Web ACLs of: {}...\n".format(", ".join(arguments[1])))
+
+    # Each scope has its own API rate limits, so the scopes are crawled in parallel.
+    # The crawls do not write to the log: when one scope fails, the others are cancelled and, once every crawl has
+    # stopped, the execution is aborted from this thread.
+    pool = ThreadPoolExecutor(max_workers = len(scopes))
+    futures = [pool.submit(crawlScopeWebAcls, scope, perWebAcl) for scope in scopes]
+    done = wait(futures, return_when = FIRST_EXCEPTION)[0]
+    failed = [future for future in futures if future in done and future.exception() is not None]
+    if len(failed) > 0:
+        for scope in scopes:
+            scope['client'].cancel()
+            if scope['cloudFront'] is not None:
+                scope['cloudFront'].cancel()
+    pool.shutdown()
+    if len(failed) > 0:
+        if not isinstance(failed[0].exception(), function.ApiCallError):
+            raise failed[0].exception()
+        function.abortMission(log, None, failed[0].exception().apiCall)
+    crawls = [future.result() for future in futures]
+
+    # Writing the templates, one scope after the other. Each one is [label, template file name].
+    templates = []
+    for i in range(len(scopes)):
+        if scopes[i]['isRegional']:
+            print("Considering WAF regional resources on " + scopes[i]['region'] + ".")
+        else:
+            print("Considering WAF global resources.")
+        if len(crawls[i]) == 0:
+            print("There are no Web ACLs on {}.\n".format(scopes[i]['name']))
+            log.write(function.getFormattedDateTime() + "No Web ACLs on " + scopes[i]['name'] + ".\n")
+            continue
+        for crawl in crawls[i]:
+            label = scopes[i]['name']
+            if perWebAcl:
+                webAcl = crawl['webAcls'][0]['WebACL']
+                label += "-" + webAcl['WebACLId']
+                log.write(function.getFormattedDateTime() + "Web ACL (ID): " + webAcl['Name'] + " (" + webAcl['WebACLId'] + ")\n")
+                print("Grabbing resources for Web ACL {} (ID: {})...".format(webAcl['Name'], webAcl['WebACLId']))
+            templateName = function.getLabeledName(listLogTemplate[1], label)
+            template = stageFile(templateName, emit.templateBufferSize)
+            log.write(function.getFormattedDateTime() + "Template for " + label + ": " + templateName + "\n")
+            blocks = templateBlocks(crawl, scopes[i]['region'], scopes[i]['isRegional'], log, not perWebAcl)
+            emit.writeTemplate(template, blocks, outputFormat)
+            template.close()
+            print("Your Terraform template file is " + templateName + "\n")
+            templates.append([label, templateName])
+    for scope in scopes:
+        function.writeApiStatistics(log, scope['client'], scope['name'])
+        if scope['cloudFront'] is not None:
+            function.writeApiStatistics(log, scope['cloudFront'], "CloudFront")
+    log.write(function.getFormattedDateTime() + "End of Log.")
+    print("All done.")
+    log.close()
+
+    # Zipping files, either all templates together or each template with the log file.
+    if perWebAcl:
+        print("")
+        for template in templates:
+            package = function.getLabeledName(listLogTemplate[2], template[0])
+            zipFiles(package, [listLogTemplate[0], template[1]])
+            print("Generated ZIP file: {}.".format(package))
+    else:
+        zipFiles(listLogTemplate[2], [listLogTemplate[0]] + [template[1] for template in templates])
+        print("\nGenerated ZIP file: {}.".format(listLogTemplate[2]))
+
+def crawlScopeWebAcls(scope, perWebAcl):
+    '''
+    Lists all Web ACLs of a scope built by getAllWafs() and crawls them (see crawlScope()), either all together or one by one.
+    Returns the list of crawls, which is empty when the scope has no Web ACLs.
+    Raises an ApiCallError with the name of the failed API call if the scope cannot be crawled.
+    '''
+
+    cache = {}
+    try:
+        response = function.listAllPages(scope['client'].list_web_acls, 'WebACLs')
     except:
-        function.abortMission(log, template, "get_web_acl()")
+        raise function.ApiCallError("list_web_acls()")
+    webAclIds = [webAcl['WebACLId'] for webAcl in response['WebACLs']]
+    if len(webAclIds) == 0:
+        return ([])
+    if not perWebAcl:
+        return ([crawlScope(scope['client'], scope['cloudFront'], scope['isRegional'], webAclIds, cache)])
+
+    # Every crawl shares the cache, so the resources used by several Web ACLs are fetched only once.
+    crawls = []
+    for webAclId in webAclIds:
+        crawls.append(crawlScope(scope['client'], scope['cloudFront'], scope['isRegional'], [webAclId], cache))
+    return (crawls)
+
+def crawlScope(client, cloudFront, isRegional, webAclIds, cache):
+    '''
+    Fetches everything needed to replicate the provided Web ACLs of one scope (global WAF or one region): the Web ACLs,
+    their rule groups, rules and conditions, and the kinds of resources associated with each of them.
+    Returns a dictionary with the 'webAcls' responses (in the provided order), the 'crawled' rules (see crawlRules()),
+    the 'conditions' (see crawlConditions()) and the 'associated' resources (see crawlAssociatedResources()).
+    Raises an ApiCallError if any API call fails (see fetchConcurrently()).
+    '''
+
+    calls = {}
+    for webAclId in webAclIds:
+        calls[("webAcls", webAclId)] = ["get_web_acl()", client.get_web_acl, {'WebACLId': webAclId}]
+    fetched = function.fetchConcurrently(calls, cache)
+    webAcls = [fetched[("webAcls", webAclId)] for webAclId in webAclIds]
+
+    aclRules = []
+    for webAcl in webAcls:
+        aclRules.extend(webAcl['WebACL']['Rules'])
+    crawled = crawlRules(client, aclRules, cache)
+    conditions = crawlConditions(client, crawled, cache)
+    associated = crawlAssociatedResources(client, cloudFront, webAclIds, isRegional, cache)
+    return ({'webAcls': webAcls, 'crawled': crawled, 'conditions': conditions, 'associated': associated})
+
+def templateBlocks(crawl, region, isRegional, log, batch):
+    '''
+    Builds the Terraform blocks replicating the crawled Web ACLs of one scope (see crawlScope()).
+    Conditions, rules and rule groups used by several Web ACLs are written only once. In batch mode, the resources written
+    once per Web ACL (the Web ACL itself, its associated resources and the outputs) get the Web ACL's position as name suffix.
+    '''
+
+    suffix = "_"
+    if isRegional:
+        suffix = "regional_"
 
-    metricName = response1['WebACL']['MetricName']
-    defaultAction = response1['WebACL']['DefaultAction']['Type']
+    # Building the template. Every resource is added to the blocks list, which is written at the end.
+    blocks = []
+    blocks.append(emit.block("provider", ["aws"], [emit.attribute("region", region)]))
 
-    # Starting the template writing.
-    template.write('provider "aws" {\n')
+    crawled = crawl['crawled']
+    conditionsResult = conditionBlocks(crawl['conditions'], suffix)
+    blocks.extend(conditionsResult[1])
+
+    # Predicates are written as 'predicate' on WAF regional and 'predicates' on global WAF.
+    predicateKeyword = "predicates"
     if isRegional:
-        template.write('  region = "' + region + '"\n')
-    else:
-        template.write('  region = "us-east-1"\n')
-    template.write('}\n\n')
-    
-    # Getting all conditions.
-    conditionsResult = crawlConditions(client, log, template, suffix) 
-    template.write(conditionsResult[1])
-    template.write("\n\n")
+        predicateKeyword = "predicate"
 
     rules = {}
-    
-    for i in range(len(response1['WebACL']['Rules'])):
-        finalString = ""
-        ruleId = response1['WebACL']['Rules'][i]['RuleId']
-        ruleType = response1['WebACL']['Rules'][i]['Type']
-        if ruleType == 'GROUP':
-            try:
-                groupTemp = client.get_rule_group(RuleGroupId = ruleId)
-            except:
-                function.abortMission(log, template, "get_rule_group()")
-            groupName = groupTemp['RuleGroup']['Name']
-            print("Rule Group (Id): {} ({})".format(groupName, ruleId))
-            log.write(function.getFormattedDateTime() + "Group Name: " + groupName + " / Group Id: " + ruleId + "\n")
-            try:
-                loopGroup = client.list_activated_rules_in_rule_group(RuleGroupId = ruleId)
-            except:
-                function.abortMission(log, template, "list_activated_rules_in_rule_group()")
-            for j in range(len(loopGroup['ActivatedRules'])):
-                idTemp = loopGroup['ActivatedRules'][j]['RuleId']
-                try:
-                    rTemp = client.get_rule(RuleId = idTemp)
-                except:
-                    function.abortMission(log, template, "get_rule()")
-                # Checking if the rule was not already recorded
+
+    for aclIndex in range(len(crawl['webAcls'])):
+        response1 = crawl['webAcls'][aclIndex]
+        webAclId = response1['WebACL']['WebACLId']
+        webAclName = response1['WebACL']['Name']
+        metricName = response1['WebACL']['MetricName']
+        defaultAction = response1['WebACL']['DefaultAction']['Type']
+        nameSuffix = ""
+        if batch:
+            nameSuffix = "_" + str(aclIndex)
+            log.write(function.getFormattedDateTime() + "Web ACL (ID): " + webAclName + " (" + webAclId + ")\n")
+            print("Grabbing resources for Web ACL {} (ID: {})...".format(webAclName, webAclId))
+
+        for i in range(len(response1['WebACL']['Rules'])):
+            ruleId = response1['WebACL']['Rules'][i]['RuleId']
+            ruleType = response1['WebACL']['Rules'][i]['Type']
+            if ruleType == 'GROUP':
+                groupTemp = crawled['groups'][ruleId]
+                groupName = groupTemp['RuleGroup']['Name']
+                print("Rule Group (Id): {} ({})".format(groupName, ruleId))
+                log.write(function.getFormattedDateTime() + "Group Name: " + groupName + " / Group Id: " + ruleId + "\n")
+                # Checking if the rule group was not already recorded by another Web ACL
+                if ruleId in rules:
+                    continue
+                loopGroup = crawled['activated'][ruleId]
+                for j in range(len(loopGroup['ActivatedRules'])):
+                    idTemp = loopGroup['ActivatedRules'][j]['RuleId']
+                    rTemp = crawled['rules'][idTemp]
+                    # Checking if the rule was not already recorded
+                    if not idTemp in rules:
+                        index = 0
+                        for key, value in rules.items():
+                            if rules[key][:5] == "rule_":
+                                index += 1 
+                        rules[idTemp] = "rule_" + str(index)
+                        nameTemp = rTemp['Rule']['Name']        
+                        print("                 Rule Name: {} / Rule ID: {}".format(nameTemp, idTemp))
+                        log.write(function.getFormattedDateTime() + "            Rule Name: " + nameTemp + " / Rule ID: " + ruleId + "\n")
+                        body = [emit.attribute("name", rTemp['Rule']['Name'], 11),
+                                emit.attribute("metric_name", rTemp['Rule']['MetricName'], 11),
+                                emit.blank()]
+                        for k in range(len(rTemp['Rule']['Predicates'])):
+                            conditionId = rTemp['Rule']['Predicates'][k]['DataId']
+                            body.append(emit.block(predicateKeyword, [], [
+                                emit.attribute("type", rTemp['Rule']['Predicates'][k]['Type'], 7),
+                                emit.attribute("negated", rTemp['Rule']['Predicates'][k]['Negated'], 7),
+                                emit.attribute("data_id", conditionReference(suffix, conditionsResult[0][conditionId]), 7)]))
+                        blocks.append(emit.block("resource", ["aws_waf" + suffix + "rule", "rule_" + str(index)], body))
+                # Rule groups are named after their position in the Web ACL, unless another Web ACL's rule group already has that name.
+                groupIndex = i
+                while "rule_group_" + str(groupIndex) in rules.values():
+                    groupIndex += 1
+                rules[ruleId] = "rule_group_" + str(groupIndex)
+                body = [emit.attribute("name", groupName, 11),
+                        emit.attribute("metric_name", groupTemp['RuleGroup']['MetricName'], 11),
+                        emit.blank()]
+                for j in range(len(loopGroup['ActivatedRules'])):
+                    body.append(emit.block("activated_rule", [], [
+                        emit.block("action", [], [emit.attribute("type", loopGroup['ActivatedRules'][j]['Action']['Type'])]),
+                        emit.blank(),
+                        emit.attribute("priority", loopGroup['ActivatedRules'][j]['Priority'], 8),
+                        emit.attribute("rule_id", "${aws_waf" + suffix + "rule." + rules[loopGroup['ActivatedRules'][j]['RuleId']] + ".id}", 8)]))
+                    body.append(emit.blank())
+                blocks.append(emit.block("resource", ["aws_waf" + suffix + "rule_group", rules[ruleId]], body))
+            elif ruleType == "RATE_BASED" or ruleType == "REGULAR":
+                if ruleType == "RATE_BASED":
+                    rTemp = crawled['rateRules'][ruleId]
+                else:
+                    rTemp = crawled['rules'][ruleId]
+                ruleName = rTemp['Rule']['Name']
+                ruleAction = response1['WebACL']['Rules'][i]['Action']['Type']
+                log.write(function.getFormattedDateTime() + "Rule Name: " + ruleName + " / Rule Id: " + ruleId + "\n")
+                print("Rule Name: {} / Rule Id: {}".format(ruleName, ruleId))
+                idTemp = rTemp['Rule']['RuleId']
                 if not idTemp in rules:
                     index = 0
                     for key, value in rules.items():
                         if rules[key][:5] == "rule_":
                             index += 1 
                     rules[idTemp] = "rule_" + str(index)
-                    nameTemp = rTemp['Rule']['Name']        
-                    print("                 Rule Name: {} / Rule ID: {}".format(nameTemp, idTemp))
-                    log.write(function.getFormattedDateTime() + "            Rule Name: " + nameTemp + " / Rule ID: " + ruleId + "\n")
-                    finalString += "resource \"aws_waf" + suffix + "rule\" \"rule_" + str(index) +"\" {\n"
-                    finalString += "  name        = \"" + rTemp['Rule']['Name'] + "\"\n"
-                    finalString += "  metric_name = \"" + rTemp['Rule']['MetricName'] + "\"\n\n"
-                    for k in range(len(rTemp['Rule']['Predicates'])):
-                        if isRegional:
-                            finalString += "  predicate {\n"
-                        else:
-                            finalString += "  predicates {\n"
-                        finalString += "    type    = \"" + rTemp['Rule']['Predicates'][k]['Type'] + "\"\n"
-                        finalString += "    negated = " + str(rTemp['Rule']['Predicates'][k]['Negated']).lower() + "\n"
-                        conditionId = rTemp['Rule']['Predicates'][k]['DataId']
-                        finalString += "    data_id = \"${aws_waf" + suffix + conditionsResult[0][conditionId][:-2] + "." + conditionsResult[0][conditionId] + ".id}\"\n"
-                        finalString += "  }\n"
-                    finalString += "}\n\n"
-            finalString += "resource \"aws_waf" + suffix + "rule_group\" \"rule_group_" + str(i) +"\" {\n"
-            rules[ruleId] = "rule_group_" + str(i)
-            finalString += "  name        = \"" + groupName + "\"\n"
-            finalString += "  metric_name = \"" + groupTemp['RuleGroup']['MetricName'] + "\"\n\n"
-            for j in range(len(loopGroup['ActivatedRules'])):
-                finalString += "  activated_rule {\n"
-                finalString += "    action {\n"
-                finalString += "      type = \"" + loopGroup['ActivatedRules'][j]['Action']['Type'] + "\"\n"
-                finalString += "    }\n\n"
-                finalString += "    priority = " + str(loopGroup['ActivatedRules'][j]['Priority']) + "\n"
-                finalString += "    rule_id  = \"${aws_waf" + suffix + "rule." + rules[loopGroup['ActivatedRules'][j]['RuleId']] + ".id}\"\n"
-                finalString += "  }\n\n"
-            finalString += "}\n\n"
-            template.write(finalString)
-        elif ruleType == "RATE_BASED":
-            try:
-                rTemp = client.get_rate_based_rule(RuleId = ruleId)
-            except:
-                function.abortMission(log, template, "get_rate_based_rule()")
-            ruleName = rTemp['Rule']['Name']
-            ruleAction = response1['WebACL']['Rules'][i]['Action']['Type']
-            log.write(function.getFormattedDateTime() + "Rule Name: " + ruleName + " / Rule Id: " + ruleId + "\n")
-            print("Rule Name: {} / Rule Id: {}".format(ruleName, ruleId))
-            idTemp = rTemp['Rule']['RuleId']
-            if not idTemp in rules:
-                index = 0
-                for key, value in rules.items():
-                    if rules[key][:5] == "rule_":
-                        index += 1 
-                rules[idTemp] = "rule_" + str(index)
-                finalString += "resource \"aws_waf" + suffix + "rate_based_rule\" \"rule_" + str(index) +"\" {\n"
-                finalString += "  name        = \"" + rTemp['Rule']['Name'] + "\"\n"
-                finalString += "  metric_name = \"" + rTemp['Rule']['MetricName'] + "\"\n\n"
-                finalString += "  rate_key    = \"" + rTemp['Rule']['RateKey'] + "\"\n"
-                finalString += "  rate_limit  = " + str(rTemp['Rule']['RateLimit']) + "\n\n"
-                for j in range(len(rTemp['Rule']['MatchPredicates'])):
-                    if isRegional:
-                        finalString += "  predicate {\n"
-                    else:
-                        finalString += "  predicates {\n"
-                    conditionId = rTemp['Rule']['MatchPredicates'][j]['DataId']
-                    finalString += "    data_id = \"${aws_waf" + suffix + conditionsResult[0][conditionId][:-2] + "." + conditionsResult[0][conditionId] + ".id}\"\n"
-                    finalString += "    negated = " + str(rTemp['Rule']['MatchPredicates'][j]['Negated']).lower() + "\n"
-                    finalString += "    type    = \"" + rTemp['Rule']['MatchPredicates'][j]['Type'] + "\"\n"
-                    finalString += "  }\n\n"
-                finalString += "}\n\n"
-                template.write(finalString)
-        elif ruleType == "REGULAR":
-            try:
-                rTemp = client.get_rule(RuleId = ruleId)
-            except:
-                function.abortMission(log, template, "get_rule()")
-            ruleName = rTemp['Rule']['Name']
-            ruleAction = response1['WebACL']['Rules'][i]['Action']['Type']
-            log.write(function.getFormattedDateTime() + "Rule Name: " + ruleName + " / Rule Id: " + ruleId + "\n")
-            print("Rule Name: {} / Rule Id: {}".format(ruleName, ruleId))
-            idTemp = rTemp['Rule']['RuleId']
-            if not idTemp in rules:
-                index = 0
-                for key, value in rules.items():
-                    if rules[key][:5] == "rule_":
-                        index += 1 
-                rules[idTemp] = "rule_" + str(index)
-                finalString += "resource \"aws_waf" + suffix + "rule\" \"rule_" + str(index) +"\" {\n"
-                finalString += "  name        = \"" + rTemp['Rule']['Name'] + "\"\n"
-                finalString += "  metric_name = \"" + rTemp['Rule']['MetricName'] + "\"\n\n"
-                for j in range(len(rTemp['Rule']['Predicates'])):
-                    if isRegional:
-                        finalString += "  predicate {\n"
+                    body = [emit.attribute("name", rTemp['Rule']['Name'], 11),
+                            emit.attribute("metric_name", rTemp['Rule']['MetricName'], 11),
+                            emit.blank()]
+                    if ruleType == "RATE_BASED":
+                        resourceType = "rate_based_rule"
+                        predicates = rTemp['Rule']['MatchPredicates']
+                        body.append(emit.attribute("rate_key", rTemp['Rule']['RateKey'], 11))
+                        body.append(emit.attribute("rate_limit", rTemp['Rule']['RateLimit'], 11))
+                        body.append(emit.blank())
                     else:
-                        finalString += "  predicates {\n"
-                    conditionId = rTemp['Rule']['Predicates'][j]['DataId']
-                    finalString += "    data_id = \"${aws_waf" + suffix + conditionsResult[0][conditionId][:-2] + "." + conditionsResult[0][conditionId] + ".id}\"\n"
-                    finalString += "    negated = " + str(rTemp['Rule']['Predicates'][j]['Negated']).lower() + "\n"
-                    finalString += "    type    = \"" + rTemp['Rule']['Predicates'][j]['Type'] + "\"\n"
-                    finalString += "  }\n\n"
-                finalString += "}\n\n"
-                template.write(finalString)
-
-    # Getting all associated resources for the Web ACL.
-    resourcesResult = getAssociatedResources(client, webAclId, region, log, template, isRegional) 
-    template.write(resourcesResult[1])
-    
-    finalString = ""
-    finalString += "resource \"aws_waf" + suffix + "web_acl\" \"web_acl\" {\n"
-    finalString += '  name        = "'+ webAclName + '"\n'
-    finalString += '  metric_name = "' + metricName + '"\n\n'
-    finalString += '  default_action {\n'
-    finalString += '    type = "' + defaultAction + '"\n'
-    finalString += '  }\n\n'
-    for i in range(len(response1['WebACL']['Rules'])):
-        ruleType = response1['WebACL']['Rules'][i]['Type']
+                        resourceType = "rule"
+                        predicates = rTemp['Rule']['Predicates']
+                    for j in range(len(predicates)):
+                        conditionId = predicates[j]['DataId']
+                        body.append(emit.block(predicateKeyword, [], [
+                            emit.attribute("data_id", conditionReference(suffix, conditionsResult[0][conditionId]), 7),
+                            emit.attribute("negated", predicates[j]['Negated'], 7),
+                            emit.attribute("type", predicates[j]['Type'], 7)]))
+                        body.append(emit.blank())
+                    blocks.append(emit.block("resource", ["aws_waf" + suffix + resourceType, "rule_" + str(index)], body))
+
+        # Getting all associated resources for the Web ACL.
+        resourcesResult = associatedResourceBlocks(crawl['associated'][webAclId], region, log, nameSuffix)
+        blocks.extend(resourcesResult[1])
+        
+        body = [emit.attribute("name", webAclName, 11),
+                emit.attribute("metric_name", metricName, 11),
+                emit.blank(),
+                emit.block("default_action", [], [emit.attribute("type", defaultAction)]),
+                emit.blank()]
+        aclRuleKeyword = "rules"
         if isRegional:
-            finalString += "  rule {\n"
-        else:
-            finalString += "  rules {\n"
-        finalString += "    priority = " + str(response1['WebACL']['Rules'][i]['Priority']) + "\n"
-        finalString += "    type     = \"" + ruleType + "\"\n"
-        if ruleType == "GROUP":
-            finalString += "    rule_id  = \"${aws_waf" + suffix + "rule_group." + rules[response1['WebACL']['Rules'][i]['RuleId']] + ".id}\"\n\n"
-            finalString += "    override_action {\n"
-            finalString += "      type = \"" + response1['WebACL']['Rules'][i]['OverrideAction']['Type'] + "\"\n"
-        elif ruleType == "REGULAR":
-            finalString += "    rule_id  = \"${aws_waf" + suffix + "rule." + rules[response1['WebACL']['Rules'][i]['RuleId']] + ".id}\"\n\n"
-            finalString += "    action {\n"
-            finalString += "      type = \"" + response1['WebACL']['Rules'][i]['Action']['Type'] + "\"\n"
-        elif ruleType == "RATE_BASED":
-            finalString += "    rule_id  = \"${aws_waf" + suffix + "rate_based_rule." + rules[response1['WebACL']['Rules'][i]['RuleId']] + ".id}\"\n\n"
-            finalString += "    action {\n"
-            finalString += "      type = \"" + response1['WebACL']['Rules'][i]['Action']['Type'] + "\"\n"
-        finalString += "    }\n"    
-        finalString += "  }\n\n"
-    finalString += "}\n\n"
-
-    # This means there are regional resources associated with the Web ACL. In case it's a Global WAF Web ACL,
-    # and there is at least one CloudFront distribution associated with it, this was already covered in the
-    # the corresponding CloudFront block while running the getAssociatedResources() function.
-    if len(resourcesResult[0]) > 0 and isRegional:
+            aclRuleKeyword = "rule"
+        for i in range(len(response1['WebACL']['Rules'])):
+            aclRule = response1['WebACL']['Rules'][i]
+            ruleType = aclRule['Type']
+            ruleBody = [emit.attribute("priority", aclRule['Priority'], 8),
+                        emit.attribute("type", ruleType, 8)]
+            if ruleType == "GROUP":
+                ruleBody.append(emit.attribute("rule_id", "${aws_waf" + suffix + "rule_group." + rules[aclRule['RuleId']] + ".id}", 8))
+                ruleBody.append(emit.blank())
+                ruleBody.append(emit.block("override_action", [], [emit.attribute("type", aclRule['OverrideAction']['Type'])]))
+            elif ruleType == "REGULAR":
+                ruleBody.append(emit.attribute("rule_id", "${aws_waf" + suffix + "rule." + rules[aclRule['RuleId']] + ".id}", 8))
+                ruleBody.append(emit.blank())
+                ruleBody.append(emit.block("action", [], [emit.attribute("type", aclRule['Action']['Type'])]))
+            elif ruleType == "RATE_BASED":
+                ruleBody.append(emit.attribute("rule_id", "${aws_waf" + suffix + "rate_based_rule." + rules[aclRule['RuleId']] + ".id}", 8))
+                ruleBody.append(emit.blank())
+                ruleBody.append(emit.block("action", [], [emit.attribute("type", aclRule['Action']['Type'])]))
+            body.append(emit.block(aclRuleKeyword, [], ruleBody))
+            body.append(emit.blank())
+        blocks.append(emit.block("resource", ["aws_waf" + suffix + "web_acl", "web_acl" + nameSuffix], body))
+
+        # This means there are regional resources associated with the Web ACL. In case it's a Global WAF Web ACL,
+        # and there is at least one CloudFront distribution associated with it, this was already covered in the
+        # the corresponding CloudFront block while running the associatedResourceBlocks() function.
+        if len(resourcesResult[0]) > 0 and isRegional:
+            for z in range(len(resourcesResult[0])):
+                if "alb_dns_name" in resourcesResult[0][z]:
+                    resourceArn = "${aws_lb.waferALB" + nameSuffix + ".arn}"  # This means an ALB needs to be associated with the Web ACL
+                else:
+                    # This means an API Gateway needs to be associated with the Web ACL
+                    resourceArn = "arn:aws:apigateway:" + region + "::/restapis/${aws_api_gateway_rest_api.waferAPI" + nameSuffix + ".id}/stages/waferStage"
+                blocks.append(emit.block("resource", ["aws_wafregional_web_acl_association", "web_acl_association" + nameSuffix + "_" + str(z)], [
+                    emit.attribute("web_acl_id", "${aws_wafregional_web_acl.web_acl" + nameSuffix + ".id}", 12),
+                    emit.attribute("resource_arn", resourceArn, 12)]))
+
+        # This is the real final part of the Web ACL's resources (the outputs).
+        blocks.append(emit.block("output", ["Web_ACL_Name" + nameSuffix], [
+            emit.attribute("description", "Please refer to this Web ACL", 11),
+            emit.attribute("value", webAclName, 11)]))
+        
         for z in range(len(resourcesResult[0])):
-            finalString += "resource \"aws_wafregional_web_acl_association\" \"web_acl_association_" + str(z) + "\" {\n"
-            finalString += "  web_acl_id   = \"${aws_wafregional_web_acl.web_acl.id}\"\n"
-            if "alb_dns_name" in resourcesResult[0][z]:
-                finalString += "  resource_arn = \"${aws_lb.waferALB.arn}\"\n"  # This means an ALB needs to be associated with the Web ACL
-            else:
-                # This means an API Gateway needs to be associated with the Web ACL
-                finalString += "  resource_arn = \"arn:aws:apigateway:" + region + "::/restapis/${aws_api_gateway_rest_api.waferAPI.id}/stages/waferStage\"\n"
-            finalString += "}\n\n"
-
-    # This is the real final part of the template file (the outputs).
-    finalString += "output \"Web_ACL_Name\" {\n"
-    finalString += "  description = \"Please refer to this Web ACL\"\n"
-    finalString += "  value       = \"" + webAclName + "\"\n"
-    finalString += "}\n\n"
-    
-    for z in range(len(resourcesResult[0])):
-        finalString += "output \"" + resourcesResult[0][z][0] + "\" {\n"
-        finalString += "  description = \"" + resourcesResult[0][z][1] + "\"\n"
-        tail = ""
-        if "api_gateway_invoke_url" in resourcesResult[0][z]:
-            tail = "/WAFER" # Adding the stage nane to the final URL.
-        finalString += "  value       = " + resourcesResult[0][z][2] + tail + "\n"
-        finalString += "}\n\n"
-    template.write(finalString)
-    log.write(function.getFormattedDateTime() + "End of Log.")
-    print("All done.")
-    log.close()
-    template.close()
+            tail = ""
+            if "api_gateway_invoke_url" in resourcesResult[0][z]:
+                tail = "/WAFER" # Adding the stage nane to the final URL.
+            blocks.append(emit.block("output", [resourcesResult[0][z][0]], [
+                emit.attribute("description", resourcesResult[0][z][1], 11),
+                emit.attribute("value", emit.expression(resourcesResult[0][z][2] + tail, "${" + resourcesResult[0][z][2] + "}" + tail), 11)]))
 
-    # Zipping files.
+    return (blocks)
+
+def zipFiles(package, fileNames):
+    '''
+    Compresses the provided files (the log and template files) into the package zip file.
+    '''
     try:
         import zlib
         compression = zipfile.ZIP_DEFLATED
@@ -337,614 +488,517 @@ def getWaf(arguments):
         compression = zipfile.ZIP_STORED
 
     zf = zipfile.ZipFile(package, mode = "w")
-    try:
-        zf.write(listLogTemplate[0], compress_type = compression)
-    except:
-        print("Unable to add {} to the zip file!".format(listLogTemplate[0]))
-    
-    try:
-        zf.write(listLogTemplate[1], compress_type = compression)
-    except:
-        print("Unable to add {} to the zip file!".format(listLogTemplate[1]))
-    
+    for fileName in fileNames:
+        try:
+            zf.write(fileName, compress_type = compression)
+        except:
+            print("Unable to add {} to the zip file!".format(fileName))
     zf.close()
-    print("\nGenerated ZIP file: {}.".format(package))
 
+def crawlRules(botoClient, aclRules, cache):
+    '''
+    Fetches the rule groups, activated rules, regular rules and rate-based rules referenced by the Web ACL's rules.
+    The calls run concurrently and every ID is fetched only once, even when several rule groups activate the same rule.
+    Returns a dictionary with the 'groups', 'activated', 'rules' and 'rateRules' responses, each keyed by ID.
+    '''
+
+    calls = {}
+    for aclRule in aclRules:
+        ruleId = aclRule['RuleId']
+        if aclRule['Type'] == "GROUP":
+            calls[("groups", ruleId)] = ["get_rule_group()", botoClient.get_rule_group, {'RuleGroupId': ruleId}]
+            calls[("activated", ruleId)] = ["list_activated_rules_in_rule_group()", function.listAllPages,
+                                            {'apiCall': botoClient.list_activated_rules_in_rule_group, 'listKey': 'ActivatedRules', 'RuleGroupId': ruleId}]
+        elif aclRule['Type'] == "RATE_BASED":
+            calls[("rateRules", ruleId)] = ["get_rate_based_rule()", botoClient.get_rate_based_rule, {'RuleId': ruleId}]
+        elif aclRule['Type'] == "REGULAR":
+            calls[("rules", ruleId)] = ["get_rule()", botoClient.get_rule, {'RuleId': ruleId}]
+    fetched = function.fetchConcurrently(calls, cache)
+
+    # The rules activated inside the rule groups are only known after listing them.
+    calls = {}
+    for key, response in fetched.items():
+        if key[0] == "activated":
+            for activatedRule in response['ActivatedRules']:
+                if not ("rules", activatedRule['RuleId']) in fetched:
+                    calls[("rules", activatedRule['RuleId'])] = ["get_rule()", botoClient.get_rule, {'RuleId': activatedRule['RuleId']}]
+    fetched.update(function.fetchConcurrently(calls, cache))
+
+    crawled = {"groups": {}, "activated": {}, "rules": {}, "rateRules": {}}
+    for key, response in fetched.items():
+        crawled[key[0]][key[1]] = response
+    return (crawled)
+
+def crawlConditions(botoClient, crawled, cache):
+    '''
+    This function crawls the conditions used by the crawled rules (see crawlRules()).
+    Returns a list with the conditions in use, by List API call in the List response format, and the Get responses by condition ID.
+    '''
 
-def crawlConditions(botoClient, log, template, suffix):
+    # Each condition type: [list API call, list response key, get API call, ID key, predicate type].
+    # Regex pattern sets are not used by predicates directly, only through regex match sets.
+    conditionTypes = [
+        ["list_byte_match_sets", "ByteMatchSets", "get_byte_match_set", "ByteMatchSetId", "ByteMatch"],
+        ["list_regex_pattern_sets", "RegexPatternSets", "get_regex_pattern_set", "RegexPatternSetId", ""],
+        ["list_regex_match_sets", "RegexMatchSets", "get_regex_match_set", "RegexMatchSetId", "RegexMatch"],
+        ["list_sql_injection_match_sets", "SqlInjectionMatchSets", "get_sql_injection_match_set", "SqlInjectionMatchSetId", "SqlInjectionMatch"],
+        ["list_size_constraint_sets", "SizeConstraintSets", "get_size_constraint_set", "SizeConstraintSetId", "SizeConstraint"],
+        ["list_ip_sets", "IPSets", "get_ip_set", "IPSetId", "IPMatch"],
+        ["list_geo_match_sets", "GeoMatchSets", "get_geo_match_set", "GeoMatchSetId", "GeoMatch"],
+        ["list_xss_match_sets", "XssMatchSets", "get_xss_match_set", "XssMatchSetId", "XssMatch"],
+    ]
+
+    # Collecting the condition IDs used by the rules' predicates, grouped by predicate type.
+    referenced = {}
+    for rule in crawled['rules'].values():
+        for predicate in rule['Rule']['Predicates']:
+            referenced.setdefault(predicate['Type'], set()).add(predicate['DataId'])
+    for rule in crawled['rateRules'].values():
+        for predicate in rule['Rule']['MatchPredicates']:
+            referenced.setdefault(predicate['Type'], set()).add(predicate['DataId'])
+
+    # Getting the referenced conditions, and then the regex pattern sets used by the regex match sets.
+    calls = {}
+    for conditionType in conditionTypes:
+        for conditionId in referenced.get(conditionType[4], []):
+            calls[conditionId] = [conditionType[2] + "()", getattr(botoClient, conditionType[2]), {conditionType[3]: conditionId}]
+    fetched = function.fetchConcurrently(calls, cache)
+
+    calls = {}
+    for conditionId in referenced.get("RegexMatch", []):
+        for regexTuple in fetched[conditionId]['RegexMatchSet']['RegexMatchTuples']:
+            calls[regexTuple['RegexPatternSetId']] = ["get_regex_pattern_set()", botoClient.get_regex_pattern_set, {'RegexPatternSetId': regexTuple['RegexPatternSetId']}]
+    fetched.update(function.fetchConcurrently(calls, cache))
+
+    # Listing (all pages of) the condition types in use, so the conditions are written in the same order as WAF lists them.
+    calls = {}
+    for conditionType in conditionTypes:
+        if len(referenced.get(conditionType[4], [])) > 0 or (conditionType[0] == "list_regex_pattern_sets" and "RegexMatch" in referenced):
+            calls[conditionType[0]] = [conditionType[0] + "()", function.listAllPages, {'apiCall': getattr(botoClient, conditionType[0]), 'listKey': conditionType[1]}]
+    listed = function.fetchConcurrently(calls, cache)
+
+    # Keeping only the listed conditions that were fetched above.
+    conditions = {}
+    for conditionType in conditionTypes:
+        inUse = []
+        if conditionType[0] in listed:
+            for listedCondition in listed[conditionType[0]][conditionType[1]]:
+                if listedCondition[conditionType[3]] in fetched:
+                    inUse.append(listedCondition)
+        conditions[conditionType[0]] = {conditionType[1]: inUse}
+
+    return ([conditions, fetched])
+
+def conditionBlocks(crawledConditions, suffix):
     '''
-    This function crawls all conditions from the provided Boto3 object and returns them in a form of a conditions list and a template string.
+    Builds the Terraform blocks of the crawled conditions (see crawlConditions()).
+    Returns them in a form of a conditions dictionary (condition ID -> resource name) and a list of blocks.
     '''
 
-    returnString = ""
+    conditions = crawledConditions[0]
+    fetched = crawledConditions[1]
+
+    # Tuple, descriptor and constraint blocks are plural on global WAF and singular on WAF regional for some condition types.
+    isGlobal = len(suffix) == 1 # This means it's global WAF (suffix == '_').
+
+    returnBlocks = []
     conditionsDict = {}
     # Getting the String Match Conditions
-    try:
-        test = botoClient.list_byte_match_sets()
-    except:
-        function.abortMission(log, template, "list_byte_match_sets()")
+    test = conditions["list_byte_match_sets"]
     for k in range(len(test['ByteMatchSets'])):
-        try:
-            condition = botoClient.get_byte_match_set(ByteMatchSetId = test['ByteMatchSets'][k]['ByteMatchSetId'])
-        except:
-            function.abortMission(log, template, "get_byte_match_set()")
+        condition = fetched[test['ByteMatchSets'][k]['ByteMatchSetId']]
         namePrefix = "byte_match_set_" + str(k)
-        returnString += "resource \"aws_waf" + suffix + "byte_match_set\" \"" + namePrefix + "\" {\n"
-        returnString += "  name = \"" + condition['ByteMatchSet']['Name'] + "\"\n\n"
-        for l in range(len(condition['ByteMatchSet']['ByteMatchTuples'])):
-            returnString += "  byte_match_tuples {\n"
-            returnString += "    text_transformation   = \"" + condition['ByteMatchSet']['ByteMatchTuples'][l]['TextTransformation'] + "\"\n"
-            returnString += "    target_string         = \"" + str(condition['ByteMatchSet']['ByteMatchTuples'][l]['TargetString'])[2:-1] + "\"\n"
-            returnString += "    positional_constraint = \"" + condition['ByteMatchSet']['ByteMatchTuples'][l]['PositionalConstraint'] + "\"\n\n"
-            returnString += "    field_to_match {\n"
-            returnString += "      type = \"" + condition['ByteMatchSet']['ByteMatchTuples'][l]['FieldToMatch']['Type'] + "\"\n"
-            if len(condition['ByteMatchSet']['ByteMatchTuples'][l]['FieldToMatch']) > 1:
-                returnString += "      data = \"" + condition['ByteMatchSet']['ByteMatchTuples'][l]['FieldToMatch']['Data'] + "\"\n"
-            returnString += "    }\n"
-            returnString += "  }"
-            if l != len(condition['ByteMatchSet']['ByteMatchTuples']) - 1:
-                returnString += "\n\n"
-            else:
-                returnString += "\n"
+        tuples = []
+        for matchTuple in condition['ByteMatchSet']['ByteMatchTuples']:
+            tuples.append(emit.block("byte_match_tuples", [], [
+                emit.attribute("text_transformation", matchTuple['TextTransformation'], 21),
+                emit.attribute("target_string", str(matchTuple['TargetString'])[2:-1], 21),
+                emit.attribute("positional_constraint", matchTuple['PositionalConstraint'], 21),
+                emit.blank(),
+                fieldToMatch(matchTuple['FieldToMatch'])]))
+        returnBlocks.append(emit.block("resource", ["aws_waf" + suffix + "byte_match_set", namePrefix],
+                                       [emit.attribute("name", condition['ByteMatchSet']['Name']), emit.blank()] + emit.separated(tuples)))
         conditionsDict[test['ByteMatchSets'][k]['ByteMatchSetId']] = namePrefix
-        returnString += "}\n\n"
 
-    returnString += "\n\n"
     # Getting the Regex Pattern Sets
-    try:
-        test = botoClient.list_regex_pattern_sets()
-    except:
-        function.abortMission(log, template, "list_regex_pattern_sets()")
+    test = conditions["list_regex_pattern_sets"]
     for k in range(len(test['RegexPatternSets'])):
-        try:
-            condition = botoClient.get_regex_pattern_set(RegexPatternSetId = test['RegexPatternSets'][k]['RegexPatternSetId'])
-        except:
-            function.abortMission(log, template, "get_regex_pattern_set()")
+        condition = fetched[test['RegexPatternSets'][k]['RegexPatternSetId']]
         namePrefix = "regex_pattern_set_" + str(k)
-        returnString += "resource \"aws_waf" + suffix + "regex_pattern_set\" \"" + namePrefix + "\" {\n"
-        returnString += "  name                  = \"" + condition['RegexPatternSet']['Name'] + "\"\n"
-        returnString += "  regex_pattern_strings = [ " 
-        for l in range(len(condition['RegexPatternSet']['RegexPatternStrings'])):
-            # The following loop is to insert another "\" for all Regex pattern sets that have "\", as Terraform may not originally understand them.
-            cadTemp = ""
-            for m in range(len(condition['RegexPatternSet']['RegexPatternStrings'][l])):
-                if condition['RegexPatternSet']['RegexPatternStrings'][l][m] == "\\":
-                    cadTemp += "\\\\" + condition['RegexPatternSet']['RegexPatternStrings'][l][m+1:]
-                    m += 1
-            if len(cadTemp) == 0:
-                cadTemp = condition['RegexPatternSet']['RegexPatternStrings'][l]
-            returnString += "\"" + cadTemp + "\""
-            if l != len(condition['RegexPatternSet']['RegexPatternStrings']) - 1:
-                returnString += ", "
-        returnString += " ]\n"
+        patterns = condition['RegexPatternSet']['RegexPatternStrings']
+        patternsHcl = ", ".join(["\"" + escapeRegexPattern(pattern) + "\"" for pattern in patterns])
+        returnBlocks.append(emit.block("resource", ["aws_waf" + suffix + "regex_pattern_set", namePrefix], [
+            emit.attribute("name", condition['RegexPatternSet']['Name'], 21),
+            emit.attribute("regex_pattern_strings", emit.expression("[ " + patternsHcl + " ]", list(patterns)), 21)]))
         conditionsDict[test['RegexPatternSets'][k]['RegexPatternSetId']] = namePrefix
-        returnString += "}\n\n"
     
     # Getting the Regex Match Conditions
-    try:
-        test = botoClient.list_regex_match_sets()
-    except:
-        function.abortMission(log, template, "list_regex_match_sets()")
+    test = conditions["list_regex_match_sets"]
     for k in range(len(test['RegexMatchSets'])):
-        try:
-            condition = botoClient.get_regex_match_set(RegexMatchSetId = test['RegexMatchSets'][k]['RegexMatchSetId'])
-        except:
-            function.abortMission(log, template, "get_regex_match_set()")
+        condition = fetched[test['RegexMatchSets'][k]['RegexMatchSetId']]
         namePrefix = "regex_match_set_" + str(k)
-        returnString += "resource \"aws_waf" + suffix + "regex_match_set\" \"" + namePrefix + "\" {\n"
-        returnString += "  name = \"" + condition['RegexMatchSet']['Name'] + "\"\n\n"
-        for l in range(len(condition['RegexMatchSet']['RegexMatchTuples'])):
-            returnString += "  regex_match_tuple {\n"
-            returnString += "    field_to_match {\n"
-            returnString += "      type = \"" + condition['RegexMatchSet']['RegexMatchTuples'][l]['FieldToMatch']['Type'] + "\"\n"
-            if len(condition['RegexMatchSet']['RegexMatchTuples'][l]['FieldToMatch']) > 1:
-                returnString += "      data = \"" + condition['RegexMatchSet']['RegexMatchTuples'][l]['FieldToMatch']['Data'] + "\"\n"
-            returnString += "    }\n\n"
-            returnString += "    text_transformation   = \"" + condition['RegexMatchSet']['RegexMatchTuples'][l]['TextTransformation'] + "\"\n"
-            returnString += "    regex_pattern_set_id  = \"${aws_waf" + suffix + "regex_pattern_set." + conditionsDict[condition['RegexMatchSet']['RegexMatchTuples'][l]['RegexPatternSetId']] + ".id}\"\n"
-            returnString += "  }"
-            if l != len(condition['RegexMatchSet']['RegexMatchTuples']) - 1:
-                returnString += "\n\n"
-            else:
-                returnString += "\n"
+        tuples = []
+        for matchTuple in condition['RegexMatchSet']['RegexMatchTuples']:
+            tuples.append(emit.block("regex_match_tuple", [], [
+                fieldToMatch(matchTuple['FieldToMatch']),
+                emit.blank(),
+                emit.attribute("text_transformation", matchTuple['TextTransformation'], 21),
+                emit.attribute("regex_pattern_set_id", "${aws_waf" + suffix + "regex_pattern_set." + conditionsDict[matchTuple['RegexPatternSetId']] + ".id}", 21)]))
+        returnBlocks.append(emit.block("resource", ["aws_waf" + suffix + "regex_match_set", namePrefix],
+                                       [emit.attribute("name", condition['RegexMatchSet']['Name']), emit.blank()] + emit.separated(tuples)))
         conditionsDict[test['RegexMatchSets'][k]['RegexMatchSetId']] = namePrefix
-        returnString += "}\n\n"
     
     # Getting the SQL Injection Conditions
-    try:
-        test = botoClient.list_sql_injection_match_sets()
-    except:
-        function.abortMission(log, template, "list_sql_injection_match_sets()")
+    test = conditions["list_sql_injection_match_sets"]
+    tupleKeyword = "sql_injection_match_tuple"
+    if isGlobal: # Terraform expects 'tuples' (plural) on global WAF.
+        tupleKeyword = "sql_injection_match_tuples"
     for k in range(len(test['SqlInjectionMatchSets'])):
-        try:
-            condition = botoClient.get_sql_injection_match_set(SqlInjectionMatchSetId = test['SqlInjectionMatchSets'][k]['SqlInjectionMatchSetId'])
-        except:
-            function.abortMission(log, template, "get_sql_injection_match_set()")
+        condition = fetched[test['SqlInjectionMatchSets'][k]['SqlInjectionMatchSetId']]
         namePrefix = "sql_injection_match_set_" + str(k)
-        returnString += "resource \"aws_waf" + suffix + "sql_injection_match_set\" \"" + namePrefix + "\" {\n"
-        returnString += "  name = \"" + condition['SqlInjectionMatchSet']['Name'] + "\"\n\n"
-        for l in range(len(condition['SqlInjectionMatchSet']['SqlInjectionMatchTuples'])):
-            if len(suffix) == 1: # This means it's global WAF (suffix == '_'). Terraaform expects 'tuples' (plural).
-                returnString += "  sql_injection_match_tuples {\n"
-            else:
-                returnString += "  sql_injection_match_tuple {\n"
-            returnString += "    text_transformation   = \"" + condition['SqlInjectionMatchSet']['SqlInjectionMatchTuples'][l]['TextTransformation'] + "\"\n"
-            returnString += "    field_to_match {\n"
-            returnString += "      type = \"" + condition['SqlInjectionMatchSet']['SqlInjectionMatchTuples'][l]['FieldToMatch']['Type'] + "\"\n"
-            if len(condition['SqlInjectionMatchSet']['SqlInjectionMatchTuples'][l]['FieldToMatch']) > 1:
-                returnString += "      data = \"" + condition['SqlInjectionMatchSet']['SqlInjectionMatchTuples'][l]['FieldToMatch']['Data'] + "\"\n"
-            returnString += "    }\n"
-            returnString += "  }"
-            if l != len(condition['SqlInjectionMatchSet']['SqlInjectionMatchTuples']) - 1:
-                returnString += "\n\n"
-            else:
-                returnString += "\n"
+        tuples = []
+        for matchTuple in condition['SqlInjectionMatchSet']['SqlInjectionMatchTuples']:
+            tuples.append(emit.block(tupleKeyword, [], [
+                emit.attribute("text_transformation", matchTuple['TextTransformation'], 21),
+                fieldToMatch(matchTuple['FieldToMatch'])]))
+        returnBlocks.append(emit.block("resource", ["aws_waf" + suffix + "sql_injection_match_set", namePrefix],
+                                       [emit.attribute("name", condition['SqlInjectionMatchSet']['Name']), emit.blank()] + emit.separated(tuples)))
         conditionsDict[test['SqlInjectionMatchSets'][k]['SqlInjectionMatchSetId']] = namePrefix
-        returnString += "}"
     
-    returnString += "\n\n"
     # Getting the Size Constraint Set Conditions
-    try:
-        test = botoClient.list_size_constraint_sets()
-    except:
-        function.abortMission(log, template, "list_size_constraint_sets()")
+    test = conditions["list_size_constraint_sets"]
     for k in range(len(test['SizeConstraintSets'])):
-        try:
-            condition = botoClient.get_size_constraint_set(SizeConstraintSetId = test['SizeConstraintSets'][k]['SizeConstraintSetId'])
-        except:
-            function.abortMission(log, template, "get_size_constraint_set())")
+        condition = fetched[test['SizeConstraintSets'][k]['SizeConstraintSetId']]
         namePrefix = "size_constraint_set_" + str(k)
-        returnString += "resource \"aws_waf" + suffix + "size_constraint_set\" \"" + namePrefix + "\" {\n"
-        returnString += "  name = \"" + condition['SizeConstraintSet']['Name'] + "\"\n\n"
-        for l in range(len(condition['SizeConstraintSet']['SizeConstraints'])):
-            returnString += "  size_constraints {\n"
-            returnString += "    text_transformation = \"" + condition['SizeConstraintSet']['SizeConstraints'][l]['TextTransformation'] + "\"\n"
-            returnString += "    comparison_operator = \"" + condition['SizeConstraintSet']['SizeConstraints'][l]['ComparisonOperator'] + "\"\n"
-            returnString += "    size                = \"" + str(condition['SizeConstraintSet']['SizeConstraints'][l]['Size']) + "\"\n\n"
-            returnString += "    field_to_match {\n"
-            returnString += "      type = \"" + condition['SizeConstraintSet']['SizeConstraints'][l]['FieldToMatch']['Type'] + "\"\n"
-            if len(condition['SizeConstraintSet']['SizeConstraints'][l]['FieldToMatch']) > 1:
-                returnString += "      data = \"" + condition['SizeConstraintSet']['SizeConstraints'][l]['FieldToMatch']['Data'] + "\"\n"
-            returnString += "    }\n"
-            returnString += "  }"
-            if l != len(condition['SizeConstraintSet']['SizeConstraints']) - 1:
-                returnString += "\n\n"
-            else:
-                returnString += "\n"
+        constraints = []
+        for constraint in condition['SizeConstraintSet']['SizeConstraints']:
+            constraints.append(emit.block("size_constraints", [], [
+                emit.attribute("text_transformation", constraint['TextTransformation'], 19),
+                emit.attribute("comparison_operator", constraint['ComparisonOperator'], 19),
+                emit.attribute("size", str(constraint['Size']), 19),
+                emit.blank(),
+                fieldToMatch(constraint['FieldToMatch'])]))
+        returnBlocks.append(emit.block("resource", ["aws_waf" + suffix + "size_constraint_set", namePrefix],
+                                       [emit.attribute("name", condition['SizeConstraintSet']['Name']), emit.blank()] + emit.separated(constraints)))
         conditionsDict[test['SizeConstraintSets'][k]['SizeConstraintSetId']] = namePrefix
-        returnString += "}"
 
-    returnString += "\n\n"
     # Getting the IP Set Conditions
-    try:
-        test = botoClient.list_ip_sets()
-    except:
-        function.abortMission(log, template, "list_ip_sets()")
+    test = conditions["list_ip_sets"]
+    descriptorKeyword = "ip_set_descriptor"
+    if isGlobal: # Terraform expects 'descriptors' (plural) on global WAF.
+        descriptorKeyword = "ip_set_descriptors"
     for k in range(len(test['IPSets'])):
-        try:
-            condition = botoClient.get_ip_set(IPSetId = test['IPSets'][k]['IPSetId'])
-        except:
-            function.abortMission(log, template, "get_ip_set()")
+        condition = fetched[test['IPSets'][k]['IPSetId']]
         namePrefix = "ipset_" + str(k)
-        returnString += "resource \"aws_waf" + suffix + "ipset\" \"" + namePrefix + "\" {\n"
-        returnString += "  name = \"" + condition['IPSet']['Name'] + "\"\n\n"
-        for l in range(len(condition['IPSet']['IPSetDescriptors'])):
-            if len(suffix) == 1: # This means it's global WAF (suffix == '_'). Terraaform expects 'descriptors' (plural).
-                returnString += "  ip_set_descriptors {\n"
-            else:
-                returnString += "  ip_set_descriptor {\n"
-            returnString += "    type  = \"" + condition['IPSet']['IPSetDescriptors'][l]['Type'] + "\"\n"
-            returnString += "    value = \"" + condition['IPSet']['IPSetDescriptors'][l]['Value'] + "\"\n"
-            returnString += "  }"
-            if l != len(condition['IPSet']['IPSetDescriptors']) - 1:
-                returnString += "\n\n"
-            else:
-                returnString += "\n"
+        descriptors = [(descriptor['Type'], descriptor['Value']) for descriptor in condition['IPSet']['IPSetDescriptors']]
+        returnBlocks.append(emit.block("resource", ["aws_waf" + suffix + "ipset", namePrefix], [
+            emit.attribute("name", condition['IPSet']['Name']),
+            emit.blank(),
+            emit.blockList(descriptorKeyword, ["type", "value"], [5, 5], descriptors)]))
         conditionsDict[test['IPSets'][k]['IPSetId']] = namePrefix
-        returnString += "}\n\n"    
     
     # Getting the Geo Conditions
-    try:
-        test = botoClient.list_geo_match_sets()
-    except:
-        function.abortMission(log, template, "list_geo_match_sets()")
+    test = conditions["list_geo_match_sets"]
     for k in range(len(test['GeoMatchSets'])):
-        try:
-            condition = botoClient.get_geo_match_set(GeoMatchSetId = test['GeoMatchSets'][k]['GeoMatchSetId'])
-        except:
-            function.abortMission(log, template, "get_geo_match_set()")
+        condition = fetched[test['GeoMatchSets'][k]['GeoMatchSetId']]
         namePrefix = "geo_match_set_" + str(k)
-        returnString += "resource \"aws_waf" + suffix + "geo_match_set\" \"" + namePrefix + "\" {\n"
-        returnString += "  name = \"" + condition['GeoMatchSet']['Name'] + "\"\n\n"
-        for l in range(len(condition['GeoMatchSet']['GeoMatchConstraints'])):
-            returnString += "  geo_match_constraint {\n"
-            returnString += "    type  = \"" + condition['GeoMatchSet']['GeoMatchConstraints'][l]['Type'] + "\"\n"
-            returnString += "    value = \"" + condition['GeoMatchSet']['GeoMatchConstraints'][l]['Value'] + "\"\n"
-            returnString += "  }"
-            if l != len(condition['GeoMatchSet']['GeoMatchConstraints']) - 1:
-                returnString += "\n\n"
-            else:
-                returnString += "\n"
+        constraints = [(constraint['Type'], constraint['Value']) for constraint in condition['GeoMatchSet']['GeoMatchConstraints']]
+        returnBlocks.append(emit.block("resource", ["aws_waf" + suffix + "geo_match_set", namePrefix], [
+            emit.attribute("name", condition['GeoMatchSet']['Name']),
+            emit.blank(),
+            emit.blockList("geo_match_constraint", ["type", "value"], [5, 5], constraints)]))
         conditionsDict[test['GeoMatchSets'][k]['GeoMatchSetId']] = namePrefix
-        returnString += "}\n\n"
 
     # Getting the XSS Conditions
-    try:
-        test = botoClient.list_xss_match_sets()
-    except:
-        function.abortMission(log, template, "list_xss_match_sets()")
+    test = conditions["list_xss_match_sets"]
+    tupleKeyword = "xss_match_tuple"
+    if isGlobal: # Terraform expects 'tuples' (plural) on global WAF.
+        tupleKeyword = "xss_match_tuples"
     for k in range(len(test['XssMatchSets'])):
-        try:
-            condition = botoClient.get_xss_match_set(XssMatchSetId = test['XssMatchSets'][k]['XssMatchSetId'])
-        except:
-            function.abortMission(log, template, "get_xss_match_set()")
+        condition = fetched[test['XssMatchSets'][k]['XssMatchSetId']]
         namePrefix = "xss_match_set_" + str(k)
-        returnString += "resource \"aws_waf" + suffix + "xss_match_set\" \"" + namePrefix + "\" {\n"
-        returnString += "  name = \"" + condition['XssMatchSet']['Name'] + "\"\n\n"
-        for l in range(len(condition['XssMatchSet']['XssMatchTuples'])):
-            if len(suffix) == 1: # This means it's global WAF (suffix == '_'). Terraform expects 'tuples' (plural).
-                returnString += "  xss_match_tuples {\n"
-            else:
-                returnString += "  xss_match_tuple {\n"
-            returnString += "    text_transformation   = \"" + condition['XssMatchSet']['XssMatchTuples'][l]['TextTransformation'] + "\"\n"
-            returnString += "    field_to_match {\n"
-            returnString += "      type = \"" + condition['XssMatchSet']['XssMatchTuples'][l]['FieldToMatch']['Type'] + "\"\n"
-            if len(condition['XssMatchSet']['XssMatchTuples'][l]['FieldToMatch']) > 1:
-                returnString += "      data = \"" + condition['XssMatchSet']['XssMatchTuples'][l]['FieldToMatch']['Data'] + "\"\n"
-            returnString += "    }\n"
-            returnString += "  }"
-            if l != len(condition['XssMatchSet']['XssMatchTuples']) - 1:
-                returnString += "\n\n"
-            else:
-                returnString += "\n"
+        tuples = []
+        for matchTuple in condition['XssMatchSet']['XssMatchTuples']:
+            tuples.append(emit.block(tupleKeyword, [], [
+                emit.attribute("text_transformation", matchTuple['TextTransformation'], 21),
+                fieldToMatch(matchTuple['FieldToMatch'])]))
+        returnBlocks.append(emit.block("resource", ["aws_waf" + suffix + "xss_match_set", namePrefix],
+                                       [emit.attribute("name", condition['XssMatchSet']['Name']), emit.blank()] + emit.separated(tuples)))
         conditionsDict[test['XssMatchSets'][k]['XssMatchSetId']] = namePrefix
-        returnString += "}"
     
-    return([conditionsDict, returnString])
+    return([conditionsDict, returnBlocks])
+
+def fieldToMatch(field):
+    '''
+    Returns the field_to_match block of a condition tuple or constraint.
+    '''
+    body = [emit.attribute("type", field['Type'], 4)]
+    if len(field) > 1:
+        body.append(emit.attribute("data", field['Data'], 4))
+    return (emit.block("field_to_match", [], body))
+
+def escapeRegexPattern(pattern):
+    '''
+    Inserts another "\\" for all Regex pattern strings that have "\\", as Terraform may not originally understand them.
+    '''
+    cadTemp = ""
+    for m in range(len(pattern)):
+        if pattern[m] == "\\":
+            cadTemp += "\\\\" + pattern[m+1:]
+    if len(cadTemp) == 0:
+        cadTemp = pattern
+    return (cadTemp)
+
+def conditionReference(suffix, conditionName):
+    '''
+    Returns the Terraform reference to the ID of a condition resource written by crawlConditions().
+    '''
+    return ("${aws_waf" + suffix + conditionName.rpartition("_")[0] + "." + conditionName + ".id}")
+
+def crawlAssociatedResources(wafClient, cloudFront, webAclIds, isRegional, cache):
+    '''
+    Looks into the customer's Web ACLs and looks for associated resources.
+    Returns a dictionary of Web ACL ID -> list with the kinds of associated resources found ("ALB", "API" and/or "CloudFront").
+    '''
+
+    # Checking if the Web ACL is associated with any resource. If the resulting array las a length greater than zero, 
+    # it means there is at least one resource of that type associated with the Web ACL.
+    # Regional Web ACLs can be associated with ALBs and API Gateway stages, global ones with CloudFront distributions.
+    calls = {}
+    for webAclId in webAclIds:
+        if isRegional:
+            calls[("resources", webAclId, "ALB")] = ["list_resources_for_web_acl(ALB)", wafClient.list_resources_for_web_acl,
+                                                     {'WebACLId': webAclId, 'ResourceType': "APPLICATION_LOAD_BALANCER"}]
+            calls[("resources", webAclId, "API")] = ["list_resources_for_web_acl(API)", wafClient.list_resources_for_web_acl,
+                                                     {'WebACLId': webAclId, 'ResourceType': "API_GATEWAY"}]
+        else:
+            calls[("resources", webAclId, "CloudFront")] = ["list_distributions_by_web_acl_id(CloudFront)", cloudFront.list_distributions_by_web_acl_id,
+                                                            {'WebACLId': webAclId}]
+    fetched = function.fetchConcurrently(calls, cache)
 
-def getAssociatedResources(wafClient, AclId, region, log, template, isRegional):
+    associated = {}
+    for webAclId in webAclIds:
+        associated[webAclId] = []
+        if isRegional:
+            if len(fetched[("resources", webAclId, "ALB")]['ResourceArns']) > 0:
+                associated[webAclId].append("ALB")
+            if len(fetched[("resources", webAclId, "API")]['ResourceArns']) > 0:
+                associated[webAclId].append("API")
+        elif fetched[("resources", webAclId, "CloudFront")]['DistributionList']['Quantity'] > 0:
+            associated[webAclId].append("CloudFront")
+    return (associated)
+
+def associatedResourceBlocks(associated, region, log, nameSuffix):
     '''
-    Looks into the customer's WebACL and looks for associated resources.
-    Returns a list of resources' names in case any is found.
+    Builds the Terraform blocks creating resources equivalent to the ones associated with a Web ACL (see crawlAssociatedResources()).
+    Returns a list of resources' outputs ([output name, description, value]) in case any is found, and the list of blocks.
+    The name suffix is appended to every resource name, so the resources of several Web ACLs can share a template.
     '''
     
-    resourceString = ""
+    resourceBlocks = []
     resourcesList  = []
     
-    # Checking if the Web ACL is associated with any resource. If the resulting array las a length greater than zero, 
-    # it means there is at least one resource of that type associated with the Web ACL.
     # Looking for ALBs first. If at least one ALB is associated, we need to create all resources to support it:
     # VPC, Subnet, Route Table, Internet Gateway, Target Group and Security Group.
-    if isRegional:
-        try:
-            rAlb = wafClient.list_resources_for_web_acl(WebACLId = AclId, ResourceType = "APPLICATION_LOAD_BALANCER")
-        except:
-            function.abort(log, template, "list_resources_for_web_acl(ALB)")
-        if len(rAlb['ResourceArns']) > 0:
-            log.write(function.getFormattedDateTime() + "Found at least one ALB associated with this Web ACL. Creating equivalent resource...\n")
-            print("Found at least one ALB associated with this Web ACL. Creating equivalent resource...")
-            resourceString += "resource \"aws_vpc\" \"waferVPC\" {\n"
-            resourceString += "  cidr_block = \"10.10.0.0/16\"\n\n"
-            resourceString += "  tags = {\n"
-            resourceString += "    Name = \"WAFER\"\n"
-            resourceString += "  }\n"
-            resourceString += "}\n\n"
-
-            resourceString += "resource \"aws_subnet\" \"waferSubnet1\" {\n"
-            resourceString += "  vpc_id            = \"${aws_vpc.waferVPC.id}\"\n"
-            resourceString += "  availability_zone = \"" + region + "a\"\n" 
-            resourceString += "  cidr_block        = \"10.10.1.0/24\"\n\n"
-            resourceString += "  tags = {\n"
-            resourceString += "    Name = \"WAFER\"\n"
-            resourceString += "  }\n"
-            resourceString += "}\n\n"
-
-            resourceString += "resource \"aws_subnet\" \"waferSubnet2\" {\n"
-            resourceString += "  vpc_id            = \"${aws_vpc.waferVPC.id}\"\n"
-            resourceString += "  availability_zone = \"" + region + "b\"\n" 
-            resourceString += "  cidr_block        = \"10.10.2.0/24\"\n\n"
-            resourceString += "  tags = {\n"
-            resourceString += "    Name = \"WAFER\"\n"
-            resourceString += "  }\n"
-            resourceString += "}\n\n"
-
-            resourceString += "resource \"aws_internet_gateway\" \"waferIGW\" {\n"
-            resourceString += "  vpc_id = \"${aws_vpc.waferVPC.id}\"\n\n"
-            resourceString += "  tags = {\n"
-            resourceString += "    Name = \"WAFER\"\n"
-            resourceString += "  }\n"
-            resourceString += "}\n\n"
-
-            resourceString += "resource \"aws_route_table\" \"waferRT\" {\n"
-            resourceString += "  vpc_id     = \"${aws_vpc.waferVPC.id}\"\n\n"
-            resourceString += "  route {\n"
-            resourceString += "    cidr_block = \"0.0.0.0/0\"\n"
-            resourceString += "    gateway_id = \"${aws_internet_gateway.waferIGW.id}\"\n"
-            resourceString += "  }\n\n"
-            resourceString += "  tags = {\n"
-            resourceString += "    Name = \"WAFER\"\n"
-            resourceString += "  }\n"
-            resourceString += "}\n\n"
-
-            resourceString += "resource \"aws_route_table_association\" \"waferRTAssociation1\" {\n"
-            resourceString += "  subnet_id      = \"${aws_subnet.waferSubnet1.id}\"\n"
-            resourceString += "  route_table_id = \"${aws_route_table.waferRT.id}\"\n"
-            resourceString += "}\n\n"
-
-            resourceString += "resource \"aws_route_table_association\" \"waferRTAssociation2\" {\n"
-            resourceString += "  subnet_id      = \"${aws_subnet.waferSubnet2.id}\"\n"
-            resourceString += "  route_table_id = \"${aws_route_table.waferRT.id}\"\n"
-            resourceString += "}\n\n"
-            
-            resourceString += "resource \"aws_security_group\" \"waferALBSG\" {\n"
-            resourceString += "  name        = \"waferALBSG\"\n"
-            resourceString += "  description = \"Allow HTTP inbound traffic\"\n"
-            resourceString += "  vpc_id      = \"${aws_vpc.waferVPC.id}\"\n"
-            resourceString += "  ingress {\n"
-            resourceString += "    from_port   = 80\n"
-            resourceString += "    to_port     = 80\n"
-            resourceString += "    protocol    = \"tcp\"\n"
-            resourceString += "    cidr_blocks = [ \"0.0.0.0/0\" ]\n"
-            resourceString += "  }\n\n"
-            resourceString += "  egress {\n"
-            resourceString += "    from_port   = 0\n"
-            resourceString += "    to_port     = 0\n"
-            resourceString += "    protocol    = \"-1\"\n"
-            resourceString += "    cidr_blocks = [ \"0.0.0.0/0\" ]\n"
-            resourceString += "  }\n\n"
-            resourceString += "  tags = {\n"
-            resourceString += "     Name = \"WAFER\"\n"
-            resourceString += "  }\n"
-            resourceString += "}\n\n"
-            
-            resourceString += "resource \"aws_lb\" \"waferALB\" {\n"
-            resourceString += "  name               = \"waferALB\"\n"
-            resourceString += "  internal           = false\n"
-            resourceString += "  load_balancer_type = \"application\"\n"
-            resourceString += "  security_groups    = [\"${aws_security_group.waferALBSG.id}\"]\n"
-            resourceString += "  subnets            = [\"${aws_subnet.waferSubnet1.id}\", \"${aws_subnet.waferSubnet2.id}\"]\n\n"
-            resourceString += "  enable_cross_zone_load_balancing = true\n\n"
-            resourceString += "  tags = {\n"
-            resourceString += "    Name = \"WAFER\"\n"
-            resourceString += "  }\n"
-            resourceString += "}\n\n"
-
-            resourceString += "resource \"aws_lb_target_group\" \"waferALBTG\" {\n"
-            resourceString += "  name     = \"waferALBTG\"\n"
-            resourceString += "  port     = 80\n"
-            resourceString += "  protocol = \"HTTP\"\n"
-            resourceString += "  vpc_id   = \"${aws_vpc.waferVPC.id}\"\n"
-            resourceString += "}\n\n"
-
-            resourceString += "resource \"aws_lb_listener\" \"waferALBListener\" {\n"
-            resourceString += "  load_balancer_arn = \"${aws_lb.waferALB.arn}\"\n"
-            resourceString += "  port     = \"80\"\n"
-            resourceString += "  protocol = \"HTTP\"\n\n"
-            resourceString += "  default_action {\n"
-            resourceString += "    type             = \"forward\"\n"
-            resourceString += "    target_group_arn = \"${aws_lb_target_group.waferALBTG.arn}\"\n"
-            resourceString += "  }\n"
-            resourceString += "}\n\n"
-            
-            listTemp = []
-            listTemp.append("ALB_DNS_Name")
-            listTemp.append("ALB DNS Name")
-            listTemp.append("aws_lb.waferALB.dns_name")
-            resourcesList.append(listTemp)
-        # Let's check also if there's an API Gateway endpoint associated with the Web ACL.
-        try:
-            rApi = wafClient.list_resources_for_web_acl(WebACLId = AclId, ResourceType = "API_GATEWAY")
-        except:
-            function.abort(log, template, "list_resources_for_web_acl(API)")
-        if len(rApi['ResourceArns']) > 0:
-            log.write(function.getFormattedDateTime() + "Found at least one API Gateway endpoint associated with this Web ACL. Creating equivalent resource...\n")
-            log.write(function.getFormattedDateTime() + "Do not forget to change the API Gateway Integration method type to something different than 'MOCK'!\n")
-            print("Found at least one API Gateway endpoint associated with this Web ACL. Creating equivalent resource...")
-            resourceString += "resource \"aws_api_gateway_rest_api\" \"waferAPI\" {\n"
-            resourceString += "  name        = \"waferAPI\"\n"
-            resourceString += "  description = \"WAFER API\"\n"
-            resourceString += "}\n\n"
-
-            resourceString += "resource \"aws_api_gateway_resource\" \"waferAPIResource\" {\n"
-            resourceString += "  rest_api_id = \"${aws_api_gateway_rest_api.waferAPI.id}\"\n"
-            resourceString += "  parent_id   = \"${aws_api_gateway_rest_api.waferAPI.root_resource_id}\"\n"
-            resourceString += "  path_part   = \"WAFER\"\n"
-            resourceString += "}\n\n"
-
-            resourceString += "resource \"aws_api_gateway_method\" \"waferMethod\" {\n"
-            resourceString += "  rest_api_id   = \"${aws_api_gateway_rest_api.waferAPI.id}\"\n"
-            resourceString += "  resource_id   = \"${aws_api_gateway_resource.waferAPIResource.id}\"\n"
-            resourceString += "  http_method   = \"GET\"\n"
-            resourceString += "  authorization = \"NONE\"\n"
-            resourceString += "}\n\n"
-
-            resourceString += "resource \"aws_api_gateway_deployment\" \"waferDeployment\" {\n"
-            resourceString += "  depends_on  = [\"aws_api_gateway_integration.waferIntegration\"]\n"
-            resourceString += "  rest_api_id = \"${aws_api_gateway_rest_api.waferAPI.id}\"\n"
-            resourceString += "  stage_name  = \"test\"\n"
-            resourceString += "}\n\n"
-
-            resourceString += "resource \"aws_api_gateway_stage\" \"waferStage\" {\n"
-            resourceString += "  stage_name    = \"waferStage\"\n"
-            resourceString += "  rest_api_id   = \"${aws_api_gateway_rest_api.waferAPI.id}\"\n"
-            resourceString += "  deployment_id = \"${aws_api_gateway_deployment.waferDeployment.id}\"\n"
-            resourceString += "}\n\n"
-
-            resourceString += "resource \"aws_api_gateway_integration\" \"waferIntegration\" {\n"
-            resourceString += "  rest_api_id             = \"${aws_api_gateway_rest_api.waferAPI.id}\"\n"
-            resourceString += "  resource_id             = \"${aws_api_gateway_resource.waferAPIResource.id}\"\n"
-            resourceString += "  http_method             = \"${aws_api_gateway_method.waferMethod.http_method}\"\n"
-            resourceString += "  integration_http_method = \"GET\"\n"
-            resourceString += "  type                    = \"MOCK\"\n"
-            resourceString += "}\n\n"
-            
-            listTemp = []
-            listTemp.append("API_Gateway_Invoke_URL")
-            listTemp.append("API Gateway Invoke URL")
-            listTemp.append("aws_api_gateway_stage.waferStage.invoke_url")
-            resourcesList.append(listTemp)
-    else:
-        # It's a global WAF, so, we can check if there's a CloudFront distribution associated with the Web ACL.
-        try:
-            cloudFront = boto3.client('cloudfront')
-            rCfn = cloudFront.list_distributions_by_web_acl_id(WebACLId = AclId)
-        except:
-            function.abort(log, template, "list_distributions_by_web_acl_id(CloudFront)")
-        if rCfn['DistributionList']['Quantity'] > 0:
-            log.write(function.getFormattedDateTime() + "Found at least one CloudFront distribution associated with this Web ACL. Creating equivalent resource...\n")
-            print("Found at least one CloudFront distribution associated with this Web ACL. Creating equivalent resource...")
-            # We need to create an ALB first and then use it as the origin for the CloudFront distribution.
-            resourceString += "resource \"aws_vpc\" \"waferVPC\" {\n"
-            resourceString += "  cidr_block = \"10.10.0.0/16\"\n\n"
-            resourceString += "  tags = {\n"
-            resourceString += "    Name = \"WAFER\"\n"
-            resourceString += "  }\n"
-            resourceString += "}\n\n"
-
-            resourceString += "resource \"aws_subnet\" \"waferSubnet1\" {\n"
-            resourceString += "  vpc_id            = \"${aws_vpc.waferVPC.id}\"\n"
-            resourceString += "  availability_zone = \"us-east-1a\"\n" 
-            resourceString += "  cidr_block        = \"10.10.1.0/24\"\n\n"
-            resourceString += "  tags = {\n"
-            resourceString += "    Name = \"WAFER\"\n"
-            resourceString += "  }\n"
-            resourceString += "}\n\n"
-
-            resourceString += "resource \"aws_subnet\" \"waferSubnet2\" {\n"
-            resourceString += "  vpc_id            = \"${aws_vpc.waferVPC.id}\"\n"
-            resourceString += "  availability_zone = \"us-east-1b\"\n" 
-            resourceString += "  cidr_block        = \"10.10.2.0/24\"\n\n"
-            resourceString += "  tags = {\n"
-            resourceString += "    Name = \"WAFER\"\n"
-            resourceString += "  }\n"
-            resourceString += "}\n\n"
-
-            resourceString += "resource \"aws_internet_gateway\" \"waferIGW\" {\n"
-            resourceString += "  vpc_id = \"${aws_vpc.waferVPC.id}\"\n\n"
-            resourceString += "  tags = {\n"
-            resourceString += "    Name = \"WAFER\"\n"
-            resourceString += "  }\n"
-            resourceString += "}\n\n"
-
-            resourceString += "resource \"aws_route_table\" \"waferRT\" {\n"
-            resourceString += "  vpc_id     = \"${aws_vpc.waferVPC.id}\"\n\n"
-            resourceString += "  route {\n"
-            resourceString += "    cidr_block = \"0.0.0.0/0\"\n"
-            resourceString += "    gateway_id = \"${aws_internet_gateway.waferIGW.id}\"\n"
-            resourceString += "  }\n\n"
-            resourceString += "  tags = {\n"
-            resourceString += "    Name = \"WAFER\"\n"
-            resourceString += "  }\n"
-            resourceString += "}\n\n"
-
-            resourceString += "resource \"aws_route_table_association\" \"waferRTAssociation1\" {\n"
-            resourceString += "  subnet_id      = \"${aws_subnet.waferSubnet1.id}\"\n"
-            resourceString += "  route_table_id = \"${aws_route_table.waferRT.id}\"\n"
-            resourceString += "}\n\n"
-
-            resourceString += "resource \"aws_route_table_association\" \"waferRTAssociation2\" {\n"
-            resourceString += "  subnet_id      = \"${aws_subnet.waferSubnet2.id}\"\n"
-            resourceString += "  route_table_id = \"${aws_route_table.waferRT.id}\"\n"
-            resourceString += "}\n\n"
-            
-            resourceString += "resource \"aws_security_group\" \"waferALBSG\" {\n"
-            resourceString += "  name        = \"waferALBSG\"\n"
-            resourceString += "  description = \"Allow HTTP inbound traffic\"\n"
-            resourceString += "  vpc_id      = \"${aws_vpc.waferVPC.id}\"\n"
-            resourceString += "  ingress {\n"
-            resourceString += "    from_port   = 80\n"
-            resourceString += "    to_port     = 80\n"
-            resourceString += "    protocol    = \"tcp\"\n"
-            resourceString += "    cidr_blocks = [ \"0.0.0.0/0\" ]\n"
-            resourceString += "  }\n\n"
-            resourceString += "  egress {\n"
-            resourceString += "    from_port   = 0\n"
-            resourceString += "    to_port     = 0\n"
-            resourceString += "    protocol    = \"-1\"\n"
-            resourceString += "    cidr_blocks = [ \"0.0.0.0/0\" ]\n"
-            resourceString += "  }\n\n"
-            resourceString += "  tags = {\n"
-            resourceString += "     Name = \"WAFER\"\n"
-            resourceString += "  }\n"
-            resourceString += "}\n\n"
-            
-            resourceString += "resource \"aws_lb\" \"waferALB\" {\n"
-            resourceString += "  name               = \"waferALB\"\n"
-            resourceString += "  internal           = false\n"
-            resourceString += "  load_balancer_type = \"application\"\n"
-            resourceString += "  security_groups    = [\"${aws_security_group.waferALBSG.id}\"]\n"
-            resourceString += "  subnets            = [\"${aws_subnet.waferSubnet1.id}\", \"${aws_subnet.waferSubnet2.id}\"]\n\n"
-            resourceString += "  enable_cross_zone_load_balancing = true\n\n"
-            resourceString += "  tags = {\n"
-            resourceString += "    Name = \"WAFER\"\n"
-            resourceString += "  }\n"
-            resourceString += "}\n\n"
-
-            resourceString += "resource \"aws_lb_target_group\" \"waferALBTG\" {\n"
-            resourceString += "  name     = \"waferALBTG\"\n"
-            resourceString += "  port     = 80\n"
-            resourceString += "  protocol = \"HTTP\"\n"
-            resourceString += "  vpc_id   = \"${aws_vpc.waferVPC.id}\"\n"
-            resourceString += "}\n\n"
-
-            resourceString += "resource \"aws_lb_listener\" \"waferALBListener\" {\n"
-            resourceString += "  load_balancer_arn = \"${aws_lb.waferALB.arn}\"\n"
-            resourceString += "  port     = \"80\"\n"
-            resourceString += "  protocol = \"HTTP\"\n\n"
-            resourceString += "  default_action {\n"
-            resourceString += "    type             = \"forward\"\n"
-            resourceString += "    target_group_arn = \"${aws_lb_target_group.waferALBTG.arn}\"\n"
-            resourceString += "  }\n"
-            resourceString += "}\n\n"
-            
-            listTemp = []
-            listTemp.append("ALB_DNS_Name")
-            listTemp.append("ALB DNS Name")
-            listTemp.append("aws_lb.waferALB.dns_name")
-            resourcesList.append(listTemp)
-            
-            # Time to create the CloudFront distribution.
-            resourceString += "resource \"aws_cloudfront_distribution\" \"waferCFN\" {\n"
-            resourceString += "  comment    = \"WAFER CloudFront Distribution\"\n"
-            resourceString += "  enabled    = true\n"
-            resourceString += "  web_acl_id = \"${aws_waf_web_acl.web_acl.id}\"\n\n"
-            resourceString += "  origin {\n"
-            resourceString += "    domain_name = \"${aws_lb.waferALB.dns_name}\"\n"
-            resourceString += "    origin_id   = \"ELB-${aws_lb.waferALB.name}\"\n\n"
-            resourceString += "    custom_origin_config {\n"
-            resourceString += "      http_port              = 80\n"
-            resourceString += "      https_port             = 443\n"
-            resourceString += "      origin_protocol_policy = \"http-only\"\n"
-            resourceString += "      origin_ssl_protocols   = [\"TLSv1\", \"TLSv1.1\", \"TLSv1.2\", \"SSLv3\"]\n"
-            resourceString += "    }\n"
-            resourceString += "  }\n\n"
-            resourceString += "  default_cache_behavior {\n"
-            resourceString += "    allowed_methods  = [\"GET\", \"HEAD\", \"OPTIONS\", \"PUT\", \"POST\", \"PATCH\", \"DELETE\"]\n"
-            resourceString += "    cached_methods   = [\"GET\", \"HEAD\"]\n"
-            resourceString += "    target_origin_id = \"ELB-${aws_lb.waferALB.name}\"\n\n"
-            resourceString += "    forwarded_values {\n"
-            resourceString += "      query_string = true\n"
-            resourceString += "      headers      = [\"*\"]\n"
-            resourceString += "      cookies {\n"
-            resourceString += "        forward = \"all\"\n"
-            resourceString += "      }\n"
-            resourceString += "    }\n\n"
-            resourceString += "    viewer_protocol_policy = \"allow-all\"\n"
-            resourceString += "  }\n\n"
-            resourceString += "  viewer_certificate {\n"
-            resourceString += "    cloudfront_default_certificate = true\n"
-            resourceString += "  }\n\n"
-            resourceString += "  restrictions {\n"
-            resourceString += "    geo_restriction {\n"
-            resourceString += "      restriction_type = \"none\"\n"
-            resourceString += "    }\n"
-            resourceString += "  }\n"
-            resourceString += "}\n\n"
-
-            listTemp = []
-            listTemp.append("CloudFront_Distribution_Domain_Name")
-            listTemp.append("CloudFront Distribution Name")
-            listTemp.append("aws_cloudfront_distribution.waferCFN.domain_name")
-            resourcesList.append(listTemp)
-
-    return([resourcesList, resourceString])
+    if "ALB" in associated:
+        log.write(function.getFormattedDateTime() + "Found at least one ALB associated with this Web ACL. Creating equivalent resource...\n")
+        print("Found at least one ALB associated with this Web ACL. Creating equivalent resource...")
+        resourceBlocks.extend(albResources(region, nameSuffix))
+        
+        listTemp = []
+        listTemp.append("ALB_DNS_Name" + nameSuffix)
+        listTemp.append("ALB DNS Name")
+        listTemp.append("aws_lb.waferALB" + nameSuffix + ".dns_name")
+        resourcesList.append(listTemp)
+    # Let's check also if there's an API Gateway endpoint associated with the Web ACL.
+    if "API" in associated:
+        log.write(function.getFormattedDateTime() + "Found at least one API Gateway endpoint associated with this Web ACL. Creating equivalent resource...\n")
+        log.write(function.getFormattedDateTime() + "Do not forget to change the API Gateway Integration method type to something different than 'MOCK'!\n")
+        print("Found at least one API Gateway endpoint associated with this Web ACL. Creating equivalent resource...")
+        resourceBlocks.extend(apiGatewayResources(nameSuffix))
+        
+        listTemp = []
+        listTemp.append("API_Gateway_Invoke_URL" + nameSuffix)
+        listTemp.append("API Gateway Invoke URL")
+        listTemp.append("aws_api_gateway_stage.waferStage" + nameSuffix + ".invoke_url")
+        resourcesList.append(listTemp)
+    # It's a global WAF, so, we can check if there's a CloudFront distribution associated with the Web ACL.
+    if "CloudFront" in associated:
+        log.write(function.getFormattedDateTime() + "Found at least one CloudFront distribution associated with this Web ACL. Creating equivalent resource...\n")
+        print("Found at least one CloudFront distribution associated with this Web ACL. Creating equivalent resource...")
+        # We need to create an ALB first and then use it as the origin for the CloudFront distribution.
+        resourceBlocks.extend(albResources("us-east-1", nameSuffix))
+        
+        listTemp = []
+        listTemp.append("ALB_DNS_Name" + nameSuffix)
+        listTemp.append("ALB DNS Name")
+        listTemp.append("aws_lb.waferALB" + nameSuffix + ".dns_name")
+        resourcesList.append(listTemp)
+        
+        # Time to create the CloudFront distribution.
+        resourceBlocks.append(cloudFrontResource(nameSuffix))
+
+        listTemp = []
+        listTemp.append("CloudFront_Distribution_Domain_Name" + nameSuffix)
+        listTemp.append("CloudFront Distribution Name")
+        listTemp.append("aws_cloudfront_distribution.waferCFN" + nameSuffix + ".domain_name")
+        resourcesList.append(listTemp)
+
+    return([resourcesList, resourceBlocks])
+
+def albResources(region, nameSuffix):
+    '''
+    Returns the Terraform blocks of an internet-facing ALB in the provided region: VPC, subnets, Internet Gateway,
+    route table, security group, load balancer, target group and listener.
+    The name suffix is appended to the resource names, and also to the load balancer and target group names, which must be unique per region.
+    '''
+    awsNameSuffix = nameSuffix.replace("_", "-")
+    allTraffic = emit.stringList(["0.0.0.0/0"], spaced = True)
+    return ([
+        emit.block("resource", ["aws_vpc", "waferVPC" + nameSuffix], [
+            emit.attribute("cidr_block", "10.10.0.0/16"),
+            emit.blank(),
+            emit.attribute("tags", emit.tags("WAFER"))]),
+        emit.block("resource", ["aws_subnet", "waferSubnet1" + nameSuffix], [
+            emit.attribute("vpc_id", "${aws_vpc.waferVPC" + nameSuffix + ".id}", 17),
+            emit.attribute("availability_zone", region + "a", 17),
+            emit.attribute("cidr_block", "10.10.1.0/24", 17),
+            emit.blank(),
+            emit.attribute("tags", emit.tags("WAFER"))]),
+        emit.block("resource", ["aws_subnet", "waferSubnet2" + nameSuffix], [
+            emit.attribute("vpc_id", "${aws_vpc.waferVPC" + nameSuffix + ".id}", 17),
+            emit.attribute("availability_zone", region + "b", 17),
+            emit.attribute("cidr_block", "10.10.2.0/24", 17),
+            emit.blank(),
+            emit.attribute("tags", emit.tags("WAFER"))]),
+        emit.block("resource", ["aws_internet_gateway", "waferIGW" + nameSuffix], [
+            emit.attribute("vpc_id", "${aws_vpc.waferVPC" + nameSuffix + ".id}"),
+            emit.blank(),
+            emit.attribute("tags", emit.tags("WAFER"))]),
+        emit.block("resource", ["aws_route_table", "waferRT" + nameSuffix], [
+            emit.attribute("vpc_id", "${aws_vpc.waferVPC" + nameSuffix + ".id}", 10),
+            emit.blank(),
+            emit.block("route", [], [
+                emit.attribute("cidr_block", "0.0.0.0/0"),
+                emit.attribute("gateway_id", "${aws_internet_gateway.waferIGW" + nameSuffix + ".id}")]),
+            emit.blank(),
+            emit.attribute("tags", emit.tags("WAFER"))]),
+        emit.block("resource", ["aws_route_table_association", "waferRTAssociation1" + nameSuffix], [
+            emit.attribute("subnet_id", "${aws_subnet.waferSubnet1" + nameSuffix + ".id}", 14),
+            emit.attribute("route_table_id", "${aws_route_table.waferRT" + nameSuffix + ".id}", 14)]),
+        emit.block("resource", ["aws_route_table_association", "waferRTAssociation2" + nameSuffix], [
+            emit.attribute("subnet_id", "${aws_subnet.waferSubnet2" + nameSuffix + ".id}", 14),
+            emit.attribute("route_table_id", "${aws_route_table.waferRT" + nameSuffix + ".id}", 14)]),
+        emit.block("resource", ["aws_security_group", "waferALBSG" + nameSuffix], [
+            emit.attribute("name", "waferALBSG", 11),
+            emit.attribute("description", "Allow HTTP inbound traffic", 11),
+            emit.attribute("vpc_id", "${aws_vpc.waferVPC" + nameSuffix + ".id}", 11),
+            emit.block("ingress", [], [
+                emit.attribute("from_port", 80, 11),
+                emit.attribute("to_port", 80, 11),
+                emit.attribute("protocol", "tcp", 11),
+                emit.attribute("cidr_blocks", allTraffic, 11)]),
+            emit.blank(),
+            emit.block("egress", [], [
+                emit.attribute("from_port", 0, 11),
+                emit.attribute("to_port", 0, 11),
+                emit.attribute("protocol", "-1", 11),
+                emit.attribute("cidr_blocks", allTraffic, 11)]),
+            emit.blank(),
+            emit.attribute("tags", emit.tags("WAFER", "     "))]),
+        emit.block("resource", ["aws_lb", "waferALB" + nameSuffix], [
+            emit.attribute("name", "waferALB" + awsNameSuffix, 18),
+            emit.attribute("internal", False, 18),
+            emit.attribute("load_balancer_type", "application", 18),
+            emit.attribute("security_groups", emit.stringList(["${aws_security_group.waferALBSG" + nameSuffix + ".id}"]), 18),
+            emit.attribute("subnets", emit.stringList(["${aws_subnet.waferSubnet1" + nameSuffix + ".id}", "${aws_subnet.waferSubnet2" + nameSuffix + ".id}"]), 18),
+            emit.blank(),
+            emit.attribute("enable_cross_zone_load_balancing", True),
+            emit.blank(),
+            emit.attribute("tags", emit.tags("WAFER"))]),
+        emit.block("resource", ["aws_lb_target_group", "waferALBTG" + nameSuffix], [
+            emit.attribute("name", "waferALBTG" + awsNameSuffix, 8),
+            emit.attribute("port", 80, 8),
+            emit.attribute("protocol", "HTTP", 8),
+            emit.attribute("vpc_id", "${aws_vpc.waferVPC" + nameSuffix + ".id}", 8)]),
+        emit.block("resource", ["aws_lb_listener", "waferALBListener" + nameSuffix], [
+            emit.attribute("load_balancer_arn", "${aws_lb.waferALB" + nameSuffix + ".arn}", 17),
+            emit.attribute("port", "80", 8),
+            emit.attribute("protocol", "HTTP", 8),
+            emit.blank(),
+            emit.block("default_action", [], [
+                emit.attribute("type", "forward", 16),
+                emit.attribute("target_group_arn", "${aws_lb_target_group.waferALBTG" + nameSuffix + ".arn}", 16)])]),
+    ])
+
+def apiGatewayResources(nameSuffix):
+    '''
+    Returns the Terraform blocks of a REST API with a MOCK integration deployed to the waferStage stage.
+    The name suffix is appended to the resource names.
+    '''
+    return ([
+        emit.block("resource", ["aws_api_gateway_rest_api", "waferAPI" + nameSuffix], [
+            emit.attribute("name", "waferAPI", 11),
+            emit.attribute("description", "WAFER API", 11)]),
+        emit.block("resource", ["aws_api_gateway_resource", "waferAPIResource" + nameSuffix], [
+            emit.attribute("rest_api_id", "${aws_api_gateway_rest_api.waferAPI" + nameSuffix + ".id}", 11),
+            emit.attribute("parent_id", "${aws_api_gateway_rest_api.waferAPI" + nameSuffix + ".root_resource_id}", 11),
+            emit.attribute("path_part", "WAFER", 11)]),
+        emit.block("resource", ["aws_api_gateway_method", "waferMethod" + nameSuffix], [
+            emit.attribute("rest_api_id", "${aws_api_gateway_rest_api.waferAPI" + nameSuffix + ".id}", 13),
+            emit.attribute("resource_id", "${aws_api_gateway_resource.waferAPIResource" + nameSuffix + ".id}", 13),
+            emit.attribute("http_method", "GET", 13),
+            emit.attribute("authorization", "NONE", 13)]),
+        emit.block("resource", ["aws_api_gateway_deployment", "waferDeployment" + nameSuffix], [
+            emit.attribute("depends_on", emit.stringList(["aws_api_gateway_integration.waferIntegration" + nameSuffix]), 11),
+            emit.attribute("rest_api_id", "${aws_api_gateway_rest_api.waferAPI" + nameSuffix + ".id}", 11),
+            emit.attribute("stage_name", "test", 11)]),
+        emit.block("resource", ["aws_api_gateway_stage", "waferStage" + nameSuffix], [
+            emit.attribute("stage_name", "waferStage", 13),
+            emit.attribute("rest_api_id", "${aws_api_gateway_rest_api.waferAPI" + nameSuffix + ".id}", 13),
+            emit.attribute("deployment_id", "${aws_api_gateway_deployment.waferDeployment" + nameSuffix + ".id}", 13)]),
+        emit.block("resource", ["aws_api_gateway_integration", "waferIntegration" + nameSuffix], [
+            emit.attribute("rest_api_id", "${aws_api_gateway_rest_api.waferAPI" + nameSuffix + ".id}", 23),
+            emit.attribute("resource_id", "${aws_api_gateway_resource.waferAPIResource" + nameSuffix + ".id}", 23),
+            emit.attribute("http_method", "${aws_api_gateway_method.waferMethod" + nameSuffix + ".http_method}", 23),
+            emit.attribute("integration_http_method", "GET", 23),
+            emit.attribute("type", "MOCK", 23)]),
+    ])
+
+def cloudFrontResource(nameSuffix):
+    '''
+    Returns the Terraform block of a CloudFront distribution protected by the global Web ACL, using the ALB as origin.
+    The name suffix is the one given to the Web ACL and the ALB, and is appended to the distribution's resource name.
+    '''
+    return (emit.block("resource", ["aws_cloudfront_distribution", "waferCFN" + nameSuffix], [
+        emit.attribute("comment", "WAFER CloudFront Distribution", 10),
+        emit.attribute("enabled", True, 10),
+        emit.attribute("web_acl_id", "${aws_waf_web_acl.web_acl" + nameSuffix + ".id}", 10),
+        emit.blank(),
+        emit.block("origin", [], [
+            emit.attribute("domain_name", "${aws_lb.waferALB" + nameSuffix + ".dns_name}", 11),
+            emit.attribute("origin_id", "ELB-${aws_lb.waferALB" + nameSuffix + ".name}", 11),
+            emit.blank(),
+            emit.block("custom_origin_config", [], [
+                emit.attribute("http_port", 80, 22),
+                emit.attribute("https_port", 443, 22),
+                emit.attribute("origin_protocol_policy", "http-only", 22),
+                emit.attribute("origin_ssl_protocols", emit.stringList(["TLSv1", "TLSv1.1", "TLSv1.2", "SSLv3"]), 22)])]),
+        emit.blank(),
+        emit.block("default_cache_behavior", [], [
+            emit.attribute("allowed_methods", emit.stringList(["GET", "HEAD", "OPTIONS", "PUT", "POST", "PATCH", "DELETE"]), 16),
+            emit.attribute("cached_methods", emit.stringList(["GET", "HEAD"]), 16),
+            emit.attribute("target_origin_id", "ELB-${aws_lb.waferALB" + nameSuffix + ".name}", 16),
+            emit.blank(),
+            emit.block("forwarded_values", [], [
+                emit.attribute("query_string", True, 12),
+                emit.attribute("headers", emit.stringList(["*"]), 12),
+                emit.block("cookies", [], [emit.attribute("forward", "all")])]),
+            emit.blank(),
+            emit.attribute("viewer_protocol_policy", "allow-all")]),
+        emit.blank(),
+        emit.block("viewer_certificate", [], [emit.attribute("cloudfront_default_certificate", True)]),
+        emit.blank(),
+        emit.block("restrictions", [], [
+            emit.block("geo_restriction", [], [emit.attribute("restriction_type", "none")])]),
+    ]))